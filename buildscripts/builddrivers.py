@@ -13,6 +13,7 @@
 # Examples: 
 #           py builddrivers.py (for interactive mode)
 #           py builddrivers.py --PHPVER=7.0.22 --ARCH=x64 --THREAD=nts --DRIVER=all --DEBUG
+#           py builddrivers.py --MATRIX=8.2.14:x64:nts,8.2.14:x86:ts,8.3.1:x64:nts --SOURCE=C:\local\source
 #
 # Output: Build the drivers using PHP SDK. When running for local development, if build is unsuccessful, 
 #         the log file will be launched for examination. Otherwise, the drivers will be renamed 
@@ -21,17 +22,20 @@
 #############################################################################################
 
 import sys
+import time
 import shutil
 import os.path
 import argparse
 import subprocess
-from buildtools import BuildUtil
+from concurrent.futures import ThreadPoolExecutor
+from buildtools import BuildUtil, PosixBuildUtil
 
 class BuildDriver(object):
     """Build sqlsrv and/or pdo_sqlsrv drivers with PHP source with the following properties:
     
     Attributes:
         util            # BuildUtil object whose constructor takes phpver, driver, arch, thread, debug 
+                        # or PosixBuildUtil object if php_config is given
         repo            # GitHub repository
         branch          # GitHub repository branch
         dest_path       # alternative destination for the drivers (None for development builds)
@@ -41,8 +45,12 @@ class BuildDriver(object):
         testing         # whether the user has turned on testing mode
     """
     
-    def __init__(self, phpver, driver, arch, thread, debug, repo, branch, source, path, testing, no_rename):
-        self.util = BuildUtil(phpver, driver, arch, thread, no_rename, debug)
+    def __init__(self, phpver, driver, arch, thread, debug, repo, branch, source, path, testing, no_rename, cache_dir = None, work_dir = None, parallel_jobs = None, 
+                 php_config = None, build_root = None, ccache = False, profile = 'release', link_source = False):
+        if php_config is None:
+            self.util = BuildUtil(phpver, driver, arch, thread, no_rename, debug, cache_dir, work_dir, parallel_jobs, link_source)
+        else:
+            self.util = PosixBuildUtil(php_config, driver, no_rename, debug, cache_dir, work_dir, parallel_jobs, build_root, ccache, profile, link_source)
         self.repo = repo
         self.branch = branch
         self.source_path = source
@@ -59,6 +67,7 @@ class BuildDriver(object):
         print('Driver: ', self.util.driver) 
         print('Source: ', self.source_path)
         print('Debug enabled: ', self.util.debug_enabled) 
+        print('Build cache: ', self.util.cache_dir)
         print()
 
     def clean_or_remove(self, root_dir, work_dir):
@@ -87,7 +96,10 @@ class BuildDriver(object):
                 self.util.remove_old_builds(root_dir)
             else:
                 print('Will remove ' + phpsrc)
-                os.system('RMDIR /s /q ' + phpsrc)
+                if os.name == 'nt':
+                    os.system('RMDIR /s /q ' + phpsrc)
+                else:
+                    shutil.rmtree(phpsrc, ignore_errors=True)
                 
             os.chdir(work_dir)  # change back to the working directory
 
@@ -122,7 +134,7 @@ class BuildDriver(object):
         :outcome: the drivers and symbols will renamed and placed in the appropriate location(s)
 
         """
-        work_dir = os.path.dirname(os.path.realpath(__file__))
+        work_dir = self.util.work_dir
         
         get_source = False if self.source_path is None else True
         if self.repo is None or self.branch is None:
@@ -131,7 +143,7 @@ class BuildDriver(object):
 
         if not get_source:
             # This will download from the specified branch on GitHub repo and copy the source
-            self.util.download_msphpsql_source(repo, branch)
+            self.util.download_msphpsql_source(repo, branch, work_dir=work_dir)
         else:
             source = self.source_path 
             # Do not prompt user for input if it's in a testing mode 
@@ -143,9 +155,7 @@ class BuildDriver(object):
             dir_list = os.listdir(source)
             print("Files and directories in '", source, "' :")
                 
-            os.system('ROBOCOPY ' + source + '\shared ' + work_dir + '\Source\shared /xx /xo ')
-            os.system('ROBOCOPY ' + source + '\sqlsrv ' + work_dir + '\Source\sqlsrv /xx /xo ')
-            os.system('ROBOCOPY ' + source + '\pdo_sqlsrv ' + work_dir + '\Source\pdo_sqlsrv /xx /xo ')
+            self.util.copy_source(source, os.path.join(work_dir, 'Source'))
                     
         print('Start building PHP with the extension...')
 
@@ -166,15 +176,12 @@ class BuildDriver(object):
             if os.path.exists(dest_symbols) == False:
                 os.makedirs(dest_symbols)
                 
-            # Now copy all the binaries
-            if self.util.driver == 'all':
-                self.util.copy_binary(ext_dir, dest_drivers, 'sqlsrv', '.dll')
-                self.util.copy_binary(ext_dir, dest_symbols, 'sqlsrv', '.pdb')
-                self.util.copy_binary(ext_dir, dest_drivers, 'pdo_sqlsrv', '.dll')
-                self.util.copy_binary(ext_dir, dest_symbols, 'pdo_sqlsrv', '.pdb')
-            else:
-                self.util.copy_binary(ext_dir, dest_drivers, self.util.driver, '.dll')
-                self.util.copy_binary(ext_dir, dest_symbols, self.util.driver, '.pdb')
+            # Now copy all the binaries, and the symbols if there are any
+            drivers = ['sqlsrv', 'pdo_sqlsrv'] if self.util.driver == 'all' else [self.util.driver]
+            for driver in drivers:
+                self.util.copy_binary(ext_dir, dest_drivers, driver, self.util.binary_suffix)
+                if self.util.symbols_suffix is not None:
+                    self.util.copy_binary(ext_dir, dest_symbols, driver, self.util.symbols_suffix)
 
         return ext_dir
 
@@ -185,8 +192,8 @@ class BuildDriver(object):
         """
         self.show_config()
     
-        work_dir = os.path.dirname(os.path.realpath(__file__))
-        root_dir = 'C:' + os.sep
+        work_dir = self.util.work_dir
+        root_dir = 'C:' + os.sep if os.name == 'nt' else work_dir
         
         quit = False
         while not quit:
@@ -231,6 +238,115 @@ class BuildDriver(object):
             
             os.chdir(work_dir)    
 
+class BuildMatrix(object):
+    """Build a matrix of configurations non-interactively and concurrently. 
+    Each configuration runs builddrivers.py in testing mode in a separate 
+    process, with its own work directory and log file, and the number of 
+    concurrent builds is limited by the CPU and memory budgets.
+    
+    Attributes:
+        configs         # list of (phpver, arch, thread) tuples, with the path to 
+                        # php-config as the fourth element in Linux and macOS
+        args            # list of command-line arguments shared by all builds
+        root_dir        # root of the per-configuration work directories
+        cpus            # number of CPUs available to the builds
+        jobs            # number of concurrent builds
+        parallel_jobs   # number of parallel compile jobs (/MP) of each build
+    """
+
+    def __init__(self, configs, args, root_dir, cpus = None, memory = None, mem_per_build = 2, jobs = None):
+        self.configs = configs
+        self.args = args
+        self.root_dir = root_dir
+        self.cpus = cpus if cpus is not None else os.cpu_count() or 1
+
+        if jobs is None:
+            jobs = self.cpus
+            if memory is not None:
+                jobs = min(jobs, int(memory // mem_per_build))
+        self.jobs = max(1, min(jobs, len(configs)))
+        self.parallel_jobs = max(1, self.cpus // self.jobs)
+
+    @staticmethod
+    def parse_configs(matrix):
+        """Return the list of (phpver, arch, thread) tuples in *matrix*, which 
+        is either a comma separated list or the path to a file with one 
+        configuration per line, each in the format phpver:arch:thread. In 
+        Linux and macOS, each configuration is the path to php-config of a 
+        PHP installation instead.
+        """
+        # An executable file in Linux and macOS is php-config itself, not a list
+        if os.path.isfile(matrix) and not (os.name != 'nt' and os.access(matrix, os.X_OK)):
+            with open(matrix) as f:
+                entries = [line.strip() for line in f]
+        else:
+            entries = [entry.strip() for entry in matrix.split(',')]
+
+        configs = []
+        for entry in entries:
+            if entry == '' or entry.startswith('#'):
+                continue
+            if os.name != 'nt':
+                util = PosixBuildUtil(entry, 'all', False)
+                configs.append((util.phpver, util.arch, util.thread, entry))
+                continue
+            fields = entry.split(':')
+            if len(fields) != 3 or fields[1] not in ['x64', 'x86'] or fields[2] not in ['nts', 'ts']:
+                print('Invalid configuration', entry, '- expecting phpver:arch:thread, e.g. 8.3.1:x64:nts')
+                exit(1)
+            configs.append(tuple(fields))
+        return configs
+
+    def build_config(self, config):
+        """Build one configuration and return a tuple of (config, return code, 
+        elapsed seconds, log file).
+        """
+        phpver, arch, thread = config[:3]
+        label = ':'.join(config[:3])
+        work_dir = os.path.join(self.root_dir, phpver + '-' + arch + '-' + thread)
+        if not os.path.exists(work_dir):
+            os.makedirs(work_dir)
+        log_file = os.path.join(work_dir, 'builddrivers.log')
+
+        if len(config) > 3:
+            options = ['--PHP_CONFIG=' + config[3]]
+        else:
+            options = ['--PHPVER=' + phpver, '--ARCH=' + arch, '--THREAD=' + thread]
+        command = [sys.executable, os.path.realpath(__file__)] + options + [
+                   '--WORKDIR=' + work_dir, '--MP=' + str(self.parallel_jobs), 
+                   '--TESTING'] + self.args
+
+        print('Starting', label, '- log file', log_file)
+        start = time.time()
+        with open(log_file, 'w') as log:
+            result = subprocess.run(command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+        elapsed = time.time() - start
+        print('Finished', label, 'in', '%.1fs' % elapsed)
+
+        return (config, result.returncode, elapsed, log_file)
+
+    def build(self):
+        """Build all configurations and print a summary. Return the number 
+        of failed builds.
+        """
+        print('Building', len(self.configs), 'configurations,', self.jobs, 'at a time, with /MP' + str(self.parallel_jobs))
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(self.build_config, self.configs))
+        elapsed = time.time() - start
+
+        print()
+        print('%-24s %-8s %10s  %s' % ('Configuration', 'Status', 'Time', 'Log file'))
+        failed = 0
+        for config, returncode, seconds, log_file in results:
+            status = 'OK' if returncode == 0 else 'FAILED'
+            if returncode != 0:
+                failed += 1
+            print('%-24s %-8s %9.1fs  %s' % (':'.join(config[:3]), status, seconds, log_file))
+        print()
+        print('Total time: %.1fs, %d succeeded, %d failed' % (elapsed, len(results) - failed, failed))
+        return failed
+
 def validate_input(question, values):
     """Return the user selected value, and it must be valid based on *values*."""
     while True:
@@ -258,6 +374,20 @@ if __name__ == '__main__':
     parser.add_argument('--TESTING', action='store_true', help="turns on testing mode (default: False)")
     parser.add_argument('--DESTPATH', default=None, help="an alternative destination for the drivers (default: None)")
     parser.add_argument('--NO_RENAME', action='store_true', help="drivers will not be renamed(default: False)")
+    parser.add_argument('--CACHEDIR', default=None, help="a local path to cache the built binaries, keyed by source and toolchain (default: None)")
+    parser.add_argument('--WORKDIR', default=None, help="the working directory of the build (default: the directory of this script)")
+    parser.add_argument('--MP', type=int, default=None, help="number of source files to compile in parallel (default: 1 in Windows, all CPUs otherwise)")
+    parser.add_argument('--MATRIX', default=None, help="build a list of configurations phpver:arch:thread, comma separated or in a file, concurrently (default: None)")
+    parser.add_argument('--MATRIX_DIR', default=None, help="root of the work directories of the matrix builds (default: 'matrix' in the directory of this script)")
+    parser.add_argument('--JOBS', type=int, default=None, help="maximum number of concurrent matrix builds (default: based on CPU and memory budget)")
+    parser.add_argument('--CPUS', type=int, default=None, help="number of CPUs available to the matrix builds (default: all)")
+    parser.add_argument('--MEMORY', type=float, default=None, help="memory in GB available to the matrix builds (default: None)")
+    parser.add_argument('--PHP_CONFIG', default=None, help="(Linux and macOS) php-config of the PHP installation to build against (default: php-config in PATH)")
+    parser.add_argument('--BUILD_ROOT', default=None, help="(Linux and macOS) root of the out-of-tree build directories (default: 'build' in the working directory)")
+    parser.add_argument('--CCACHE', action='store_true', help="(Linux and macOS) compile with ccache (default: False)")
+    parser.add_argument('--PROFILE', default='release', choices=sorted(PosixBuildUtil.FLAG_PROFILES), help="(Linux and macOS) compiler flag profile (default: release)")
+    parser.add_argument('--LINK_SOURCE', action='store_true', help="hard link the driver source into the build tree instead of copying it, where possible (default: False)")
+    parser.add_argument('--MEM_PER_BUILD', type=float, default=2, help="memory in GB reserved for each matrix build (default: 2)")
 
     args = parser.parse_args()
 
@@ -272,8 +402,50 @@ if __name__ == '__main__':
     path = args.DESTPATH
     testing = args.TESTING
     no_rename = args.NO_RENAME
+    cache_dir = args.CACHEDIR
+
+    if args.MATRIX is not None:
+        # The non-interactive matrix mode, in which every configuration is 
+        # built in testing mode by a separate process
+        configs = BuildMatrix.parse_configs(args.MATRIX)
+        
+        shared_args = ['--DRIVER=' + driver]
+        if debug:
+            shared_args.append('--DEBUG')
+        if source is not None:
+            shared_args.append('--SOURCE=' + os.path.realpath(source))
+        else:
+            shared_args += ['--REPO=' + repo, '--BRANCH=' + branch]
+        if path is not None:
+            shared_args.append('--DESTPATH=' + os.path.realpath(path))
+        if no_rename:
+            shared_args.append('--NO_RENAME')
+        if cache_dir is not None:
+            shared_args.append('--CACHEDIR=' + os.path.realpath(cache_dir))
+        if args.CCACHE:
+            shared_args.append('--CCACHE')
+        if args.PROFILE != 'release':
+            shared_args.append('--PROFILE=' + args.PROFILE)
+        if args.LINK_SOURCE:
+            shared_args.append('--LINK_SOURCE')
+
+        matrix_dir = args.MATRIX_DIR
+        if matrix_dir is None:
+            matrix_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'matrix')
+
+        matrix = BuildMatrix(configs, shared_args, os.path.realpath(matrix_dir), args.CPUS, args.MEMORY, args.MEM_PER_BUILD, args.JOBS)
+        failed = matrix.build()
+        exit(1 if failed > 0 else 0)
+
+    php_config = args.PHP_CONFIG
+    if os.name != 'nt' and php_config is None:
+        # phpize builds use the PHP version, arch and thread of the installed PHP
+        php_config = shutil.which('php-config')
+        if php_config is None:
+            print('Could not find php-config, please use --PHP_CONFIG')
+            exit(1)
 
-    if phpver is None:
+    if phpver is None and php_config is None:
         # starts interactive mode, testing mode is False
         # will not prompt for drivers' destination path, which is None by default
         while True:
@@ -318,6 +490,14 @@ if __name__ == '__main__':
                           source, 
                           path,
                           testing,
-                          no_rename)
+                          no_rename,
+                          cache_dir,
+                          args.WORKDIR,
+                          args.MP,
+                          php_config,
+                          args.BUILD_ROOT,
+                          args.CCACHE,
+                          args.PROFILE,
+                          args.LINK_SOURCE)
 
     builder.build()
@@ -2,7 +2,8 @@
 #########################################################################################
 #
 # Description:  The class BuildUtil will build Microsoft SQL Server PHP 7+ Drivers 
-#               for 32 bit and 64 bit.
+#               for 32 bit and 64 bit. The class PosixBuildUtil builds the drivers
+#               with phpize in Linux and macOS.
 #
 # Requirement:
 #               python 3.x
@@ -10,6 +11,8 @@
 #               Driver source code folder
 #               Git for Windows
 #               Visual Studio 2015 (PHP 7.0* and 7.1*) and Visual Studio 2017 (PHP 7.2*)
+#               (Linux and macOS) PHP development package with phpize and php-config,
+#               autoconf, make, a C++ compiler and unixODBC development headers
 #
 # Output: The drivers will be renamed and copied to the specified location.
 #
@@ -19,6 +22,9 @@ import shutil
 import os.path
 import stat
 import datetime
+import hashlib
+import platform
+import subprocess
 import urllib.request
 import zipfile 
 import fileinput
@@ -33,16 +39,30 @@ class BuildUtil(object):
         thread          # nts or ts
         no_rename       # do NOT rename the drivers if True
         debug_enabled   # whether debug is enabled
+        cache_dir       # root of the build artifact cache (None to disable caching)
+        work_dir        # working directory of this build (default: the directory of this script)
+        parallel_jobs   # number of source files the compiler may build in parallel (/MP)
+        link_source     # hard link the driver source into the build tree instead of copying it if True
     """
+
+    binary_suffix = '.dll'
+    symbols_suffix = '.pdb'
     
-    def __init__(self, phpver, driver, arch, thread, no_rename, debug_enabled = False):
+    def __init__(self, phpver, driver, arch, thread, no_rename, debug_enabled = False, cache_dir = None, work_dir = None, parallel_jobs = None, link_source = False):
         self.phpver = phpver
         self.driver = driver.lower()
         self.arch = arch.lower()
         self.thread = thread.lower()
         self.no_rename = no_rename
         self.debug_enabled = debug_enabled
+        self.cache_dir = cache_dir
+        self.work_dir = work_dir
+        if work_dir is None:
+            self.work_dir = os.path.dirname(os.path.realpath(__file__))
+        self.parallel_jobs = parallel_jobs if parallel_jobs is not None else 1
+        self.link_source = link_source
         self.vc = ''
+        self.vs_version = ''
 
     def major_version(self):
         """Return the major version number based on the PHP version."""
@@ -88,6 +108,7 @@ class BuildUtil(object):
         with open('temp.txt', 'r') as f:
             ver = f.readline()
             print('Version: ' + ver)
+        self.vs_version = ver.strip()
         vc = ver[:2]
         if vc == '15':
             return 'vc15'
@@ -182,7 +203,7 @@ class BuildUtil(object):
     @staticmethod
     def update_file_content(file, search_str, new_str):
         """Find *search_str* and replace it by *new_str* in a *file*"""
-        os.chmod(file, stat.S_IWRITE)
+        os.chmod(file, os.stat(file).st_mode | stat.S_IWRITE)
         with fileinput.FileInput(file, inplace=True) as f:
             for line in f:
                 print(line.replace(search_str, new_str), end='')
@@ -232,33 +253,110 @@ class BuildUtil(object):
         file.write('@CALL ROBOCOPY ' + source + ' ' + dest + ' /s /xx /xo' + os.linesep)
     
     @staticmethod
-    def download_msphpsql_source(repo, branch, dest_folder = 'Source'):
-        """Download to *dest_folder* the msphpsql archive of the specified 
-        GitHub *repo* and *branch*. The downloaded files will be removed by default.
+    def copy_source(source, dest):
+        """Copy the shared, sqlsrv and pdo_sqlsrv folders in *source* to *dest*."""
+        os.system('ROBOCOPY ' + source + '\\shared ' + dest + '\\shared /xx /xo ')
+        os.system('ROBOCOPY ' + source + '\\sqlsrv ' + dest + '\\sqlsrv /xx /xo ')
+        os.system('ROBOCOPY ' + source + '\\pdo_sqlsrv ' + dest + '\\pdo_sqlsrv /xx /xo ')
+
+    @staticmethod
+    def file_digest(path):
+        """Return the SHA-256 digest of the contents of the file *path*."""
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                sha.update(chunk)
+        return sha.digest()
+
+    @classmethod
+    def sync_tree(cls, source, dest, link = False):
+        """Copy the files in *source* to *dest* recursively, but only those 
+        that are missing in *dest* or whose contents differ, so that unchanged 
+        files keep their timestamps and are not recompiled. If *link* is True, 
+        the files are hard linked instead of copied where possible. Files in 
+        *dest* that are not in *source* are left alone. Return the number of 
+        files updated.
+        """
+        updated = 0
+        for root, dirs, files in os.walk(source):
+            dest_root = os.path.join(dest, os.path.relpath(root, source))
+            if not os.path.exists(dest_root):
+                os.makedirs(dest_root)
+            for name in files:
+                src_file = os.path.join(root, name)
+                dest_file = os.path.join(dest_root, name)
+                if os.path.exists(dest_file):
+                    if os.path.samefile(src_file, dest_file):
+                        continue
+                    if os.path.getsize(src_file) == os.path.getsize(dest_file) and cls.file_digest(src_file) == cls.file_digest(dest_file):
+                        continue
+                    # Never write through an existing file, which might be 
+                    # a hard link shared with another tree
+                    os.chmod(dest_file, os.stat(dest_file).st_mode | stat.S_IWRITE)
+                    os.remove(dest_file)
+                
+                copied = False
+                if link:
+                    try:
+                        os.link(src_file, dest_file)
+                        copied = True
+                    except OSError:
+                        pass
+                if not copied:
+                    shutil.copy2(src_file, dest_file)
+                updated += 1
+        return updated
+
+    @classmethod
+    def sync_driver_source(cls, source_dir, ext_dir, driver, link = False):
+        """Synchronize the *driver* source, with the shared source as a 
+        subfolder, from *source_dir* to *ext_dir*.
+        """
+        updated = cls.sync_tree(os.path.join(source_dir, driver), os.path.join(ext_dir, driver), link)
+        updated += cls.sync_tree(os.path.join(source_dir, 'shared'), os.path.join(ext_dir, driver, 'shared'), link)
+        print('Synchronized', driver, 'source:', updated, 'file(s) updated')
+        return updated
+
+    @staticmethod
+    def update_mirror(repo, branch, mirror):
+        """Update the local clone *mirror* of the msphpsql repository to 
+        the latest commit of *branch* in GitHub *repo*, cloning it first if 
+        it does not exist. The clone is kept and reused across builds.
+        """
+        url = 'https://github.com/' + repo + '/msphpsql.git'
+        if not os.path.exists(os.path.join(mirror, '.git')):
+            subprocess.run(['git', 'clone', '--no-checkout', url, mirror], check=True)
+        else:
+            subprocess.run(['git', 'remote', 'set-url', 'origin', url], cwd=mirror, check=True)
+        subprocess.run(['git', 'fetch', '--depth', '1', 'origin', branch], cwd=mirror, check=True)
+        subprocess.run(['git', 'checkout', '--force', 'FETCH_HEAD'], cwd=mirror, check=True)
+
+    @classmethod
+    def download_msphpsql_source(cls, repo, branch, dest_folder = 'Source', work_dir = None):
+        """Download to *dest_folder* the msphpsql source of the specified 
+        GitHub *repo* and *branch*. The local mirror of the repository in the 
+        temp folder is reused and updated with git fetch, and only the files 
+        that have changed are copied to *dest_folder*.
         """
         try:
-            work_dir = os.path.dirname(os.path.realpath(__file__))   
+            if work_dir is None:
+                work_dir = os.path.dirname(os.path.realpath(__file__))   
 
             temppath = os.path.join(work_dir, 'temp')
             # There is no need to remove tree - 
             # for Bamboo, it will be cleaned up eventually
-            # for local development, this can act as a cached copy of the repo
+            # for local development, this acts as a cached copy of the repo
             if not os.path.exists(temppath):
                 os.makedirs(temppath)
-            os.chdir(temppath)
             
-            msphpsqlFolder = os.path.join(temppath, 'msphpsql-' + branch)
-            
-            url = 'https://github.com/' + repo + '/msphpsql.git'
-            command = 'git clone ' + url + ' -b ' + branch + ' --single-branch --depth 1 ' + msphpsqlFolder
-            os.system(command)
+            msphpsqlFolder = os.path.join(temppath, 'msphpsql-' + repo)
+            cls.update_mirror(repo, branch, msphpsqlFolder)
             
             source = os.path.join(msphpsqlFolder, 'source')
             os.chdir(work_dir)
             
-            os.system('ROBOCOPY ' + source + '\shared ' + dest_folder + '\shared /xx /xo')
-            os.system('ROBOCOPY ' + source + '\pdo_sqlsrv ' + dest_folder + '\pdo_sqlsrv /xx /xo')
-            os.system('ROBOCOPY ' + source + '\sqlsrv ' + dest_folder + '\sqlsrv /xx /xo')
+            for folder in ['shared', 'sqlsrv', 'pdo_sqlsrv']:
+                cls.sync_tree(os.path.join(source, folder), os.path.join(dest_folder, folder))
                 
         except:
             print('Error occurred when downloading source')
@@ -326,14 +424,19 @@ class BuildUtil(object):
             cmd_line = cmd_line + ' --disable-zts'
         return cmd_line
     
-    def create_local_batch_file(self, make_clean, cmd_line, log_file):
-        """Generate the batch file to be picked up by the PHP starter script."""
+    def create_local_batch_file(self, make_clean, cmd_line, log_file, copy_source = True):
+        """Generate the batch file to be picked up by the PHP starter script. 
+        The driver source is copied by the batch file only if *copy_source* is True.
+        """
         filename = 'phpsdk-build-task.bat'
         print('Generating ', filename)
         try:
-            file = open(filename, 'w')
+            file = open(os.path.join(self.work_dir, filename), 'w')
             file.write('@ECHO OFF' + os.linesep)
             file.write('SET currDir=%CD%' + os.linesep)
+            if self.parallel_jobs > 1:
+                # cl.exe picks up additional options from the CL environment variable
+                file.write('SET CL=/MP' + str(self.parallel_jobs) + os.linesep)
             file.write('SET LOG_NAME=%currDir%\\' + log_file + os.linesep)       
             file.write('@CALL phpsdk_buildtree phpdev > %LOG_NAME% 2>&1' + os.linesep)
             
@@ -350,12 +453,13 @@ class BuildUtil(object):
             file.write('SET phpSrc=%CD%' + os.linesep)
             file.write('@CALL phpsdk_deps -u >> %LOG_NAME% 2>&1' + os.linesep)
             
-            # copy source files to extension
-            if self.driver == 'all':
-                self.write_lines_to_copy_source('sqlsrv', file)
-                self.write_lines_to_copy_source('pdo_sqlsrv', file)
-            else:
-                self.write_lines_to_copy_source(self.driver, file)
+            # copy source files to extension, unless they are already synchronized
+            if copy_source:
+                if self.driver == 'all':
+                    self.write_lines_to_copy_source('sqlsrv', file)
+                    self.write_lines_to_copy_source('pdo_sqlsrv', file)
+                else:
+                    self.write_lines_to_copy_source(self.driver, file)
             
             # configure and build
             file.write('@CALL buildconf --force >> %LOG_NAME% 2>&1' + os.linesep)
@@ -370,13 +474,106 @@ class BuildUtil(object):
         except:
             print('Cannot create ', filename)
 
+    def toolchain_label(self, sdk_dir):
+        """Return a label identifying the compiler used for this build. If 
+        vswhere.exe is available in the PHP SDK, the installed Visual Studio 
+        version is included as well.
+        """
+        vc = self.compiler_version(sdk_dir)
+        vswhere = os.path.join(sdk_dir, 'php-sdk', 'bin', 'vswhere.exe')
+        if os.path.exists(vswhere):
+            vs_ver = 16 if vc == 'vs16' else 15
+            vc = self.determine_compiler(sdk_dir, vs_ver)
+            return vc + '-' + self.vs_version
+        return vc
+
+    def build_cache_key(self, source_dir, sdk_dir):
+        """Return the cache key of the current build configuration, which is 
+        a hash of the driver source in *source_dir*, the PHP version, the 
+        build options and the compiler.
+        """
+        sha = hashlib.sha256()
+        for folder in ['shared', 'sqlsrv', 'pdo_sqlsrv']:
+            folder_path = os.path.join(source_dir, folder)
+            for root, dirs, files in os.walk(folder_path):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    rel_path = os.path.relpath(path, source_dir).replace(os.sep, '/')
+                    sha.update(rel_path.encode('utf-8') + b'\0')
+                    with open(path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(65536), b''):
+                            sha.update(chunk)
+                    sha.update(b'\0')
+
+        config = [self.phpver, self.arch, self.thread, self.driver, 
+                  str(self.no_rename), self.generate_build_options(), 
+                  self.toolchain_label(sdk_dir)]
+        sha.update('|'.join(config).encode('utf-8'))
+        return sha.hexdigest()
+
+    def php_source_exists(self, sdk_dir):
+        """Return True if the PHP source folder exists in *sdk_dir*."""
+        return os.path.exists(self.phpsrc_root(sdk_dir))
+
+    def cache_path(self, key):
+        """Return the cache folder for the given *key*."""
+        return os.path.join(self.cache_dir, self.phpver + '-' + self.arch + '-' + self.thread, key)
+
+    def restore_from_cache(self, key, sdk_dir):
+        """Copy the cached binaries for *key* into the build folder. Return 
+        True on a cache hit, or False if there is nothing cached for *key* 
+        or the PHP source folder is missing.
+        """
+        if self.cache_dir is None:
+            return False
+        cached = self.cache_path(key)
+        if not os.path.exists(os.path.join(cached, 'complete')):
+            print('Build cache miss: ', key)
+            return False
+        if not self.php_source_exists(sdk_dir):
+            print('Build cache ignored, PHP source folder is missing')
+            return False
+
+        print('Build cache hit: ', key)
+        build_dir = self.build_abs_path(sdk_dir)
+        if not os.path.exists(build_dir):
+            os.makedirs(build_dir)
+        for name in os.listdir(cached):
+            if name != 'complete':
+                shutil.copy2(os.path.join(cached, name), build_dir)
+        return True
+
+    def save_to_cache(self, key, sdk_dir):
+        """Store the binaries in the build folder under *key*. Only the files 
+        in the top level of the build folder are stored, i.e. the PHP binaries 
+        and the drivers with their symbols, not the intermediate object files.
+        """
+        if self.cache_dir is None:
+            return
+        build_dir = self.build_abs_path(sdk_dir)
+        if not os.path.exists(build_dir):
+            return
+
+        cached = self.cache_path(key)
+        shutil.rmtree(cached, ignore_errors=True)
+        os.makedirs(cached)
+        print('Saving binaries to build cache', cached)
+        for name in os.listdir(build_dir):
+            path = os.path.join(build_dir, name)
+            # php.ini is generated by copy_binaries() every time
+            if os.path.isfile(path) and name != 'php.ini':
+                shutil.copy2(path, cached)
+        # Mark the cache entry as usable only after all files are copied
+        open(os.path.join(cached, 'complete'), 'w').close()
+
     def build_drivers(self, make_clean = False, dest = None, log_file = None):
         """Build sqlsrv/pdo_sqlsrv extensions for PHP, assuming the Source folder 
         exists in the working directory, and this folder will be removed when the build 
         is complete.
         """
         print("build_drivers")
-        work_dir = os.path.dirname(os.path.realpath(__file__))   
+        work_dir = self.work_dir
         # First, update the driver source file contents
         source_dir = os.path.join(work_dir, 'Source')
         if self.driver == 'all':
@@ -389,22 +586,28 @@ class BuildUtil(object):
         cmd_line = self.generate_build_options()
         print('cmd_line: ' + cmd_line)
 
+        # if *dest* is None, simply use the current working directory
+        sdk_dir = dest
+        copy_to_ext = True      # this determines where to copy the binaries to
+        if dest is None:
+            sdk_dir = work_dir
+            copy_to_ext = False
+
+        # If the PHP source already exists, the driver source is synchronized 
+        # here, so only the changed files are updated and recompiled. 
+        # Otherwise, the batch file copies the source after cloning PHP source.
+        ext_dir = os.path.join(self.phpsrc_root(sdk_dir), 'ext')
+        sync_source = os.path.exists(ext_dir)
+
         # Generate a batch file based on the inputs
         if log_file is None:
             log_file = self.get_logfile_name()
         
-        batch_file = self.create_local_batch_file(make_clean, cmd_line, log_file)
+        batch_file = self.create_local_batch_file(make_clean, cmd_line, log_file, not sync_source)
         
         # Reference: https://github.com/php/php-sdk-binary-tools
         # Clone the master branch of PHP sdk if the directory does not exist 
         print('Downloading the latest php SDK...')
-        
-        # if *dest* is None, simply use the current working directory
-        sdk_dir = dest
-        copy_to_ext = True      # this determines where to copy the binaries to
-        if dest is None:
-            sdk_dir = work_dir
-            copy_to_ext = False
 
         phpSDK = os.path.join(sdk_dir, 'php-sdk')
         if not os.path.exists( phpSDK ):
@@ -413,6 +616,20 @@ class BuildUtil(object):
         os.system('git pull ')
         print('Done cloning the latest php SDK...')
 
+        # With caching enabled, skip the build if the same source has already 
+        # been built with the same configuration and compiler
+        cache_key = None
+        if self.cache_dir is not None:
+            cache_key = self.build_cache_key(source_dir, sdk_dir)
+            if self.restore_from_cache(cache_key, sdk_dir):
+                shutil.rmtree(source_dir, ignore_errors=True)
+                return self.copy_binaries(sdk_dir, copy_to_ext)
+
+        if sync_source:
+            drivers = ['sqlsrv', 'pdo_sqlsrv'] if self.driver == 'all' else [self.driver]
+            for driver in drivers:
+                self.sync_driver_source(source_dir, ext_dir, driver, self.link_source)
+
         # Move the generated batch file to phpSDK for the php starter script 
         print('Moving the sdk bath file over...')
         sdk_batch_file = os.path.join(phpSDK, batch_file)
@@ -447,6 +664,9 @@ class BuildUtil(object):
             self.rename_binaries(sdk_dir)
             print('rename_binaries complete')
 
+        if cache_key is not None:
+            self.save_to_cache(cache_key, sdk_dir)
+
         # Final step, copy the binaries to the right place
         ext_dir = self.copy_binaries(sdk_dir, copy_to_ext)
         print('copy_binaries complete')
@@ -455,8 +675,8 @@ class BuildUtil(object):
 
     def rename_binary(self, path, driver):
         """Rename the *driver* binary (sqlsrv or pdo_sqlsrv) (only the dlls)."""
-        driver_old_name = self.driver_name(driver, '.dll')
-        driver_new_name = self.driver_new_name(driver, '.dll')
+        driver_old_name = self.driver_name(driver, self.binary_suffix)
+        driver_new_name = self.driver_new_name(driver, self.binary_suffix)
 
         os.rename(os.path.join(path, driver_old_name), os.path.join(path, driver_new_name))
 
@@ -478,7 +698,7 @@ class BuildUtil(object):
     def copy_binary(self, from_dir, dest_dir, driver, suffix):
         """Copy sqlsrv or pdo_sqlsrv binary (based on *suffix*) to *dest_dir*."""
         print('')
-        if not self.no_rename and suffix == '.dll':
+        if not self.no_rename and suffix == self.binary_suffix:
             binary = self.driver_new_name(driver, suffix)
         else:
             binary = self.driver_name(driver, suffix)
@@ -551,3 +771,279 @@ class BuildUtil(object):
             
         return dest_dir
               
+
+
+class PosixBuildUtil(BuildUtil):
+    """Build sqlsrv and/or pdo_sqlsrv drivers in Linux or macOS with phpize, 
+    against the PHP installation of *php_config*. The PHP version, arch and 
+    thread are derived from that installation. In addition to the attributes 
+    of BuildUtil:
+    
+    Attributes:
+        php_config      # path to the php-config script of the PHP installation
+        build_root      # root of the out-of-tree build directories
+        ccache          # whether to compile with ccache
+        profile         # compiler flag profile, one of FLAG_PROFILES
+        profile_dir     # where the PGO profiles are written to or read from
+    """
+
+    binary_suffix = '.so'
+    symbols_suffix = None
+
+    # Additional compiler and linker flags of each profile
+    FLAG_PROFILES = {
+        'release': '',
+        'lto': '-flto',
+        'pgo-generate': '-fprofile-generate -fprofile-update=atomic',
+        'pgo-use': '-fprofile-use -fprofile-correction -Wno-missing-profile',
+        'lto-pgo-use': '-flto -fprofile-use -fprofile-correction -Wno-missing-profile',
+    }
+
+    def __init__(self, php_config, driver, no_rename, debug_enabled = False, cache_dir = None, work_dir = None, parallel_jobs = None, build_root = None, ccache = False, profile = 'release', link_source = False):
+        self.php_config = php_config
+        phpver = self.query_php_config('--version')
+        php_binary = self.query_php_config('--php-binary')
+        thread = 'ts' if self.query_php(php_binary, 'echo PHP_ZTS;') == '1' else 'nts'
+        if self.query_php(php_binary, 'echo PHP_INT_SIZE;') == '4':
+            arch = 'x86'
+        else:
+            machine = platform.machine().lower()
+            arch = 'x64' if machine in ['x86_64', 'amd64'] else machine
+
+        if parallel_jobs is None:
+            parallel_jobs = os.cpu_count() or 1
+        BuildUtil.__init__(self, phpver, driver, arch, thread, no_rename, debug_enabled, cache_dir, work_dir, parallel_jobs, link_source)
+
+        self.build_root = build_root
+        if build_root is None:
+            self.build_root = os.path.join(self.work_dir, 'build')
+        self.ccache = ccache
+        if profile not in self.FLAG_PROFILES:
+            print('Unknown flag profile', profile, '- choose from', ', '.join(self.FLAG_PROFILES))
+            exit(1)
+        self.profile = profile
+        self.profile_dir = os.path.join(self.build_tree(), 'pgo')
+
+    def query_php_config(self, option):
+        """Return the output of php-config with the given *option*."""
+        output = subprocess.check_output([self.php_config, option], universal_newlines=True)
+        return output.strip()
+
+    @staticmethod
+    def query_php(php_binary, code):
+        """Return the output of running *code* with *php_binary*."""
+        output = subprocess.check_output([php_binary, '-n', '-r', code], universal_newlines=True)
+        return output.strip()
+
+    def driver_name(self, driver, suffix):
+        """Return the *driver* name with *suffix* after the driver is successfully compiled."""
+        return driver + suffix
+
+    @staticmethod
+    def copy_source(source, dest):
+        """Copy the shared, sqlsrv and pdo_sqlsrv folders in *source* to *dest*."""
+        for folder in ['shared', 'sqlsrv', 'pdo_sqlsrv']:
+            shutil.copytree(os.path.join(source, folder), os.path.join(dest, folder), dirs_exist_ok=True)
+
+    def build_tree(self):
+        """Return the build directory of the current PHP version, arch and thread."""
+        return os.path.join(self.build_root, self.phpver + '-' + self.arch + '-' + self.thread)
+
+    def phpsrc_root(self, sdk_dir):
+        """Return the build directory, the counterpart of the PHP source folder 
+        in Windows. The drivers are built with phpize outside of PHP source.
+        """
+        return self.build_tree()
+
+    def build_abs_path(self, sdk_dir):
+        """Return the absolute path to the folder of the compiled drivers."""
+        return os.path.join(self.build_tree(), 'modules')
+
+    def php_source_exists(self, sdk_dir):
+        """Return True, because phpize only needs the installed PHP headers."""
+        return True
+
+    def remove_old_builds(self, sdk_dir):
+        """Remove the staged source, the object files and the drivers of all 
+        previous builds with the current PHP version, arch and thread.
+        """
+        print('Removing old builds...')
+        shutil.rmtree(self.build_tree(), ignore_errors=True)
+
+    def remove_prev_build(self, sdk_dir):
+        """Remove the drivers of the previous build, but keep the object files 
+        so that rebuilding is incremental.
+        """
+        print('Removing previous build...')
+        build_dir = self.build_abs_path(sdk_dir)
+        if not os.path.exists(build_dir):
+            return
+        for name in os.listdir(build_dir):
+            if 'sqlsrv' in name:
+                os.remove(os.path.join(build_dir, name))
+
+    def compiler(self):
+        """Return the C++ compiler, defaulting to c++ unless CXX is set."""
+        return os.environ.get('CXX', 'c++')
+
+    def toolchain_label(self, sdk_dir):
+        """Return a label identifying the compiler used for this build."""
+        output = subprocess.check_output([self.compiler(), '--version'], universal_newlines=True)
+        return output.splitlines()[0].strip()
+
+    def compiler_flags(self):
+        """Return the additional compiler flags based on the profile."""
+        flags = self.FLAG_PROFILES[self.profile]
+        if 'profile-' in flags:
+            flags = flags.replace('-fprofile-generate', '-fprofile-generate=' + self.profile_dir)
+            flags = flags.replace('-fprofile-use', '-fprofile-use=' + self.profile_dir)
+        if self.debug_enabled:
+            flags = '-g ' + flags
+        return flags.strip()
+
+    def configure_options(self, driver):
+        """Return the configure options to build *driver*."""
+        if driver == 'sqlsrv':
+            option = '--enable-sqlsrv'
+        else:
+            option = '--with-pdo_sqlsrv'
+        return ['--with-php-config=' + self.php_config, option]
+
+    def generate_build_options(self):
+        """Return the generated build configuration and arguments"""
+        drivers = ['sqlsrv', 'pdo_sqlsrv'] if self.driver == 'all' else [self.driver]
+        options = ['--with-php-config=' + self.php_config]
+        for driver in drivers:
+            options += self.configure_options(driver)[1:]
+        return 'configure ' + ' '.join(options) + ' CXXFLAGS="' + self.compiler_flags() + '"'
+
+    def build_environment(self):
+        """Return the environment variables for configure and make."""
+        env = dict(os.environ)
+        cc = env.get('CC', 'cc')
+        cxx = self.compiler()
+        if self.ccache and shutil.which('ccache') is not None:
+            cc = 'ccache ' + cc
+            cxx = 'ccache ' + cxx
+        env['CC'] = cc
+        env['CXX'] = cxx
+
+        flags = self.compiler_flags()
+        if flags != '':
+            env['CFLAGS'] = (env.get('CFLAGS', '') + ' ' + flags).strip()
+            env['CXXFLAGS'] = (env.get('CXXFLAGS', '') + ' ' + flags).strip()
+            env['LDFLAGS'] = (env.get('LDFLAGS', '') + ' ' + flags).strip()
+        return env
+
+    @staticmethod
+    def run_logged(command, cwd, env, log):
+        """Run *command* in *cwd*, appending its output to *log*."""
+        log.write('>>> ' + ' '.join(command) + os.linesep)
+        log.flush()
+        subprocess.run(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT, check=True)
+
+    def stage_source(self, source_dir, driver):
+        """Synchronize the *driver* source, with the shared source as a 
+        subfolder, into the build directory and return the staged source path. 
+        Only the files that have changed are updated, so that make only 
+        rebuilds what has changed.
+        """
+        self.sync_driver_source(source_dir, os.path.join(self.build_tree(), 'src'), driver, self.link_source)
+        return os.path.join(self.build_tree(), 'src', driver)
+
+    def build_driver(self, source_dir, driver, make_clean, log):
+        """Build *driver* with phpize, configure and make in an out-of-tree 
+        object directory, and copy it to the folder of the compiled drivers.
+        """
+        env = self.build_environment()
+        staged = self.stage_source(source_dir, driver)
+        obj_dir = os.path.join(self.build_tree(), 'obj', driver)
+        if make_clean:
+            shutil.rmtree(obj_dir, ignore_errors=True)
+        if not os.path.exists(obj_dir):
+            os.makedirs(obj_dir)
+
+        # phpize and configure only when necessary, otherwise the generated 
+        # headers would be touched and everything would be recompiled
+        if make_clean or not os.path.exists(os.path.join(staged, 'configure')):
+            phpize = os.path.join(os.path.dirname(self.php_config), 'phpize')
+            if not os.path.exists(phpize):
+                phpize = 'phpize'
+            self.run_logged([phpize], staged, env, log)
+        if make_clean or not os.path.exists(os.path.join(obj_dir, 'Makefile')):
+            command = [os.path.join(staged, 'configure')] + self.configure_options(driver)
+            self.run_logged(command, obj_dir, env, log)
+
+        self.run_logged(['make', '-j' + str(self.parallel_jobs)], obj_dir, env, log)
+
+        build_dir = self.build_abs_path(None)
+        if not os.path.exists(build_dir):
+            os.makedirs(build_dir)
+        shutil.copy2(os.path.join(obj_dir, 'modules', self.driver_name(driver, self.binary_suffix)), build_dir)
+
+    def build_drivers(self, make_clean = False, dest = None, log_file = None):
+        """Build sqlsrv/pdo_sqlsrv extensions with phpize, assuming the Source 
+        folder exists in the working directory, and this folder will be removed 
+        when the build is complete.
+        """
+        print("build_drivers")
+        work_dir = self.work_dir
+        source_dir = os.path.join(work_dir, 'Source')
+        drivers = ['sqlsrv', 'pdo_sqlsrv'] if self.driver == 'all' else [self.driver]
+        for driver in drivers:
+            self.update_driver_source(source_dir, driver)
+
+        print('build options: ' + self.generate_build_options())
+
+        if log_file is None:
+            log_file = self.get_logfile_name()
+        log_path = os.path.join(work_dir, log_file)
+
+        # if *dest* is None, simply use the current working directory
+        sdk_dir = dest
+        copy_to_ext = True
+        if dest is None:
+            sdk_dir = work_dir
+            copy_to_ext = False
+
+        cache_key = None
+        if self.cache_dir is not None:
+            cache_key = self.build_cache_key(source_dir, sdk_dir)
+            if self.restore_from_cache(cache_key, sdk_dir):
+                shutil.rmtree(source_dir, ignore_errors=True)
+                return self.copy_binaries(sdk_dir, copy_to_ext)
+
+        with open(log_path, 'a') as log:
+            for driver in drivers:
+                print('Building', driver, '- log file', log_path)
+                self.build_driver(source_dir, driver, make_clean, log)
+        shutil.rmtree(source_dir, ignore_errors=True)
+
+        if not self.no_rename:
+            self.rename_binaries(sdk_dir)
+            print('rename_binaries complete')
+
+        if cache_key is not None:
+            self.save_to_cache(cache_key, sdk_dir)
+
+        ext_dir = self.copy_binaries(sdk_dir, copy_to_ext)
+        print('copy_binaries complete')
+        return ext_dir
+
+    def copy_binaries(self, sdk_dir, copy_to_ext):
+        """Copy the sqlsrv and/or pdo_sqlsrv binaries to the 'ext' folder of 
+        the build directory if *copy_to_ext* is True, otherwise to *sdk_dir*.
+        """
+        build_dir = self.build_abs_path(sdk_dir)
+        if copy_to_ext:
+            dest_dir = os.path.join(self.build_tree(), 'ext')
+        else:
+            dest_dir = sdk_dir
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+
+        print('Copying the binaries from', build_dir, 'to', dest_dir)
+        drivers = ['sqlsrv', 'pdo_sqlsrv'] if self.driver == 'all' else [self.driver]
+        for driver in drivers:
+            self.copy_binary(build_dir, dest_dir, driver, self.binary_suffix)
+        return dest_dir
@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+#########################################################################################
+#
+# Description:  This script builds the drivers with profile-guided optimization (PGO)
+#               in Linux or macOS, using the performance benchmarks in test/Performance
+#               as the training set, and reports the speedup over a plain build.
+#
+# Requirement:
+#               python 3.x
+#               The requirements of PosixBuildUtil in buildtools.py, with GCC
+#               PHPBench installed in the performance test folder (composer install)
+#               MS ODBC Driver for SQL Server
+#               Docker, only if a local SQL Server container should be started
+#
+# Execution: Run with command line with required options.
+# Examples:
+#           python3 pgobuild.py --SOURCE=/local/source --START_CONTAINER --PWD=<sa password>
+#           python3 pgobuild.py --SOURCE=/local/source --SERVER=myserver --UID=usr --PWD=pwd --TRAINING=SqlsrvFetchBench.php,PDOFetchBench.php
+#
+# Output: The plain and the optimized drivers, in the 'plain' and 'optimized' subfolders
+#         of the work directory, and a summary of the benchmark results of both builds.
+#
+#############################################################################################
+
+import os
+import time
+import shutil
+import os.path
+import argparse
+import subprocess
+import xml.etree.ElementTree as ET
+from buildtools import PosixBuildUtil
+
+# The benchmarks that exercise the execute and fetch code paths
+DEFAULT_TRAINING = [
+    'SqlsrvFetchBench.php', 'SqlsrvFetchLargeBench.php', 'SqlsrvInsertBench.php', 'SqlsrvCRUDBench.php',
+    'PDOFetchBench.php', 'PDOFetchLargeBench.php', 'PDOInsertBench.php', 'PDOCRUDBench.php',
+]
+
+CONTAINER_NAME = 'msphpsql-pgo'
+CONTAINER_IMAGE = 'mcr.microsoft.com/mssql/server:2022-latest'
+
+class PGOBuild(object):
+    """Build sqlsrv and pdo_sqlsrv drivers with profile-guided optimization:
+    a plain build, an instrumented build that is trained with the benchmarks,
+    and an optimized build using the collected profiles.
+
+    Attributes:
+        php_config      # php-config of the PHP installation to build against
+        source          # path to the local source folder
+        work_dir        # working directory, where the builds and reports go
+        perf_dir        # the performance test folder with the benchmarks
+        training        # list of the benchmark files to run
+        iterations      # number of iterations of each benchmark (None for the defaults)
+        db              # dictionary of server, database, uid and pwd
+        ccache          # whether to compile with ccache
+    """
+
+    def __init__(self, php_config, source, work_dir, perf_dir, training, iterations, db, ccache = False):
+        self.php_config = php_config
+        self.source = source
+        self.work_dir = work_dir
+        self.perf_dir = perf_dir
+        self.training = training
+        self.iterations = iterations
+        self.db = db
+        self.ccache = ccache
+        self.php_binary = None
+
+    def build(self, variant, profile, make_clean):
+        """Build both drivers with the flag *profile* in the *variant* subfolder
+        of the work directory and return the folder of the compiled drivers.
+        """
+        print('Building the', variant, 'drivers with profile', profile)
+        build_root = os.path.join(self.work_dir, variant)
+        util = PosixBuildUtil(self.php_config, 'all', False, False, None, self.work_dir, None, build_root, self.ccache, profile)
+        # The instrumented and the optimized builds must share the same objects
+        # paths and profile folder, otherwise GCC cannot match the profiles
+        util.profile_dir = os.path.join(self.work_dir, 'profiles')
+        if not os.path.exists(util.profile_dir):
+            os.makedirs(util.profile_dir)
+        self.php_binary = util.query_php_config('--php-binary')
+
+        util.copy_source(self.source, os.path.join(self.work_dir, 'Source'))
+        util.build_drivers(make_clean, None, variant + '.log')
+        return util.build_abs_path(None)
+
+    def write_ini(self, modules_dir):
+        """Write an ini file loading the drivers in *modules_dir* into its own
+        scan folder and return that folder.
+        """
+        ini_dir = os.path.join(modules_dir, 'conf.d')
+        if not os.path.exists(ini_dir):
+            os.makedirs(ini_dir)
+        with open(os.path.join(ini_dir, '30-msphpsql.ini'), 'w') as ini:
+            for name in sorted(os.listdir(modules_dir)):
+                if name.endswith(PosixBuildUtil.binary_suffix):
+                    ini.write('extension=' + os.path.join(modules_dir, name) + '\n')
+        return ini_dir
+
+    def php_env(self, modules_dir):
+        """Return the environment in which PHP loads the drivers in *modules_dir*."""
+        env = dict(os.environ)
+        # The leading separator appends the folder to the default scan folders
+        env['PHP_INI_SCAN_DIR'] = os.pathsep + self.write_ini(modules_dir)
+        return env
+
+    def start_container(self):
+        """Start a local SQL Server container."""
+        print('Starting SQL Server container', CONTAINER_NAME)
+        subprocess.run(['docker', 'rm', '-f', CONTAINER_NAME], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        subprocess.run(['docker', 'run', '-d', '--name', CONTAINER_NAME,
+                        '-e', 'ACCEPT_EULA=Y', '-e', 'MSSQL_SA_PASSWORD=' + self.db['pwd'],
+                        '-p', '1433:1433', CONTAINER_IMAGE], check=True)
+
+    @staticmethod
+    def stop_container():
+        """Remove the local SQL Server container."""
+        print('Removing SQL Server container', CONTAINER_NAME)
+        subprocess.run(['docker', 'rm', '-f', CONTAINER_NAME], stdout=subprocess.DEVNULL)
+
+    def prepare_database(self, modules_dir, timeout = 120):
+        """Wait for the server to accept connections and create the test
+        database if it does not exist, using the drivers in *modules_dir*.
+        """
+        code = ('$conn = sqlsrv_connect($argv[1], array("UID"=>$argv[2], "PWD"=>$argv[3], "TrustServerCertificate"=>true));'
+                'if ($conn === false) exit(1);'
+                '$db = str_replace("]", "]]", $argv[4]);'
+                'sqlsrv_query($conn, "IF DB_ID(\'" . str_replace("\'", "\'\'", $argv[4]) . "\') IS NULL CREATE DATABASE [$db]");')
+        command = [self.php_binary, '-r', code, '--', self.db['server'], self.db['uid'], self.db['pwd'], self.db['database']]
+        start = time.time()
+        while True:
+            result = subprocess.run(command, env=self.php_env(modules_dir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if result.returncode == 0:
+                return
+            if time.time() - start > timeout:
+                print('Could not connect to', self.db['server'])
+                exit(1)
+            time.sleep(5)
+
+    def write_connect_file(self):
+        """Point lib/connect.php of the benchmarks to the test database and
+        return the path of the backup of the original file.
+        """
+        connect_file = os.path.join(self.perf_dir, 'lib', 'connect.php')
+        backup = connect_file + '.bak'
+        shutil.copy2(connect_file, backup)
+        with open(connect_file, 'w') as f:
+            f.write('<?php\n')
+            for key in ['server', 'database', 'uid', 'pwd']:
+                value = self.db[key].replace('\\', '\\\\').replace("'", "\\'")
+                f.write('$' + key + " = '" + value + "';\n")
+            f.write('$pooling=false;\n$mars=false;\n?>\n')
+        return backup
+
+    def run_benchmarks(self, modules_dir, dump_file):
+        """Run the benchmarks of the training set with the drivers in
+        *modules_dir* and return the parsed results.
+        """
+        phpbench = os.path.join(self.perf_dir, 'vendor', 'bin', 'phpbench')
+        paths = []
+        for name in self.training:
+            folder = 'pdo_sqlsrv' if name.startswith('PDO') else 'sqlsrv'
+            paths.append(os.path.join('benchmark', folder, name))
+
+        command = [self.php_binary, phpbench, 'run'] + paths + ['--dump-file=' + dump_file]
+        if self.iterations is not None:
+            command.append('--iterations=' + str(self.iterations))
+        print('Running benchmarks:', ' '.join(self.training))
+        subprocess.run(command, cwd=self.perf_dir, env=self.php_env(modules_dir), check=True)
+        return self.parse_results(os.path.join(self.perf_dir, dump_file))
+
+    @staticmethod
+    def parse_results(dump_file):
+        """Return a dictionary of the mean time in microseconds of each
+        successful benchmark in the PHPBench *dump_file*.
+        """
+        results = {}
+        root = ET.parse(dump_file).getroot()
+        for benchmark in root[0].findall('benchmark'):
+            name = benchmark.get('class')[1:]
+            variant = benchmark[0][0]
+            if variant.find('errors') is not None:
+                print(name, 'failed:', variant.find('errors')[0].text)
+                continue
+            results[name] = float(variant.find('stats').get('mean'))
+        return results
+
+    @staticmethod
+    def report(plain, optimized):
+        """Print the speedup of each benchmark and the overall (geometric mean)
+        speedup of the optimized build over the plain build.
+        """
+        print()
+        print('%-28s %14s %14s %9s' % ('Benchmark', 'Plain (us)', 'PGO (us)', 'Speedup'))
+        product = 1.0
+        count = 0
+        for name in sorted(plain):
+            if name not in optimized or optimized[name] == 0:
+                continue
+            speedup = plain[name] / optimized[name]
+            product *= speedup
+            count += 1
+            print('%-28s %14.1f %14.1f %8.3fx' % (name, plain[name], optimized[name], speedup))
+        if count > 0:
+            print()
+            print('Overall speedup (geometric mean): %.3fx' % (product ** (1.0 / count)))
+
+    def run(self, start_container = False):
+        """Build the plain, instrumented and optimized drivers, train the
+        instrumented drivers and compare the plain and optimized drivers.
+        """
+        if not os.path.exists(os.path.join(self.perf_dir, 'vendor', 'bin', 'phpbench')):
+            print('PHPBench not found, run composer install in', self.perf_dir)
+            exit(1)
+
+        plain_dir = self.build('plain', 'release', True)
+
+        if start_container:
+            self.start_container()
+        backup = self.write_connect_file()
+        try:
+            self.prepare_database(plain_dir)
+            plain = self.run_benchmarks(plain_dir, 'pgo-plain-results.xml')
+
+            # Remove the profiles of previous runs before training
+            shutil.rmtree(os.path.join(self.work_dir, 'profiles'), ignore_errors=True)
+            instrumented_dir = self.build('optimized', 'pgo-generate', True)
+            self.run_benchmarks(instrumented_dir, 'pgo-training-results.xml')
+
+            optimized_dir = self.build('optimized', 'pgo-use', True)
+            optimized = self.run_benchmarks(optimized_dir, 'pgo-optimized-results.xml')
+        finally:
+            shutil.move(backup, os.path.join(self.perf_dir, 'lib', 'connect.php'))
+            if start_container:
+                self.stop_container()
+
+        self.report(plain, optimized)
+        print()
+        print('Plain drivers:', plain_dir)
+        print('Optimized drivers:', optimized_dir)
+
+################################### Main Function ###################################
+if __name__ == '__main__':
+    work_dir = os.path.dirname(os.path.realpath(__file__))
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--SOURCE', required=True, help="a local path to source file")
+    parser.add_argument('--PHP_CONFIG', default=None, help="php-config of the PHP installation to build against (default: php-config in PATH)")
+    parser.add_argument('--WORKDIR', default=os.path.join(work_dir, 'pgo'), help="the working directory (default: 'pgo' in the directory of this script)")
+    parser.add_argument('--PERF_DIR', default=os.path.join(work_dir, '..', 'test', 'Performance'), help="the performance test folder (default: test/Performance)")
+    parser.add_argument('--TRAINING', default=','.join(DEFAULT_TRAINING), help="comma separated benchmark files to train and measure with (default: the fetch, insert and CRUD benchmarks)")
+    parser.add_argument('--ITERATIONS', type=int, default=None, help="number of iterations of each benchmark (default: as annotated in the benchmarks)")
+    parser.add_argument('--SERVER', default='localhost', help="SQL Server to run the benchmarks against (default: localhost)")
+    parser.add_argument('--DATABASE', default='pgo_testdb', help="test database, created if it does not exist (default: pgo_testdb)")
+    parser.add_argument('--UID', default='sa', help="login (default: sa)")
+    parser.add_argument('--PWD', required=True, help="password, also used as the sa password of the container")
+    parser.add_argument('--START_CONTAINER', action='store_true', help="start a local SQL Server container for the benchmarks (default: False)")
+    parser.add_argument('--CCACHE', action='store_true', help="compile with ccache (default: False)")
+
+    args = parser.parse_args()
+
+    if os.name == 'nt':
+        print('PGO builds are only supported in Linux and macOS')
+        exit(1)
+
+    php_config = args.PHP_CONFIG
+    if php_config is None:
+        php_config = shutil.which('php-config')
+        if php_config is None:
+            print('Could not find php-config, please use --PHP_CONFIG')
+            exit(1)
+
+    db = {'server': args.SERVER, 'database': args.DATABASE, 'uid': args.UID, 'pwd': args.PWD}
+    training = [name.strip() for name in args.TRAINING.split(',') if name.strip() != '']
+
+    work = os.path.realpath(args.WORKDIR)
+    if not os.path.exists(work):
+        os.makedirs(work)
+
+    pgo = PGOBuild(php_config, os.path.realpath(args.SOURCE), work, os.path.realpath(args.PERF_DIR),
+                   training, args.ITERATIONS, db, args.CCACHE)
+    pgo.run(args.START_CONTAINER)
@@ -70,6 +70,8 @@ const char TransparentNetworkIPResolution[] = "TransparentNetworkIPResolution";
 const char WSID[] = "WSID";
 const char ComputePool[] = "ComputePool";
 const char HostNameInCertificate[] = "HostNameInCertificate";
+const char StatementCacheSize[] = "StatementCacheSize";
+const char StatementCacheMaxKBSize[] = "StatementCacheMaxKBSize";
 
 }
 
@@ -90,7 +92,13 @@ enum PDO_STMT_OPTIONS {
     PDO_STMT_OPTION_FETCHES_DATETIME_TYPE,
     PDO_STMT_OPTION_FORMAT_DECIMALS,
     PDO_STMT_OPTION_DECIMAL_PLACES,
-    PDO_STMT_OPTION_DATA_CLASSIFICATION
+    PDO_STMT_OPTION_DATA_CLASSIFICATION,
+    PDO_STMT_OPTION_FETCH_BLOCK_SIZE,
+    PDO_STMT_OPTION_CLIENT_BUFFER_SPILL,
+    PDO_STMT_OPTION_STREAM_CHUNK_SIZE,
+    PDO_STMT_OPTION_ASYNC_EXECUTE,
+    PDO_STMT_OPTION_DEFER_PREPARE,
+    PDO_STMT_OPTION_READ_AHEAD
 };
 
 // List of all the statement options supported by this driver.
@@ -108,6 +116,12 @@ const stmt_option PDO_STMT_OPTS[] = {
     { NULL, 0, PDO_STMT_OPTION_FORMAT_DECIMALS, std::unique_ptr<stmt_option_format_decimals>( new stmt_option_format_decimals ) },
     { NULL, 0, PDO_STMT_OPTION_DECIMAL_PLACES, std::unique_ptr<stmt_option_decimal_places>( new stmt_option_decimal_places ) },
     { NULL, 0, PDO_STMT_OPTION_DATA_CLASSIFICATION, std::unique_ptr<stmt_option_data_classification>( new stmt_option_data_classification ) },
+    { NULL, 0, PDO_STMT_OPTION_FETCH_BLOCK_SIZE, std::unique_ptr<stmt_option_fetch_block_size>( new stmt_option_fetch_block_size ) },
+    { NULL, 0, PDO_STMT_OPTION_CLIENT_BUFFER_SPILL, std::unique_ptr<stmt_option_buffered_query_spill>( new stmt_option_buffered_query_spill ) },
+    { NULL, 0, PDO_STMT_OPTION_STREAM_CHUNK_SIZE, std::unique_ptr<stmt_option_stream_chunk_size>( new stmt_option_stream_chunk_size ) },
+    { NULL, 0, PDO_STMT_OPTION_ASYNC_EXECUTE, std::unique_ptr<stmt_option_async_execute>( new stmt_option_async_execute ) },
+    { NULL, 0, PDO_STMT_OPTION_DEFER_PREPARE, std::unique_ptr<stmt_option_defer_prepare>( new stmt_option_defer_prepare ) },
+    { NULL, 0, PDO_STMT_OPTION_READ_AHEAD, std::unique_ptr<stmt_option_read_ahead>( new stmt_option_read_ahead ) },
 
     { NULL, 0, SQLSRV_STMT_OPTION_INVALID, std::unique_ptr<stmt_option_functor>{} },
 };
@@ -210,6 +224,10 @@ void add_stmt_option_key( _Inout_ sqlsrv_context& ctx, _In_ size_t key, _Inout_
                          _Inout_ zval** data );
 void validate_stmt_options( _Inout_ sqlsrv_context& ctx, _Inout_ zval* stmt_options, _Inout_ HashTable* pdo_stmt_options_ht );
 
+// calls a method of a PDO or PDOStatement object
+bool call_pdo_method( _Inout_ zval* object_z, _In_ const char* method, _Out_ zval& retval, _In_ uint32_t param_count = 0,
+                      _In_opt_ zval* params = NULL );
+
 }       // namespace
 
 
@@ -485,6 +503,24 @@ const connection_option PDO_CONN_OPTS[] = {
         CONN_ATTR_STRING,
         conn_str_append_func::func
     },
+    {
+        PDOConnOptionNames::StatementCacheSize,
+        sizeof( PDOConnOptionNames::StatementCacheSize ),
+        SQLSRV_CONN_OPTION_STMT_CACHE_SIZE,
+        PDOConnOptionNames::StatementCacheSize,
+        sizeof( PDOConnOptionNames::StatementCacheSize ),
+        CONN_ATTR_INT,
+        stmt_cache_set_func::func
+    },
+    {
+        PDOConnOptionNames::StatementCacheMaxKBSize,
+        sizeof( PDOConnOptionNames::StatementCacheMaxKBSize ),
+        SQLSRV_CONN_OPTION_STMT_CACHE_MAX_KB_SIZE,
+        PDOConnOptionNames::StatementCacheMaxKBSize,
+        sizeof( PDOConnOptionNames::StatementCacheMaxKBSize ),
+        CONN_ATTR_INT,
+        stmt_cache_set_func::func
+    },
     { NULL, 0, SQLSRV_CONN_OPTION_INVALID, NULL, 0 , CONN_ATTR_INVALID, NULL },  //terminate the table
 };
 
@@ -546,6 +582,14 @@ void pdo_sqlsrv_dbh_return_error(_In_ pdo_dbh_t *dbh, _In_opt_ pdo_stmt_t *stmt,
 
 #endif
 
+// persistent connections, which go back to the persistent connection pool of the core layer
+#if PHP_VERSION_ID < 80100
+int pdo_sqlsrv_dbh_check_liveness(_Inout_ pdo_dbh_t *dbh);
+#else
+zend_result pdo_sqlsrv_dbh_check_liveness(_Inout_ pdo_dbh_t *dbh);
+#endif
+void pdo_sqlsrv_dbh_persistent_shutdown(_Inout_ pdo_dbh_t *dbh);
+
 // additional methods are supported in this function
 pdo_sqlsrv_function_entry *pdo_sqlsrv_get_driver_methods( _Inout_ pdo_dbh_t *dbh, int kind );
 
@@ -563,9 +607,9 @@ struct pdo_dbh_methods pdo_sqlsrv_dbh_methods = {
     pdo_sqlsrv_dbh_last_id,
     pdo_sqlsrv_dbh_return_error,
     pdo_sqlsrv_dbh_get_attr,
-    NULL,                               // check liveness not implemented
+    pdo_sqlsrv_dbh_check_liveness,
     pdo_sqlsrv_get_driver_methods,
-    NULL,                               // request shutdown not implemented
+    pdo_sqlsrv_dbh_persistent_shutdown,
 #if PHP_VERSION_ID < 80100
     NULL                                // in transaction not implemented
 };
@@ -648,11 +692,6 @@ int pdo_sqlsrv_db_handle_factory( _Inout_ pdo_dbh_t *dbh, _In_opt_ zval *driver_
     CHECK_CUSTOM_ERROR( driver_options && Z_TYPE_P( driver_options ) != IS_ARRAY, *g_pdo_henv_cp, SQLSRV_ERROR_CONN_OPTS_WRONG_TYPE ) {
         throw core::CoreException();
     }
-	// throws PDOException if the ATTR_PERSISTENT is in connection options
-	CHECK_CUSTOM_ERROR( dbh->is_persistent, *g_pdo_henv_cp, PDO_SQLSRV_ERROR_UNSUPPORTED_DBH_ATTR ) {
-		dbh->refcount--;
-		throw pdo::PDOException();
-	}
 
     // Initialize the options array to be passed to the core layer
     ALLOC_HASHTABLE( pdo_conn_options_ht );
@@ -660,6 +699,13 @@ int pdo_sqlsrv_db_handle_factory( _Inout_ pdo_dbh_t *dbh, _In_opt_ zval *driver_
     core::sqlsrv_zend_hash_init( *g_pdo_henv_cp, pdo_conn_options_ht, 10 /* # of buckets */,
                                  ZVAL_PTR_DTOR, 0 /*persistent*/ );
 
+    // PDO::ATTR_PERSISTENT takes the connection from the persistent connection pool of the core layer
+    if( dbh->is_persistent ) {
+        zval persistent_z;
+        ZVAL_TRUE( &persistent_z );
+        core::sqlsrv_zend_hash_index_update( *g_pdo_henv_cp, pdo_conn_options_ht, SQLSRV_CONN_OPTION_PERSISTENT, &persistent_z );
+    }
+
     // Either of g_pdo_henv_cp or g_pdo_henv_ncp can be used to propogate the error.
     dsn_parser = new ( sqlsrv_malloc( sizeof( conn_string_parser ))) conn_string_parser( *g_pdo_henv_cp, dbh->data_source,
                                                                                           static_cast<int>( dbh->data_source_len ), pdo_conn_options_ht );
@@ -751,6 +797,41 @@ void pdo_sqlsrv_dbh_close(_Inout_ pdo_dbh_t *dbh)
 #endif
 }
 
+// pdo_sqlsrv_dbh_persistent_shutdown
+// Called when a PDO object created with PDO::ATTR_PERSISTENT is destroyed.
+// PDO keeps the pdo_dbh_t of a persistent connection across requests, but the driver's
+// connection object is allocated from the memory of the request.  So the connection is
+// closed, which returns its ODBC connection to the persistent connection pool of the core
+// layer, unless another PDO object of the request still uses it.
+// Parameters:
+// dbh - The PDO managed connection object.
+void pdo_sqlsrv_dbh_persistent_shutdown( _Inout_ pdo_dbh_t *dbh )
+{
+    // the persistent list holds a reference, and each PDO object using the connection another
+    if( dbh->refcount > 2 ) {
+        return;
+    }
+
+    pdo_sqlsrv_dbh_close( dbh );
+}
+
+// pdo_sqlsrv_dbh_check_liveness
+// Called by PDO before it reuses the pdo_dbh_t of a persistent connection.
+// A connection closed by pdo_sqlsrv_dbh_persistent_shutdown is reported as dead so that PDO
+// calls pdo_sqlsrv_db_handle_factory again, which takes the connection from the pool.
+// Parameters:
+// dbh - The PDO managed connection object.
+// Return:
+// SUCCESS if the connection is still open, FAILURE otherwise.
+#if PHP_VERSION_ID < 80100
+int pdo_sqlsrv_dbh_check_liveness( _Inout_ pdo_dbh_t *dbh )
+#else
+zend_result pdo_sqlsrv_dbh_check_liveness( _Inout_ pdo_dbh_t *dbh )
+#endif
+{
+    return ( dbh->driver_data != NULL ) ? SUCCESS : FAILURE;
+}
+
 // pdo_sqlsrv_dbh_prepare
 // Called by PDO::prepare and PDOStatement::__construct.
 // Creates a statement and prepares it for execution by PDO
@@ -774,8 +855,7 @@ bool pdo_sqlsrv_dbh_prepare(_Inout_ pdo_dbh_t *dbh, _In_ zend_string *sql_zstr,
     PDO_LOG_DBH_ENTRY;
 
     hash_auto_ptr pdo_stmt_options_ht;
-    sqlsrv_malloc_auto_ptr<char> sql_rewrite;
-    size_t sql_rewrite_len = 0;
+    std::string sql_rewrite;
     sqlsrv_malloc_auto_ptr<pdo_sqlsrv_stmt> driver_stmt;
     hash_auto_ptr placeholders;
     sqlsrv_malloc_auto_ptr<sql_string_parser> sql_parser;
@@ -811,7 +891,6 @@ bool pdo_sqlsrv_dbh_prepare(_Inout_ pdo_dbh_t *dbh, _In_ zend_string *sql_zstr,
         }
 
 #if PHP_VERSION_ID >= 80100
-        zend_string* sql_rewrite_zstr = NULL;
         const char* sql = ZSTR_VAL(sql_zstr);
         size_t sql_len = ZSTR_LEN(sql_zstr);
 #endif
@@ -821,29 +900,17 @@ bool pdo_sqlsrv_dbh_prepare(_Inout_ pdo_dbh_t *dbh, _In_ zend_string *sql_zstr,
         if( stmt->supports_placeholders != PDO_PLACEHOLDER_NONE ) {
 
             // rewrite the query to map named parameters to positional parameters.  We do this rather than use the ODBC named
-            // parameters for consistency with the PDO MySQL and PDO ODBC drivers.
-#if PHP_VERSION_ID < 80100
-            int zr = pdo_parse_params( stmt, const_cast<char*>( sql ), sql_len, &sql_rewrite, &sql_rewrite_len );
-            CHECK_ZEND_ERROR(zr, driver_dbh, PDO_SQLSRV_ERROR_PARAM_PARSE) {
-                throw core::CoreException();
-            }
-            // if parameter substitution happened, use that query instead of the original
-            if (sql_rewrite != 0) {
-                sql = sql_rewrite;
-                sql_len = sql_rewrite_len;
-            }
-#else
-            int zr = pdo_parse_params(stmt, sql_zstr, &sql_rewrite_zstr);
+            // parameters for consistency with the PDO MySQL and PDO ODBC drivers.  Queries parsed before are rewritten
+            // from the parsed SQL cache.
+            int zr = pdo_sqlsrv_parse_params( stmt, sql, sql_len, sql_rewrite );
             CHECK_ZEND_ERROR(zr, driver_dbh, PDO_SQLSRV_ERROR_PARAM_PARSE) {
                 throw core::CoreException();
             }
-
             // if parameter substitution happened, use that query instead of the original
-            if (sql_rewrite_zstr != NULL) {
-                sql = ZSTR_VAL(sql_rewrite_zstr);
-                sql_len = ZSTR_LEN(sql_rewrite_zstr);
+            if( zr == 1 ) {
+                sql = sql_rewrite.c_str();
+                sql_len = sql_rewrite.length();
             }
-#endif
         }
 
         if( !driver_stmt->direct_query && stmt->supports_placeholders != PDO_PLACEHOLDER_NONE ) {
@@ -860,12 +927,6 @@ bool pdo_sqlsrv_dbh_prepare(_Inout_ pdo_dbh_t *dbh, _In_ zend_string *sql_zstr,
             driver_stmt->direct_query_subst_string_len = sql_len;
         }
 
-#if PHP_VERSION_ID >= 80100
-        if (sql_rewrite_zstr != NULL) {
-            zend_string_release(sql_rewrite_zstr);
-        }
-#endif
-
         // else if stmt->support_placeholders == PDO_PLACEHOLDER_NONE means that stmt->active_query_string will be
         // set to the substituted query
         if ( stmt->supports_placeholders == PDO_PLACEHOLDER_NONE ) {
@@ -1253,6 +1314,10 @@ bool pdo_sqlsrv_dbh_set_attr(_Inout_ pdo_dbh_t *dbh, _In_ zend_long attr, _Inout
                 driver_dbh->direct_query = zend_is_true(val);
                 break;
 
+            case SQLSRV_ATTR_DEFER_PREPARE:
+                driver_dbh->defer_prepare = zend_is_true( val );
+                break;
+
             case SQLSRV_ATTR_QUERY_TIMEOUT:
                 if( Z_TYPE_P( val ) != IS_LONG || Z_LVAL_P( val ) < 0 ) {
                     convert_to_string( val );
@@ -1344,6 +1409,11 @@ bool pdo_sqlsrv_dbh_set_attr(_Inout_ pdo_dbh_t *dbh, _In_ zend_long attr, _Inout
             case PDO_ATTR_CLIENT_VERSION:
             case PDO_ATTR_DRIVER_NAME:
             case PDO_ATTR_CONNECTION_STATUS:
+            case SQLSRV_ATTR_STATEMENT_CACHE_INFO:
+            case SQLSRV_ATTR_PERSISTENT_POOL_INFO:
+            case SQLSRV_ATTR_SQL_CACHE_INFO:
+            case SQLSRV_ATTR_DSN_CACHE_INFO:
+            case SQLSRV_ATTR_TRACE_INFO:
             {
                 THROW_PDO_ERROR( driver_dbh, PDO_SQLSRV_ERROR_READ_ONLY_DBH_ATTR );
             }
@@ -1360,6 +1430,11 @@ bool pdo_sqlsrv_dbh_set_attr(_Inout_ pdo_dbh_t *dbh, _In_ zend_long attr, _Inout
             case PDO_ATTR_CURSOR:
             case SQLSRV_ATTR_CURSOR_SCROLL_TYPE:
             case SQLSRV_ATTR_DATA_CLASSIFICATION:
+            case SQLSRV_ATTR_FETCH_BLOCK_SIZE:
+            case SQLSRV_ATTR_READ_AHEAD:
+            case SQLSRV_ATTR_CLIENT_BUFFER_SPILL:
+            case SQLSRV_ATTR_STREAM_CHUNK_SIZE:
+            case SQLSRV_ATTR_ASYNC_EXECUTE:
             {
                 THROW_PDO_ERROR( driver_dbh, PDO_SQLSRV_ERROR_STMT_LEVEL_ATTR );
             }
@@ -1439,6 +1514,11 @@ int pdo_sqlsrv_dbh_get_attr(_Inout_ pdo_dbh_t *dbh, _In_ zend_long attr, _Inout_
             case PDO_ATTR_CURSOR:
             case SQLSRV_ATTR_CURSOR_SCROLL_TYPE:
             case SQLSRV_ATTR_DATA_CLASSIFICATION:
+            case SQLSRV_ATTR_FETCH_BLOCK_SIZE:
+            case SQLSRV_ATTR_READ_AHEAD:
+            case SQLSRV_ATTR_CLIENT_BUFFER_SPILL:
+            case SQLSRV_ATTR_STREAM_CHUNK_SIZE:
+            case SQLSRV_ATTR_ASYNC_EXECUTE:
             {
                 THROW_PDO_ERROR( driver_dbh, PDO_SQLSRV_ERROR_STMT_LEVEL_ATTR );
             }
@@ -1462,6 +1542,36 @@ int pdo_sqlsrv_dbh_get_attr(_Inout_ pdo_dbh_t *dbh, _In_ zend_long attr, _Inout_
                 break;
             }
 
+            case SQLSRV_ATTR_STATEMENT_CACHE_INFO:
+            {
+                core_sqlsrv_get_stmt_cache_info( driver_dbh, return_value );
+                break;
+            }
+
+            case SQLSRV_ATTR_PERSISTENT_POOL_INFO:
+            {
+                core_sqlsrv_get_conn_pool_info( return_value );
+                break;
+            }
+
+            case SQLSRV_ATTR_SQL_CACHE_INFO:
+            {
+                pdo_sqlsrv_get_sql_cache_info( return_value );
+                break;
+            }
+
+            case SQLSRV_ATTR_DSN_CACHE_INFO:
+            {
+                pdo_sqlsrv_get_dsn_cache_info( return_value );
+                break;
+            }
+
+            case SQLSRV_ATTR_TRACE_INFO:
+            {
+                core_sqlsrv_get_trace_info( return_value );
+                break;
+            }
+
             case PDO_ATTR_CLIENT_VERSION:
             {
                 core_sqlsrv_get_client_info( driver_dbh, return_value );
@@ -1492,6 +1602,12 @@ int pdo_sqlsrv_dbh_get_attr(_Inout_ pdo_dbh_t *dbh, _In_ zend_long attr, _Inout_
                 break;
             }
 
+            case SQLSRV_ATTR_DEFER_PREPARE:
+            {
+                ZVAL_BOOL( return_value, driver_dbh->defer_prepare );
+                break;
+            }
+
             case SQLSRV_ATTR_CLIENT_BUFFER_MAX_KB_SIZE:
             {
                 ZVAL_LONG( return_value, driver_dbh->client_buffer_max_size );
@@ -1897,21 +2013,133 @@ zend_string* pdo_sqlsrv_dbh_quote(_Inout_ pdo_dbh_t* dbh, _In_ const zend_string
     }
 }
 
-// This method is not implemented by this driver.
+// pdo_sqlsrv_dbh_query_batch
+// Maps to the driver specific method PDO::sqlsrvQueryBatch( array $queries [, int $mode] ).
+// Joins the queries, each a string or an array of a string and an array of parameters for its ? placeholders,
+// into one statement that is sent to the server in a single round trip.  See core_sqlsrv_build_query_batch.  The
+// statement is created with PDO::prepare and PDOStatement::execute, so it has the attributes of the connection
+// and its errors are reported as for any other statement.
+// Return:
+// Without $mode, the executed PDOStatement, positioned on the rowset of the first query.  The rowsets of the
+// other queries are read in turn after PDOStatement::nextRowset.  With $mode, an array with an element for each
+// rowset: the rows returned by PDOStatement::fetchAll( $mode ), or the number of rows modified by a rowset
+// without columns.  false if the batch fails.
+PHP_FUNCTION( pdo_sqlsrv_dbh_query_batch )
+{
+    zval* queries_z = NULL;
+    zend_long mode = PDO_FETCH_USE_DEFAULT;
+
+    if( zend_parse_parameters( ZEND_NUM_ARGS(), "a|l", &queries_z, &mode ) == FAILURE ) {
+        RETURN_FALSE;
+    }
+
+    bool fetch_results = ( ZEND_NUM_ARGS() > 1 );
+    pdo_dbh_t* dbh = Z_PDO_DBH_P( getThis() );
+
+    PDO_RESET_DBH_ERROR;
+    PDO_VALIDATE_CONN;
+    PDO_LOG_DBH_ENTRY;
+
+    pdo_sqlsrv_dbh* driver_dbh = reinterpret_cast<pdo_sqlsrv_dbh*>( dbh->driver_data );
+    std::string sql;
+    zval params_z;
+    ZVAL_UNDEF( &params_z );
+
+    try {
+
+        core_sqlsrv_build_query_batch( *driver_dbh, Z_ARRVAL_P( queries_z ), sql, params_z );
+    }
+    catch( core::CoreException& ) {
+
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "pdo_sqlsrv_dbh_query_batch: Unexpected exception occurred." );
+    }
+
+    zval sql_z;
+    zval stmt_z;
+    zval executed_z;
+    ZVAL_STRINGL( &sql_z, sql.c_str(), sql.length() );
+    bool executed = call_pdo_method( getThis(), "prepare", stmt_z, 1, &sql_z ) && Z_TYPE( stmt_z ) == IS_OBJECT &&
+                    call_pdo_method( &stmt_z, "execute", executed_z, 1, &params_z ) && Z_TYPE( executed_z ) == IS_TRUE;
+    zval_ptr_dtor( &sql_z );
+    zval_ptr_dtor( &params_z );
+
+    if( !executed ) {
+        zval_ptr_dtor( &stmt_z );
+        RETURN_FALSE;
+    }
+
+    if( !fetch_results ) {
+        ZVAL_COPY_VALUE( return_value, &stmt_z );
+        return;
+    }
+
+    pdo_stmt_t* stmt = Z_PDO_STMT_P( &stmt_z );
+    zval mode_z;
+    ZVAL_LONG( &mode_z, mode );
+    array_init( return_value );
+
+    bool more_rowsets = true;
+    while( more_rowsets ) {
+
+        zval result_z;
+        if( stmt->column_count > 0 ) {
+            if( !call_pdo_method( &stmt_z, "fetchAll", result_z, 1, &mode_z ) || Z_TYPE( result_z ) != IS_ARRAY ) {
+                zval_ptr_dtor( &result_z );
+                break;
+            }
+        }
+        else {
+            ZVAL_LONG( &result_z, static_cast<zend_long>( stmt->row_count ));
+        }
+        zend_hash_next_index_insert_new( Z_ARRVAL_P( return_value ), &result_z );
+
+        zval next_z;
+        if( !call_pdo_method( &stmt_z, "nextRowset", next_z )) {
+            break;
+        }
+        more_rowsets = ( Z_TYPE( next_z ) == IS_TRUE );
+    }
+
+    // PDOStatement::nextRowset also returns false when there are no more rowsets, so only its error code tells
+    // whether the rowsets were all read
+    if( more_rowsets || strcmp( stmt->error_code, "00000" ) != 0 ) {
+        zval_ptr_dtor( return_value );
+        ZVAL_FALSE( return_value );
+    }
+
+    zval_ptr_dtor( &stmt_z );
+}
+
+ZEND_BEGIN_ARG_INFO_EX( pdo_sqlsrv_dbh_query_batch_arginfo, 0, 0, 1 )
+    ZEND_ARG_INFO( 0, queries )
+    ZEND_ARG_INFO( 0, mode )
+ZEND_END_ARG_INFO()
+
+const zend_function_entry pdo_sqlsrv_dbh_driver_methods[] = {
+    ZEND_FENTRY( sqlsrvQueryBatch, ZEND_FN( pdo_sqlsrv_dbh_query_batch ), pdo_sqlsrv_dbh_query_batch_arginfo, ZEND_ACC_PUBLIC )
+    PHP_FE_END
+};
+
+// Returns the driver specific methods of PDO or PDOStatement.
 pdo_sqlsrv_function_entry *pdo_sqlsrv_get_driver_methods( _Inout_ pdo_dbh_t *dbh, int kind )
 {
     PDO_RESET_DBH_ERROR;
     PDO_VALIDATE_CONN;
     PDO_LOG_DBH_ENTRY;
 
-    sqlsrv_conn* driver_conn = reinterpret_cast<sqlsrv_conn*>( dbh->driver_data );
+    if( kind == PDO_DBH_DRIVER_METHOD_KIND_DBH ) {
+        return pdo_sqlsrv_dbh_driver_methods;
+    }
 
-    // As per documentation, simply return false if the method does not exist
-    // https://www.php.net/manual/en/function.is-callable.php
-    // But user can call PDO::errorInfo() to check the error message if necessary
-    CHECK_CUSTOM_WARNING_AS_ERROR(true, driver_conn, PDO_SQLSRV_ERROR_FUNCTION_NOT_IMPLEMENTED, NULL);
+    if( kind == PDO_DBH_DRIVER_METHOD_KIND_STMT ) {
+        return pdo_sqlsrv_stmt_driver_methods;
+    }
 
-    return NULL;    // return NULL for PDO to take care of the rest
+    return NULL;
 }
 
 namespace {
@@ -1975,6 +2203,30 @@ void add_stmt_option_key(_Inout_ sqlsrv_context& ctx, _In_ size_t key, _Inout_ H
         option_key = PDO_STMT_OPTION_DATA_CLASSIFICATION;
         break;
 
+    case SQLSRV_ATTR_FETCH_BLOCK_SIZE:
+        option_key = PDO_STMT_OPTION_FETCH_BLOCK_SIZE;
+        break;
+
+    case SQLSRV_ATTR_CLIENT_BUFFER_SPILL:
+        option_key = PDO_STMT_OPTION_CLIENT_BUFFER_SPILL;
+        break;
+
+    case SQLSRV_ATTR_STREAM_CHUNK_SIZE:
+        option_key = PDO_STMT_OPTION_STREAM_CHUNK_SIZE;
+        break;
+
+    case SQLSRV_ATTR_ASYNC_EXECUTE:
+        option_key = PDO_STMT_OPTION_ASYNC_EXECUTE;
+        break;
+
+    case SQLSRV_ATTR_DEFER_PREPARE:
+        option_key = PDO_STMT_OPTION_DEFER_PREPARE;
+        break;
+
+    case SQLSRV_ATTR_READ_AHEAD:
+        option_key = PDO_STMT_OPTION_READ_AHEAD;
+        break;
+
     default:
         CHECK_CUSTOM_ERROR(true, ctx, PDO_SQLSRV_ERROR_INVALID_STMT_OPTION)
         {
@@ -2105,4 +2357,26 @@ void pdo_txn_isolation_conn_attr_func::func( connection_option const* /*option*/
     }
 }
 
+
+// Calls a method of a PDO or PDOStatement object, as a PHP script would.  Returns false, with retval undefined, if the
+// method could not be called or threw an exception, which is left for the script to catch.
+bool call_pdo_method( _Inout_ zval* object_z, _In_ const char* method, _Out_ zval& retval, _In_ uint32_t param_count,
+                      _In_opt_ zval* params )
+{
+    zval function_z;
+    ZVAL_STRING( &function_z, method );
+    ZVAL_UNDEF( &retval );
+
+    int zr = call_user_function( EG( function_table ), object_z, &function_z, &retval, param_count, params );
+    zval_ptr_dtor( &function_z );
+
+    if( zr == FAILURE || EG( exception )) {
+        zval_ptr_dtor( &retval );
+        ZVAL_UNDEF( &retval );
+        return false;
+    }
+
+    return true;
+}
+
 }       // namespace
@@ -167,6 +167,28 @@ PHP_MINIT_FUNCTION(pdo_sqlsrv)
     // retrieve the handles for the environments
     core_sqlsrv_minit( &g_pdo_henv_cp, &g_pdo_henv_ncp, pdo_sqlsrv_handle_env_error, "PHP_MINIT_FUNCTION for pdo_sqlsrv" );
 
+    char max_idle_time[] = INI_PREFIX INI_PDO_SQLSRV_PERSISTENT_MAX_IDLE_TIME;
+    core_sqlsrv_conn_pool_set_max_idle_time( INI_INT( max_idle_time ));
+
+    char sql_cache_size[] = INI_PREFIX INI_PDO_SQLSRV_SQL_CACHE_SIZE;
+    pdo_sqlsrv_sql_cache_set_max_entries( INI_INT( sql_cache_size ));
+    char sql_cache_max_size[] = INI_PREFIX INI_PDO_SQLSRV_SQL_CACHE_MAX_SIZE;
+    pdo_sqlsrv_sql_cache_set_max_memory( INI_INT( sql_cache_max_size ));
+
+    char dsn_cache_size[] = INI_PREFIX INI_PDO_SQLSRV_DSN_CACHE_SIZE;
+    pdo_sqlsrv_dsn_cache_set_max_entries( INI_INT( dsn_cache_size ));
+
+    char trace[] = INI_PREFIX INI_PDO_SQLSRV_TRACE;
+    char trace_sink[] = INI_PREFIX INI_PDO_SQLSRV_TRACE_SINK;
+    core_sqlsrv_trace_init( INI_BOOL( trace ) != 0, INI_STR( trace_sink ));
+
+    char slow_query_log[] = INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_LOG;
+    char slow_query_threshold[] = INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_THRESHOLD;
+    char slow_query_sample_rate[] = INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_SAMPLE_RATE;
+    char slow_query_log_max_size[] = INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_LOG_MAX_SIZE;
+    core_sqlsrv_slow_query_init( INI_STR( slow_query_log ), INI_INT( slow_query_threshold ), INI_FLT( slow_query_sample_rate ),
+                                 INI_INT( slow_query_log_max_size ));
+
     }
     catch( ... ) {
 
@@ -195,6 +217,8 @@ PHP_MSHUTDOWN_FUNCTION(pdo_sqlsrv)
         zend_hash_destroy( g_pdo_errors_ht );
         pefree( g_pdo_errors_ht, 1 /*persistent*/ );
 
+        pdo_sqlsrv_parse_caches_free();
+
         core_sqlsrv_mshutdown( *g_pdo_henv_cp, *g_pdo_henv_ncp );
 
     }
@@ -252,6 +276,8 @@ PHP_RSHUTDOWN_FUNCTION(pdo_sqlsrv)
 
     PDO_LOG_NOTICE("pdo_sqlsrv: entering rshutdown");
 
+    core_sqlsrv_trace_flush();
+
     return SUCCESS;
 }
 
@@ -304,6 +330,17 @@ namespace {
         { "SQLSRV_ATTR_FORMAT_DECIMALS"     , SQLSRV_ATTR_FORMAT_DECIMALS },
         { "SQLSRV_ATTR_DECIMAL_PLACES"      , SQLSRV_ATTR_DECIMAL_PLACES },
         { "SQLSRV_ATTR_DATA_CLASSIFICATION" , SQLSRV_ATTR_DATA_CLASSIFICATION },
+        { "SQLSRV_ATTR_FETCH_BLOCK_SIZE"    , SQLSRV_ATTR_FETCH_BLOCK_SIZE },
+        { "SQLSRV_ATTR_CLIENT_BUFFER_SPILL" , SQLSRV_ATTR_CLIENT_BUFFER_SPILL },
+        { "SQLSRV_ATTR_STATEMENT_CACHE_INFO", SQLSRV_ATTR_STATEMENT_CACHE_INFO },
+        { "SQLSRV_ATTR_STREAM_CHUNK_SIZE"   , SQLSRV_ATTR_STREAM_CHUNK_SIZE },
+        { "SQLSRV_ATTR_ASYNC_EXECUTE"       , SQLSRV_ATTR_ASYNC_EXECUTE },
+        { "SQLSRV_ATTR_PERSISTENT_POOL_INFO", SQLSRV_ATTR_PERSISTENT_POOL_INFO },
+        { "SQLSRV_ATTR_SQL_CACHE_INFO"      , SQLSRV_ATTR_SQL_CACHE_INFO },
+        { "SQLSRV_ATTR_DSN_CACHE_INFO"      , SQLSRV_ATTR_DSN_CACHE_INFO },
+        { "SQLSRV_ATTR_TRACE_INFO"          , SQLSRV_ATTR_TRACE_INFO },
+        { "SQLSRV_ATTR_DEFER_PREPARE"       , SQLSRV_ATTR_DEFER_PREPARE },
+        { "SQLSRV_ATTR_READ_AHEAD"          , SQLSRV_ATTR_READ_AHEAD },
 
         // used for the size for output parameters: PDO::PARAM_INT and PDO::PARAM_BOOL use the default size of int,
         // PDO::PARAM_STR uses the size of the string in the variable
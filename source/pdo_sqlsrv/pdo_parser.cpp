@@ -1,7 +1,7 @@
 //---------------------------------------------------------------------------------------------------------------------------------
 // File: pdo_parser.cpp
 //
-// Contents: Implements a parser to parse the PDO DSN.
+// Contents: Implements the parsers of the PDO DSN and of query placeholders, and the caches of the parsed DSNs and queries.
 //
 // Copyright Microsoft Corporation
 //
@@ -25,6 +25,110 @@ extern "C" {
 
 #include "php_pdo_sqlsrv_int.h"
 
+#include <algorithm>
+#include <list>
+#include <mutex>
+#include <unordered_map>
+
+#include "ext/standard/sha1.h"
+
+namespace {
+
+// kinds of parsing kept in the parse caches, which prefix the cache keys
+const char SQL_CACHE_PARSE_PARAMS = 'P';     // pdo_parse_params for queries prepared by ODBC
+const char SQL_CACHE_PLACEHOLDERS = 'E';     // sql_string_parser for emulated prepares
+const char DSN_CACHE_OPTIONS = 'D';          // conn_string_parser for the DSN of a connection
+
+// A string parsed before.  The elements are the names of the placeholders by position for a query, with empty
+// names for positional placeholders of emulated prepares, and the values of the options by key for a DSN.
+struct parse_cache_entry {
+    std::string key;
+    bool rewritten;                     // whether pdo_parse_params rewrote the query
+    std::string sql;                    // the rewritten query
+    std::vector<std::pair<zend_ulong, std::string>> elements;
+    bool secret;                        // whether the elements may hold credentials
+
+    parse_cache_entry( void ) : rewritten( false ), secret( false )
+    {
+    }
+
+    // the values of a DSN may hold a password, so they are wiped before the memory is given back
+    ~parse_cache_entry( void )
+    {
+        if( secret ) {
+            for( size_t i = 0; i < elements.size(); ++i ) {
+                if( !elements[i].second.empty() ) {
+                    ZEND_SECURE_ZERO( &elements[i].second[0], elements[i].second.size() );
+                }
+            }
+        }
+    }
+
+    // approximate memory used by the entry, including its key in the index
+    size_t memory( void ) const
+    {
+        size_t size = sizeof( parse_cache_entry ) + key.size() * 2 + sql.size();
+        for( size_t i = 0; i < elements.size(); ++i ) {
+            size += sizeof( elements[i] ) + elements[i].second.size();
+        }
+        return size;
+    }
+};
+
+// A parse cache of the process.  It outlives the requests and is shared by the threads of a thread safe
+// build, so it is allocated with the C++ allocator rather than PHP's and guarded by a mutex.
+struct parse_cache {
+    std::mutex lock;
+    std::list<parse_cache_entry> entries;                                               // most recently used first
+    std::unordered_map<std::string, std::list<parse_cache_entry>::iterator> index;      // entries by key
+    zend_long max_entries;
+    size_t max_memory;                  // approximate number of bytes the entries may use
+    zend_long hits;
+    zend_long misses;
+    zend_long evictions;
+    size_t memory;
+
+    parse_cache( void ) : max_entries( 0 ), max_memory( std::numeric_limits<size_t>::max() ), hits( 0 ), misses( 0 ), evictions( 0 ), memory( 0 )
+    {
+    }
+};
+
+parse_cache parsed_sql;
+parse_cache parsed_dsn;
+
+// frees the names of the parameter maps rebuilt from the cache, as PDO frees the names of the maps it builds
+void sql_cache_free_param_name( _Inout_ zval* name_z )
+{
+#if PHP_VERSION_ID < 80100
+    efree( Z_PTR_P( name_z ));
+#else
+    zend_string_release( reinterpret_cast<zend_string*>( Z_PTR_P( name_z )));
+#endif
+}
+
+// the key of a DSN is its SHA-1 digest, so that the cache does not keep the text of the DSN as a key
+std::string dsn_cache_key( _In_reads_(len) const char* dsn, _In_ size_t len )
+{
+    PHP_SHA1_CTX context;
+    unsigned char digest[20];
+
+    PHP_SHA1Init( &context );
+    PHP_SHA1Update( &context, reinterpret_cast<const unsigned char*>( dsn ), len );
+    PHP_SHA1Final( digest, &context );
+
+    std::string key( 1, DSN_CACHE_OPTIONS );
+    key.append( reinterpret_cast<const char*>( digest ), sizeof( digest ));
+    return key;
+}
+
+bool parse_cache_find( _Inout_ parse_cache& cache, _In_ const std::string& key, _Out_ parse_cache_entry& found );
+void parse_cache_add( _Inout_ parse_cache& cache, _Inout_ parse_cache_entry& entry );
+void parse_cache_evict( _Inout_ parse_cache& cache, _In_ zend_long max_entries, _In_ size_t max_memory );
+void parse_cache_clear( _Inout_ parse_cache& cache );
+void parse_cache_info( _Inout_ parse_cache& cache, _Out_ zval* return_value );
+
+}
+
 // Constructor
 conn_string_parser:: conn_string_parser( _In_ sqlsrv_context& ctx, _In_ const char* dsn, _In_ int len, _In_ HashTable* conn_options_ht )
 {
@@ -185,6 +289,25 @@ inline bool sql_string_parser::is_placeholder_char( char c )
 // Primary function which parses the connection string/DSN.
 void conn_string_parser:: parse_conn_string( void )
 {
+    // a DSN parsed before takes the values of its options from the parsed DSN cache
+    parse_cache_entry cached;
+    cached.secret = true;
+    std::string key = dsn_cache_key( this->orig_str, this->len );
+    if( parse_cache_find( parsed_dsn, key, cached )) {
+        for( size_t i = 0; i < cached.elements.size(); ++i ) {
+            this->current_key = static_cast<unsigned int>( cached.elements[i].first );
+            add_key_value_pair( cached.elements[i].second.c_str(), static_cast<int>( cached.elements[i].second.size() ));
+        }
+        return;
+    }
+
+    // the options the caller added to the hashtable before the parse, such as the persistent flag, are not part of the DSN
+    std::vector<zend_ulong> caller_keys;
+    zend_ulong index = 0;
+    ZEND_HASH_FOREACH_NUM_KEY( this->element_ht, index ) {
+        caller_keys.push_back( index );
+    } ZEND_HASH_FOREACH_END();
+
     States state = FirstKeyValuePair; // starting state
     int start_pos = -1;
 
@@ -389,10 +512,41 @@ void conn_string_parser:: parse_conn_string( void )
 
         throw;
     }
+
+    // only the options parsed from the DSN are cached, not the ones the caller added to the hashtable before
+    cached.key.swap( key );
+    cached.elements.reserve( zend_hash_num_elements( this->element_ht ));    // no copies of the values are left behind by growing
+    zval* value_z = NULL;
+    ZEND_HASH_FOREACH_NUM_KEY_VAL( this->element_ht, index, value_z ) {
+        if( std::find( caller_keys.begin(), caller_keys.end(), index ) != caller_keys.end() ) {
+            continue;
+        }
+        SQLSRV_ASSERT( Z_TYPE_P( value_z ) == IS_STRING, "conn_string_parser::parse_conn_string: a DSN option must be a string." );
+        cached.elements.push_back( std::make_pair( index, std::string( Z_STRVAL_P( value_z ), Z_STRLEN_P( value_z ))));
+    } ZEND_HASH_FOREACH_END();
+    parse_cache_add( parsed_dsn, cached );
 }
 
 // Primary function which parses out the named placeholders from a sql string.
 void sql_string_parser::parse_sql_string( void ) {
+
+    // a query parsed before takes its placeholders from the parsed SQL cache
+    parse_cache_entry cached;
+    std::string key( 1, SQL_CACHE_PLACEHOLDERS );
+    key.append( this->orig_str, this->len );
+    if( parse_cache_find( parsed_sql, key, cached )) {
+        for( size_t i = 0; i < cached.elements.size(); ++i ) {
+            this->current_key = static_cast<unsigned int>( cached.elements[i].first );
+            if( cached.elements[i].second.empty() ) {
+                add_key_int_value_pair( this->current_key );
+            }
+            else {
+                add_key_value_pair( cached.elements[i].second.c_str(), static_cast<int>( cached.elements[i].second.size() ));
+            }
+        }
+        return;
+    }
+
     try {
         int start_pos = -1;
         while ( !this->is_eos() ) {
@@ -447,4 +601,224 @@ void sql_string_parser::parse_sql_string( void ) {
     catch ( pdo::PDOException& ) {
         throw;
     }
-}
\ No newline at end of file
+
+    cached.key.swap( key );
+    zend_ulong index = 0;
+    zval* value_z = NULL;
+    ZEND_HASH_FOREACH_NUM_KEY_VAL( this->element_ht, index, value_z ) {
+        cached.elements.push_back( std::make_pair( index, ( Z_TYPE_P( value_z ) == IS_STRING ) ?
+                                                              std::string( Z_STRVAL_P( value_z ), Z_STRLEN_P( value_z )) : std::string() ));
+    } ZEND_HASH_FOREACH_END();
+    parse_cache_add( parsed_sql, cached );
+}
+
+// Rewrites the named placeholders of a query prepared by ODBC with pdo_parse_params, which also builds the map of
+// the positions of the parameters to their names in stmt->bound_param_map.  A query parsed before takes the rewritten
+// query and the map from the parsed SQL cache instead.
+int pdo_sqlsrv_parse_params( _Inout_ pdo_stmt_t* stmt, _In_reads_(sql_len) const char* sql, _In_ size_t sql_len,
+                             _Out_ std::string& sql_rewrite )
+{
+    parse_cache_entry cached;
+    std::string key( 1, SQL_CACHE_PARSE_PARAMS );
+    key.append( sql, sql_len );
+    if( parse_cache_find( parsed_sql, key, cached )) {
+
+        if( !cached.elements.empty() ) {
+            ALLOC_HASHTABLE( stmt->bound_param_map );
+            zend_hash_init( stmt->bound_param_map, static_cast<uint32_t>( cached.elements.size() ), NULL, sql_cache_free_param_name, 0 );
+            for( size_t i = 0; i < cached.elements.size(); ++i ) {
+                const std::string& name = cached.elements[i].second;
+#if PHP_VERSION_ID < 80100
+                zend_hash_index_update_ptr( stmt->bound_param_map, cached.elements[i].first, estrndup( name.c_str(), name.size() ));
+#else
+                zend_hash_index_update_ptr( stmt->bound_param_map, cached.elements[i].first, zend_string_init( name.c_str(), name.size(), 0 ));
+#endif
+            }
+        }
+
+        if( !cached.rewritten ) {
+            return 0;
+        }
+        sql_rewrite.swap( cached.sql );
+        return 1;
+    }
+
+#if PHP_VERSION_ID < 80100
+    sqlsrv_malloc_auto_ptr<char> sql_out;
+    size_t sql_out_len = 0;
+    int zr = pdo_parse_params( stmt, const_cast<char*>( sql ), sql_len, &sql_out, &sql_out_len );
+    if( zr == -1 ) {
+        return zr;
+    }
+    cached.rewritten = ( sql_out != 0 );
+    if( cached.rewritten ) {
+        cached.sql.assign( sql_out.get(), sql_out_len );
+    }
+#else
+    zend_string* sql_zstr = zend_string_init( sql, sql_len, 0 );
+    zend_string* sql_out = NULL;
+    int zr = pdo_parse_params( stmt, sql_zstr, &sql_out );
+    zend_string_release( sql_zstr );
+    if( zr == -1 ) {
+        return zr;
+    }
+    cached.rewritten = ( sql_out != NULL );
+    if( cached.rewritten ) {
+        cached.sql.assign( ZSTR_VAL( sql_out ), ZSTR_LEN( sql_out ));
+        zend_string_release( sql_out );
+    }
+#endif
+
+    if( stmt->bound_param_map != NULL ) {
+        zend_ulong index = 0;
+        void* name = NULL;
+        ZEND_HASH_FOREACH_NUM_KEY_PTR( stmt->bound_param_map, index, name ) {
+#if PHP_VERSION_ID < 80100
+            cached.elements.push_back( std::make_pair( index, std::string( static_cast<char*>( name ))));
+#else
+            cached.elements.push_back( std::make_pair( index, std::string( ZSTR_VAL( static_cast<zend_string*>( name )),
+                                                                               ZSTR_LEN( static_cast<zend_string*>( name )))));
+#endif
+        } ZEND_HASH_FOREACH_END();
+    }
+
+    cached.key.swap( key );
+    if( cached.rewritten ) {
+        sql_rewrite = cached.sql;
+    }
+    parse_cache_add( parsed_sql, cached );
+
+    return zr;
+}
+
+void pdo_sqlsrv_sql_cache_set_max_entries( _In_ zend_long max_entries )
+{
+    std::lock_guard<std::mutex> guard( parsed_sql.lock );
+
+    parsed_sql.max_entries = ( max_entries > 0 ) ? max_entries : 0;
+    parse_cache_evict( parsed_sql, parsed_sql.max_entries, parsed_sql.max_memory );
+}
+
+void pdo_sqlsrv_sql_cache_set_max_memory( _In_ zend_long max_kb_size )
+{
+    std::lock_guard<std::mutex> guard( parsed_sql.lock );
+
+    parsed_sql.max_memory = ( max_kb_size > 0 ) ? static_cast<size_t>( max_kb_size ) * 1024 : 0;
+    parse_cache_evict( parsed_sql, parsed_sql.max_entries, parsed_sql.max_memory );
+}
+
+void pdo_sqlsrv_dsn_cache_set_max_entries( _In_ zend_long max_entries )
+{
+    std::lock_guard<std::mutex> guard( parsed_dsn.lock );
+
+    parsed_dsn.max_entries = ( max_entries > 0 ) ? max_entries : 0;
+    parse_cache_evict( parsed_dsn, parsed_dsn.max_entries, parsed_dsn.max_memory );
+}
+
+// Frees the queries and the DSNs in the parse caches when the module shuts down.
+void pdo_sqlsrv_parse_caches_free( void )
+{
+    parse_cache_clear( parsed_sql );
+    parse_cache_clear( parsed_dsn );
+}
+
+// Returns the counters of the parsed SQL cache of the process as an array.  HitRate is the share of the
+// queries parsed since the process started that were found in the cache, and MemoryUsage the approximate
+// number of bytes used by the cached queries.
+void pdo_sqlsrv_get_sql_cache_info( _Out_ zval* return_value )
+{
+    parse_cache_info( parsed_sql, return_value );
+}
+
+// Returns the counters of the parsed DSN cache of the process, with the same keys as the parsed SQL cache.
+void pdo_sqlsrv_get_dsn_cache_info( _Out_ zval* return_value )
+{
+    parse_cache_info( parsed_dsn, return_value );
+}
+
+namespace {
+
+// Looks up a parsed string in a cache, and copies the entry found since it may be evicted by another
+// thread as soon as the lock is released.
+bool parse_cache_find( _Inout_ parse_cache& cache, _In_ const std::string& key, _Out_ parse_cache_entry& found )
+{
+    std::lock_guard<std::mutex> guard( cache.lock );
+
+    if( cache.max_entries == 0 ) {
+        return false;
+    }
+
+    auto it = cache.index.find( key );
+    if( it == cache.index.end() ) {
+        ++cache.misses;
+        return false;
+    }
+
+    ++cache.hits;
+    cache.entries.splice( cache.entries.begin(), cache.entries, it->second );
+    found.rewritten = it->second->rewritten;
+    found.sql = it->second->sql;
+    found.secret = it->second->secret;
+    found.elements = it->second->elements;
+
+    return true;
+}
+
+// Adds a parsed string to a cache, evicting the least recently used entries to make room for it.  A string
+// whose entry alone would use more than the memory allowed to the cache is not cached.
+void parse_cache_add( _Inout_ parse_cache& cache, _Inout_ parse_cache_entry& entry )
+{
+    size_t entry_memory = entry.memory();
+
+    std::lock_guard<std::mutex> guard( cache.lock );
+
+    // another thread may have parsed the same string in the meantime
+    if( cache.max_entries == 0 || entry_memory > cache.max_memory || cache.index.count( entry.key ) > 0 ) {
+        return;
+    }
+
+    parse_cache_evict( cache, cache.max_entries - 1, cache.max_memory - entry_memory );
+
+    cache.memory += entry_memory;
+    cache.entries.push_front( std::move( entry ));
+    cache.index.emplace( cache.entries.front().key, cache.entries.begin() );
+}
+
+// Evicts the least recently used entries until at most max_entries are left and they use at most max_memory
+// bytes.  The lock must be held.
+void parse_cache_evict( _Inout_ parse_cache& cache, _In_ zend_long max_entries, _In_ size_t max_memory )
+{
+    while( static_cast<zend_long>( cache.entries.size() ) > max_entries || cache.memory > max_memory ) {
+        const parse_cache_entry& last = cache.entries.back();
+        cache.memory -= last.memory();
+        cache.index.erase( last.key );
+        cache.entries.pop_back();
+        ++cache.evictions;
+    }
+}
+
+void parse_cache_clear( _Inout_ parse_cache& cache )
+{
+    std::lock_guard<std::mutex> guard( cache.lock );
+
+    cache.index.clear();
+    cache.entries.clear();
+    cache.memory = 0;
+}
+
+void parse_cache_info( _Inout_ parse_cache& cache, _Out_ zval* return_value )
+{
+    std::lock_guard<std::mutex> guard( cache.lock );
+
+    array_init( return_value );
+    add_assoc_long( return_value, "Entries", static_cast<zend_long>( cache.entries.size() ));
+    add_assoc_long( return_value, "MaxEntries", cache.max_entries );
+    add_assoc_long( return_value, "Hits", cache.hits );
+    add_assoc_long( return_value, "Misses", cache.misses );
+    add_assoc_long( return_value, "Evictions", cache.evictions );
+    zend_long lookups = cache.hits + cache.misses;
+    add_assoc_double( return_value, "HitRate", ( lookups > 0 ) ? static_cast<double>( cache.hits ) / lookups : 0.0 );
+    add_assoc_long( return_value, "MemoryUsage", static_cast<zend_long>( cache.memory ));
+}
+
+}
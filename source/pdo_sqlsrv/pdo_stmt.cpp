@@ -269,6 +269,12 @@ zval convert_to_zval(_Inout_ sqlsrv_stmt* stmt, _In_ SQLSRV_PHPTYPE sqlsrv_php_t
     return out_zval;
 }
 
+void set_execute_results( _Inout_ pdo_stmt_t* stmt, _In_ SQLRETURN r );
+void free_columns( _Inout_ pdo_stmt_t* stmt );
+bool describe_columns( _Inout_ pdo_stmt_t* stmt );
+bool fetch_next_row( _Inout_ pdo_stmt_t* stmt );
+void fetch_column_value( _Inout_ pdo_stmt_t* stmt, _In_ int colno, _Out_ zval& value );
+
 }       // namespace
 
 int pdo_sqlsrv_stmt_dtor( _Inout_ pdo_stmt_t *stmt );
@@ -346,6 +352,12 @@ void stmt_option_fetch_datetime:: operator()( _Inout_ sqlsrv_stmt* stmt, stmt_op
     pdo_stmt->fetch_datetime = zend_is_true(value_z);
 }
 
+void stmt_option_async_execute:: operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /*opt*/, _In_ zval* value_z )
+{
+    pdo_sqlsrv_stmt *pdo_stmt = static_cast<pdo_sqlsrv_stmt*>( stmt );
+    pdo_stmt->async_execute = zend_is_true(value_z);
+}
+
 // log a function entry point
 #define PDO_LOG_STMT_ENTRY \
 { \
@@ -391,6 +403,9 @@ int pdo_sqlsrv_stmt_close_cursor( _Inout_ pdo_stmt_t *stmt )
 
         SQLSRV_ASSERT( driver_stmt != NULL, "pdo_sqlsrv_stmt_close_cursor: driver_data object was null" );
 
+        // an asynchronous execution that has not completed is canceled
+        core_sqlsrv_cancel_async( driver_stmt );
+
         // to "close the cursor" means we make the statement ready for execution again.  To do this, we
         // skip all the result sets on the current statement.
         // If the statement has not been executed there are no next results to iterate over.
@@ -430,19 +445,29 @@ int pdo_sqlsrv_stmt_describe_col( _Inout_ pdo_stmt_t *stmt, _In_ int colno)
     SQLSRV_ASSERT(( colno >= 0 ), "pdo_sqlsrv_stmt_describe_col: Column number should be >= 0." );
     SQLSRV_ASSERT( stmt->driver_data != NULL, "pdo_sqlsrv_stmt_describe_col: driver_data object was NULL." );
 
-    sqlsrv_malloc_auto_ptr<field_meta_data> core_meta_data;
-
-    try {
+    pdo_sqlsrv_stmt* driver_stmt = reinterpret_cast<pdo_sqlsrv_stmt*>( stmt->driver_data );
+    sqlsrv_malloc_auto_ptr<field_meta_data> new_meta_data;
+    field_meta_data* core_meta_data = NULL;
 
-        core_meta_data = core_sqlsrv_field_metadata( reinterpret_cast<sqlsrv_stmt*>( stmt->driver_data ), colno );
+    // a statement prepared with a handle from the statement cache may have the metadata of its columns already
+    if( colno < static_cast<int>( driver_stmt->current_meta_data.size() )) {
+        core_meta_data = driver_stmt->current_meta_data[colno];
     }
+    else {
+        try {
 
-    catch( core::CoreException& ) {
-        return 0;
-    }
+            new_meta_data = core_sqlsrv_field_metadata( driver_stmt, colno );
+        }
 
-    catch(...) {
-        DIE( "pdo_sqlsrv_stmt_describe_col: Unexpected exception occurred." );
+        catch( core::CoreException& ) {
+            return 0;
+        }
+
+        catch(...) {
+            DIE( "pdo_sqlsrv_stmt_describe_col: Unexpected exception occurred." );
+        }
+
+        core_meta_data = new_meta_data.get();
     }
 
     pdo_column_data* column_data = &(stmt->columns[colno]);
@@ -463,11 +488,11 @@ int pdo_sqlsrv_stmt_describe_col( _Inout_ pdo_stmt_t *stmt, _In_ int colno)
     column_data->param_type = PDO_PARAM_ZVAL;
 #endif
     // store the field data for use by pdo_sqlsrv_stmt_get_col_data
-    pdo_sqlsrv_stmt* driver_stmt = reinterpret_cast<pdo_sqlsrv_stmt*>( stmt->driver_data );
-    SQLSRV_ASSERT( driver_stmt != NULL, "Invalid driver statement in pdo_sqlsrv_stmt_describe_col" );
-    driver_stmt->current_meta_data.push_back( core_meta_data.get() );
-    SQLSRV_ASSERT( driver_stmt->current_meta_data.size() == colno + 1, "Meta data vector out of sync with column numbers" );
-    core_meta_data.transferred();
+    if( new_meta_data.get() != NULL ) {
+        driver_stmt->current_meta_data.push_back( new_meta_data.get() );
+        SQLSRV_ASSERT( driver_stmt->current_meta_data.size() == colno + 1, "Meta data vector out of sync with column numbers" );
+        new_meta_data.transferred();
+    }
 
     return 1;
 }
@@ -571,32 +596,26 @@ int pdo_sqlsrv_stmt_execute( _Inout_ pdo_stmt_t *stmt )
         // PDOStatement::setAttribute()
         driver_stmt->set_query_timeout();
 
-        SQLRETURN execReturn = core_sqlsrv_execute( driver_stmt, query, query_len );
+        SQLRETURN execReturn = SQL_ERROR;
 
-        if ( execReturn == SQL_NO_DATA ) {
-            stmt->column_count = 0;
-            stmt->row_count = 0;
-            driver_stmt->column_count = 0;
-            driver_stmt->row_count = 0;
-        }
-        else {
-            if (driver_stmt->column_count == ACTIVE_NUM_COLS_INVALID) {
-                stmt->column_count = core::SQLNumResultCols( driver_stmt );
-                driver_stmt->column_count = stmt->column_count;
-            }
-            else {
-                stmt->column_count = driver_stmt->column_count;
-            }
+        if( driver_stmt->async_execute ) {
 
-            if (driver_stmt->row_count == ACTIVE_NUM_ROWS_INVALID) {
-                // return the row count regardless if there are any rows or not
-                stmt->row_count = core::SQLRowCount( driver_stmt );
-                driver_stmt->row_count = stmt->row_count;
-            }
-            else {
-                stmt->row_count = driver_stmt->row_count;
+            execReturn = core_sqlsrv_execute_async( driver_stmt, query, query_len );
+
+            // there are no columns until the execution completes, and PDOStatement::sqlsrvPoll describes them.
+            // The statement is marked as executed so that PDO doesn't try to describe them now.
+            if( execReturn == SQL_STILL_EXECUTING ) {
+                free_columns( stmt );
+                stmt->row_count = 0;
+                stmt->executed = 1;
+                return 1;
             }
         }
+        else {
+            execReturn = core_sqlsrv_execute( driver_stmt, query, query_len );
+        }
+
+        set_execute_results( stmt, execReturn );
 
         // workaround for a bug in the PDO driver manager.  It is fairly simple to crash the PDO driver manager with
         // the following sequence:
@@ -630,6 +649,221 @@ int pdo_sqlsrv_stmt_execute( _Inout_ pdo_stmt_t *stmt )
 
 
 
+// pdo_sqlsrv_stmt_execute_batch
+// Maps to the driver specific method PDOStatement::sqlsrvExecuteBatch( array $rows [, int $batchSize] ).
+// Executes the prepared statement once for each row of parameter values, sending the rows in batches
+// of parameter arrays.  See core_sqlsrv_execute_batch.
+// Return:
+// An array with true or false for each row, or false if the batch could not be executed.
+PHP_FUNCTION( pdo_sqlsrv_stmt_execute_batch )
+{
+    zval* rows_z = NULL;
+    zend_long batch_size = EXECUTE_BATCH_SIZE_DEFAULT;
+
+    if( zend_parse_parameters( ZEND_NUM_ARGS(), "a|l", &rows_z, &batch_size ) == FAILURE ) {
+        RETURN_FALSE;
+    }
+
+    pdo_stmt_t* stmt = Z_PDO_STMT_P( getThis() );
+
+    PDO_RESET_STMT_ERROR;
+    PDO_VALIDATE_STMT;
+    PDO_LOG_STMT_ENTRY;
+
+    try {
+
+        pdo_sqlsrv_stmt* driver_stmt = reinterpret_cast<pdo_sqlsrv_stmt*>( stmt->driver_data );
+        SQLSRV_ASSERT( driver_stmt != NULL, "pdo_sqlsrv_stmt_execute_batch: driver_data object was null" );
+
+        // the statement must have been prepared by ODBC for its parameters to be bound as arrays
+        CHECK_CUSTOM_ERROR( driver_stmt->direct_query || stmt->supports_placeholders == PDO_PLACEHOLDER_NONE, driver_stmt,
+                            PDO_SQLSRV_ERROR_BATCH_NOT_PREPARED ) {
+            throw core::CoreException();
+        }
+
+        // prepare for execution by flushing anything remaining in the result set
+        if( driver_stmt->executed ) {
+
+            while( driver_stmt->past_next_result_end == false ) {
+
+                core_sqlsrv_next_result( driver_stmt, false );
+            }
+        }
+
+        driver_stmt->set_query_timeout();
+
+        core_sqlsrv_execute_batch( driver_stmt, Z_ARRVAL_P( rows_z ), batch_size, return_value );
+    }
+    catch( core::CoreException& ) {
+
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "pdo_sqlsrv_stmt_execute_batch: Unexpected exception occurred." );
+    }
+}
+
+// pdo_sqlsrv_stmt_poll
+// Maps to the driver specific method PDOStatement::sqlsrvPoll().
+// Checks whether the statement executed with PDO::SQLSRV_ATTR_ASYNC_EXECUTE has completed.  Once it has,
+// its columns are described and the results are fetched as usual.  See core_sqlsrv_poll.
+// Return:
+// true if the execution has completed, or if the statement was not executed asynchronously.  null if the
+// statement is still executing.  false if the execution failed.
+PHP_FUNCTION( pdo_sqlsrv_stmt_poll )
+{
+    if( zend_parse_parameters( ZEND_NUM_ARGS(), "" ) == FAILURE ) {
+        RETURN_FALSE;
+    }
+
+    pdo_stmt_t* stmt = Z_PDO_STMT_P( getThis() );
+
+    PDO_RESET_STMT_ERROR;
+    PDO_VALIDATE_STMT;
+    PDO_LOG_STMT_ENTRY;
+
+    try {
+
+        pdo_sqlsrv_stmt* driver_stmt = reinterpret_cast<pdo_sqlsrv_stmt*>( stmt->driver_data );
+        SQLSRV_ASSERT( driver_stmt != NULL, "pdo_sqlsrv_stmt_poll: driver_data object was null" );
+
+        if( !driver_stmt->async_executing ) {
+            RETURN_TRUE;
+        }
+
+        SQLRETURN r = core_sqlsrv_poll( driver_stmt );
+        if( r == SQL_STILL_EXECUTING ) {
+            RETURN_NULL();
+        }
+
+        set_execute_results( stmt, r );
+
+        if( !describe_columns( stmt )) {
+            RETURN_FALSE;
+        }
+
+        RETURN_TRUE;
+    }
+    catch( core::CoreException& ) {
+
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "pdo_sqlsrv_stmt_poll: Unexpected exception occurred." );
+    }
+}
+
+// pdo_sqlsrv_stmt_fetch_all
+// Maps to the driver specific method PDOStatement::sqlsrvFetchAll( [int $mode] ).
+// Fetches the remaining rows of the result set as PDOStatement::fetchAll does for PDO::FETCH_ASSOC,
+// PDO::FETCH_NUM and PDO::FETCH_BOTH, without returning to PDO for each row.  The column names described
+// for the result set are the keys of every row, and the array is sized for the rows up front when the
+// cursor knows how many there are.  Columns bound with PDOStatement::bindColumn are not updated.
+// Return:
+// An array of rows, which is empty if there are no more rows, or false if the rows could not be fetched.
+PHP_FUNCTION( pdo_sqlsrv_stmt_fetch_all )
+{
+    zend_long mode = PDO_FETCH_USE_DEFAULT;
+
+    if( zend_parse_parameters( ZEND_NUM_ARGS(), "|l", &mode ) == FAILURE ) {
+        RETURN_FALSE;
+    }
+
+    pdo_stmt_t* stmt = Z_PDO_STMT_P( getThis() );
+
+    PDO_RESET_STMT_ERROR;
+    PDO_VALIDATE_STMT;
+    PDO_LOG_STMT_ENTRY;
+
+    try {
+
+        pdo_sqlsrv_stmt* driver_stmt = reinterpret_cast<pdo_sqlsrv_stmt*>( stmt->driver_data );
+        SQLSRV_ASSERT( driver_stmt != NULL, "pdo_sqlsrv_stmt_fetch_all: driver_data object was null" );
+
+        if( mode == PDO_FETCH_USE_DEFAULT ) {
+            mode = stmt->default_fetch_type & ~PDO_FETCH_FLAGS;
+        }
+
+        CHECK_CUSTOM_ERROR( mode != PDO_FETCH_ASSOC && mode != PDO_FETCH_NUM && mode != PDO_FETCH_BOTH, driver_stmt,
+                            PDO_SQLSRV_ERROR_FETCH_ALL_MODE_UNSUPPORTED ) {
+            throw core::CoreException();
+        }
+
+        if( !fetch_next_row( stmt )) {
+            array_init( return_value );
+            return;
+        }
+
+        if( !describe_columns( stmt )) {
+            throw core::CoreException();
+        }
+
+        // only cursors that count their rows can size the array up front.  Scrollable cursors
+        // may be positioned past the first row, so the count is an upper bound.
+        SQLLEN row_count = 0;
+        if( driver_stmt->cursor_type != SQL_CURSOR_FORWARD_ONLY && driver_stmt->cursor_type != SQL_CURSOR_DYNAMIC ) {
+            row_count = driver_stmt->current_results->row_count();
+        }
+        array_init_size( return_value, ( row_count > 0 ) ? static_cast<uint32_t>( row_count ) : 0 );
+
+        uint32_t row_size = ( mode == PDO_FETCH_BOTH ) ? stmt->column_count * 2 : stmt->column_count;
+
+        do {
+            zval row;
+            array_init_size( &row, row_size );
+            // add the row before its columns so that it is freed with the rows if a column fails
+            zend_hash_next_index_insert_new( Z_ARRVAL_P( return_value ), &row );
+
+            for( int i = 0; i < stmt->column_count; ++i ) {
+
+                zval value;
+                fetch_column_value( stmt, i, value );
+
+                if( mode != PDO_FETCH_NUM ) {
+                    zend_symtable_update( Z_ARRVAL( row ), stmt->columns[i].name, &value );
+                    if( mode == PDO_FETCH_BOTH ) {
+                        Z_TRY_ADDREF( value );
+                    }
+                }
+                if( mode != PDO_FETCH_ASSOC ) {
+                    zend_hash_next_index_insert( Z_ARRVAL( row ), &value );
+                }
+            }
+        } while( fetch_next_row( stmt ));
+    }
+    catch( core::CoreException& ) {
+
+        zval_ptr_dtor( return_value );
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "pdo_sqlsrv_stmt_fetch_all: Unexpected exception occurred." );
+    }
+}
+
+ZEND_BEGIN_ARG_INFO_EX( pdo_sqlsrv_stmt_execute_batch_arginfo, 0, 0, 1 )
+    ZEND_ARG_INFO( 0, rows )
+    ZEND_ARG_INFO( 0, batch_size )
+ZEND_END_ARG_INFO()
+
+ZEND_BEGIN_ARG_INFO_EX( pdo_sqlsrv_stmt_poll_arginfo, 0, 0, 0 )
+ZEND_END_ARG_INFO()
+
+ZEND_BEGIN_ARG_INFO_EX( pdo_sqlsrv_stmt_fetch_all_arginfo, 0, 0, 0 )
+    ZEND_ARG_INFO( 0, mode )
+ZEND_END_ARG_INFO()
+
+const zend_function_entry pdo_sqlsrv_stmt_driver_methods[] = {
+    ZEND_FENTRY( sqlsrvExecuteBatch, ZEND_FN( pdo_sqlsrv_stmt_execute_batch ), pdo_sqlsrv_stmt_execute_batch_arginfo, ZEND_ACC_PUBLIC )
+    ZEND_FENTRY( sqlsrvPoll, ZEND_FN( pdo_sqlsrv_stmt_poll ), pdo_sqlsrv_stmt_poll_arginfo, ZEND_ACC_PUBLIC )
+    ZEND_FENTRY( sqlsrvFetchAll, ZEND_FN( pdo_sqlsrv_stmt_fetch_all ), pdo_sqlsrv_stmt_fetch_all_arginfo, ZEND_ACC_PUBLIC )
+    PHP_FE_END
+};
+
+
 // pdo_sqlsrv_stmt_fetch
 // Maps to PDOStatement::fetch
 // Move the cursor to the record indicated. If the cursor is moved off the end,
@@ -906,6 +1140,10 @@ int pdo_sqlsrv_stmt_set_attr( _Inout_ pdo_stmt_t *stmt, _In_ zend_long attr, _In
                 THROW_PDO_ERROR( driver_stmt, PDO_SQLSRV_ERROR_DQ_ATTR_AT_PREPARE_ONLY );
                 break;
 
+            case SQLSRV_ATTR_DEFER_PREPARE:
+                THROW_PDO_ERROR( driver_stmt, PDO_SQLSRV_ERROR_DEFER_PREPARE_AT_PREPARE_ONLY );
+                break;
+
             case SQLSRV_ATTR_ENCODING:
                 set_stmt_encoding( driver_stmt, val );
                 break;
@@ -946,6 +1184,26 @@ int pdo_sqlsrv_stmt_set_attr( _Inout_ pdo_stmt_t *stmt, _In_ zend_long attr, _In
                 driver_stmt->data_classification = zend_is_true(val);
                 break;
 
+            case SQLSRV_ATTR_FETCH_BLOCK_SIZE:
+                core_sqlsrv_set_fetch_block_size( driver_stmt, val );
+                break;
+
+            case SQLSRV_ATTR_READ_AHEAD:
+                core_sqlsrv_set_read_ahead( driver_stmt, val );
+                break;
+
+            case SQLSRV_ATTR_CLIENT_BUFFER_SPILL:
+                driver_stmt->buffered_query_spill = zend_is_true( val );
+                break;
+
+            case SQLSRV_ATTR_STREAM_CHUNK_SIZE:
+                core_sqlsrv_set_stream_chunk_size( driver_stmt, val );
+                break;
+
+            case SQLSRV_ATTR_ASYNC_EXECUTE:
+                driver_stmt->async_execute = zend_is_true( val );
+                break;
+
             default:
                 THROW_PDO_ERROR( driver_stmt, PDO_SQLSRV_ERROR_INVALID_STMT_ATTR );
                 break;
@@ -990,6 +1248,12 @@ int pdo_sqlsrv_stmt_get_attr( _Inout_ pdo_stmt_t *stmt, _In_ zend_long attr, _In
                 break;
             }
 
+            case SQLSRV_ATTR_DEFER_PREPARE:
+            {
+                ZVAL_BOOL( return_value, driver_stmt->defer_prepare );
+                break;
+            }
+
            case SQLSRV_ATTR_ENCODING:
             {
                 ZVAL_LONG( return_value, driver_stmt->encoding() );
@@ -1051,6 +1315,37 @@ int pdo_sqlsrv_stmt_get_attr( _Inout_ pdo_stmt_t *stmt, _In_ zend_long attr, _In
                 break;
             }
 
+            case SQLSRV_ATTR_FETCH_BLOCK_SIZE:
+            {
+                ZVAL_LONG( return_value, driver_stmt->fetch_block_size );
+                break;
+            }
+
+            case SQLSRV_ATTR_READ_AHEAD:
+            {
+                ZVAL_LONG( return_value, driver_stmt->read_ahead );
+                break;
+            }
+
+            case SQLSRV_ATTR_CLIENT_BUFFER_SPILL:
+            {
+                ZVAL_BOOL( return_value, driver_stmt->buffered_query_spill );
+                break;
+            }
+
+            case SQLSRV_ATTR_STREAM_CHUNK_SIZE:
+            {
+                SQLULEN chunk_size = driver_stmt->stream_chunk_size;
+                ZVAL_LONG( return_value, chunk_size > 0 ? static_cast<zend_long>( chunk_size ) : PHP_STREAM_BUFFER_SIZE );
+                break;
+            }
+
+            case SQLSRV_ATTR_ASYNC_EXECUTE:
+            {
+                ZVAL_BOOL( return_value, driver_stmt->async_execute );
+                break;
+            }
+
             default:
                 THROW_PDO_ERROR( driver_stmt, PDO_SQLSRV_ERROR_INVALID_STMT_ATTR );
                 break;
@@ -1111,6 +1406,9 @@ int pdo_sqlsrv_stmt_get_col_meta( _Inout_ pdo_stmt_t *stmt, _In_ zend_long colno
         SQLSRV_ASSERT(colno < driver_stmt->current_meta_data.size(), "pdo_sqlsrv_stmt_get_col_meta: Metadata vector out of sync with column numbers");
         core_meta_data = driver_stmt->current_meta_data[colno];
 
+        // the attributes below are read from the handle, which a thread reading ahead may be using
+        core_sqlsrv_stop_read_ahead( driver_stmt, false );
+
         // add the following fields: flags, native_type, driver:decl_type, table
         if (driver_stmt->data_classification) {
             core_sqlsrv_sensitivity_metadata(driver_stmt);
@@ -1570,3 +1868,147 @@ sqlsrv_phptype pdo_sqlsrv_stmt::sql_type_to_php_type( _In_ SQLINTEGER sql_type,
 
     return sqlsrv_phptype;
 }
+
+namespace {
+
+// Sets the number of columns and rows affected of a PDO statement once its execution returned r.
+void set_execute_results( _Inout_ pdo_stmt_t* stmt, _In_ SQLRETURN r )
+{
+    pdo_sqlsrv_stmt* driver_stmt = reinterpret_cast<pdo_sqlsrv_stmt*>( stmt->driver_data );
+
+    if ( r == SQL_NO_DATA ) {
+        stmt->column_count = 0;
+        stmt->row_count = 0;
+        driver_stmt->column_count = 0;
+        driver_stmt->row_count = 0;
+    }
+    else {
+        if (driver_stmt->column_count == ACTIVE_NUM_COLS_INVALID) {
+            stmt->column_count = core::SQLNumResultCols( driver_stmt );
+            driver_stmt->column_count = stmt->column_count;
+        }
+        else {
+            stmt->column_count = driver_stmt->column_count;
+        }
+
+        if (driver_stmt->row_count == ACTIVE_NUM_ROWS_INVALID) {
+            // return the row count regardless if there are any rows or not
+            stmt->row_count = core::SQLRowCount( driver_stmt );
+            driver_stmt->row_count = stmt->row_count;
+        }
+        else {
+            stmt->row_count = driver_stmt->row_count;
+        }
+    }
+}
+
+// Frees the columns PDO described for a previous execution of the statement.
+void free_columns( _Inout_ pdo_stmt_t* stmt )
+{
+    if( stmt->columns ) {
+        for( int i = 0; i < stmt->column_count; ++i ) {
+            if( stmt->columns[i].name ) {
+                zend_string_release( stmt->columns[i].name );
+            }
+        }
+        efree( stmt->columns );
+        stmt->columns = NULL;
+    }
+    stmt->column_count = 0;
+}
+
+// Describes the columns of a statement whose asynchronous execution completed, as PDO does after a
+// synchronous execution, including the case of the column names and the columns bound by name.
+bool describe_columns( _Inout_ pdo_stmt_t* stmt )
+{
+    if( stmt->columns != NULL || stmt->column_count <= 0 ) {
+        return true;
+    }
+
+    stmt->columns = reinterpret_cast<pdo_column_data*>( ecalloc( stmt->column_count, sizeof( pdo_column_data )));
+
+    for( int col = 0; col < stmt->column_count; ++col ) {
+
+        if( !pdo_sqlsrv_stmt_describe_col( stmt, col )) {
+            return false;
+        }
+
+        if( stmt->dbh->native_case != stmt->dbh->desired_case && stmt->dbh->desired_case != PDO_CASE_NATURAL ) {
+            zend_string* orig_name = stmt->columns[col].name;
+            if( stmt->dbh->desired_case == PDO_CASE_LOWER ) {
+                stmt->columns[col].name = zend_string_tolower( orig_name );
+                zend_string_release( orig_name );
+            }
+            else {
+                stmt->columns[col].name = zend_string_separate( orig_name, 0 );
+                for( char* p = ZSTR_VAL( stmt->columns[col].name ); *p != '\0'; ++p ) {
+                    *p = static_cast<char>( toupper( *p ));
+                }
+            }
+        }
+
+        if( stmt->bound_columns ) {
+            struct pdo_bound_param_data* param = reinterpret_cast<pdo_bound_param_data*>(
+                zend_hash_find_ptr( stmt->bound_columns, stmt->columns[col].name ));
+            if( param != NULL ) {
+                param->paramno = col;
+            }
+        }
+    }
+
+    return true;
+}
+
+// Moves to the next row for PDOStatement::sqlsrvFetchAll as PDO does for each fetch, so that the row count
+// is kept up to date.  Returns false at the end of the result set and throws if the fetch failed.
+bool fetch_next_row( _Inout_ pdo_stmt_t* stmt )
+{
+    if( pdo_sqlsrv_stmt_fetch( stmt, PDO_FETCH_ORI_NEXT, 0 )) {
+        return true;
+    }
+
+    // the error, if any, was already recorded on the statement
+    if( strcmp( stmt->error_code, PDO_ERR_NONE ) != 0 ) {
+        throw core::CoreException();
+    }
+
+    return false;
+}
+
+// Retrieves a column of the current row for PDOStatement::sqlsrvFetchAll with the conversions PDO applies
+// to fetched values for PDO::ATTR_ORACLE_NULLS and PDO::ATTR_STRINGIFY_FETCHES.
+void fetch_column_value( _Inout_ pdo_stmt_t* stmt, _In_ int colno, _Out_ zval& value )
+{
+    ZVAL_NULL( &value );
+
+#if PHP_VERSION_ID < 80100
+    char* ptr = NULL;
+    size_t len = 0;
+    int caller_frees = 0;
+    if( !pdo_sqlsrv_stmt_get_col_data( stmt, colno, &ptr, &len, &caller_frees )) {
+        throw core::CoreException();
+    }
+    if( ptr != NULL ) {
+        ZVAL_COPY_VALUE( &value, reinterpret_cast<zval*>( ptr ));
+        sqlsrv_free( ptr );
+    }
+#else
+    enum pdo_param_type type = PDO_PARAM_ZVAL;
+    if( !pdo_sqlsrv_stmt_get_col_data( stmt, colno, &value, &type )) {
+        throw core::CoreException();
+    }
+#endif
+
+    if( Z_TYPE( value ) == IS_NULL && stmt->dbh->oracle_nulls == PDO_NULL_TO_STRING ) {
+        ZVAL_EMPTY_STRING( &value );
+    }
+    if( stmt->dbh->stringify && ( Z_TYPE( value ) == IS_LONG || Z_TYPE( value ) == IS_DOUBLE )) {
+        convert_to_string( &value );
+    }
+    if( Z_TYPE( value ) == IS_STRING && Z_STRLEN( value ) == 0 && stmt->dbh->oracle_nulls == PDO_NULL_EMPTY_STRING ) {
+        zval_ptr_dtor_str( &value );
+        ZVAL_NULL( &value );
+    }
+}
+
+}       // namespace
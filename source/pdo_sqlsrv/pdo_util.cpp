@@ -305,10 +305,6 @@ pdo_error PDO_ERRORS[] = {
         { IMSSP, (SQLCHAR*) "Invalid size for output string parameter %1!d!.  Input/output string parameters must have an "
           "explicit length.", -57, true }
     },
-    {
-        PDO_SQLSRV_ERROR_FUNCTION_NOT_IMPLEMENTED,
-        { IMSSP, (SQLCHAR*) "This function is not implemented by this driver.", -58, false }
-    },      
     {
         /* The stream related errors are not currently used in PDO, but the core layer can throw the stream related 
            errors so having a mapping here */
@@ -489,6 +485,72 @@ pdo_error PDO_ERRORS[] = {
         SQLSRV_ERROR_TVP_INPUT_PARAM_ONLY,
         { IMSSP, (SQLCHAR*) "You cannot return data in a table-valued parameter. Table-valued parameters are input-only.", -106, false }
     },
+    {
+        SQLSRV_ERROR_INVALID_FETCH_BLOCK_SIZE,
+        { IMSSP, (SQLCHAR*) "The fetch block size must be an integer between 1 and %1!d!.", -107, true }
+    },
+    {
+        SQLSRV_ERROR_INVALID_BATCH_SIZE,
+        { IMSSP, (SQLCHAR*) "The batch size must be an integer between 1 and %1!d!.", -108, true }
+    },
+    {
+        SQLSRV_ERROR_BATCH_NO_PARAMS,
+        { IMSSP, (SQLCHAR*) "Only statements with parameters can be executed in a batch.", -109, false }
+    },
+    {
+        SQLSRV_ERROR_BATCH_INVALID_ROW,
+        { IMSSP, (SQLCHAR*) "The row at index %1!d! of the batch must be an array with a value for each of the %2!d! parameters of the statement.", -110, true }
+    },
+    {
+        SQLSRV_ERROR_BATCH_INVALID_VALUE,
+        { IMSSP, (SQLCHAR*) "Invalid value for parameter %1!d! in the row at index %2!d! of the batch. Only null, boolean, integer, float and string values can be executed in a batch.", -111, true }
+    },
+    {
+        PDO_SQLSRV_ERROR_BATCH_NOT_PREPARED,
+        { IMSSP, (SQLCHAR*) "Batch execution is not supported with PDO::ATTR_EMULATE_PREPARES or PDO::SQLSRV_ATTR_DIRECT_QUERY.", -112, false }
+    },
+    {
+        SQLSRV_ERROR_BUFFER_SPILL_FAILED,
+        { IMSSP, (SQLCHAR*) "Failed to write the rows of a buffered query to a temporary file.", -113, false }
+    },
+    {
+        SQLSRV_ERROR_INVALID_STMT_CACHE_OPTION,
+        { IMSSP, (SQLCHAR*) "Invalid value for the connection option %1!s!. The value must be a non-negative integer.", -114, true }
+    },
+    {
+        SQLSRV_ERROR_INVALID_STREAM_CHUNK_SIZE,
+        { IMSSP, (SQLCHAR*) "The stream chunk size must be an integer between %1!d! and %2!d!.", -115, true }
+    },
+    {
+        SQLSRV_ERROR_ASYNC_EXECUTING,
+        { IMSSP, (SQLCHAR*) "The statement is still executing. Poll the statement until the execution completes.", -116, false }
+    },
+    {
+        SQLSRV_ERROR_ASYNC_STREAM_PARAMS,
+        { IMSSP, (SQLCHAR*) "Stream parameters cannot be sent by a statement executed asynchronously.", -117, false }
+    },
+    {
+        PDO_SQLSRV_ERROR_FETCH_ALL_MODE_UNSUPPORTED,
+        { IMSSP, (SQLCHAR*) "PDOStatement::sqlsrvFetchAll supports only the PDO::FETCH_ASSOC, PDO::FETCH_NUM and PDO::FETCH_BOTH fetch modes.", -118, false }
+    },
+    {
+        PDO_SQLSRV_ERROR_DEFER_PREPARE_AT_PREPARE_ONLY,
+        { IMSSP, (SQLCHAR*) "The PDO::SQLSRV_ATTR_DEFER_PREPARE attribute may only be set on the PDO object or in the "
+          "$driver_options array of PDO::prepare.", -119, false }
+    },
+    {
+        SQLSRV_ERROR_INVALID_READ_AHEAD,
+        { IMSSP, (SQLCHAR*) "The number of blocks read ahead must be an integer between 0 and %1!d!.", -120, true }
+    },
+    {
+        SQLSRV_ERROR_QUERY_BATCH_EMPTY,
+        { IMSSP, (SQLCHAR*) "A batch must contain at least one query.", -121, false }
+    },
+    {
+        SQLSRV_ERROR_INVALID_BATCH_QUERY,
+        { IMSSP, (SQLCHAR*) "The query at position %1!d! of the batch must be a non-empty string, or an array with a non-empty "
+          "string and an array of parameters.", -122, true }
+    },
 
     { UINT_MAX, {} }
 };
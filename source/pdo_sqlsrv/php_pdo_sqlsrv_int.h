@@ -54,6 +54,19 @@ extern HMODULE g_sqlsrv_hmodule;
 #define INI_PDO_SQLSRV_CLIENT_BUFFER_MAX_SIZE "client_buffer_max_kb_size"
 #define INI_PDO_SQLSRV_LOG   "log_severity"
 #define INI_PDO_SQLSRV_MORE_ERRORS  "report_additional_errors"
+#define INI_PDO_SQLSRV_PERSISTENT_MAX_IDLE_TIME "persistent_max_idle_time"
+#define INI_PDO_SQLSRV_SQL_CACHE_SIZE "sql_cache_size"
+#define INI_PDO_SQLSRV_SQL_CACHE_SIZE_DEFAULT "512"
+#define INI_PDO_SQLSRV_SQL_CACHE_MAX_SIZE "sql_cache_max_kb_size"
+#define INI_PDO_SQLSRV_SQL_CACHE_MAX_SIZE_DEFAULT "8192"
+#define INI_PDO_SQLSRV_DSN_CACHE_SIZE "dsn_cache_size"
+#define INI_PDO_SQLSRV_DSN_CACHE_SIZE_DEFAULT "64"
+#define INI_PDO_SQLSRV_TRACE "trace"
+#define INI_PDO_SQLSRV_TRACE_SINK "trace_sink"
+#define INI_PDO_SQLSRV_SLOW_QUERY_LOG "slow_query_log"
+#define INI_PDO_SQLSRV_SLOW_QUERY_THRESHOLD "slow_query_threshold"
+#define INI_PDO_SQLSRV_SLOW_QUERY_SAMPLE_RATE "slow_query_sample_rate"
+#define INI_PDO_SQLSRV_SLOW_QUERY_LOG_MAX_SIZE "slow_query_log_max_kb_size"
 #define INI_PREFIX           "pdo_sqlsrv."
 
 #ifndef _WIN32
@@ -66,6 +79,21 @@ PHP_INI_BEGIN()
     STD_PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_CLIENT_BUFFER_MAX_SIZE , INI_BUFFERED_QUERY_LIMIT_DEFAULT, PHP_INI_ALL, OnUpdateLong,
                        client_buffer_max_size, zend_pdo_sqlsrv_globals, pdo_sqlsrv_globals )
     STD_PHP_INI_ENTRY(INI_PREFIX INI_PDO_SQLSRV_MORE_ERRORS, "1", PHP_INI_ALL, OnUpdateLong, report_additional_errors, zend_pdo_sqlsrv_globals, pdo_sqlsrv_globals)
+    // read once by MINIT, since the persistent connection pool is shared by the requests of the process
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_PERSISTENT_MAX_IDLE_TIME, INI_PERSISTENT_MAX_IDLE_TIME_DEFAULT, PHP_INI_SYSTEM, NULL )
+    // read once by MINIT, since the parsed SQL cache is shared by the requests of the process
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_SQL_CACHE_SIZE, INI_PDO_SQLSRV_SQL_CACHE_SIZE_DEFAULT, PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_SQL_CACHE_MAX_SIZE, INI_PDO_SQLSRV_SQL_CACHE_MAX_SIZE_DEFAULT, PHP_INI_SYSTEM, NULL )
+    // read once by MINIT, since the parsed DSN cache is shared by the requests of the process
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_DSN_CACHE_SIZE, INI_PDO_SQLSRV_DSN_CACHE_SIZE_DEFAULT, PHP_INI_SYSTEM, NULL )
+    // read once by MINIT, since the spans and counters are kept for the process
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_TRACE, "0", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_TRACE_SINK, "", PHP_INI_SYSTEM, NULL )
+    // read once by MINIT, since the slow query log is written by a thread of the process
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_LOG, "", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_THRESHOLD, "1000", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_SAMPLE_RATE, "1", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_PDO_SQLSRV_SLOW_QUERY_LOG_MAX_SIZE, "10240", PHP_INI_SYSTEM, NULL )
 #ifndef _WIN32
     STD_PHP_INI_ENTRY(INI_PREFIX INI_PDO_SET_LOCALE_INFO, "2", PHP_INI_ALL, OnUpdateLong, set_locale_info,
                         zend_pdo_sqlsrv_globals, pdo_sqlsrv_globals)
@@ -90,7 +118,18 @@ enum PDO_SQLSRV_ATTR {
     SQLSRV_ATTR_FETCHES_DATETIME_TYPE,
     SQLSRV_ATTR_FORMAT_DECIMALS,
     SQLSRV_ATTR_DECIMAL_PLACES,
-    SQLSRV_ATTR_DATA_CLASSIFICATION
+    SQLSRV_ATTR_DATA_CLASSIFICATION,
+    SQLSRV_ATTR_FETCH_BLOCK_SIZE,
+    SQLSRV_ATTR_CLIENT_BUFFER_SPILL,
+    SQLSRV_ATTR_STATEMENT_CACHE_INFO,
+    SQLSRV_ATTR_STREAM_CHUNK_SIZE,
+    SQLSRV_ATTR_ASYNC_EXECUTE,
+    SQLSRV_ATTR_PERSISTENT_POOL_INFO,
+    SQLSRV_ATTR_SQL_CACHE_INFO,
+    SQLSRV_ATTR_DSN_CACHE_INFO,
+    SQLSRV_ATTR_TRACE_INFO,
+    SQLSRV_ATTR_DEFER_PREPARE,
+    SQLSRV_ATTR_READ_AHEAD
 };
 
 // valid set of values for TransactionIsolation connection option
@@ -170,6 +209,29 @@ class sql_string_parser : private string_parser
         void parse_sql_string(void);
 };
 
+// Rewrites the named placeholders of a query prepared by ODBC to positional placeholders with pdo_parse_params.
+// Returns -1 if the query could not be parsed, 0 if it is used as is and 1 if it was rewritten into sql_rewrite.
+int pdo_sqlsrv_parse_params( _Inout_ pdo_stmt_t* stmt, _In_reads_(sql_len) const char* sql, _In_ size_t sql_len,
+                             _Out_ std::string& sql_rewrite );
+
+// Parsed SQL cache
+// The placeholders of the queries prepared by the process, and the queries rewritten with positional placeholders,
+// are kept in a cache of pdo_sqlsrv.sql_cache_size queries so that preparing a query again skips parsing it.
+// The least recently used query is evicted when the cache is full, and a size of 0 disables the cache.  The cached
+// queries use at most pdo_sqlsrv.sql_cache_max_kb_size KB, and a query too large to fit on its own is not cached.
+void pdo_sqlsrv_sql_cache_set_max_entries( _In_ zend_long max_entries );
+void pdo_sqlsrv_sql_cache_set_max_memory( _In_ zend_long max_kb_size );
+void pdo_sqlsrv_get_sql_cache_info( _Out_ zval* return_value );
+
+// Parsed DSN cache
+// The options parsed from the DSNs of the connections opened by the process are kept by the SHA-1 digest of the DSN
+// in a cache of pdo_sqlsrv.dsn_cache_size DSNs, so that connecting again with the same DSN skips parsing it.  The
+// values may hold a password, so they stay in the memory of the process only and are wiped when they are evicted.
+void pdo_sqlsrv_dsn_cache_set_max_entries( _In_ zend_long max_entries );
+void pdo_sqlsrv_get_dsn_cache_info( _Out_ zval* return_value );
+
+void pdo_sqlsrv_parse_caches_free( void );
+
 
 //*********************************************************************************************************************************
 // Connection
@@ -229,8 +291,15 @@ struct stmt_option_fetch_datetime : public stmt_option_functor {
     virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /*opt*/, _In_ zval* value_z );
 };
 
+struct stmt_option_async_execute : public stmt_option_functor {
+    virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /*opt*/, _In_ zval* value_z );
+};
+
 extern struct pdo_stmt_methods pdo_sqlsrv_stmt_methods;
 
+// driver specific methods added to PDOStatement
+extern const zend_function_entry pdo_sqlsrv_stmt_driver_methods[];
+
 // a core layer pdo stmt object. This object inherits and overrides the callbacks necessary
 struct pdo_sqlsrv_stmt : public sqlsrv_stmt {
     pdo_sqlsrv_stmt( _In_ sqlsrv_conn* c, _In_ SQLHANDLE handle, _In_ error_callback e, _In_ void* drv ) :
@@ -241,7 +310,8 @@ struct pdo_sqlsrv_stmt : public sqlsrv_stmt {
         placeholders(NULL),
         bound_column_param_types( NULL ),
         fetch_numeric( false ),
-        fetch_datetime( false )
+        fetch_datetime( false ),
+        async_execute( false )
     {
         pdo_sqlsrv_dbh* db = static_cast<pdo_sqlsrv_dbh*>( c );
         direct_query = db->direct_query;
@@ -266,6 +336,7 @@ struct pdo_sqlsrv_stmt : public sqlsrv_stmt {
     pdo_param_type* bound_column_param_types;
     bool fetch_numeric;
     bool fetch_datetime;
+    bool async_execute;                         // execute asynchronously, PDOStatement::sqlsrvPoll is called until the execution completes
 };
 
 
@@ -364,7 +435,6 @@ enum PDO_ERROR_CODES {
     PDO_SQLSRV_ERROR_READ_ONLY_DBH_ATTR,
     PDO_SQLSRV_ERROR_INVALID_STMT_OPTION,
     PDO_SQLSRV_ERROR_INVALID_CURSOR_TYPE,
-    PDO_SQLSRV_ERROR_FUNCTION_NOT_IMPLEMENTED,
     PDO_SQLSRV_ERROR_PARAM_PARSE,
     PDO_SQLSRV_ERROR_LAST_INSERT_ID,
     PDO_SQLSRV_ERROR_INVALID_COLUMN_DRIVER_DATA,
@@ -390,7 +460,10 @@ enum PDO_ERROR_CODES {
     PDO_SQLSRV_ERROR_EMULATE_INOUT_UNSUPPORTED,
     PDO_SQLSRV_ERROR_CE_DIRECT_QUERY_UNSUPPORTED,
     PDO_SQLSRV_ERROR_CE_EMULATE_PREPARE_UNSUPPORTED,
-    PDO_SQLSRV_ERROR_EXTENDED_STRING_TYPE_INVALID
+    PDO_SQLSRV_ERROR_EXTENDED_STRING_TYPE_INVALID,
+    PDO_SQLSRV_ERROR_BATCH_NOT_PREPARED,
+    PDO_SQLSRV_ERROR_FETCH_ALL_MODE_UNSUPPORTED,
+    PDO_SQLSRV_ERROR_DEFER_PREPARE_AT_PREPARE_ONLY
 };
 
 extern pdo_error PDO_ERRORS[];
@@ -26,9 +26,14 @@
 #include <windows.h>
 #include <winver.h>
 #endif // _WIN32
+#include <ctime>
+#include <mutex>
 #include <sstream>
+#include <unordered_map>
 #include <vector>
 
+#include "ext/standard/sha1.h"
+
 #ifndef _WIN32
 #include <sys/utsname.h>
 #include <odbcinst.h>
@@ -60,6 +65,38 @@ const char CONNECTION_OPTION_NO_CREDENTIALS[] = "Trusted_Connection={Yes};";
 // connection option appended for MARS when MARS isn't explicitly mentioned
 const char CONNECTION_OPTION_MARS_ON[] = "MARS_Connection={Yes};";
 
+// seconds a persistent connection may stay idle in the pool unless the php.ini setting says otherwise
+const zend_long CONN_POOL_MAX_IDLE_TIME_DEFAULT = 300;
+
+// an idle connection kept by the persistent connection pool
+struct conn_pool_entry {
+    SQLHANDLE handle;
+    SQLHANDLE henv;                     // environment the handle was allocated from
+    SERVER_VERSION server_version;
+    ODBC_DRIVER driver_version;
+    time_t released;                    // when the connection went back to the pool
+};
+
+// The persistent connection pool of the process.  It outlives the requests and is shared by the threads of a
+// thread safe build, so it is allocated with the C++ allocator rather than PHP's and guarded by a mutex.
+struct conn_pool {
+    std::mutex lock;
+    std::unordered_multimap<std::string, conn_pool_entry> idle;    // idle connections by key
+    zend_long max_idle_time;            // seconds before an idle connection is disconnected (0 for no limit)
+    zend_long active;                   // persistent connections taken out of the pool or opened, and not closed yet
+    zend_long hits;
+    zend_long misses;
+    zend_long expired;                  // idle connections disconnected after the maximum idle time
+    zend_long discarded;                // connections disconnected because they failed a health check
+
+    conn_pool( void ) : max_idle_time( CONN_POOL_MAX_IDLE_TIME_DEFAULT ), active( 0 ), hits( 0 ), misses( 0 ),
+                        expired( 0 ), discarded( 0 )
+    {
+    }
+};
+
+conn_pool persistent_pool;
+
 // *** internal function prototypes ***
 
 void build_connection_string_and_set_conn_attr( _Inout_ sqlsrv_conn* conn, _Inout_z_ const char* server, _Inout_opt_z_ const char* uid, _Inout_opt_z_ const char* pwd,
@@ -76,6 +113,11 @@ std::string get_ODBC_driver_name(_In_ ODBC_DRIVER driver);
 #ifndef _WIN32
 bool core_search_odbc_driver_unix(_In_ ODBC_DRIVER driver);
 #endif
+void conn_pool_key( _In_ sqlsrv_context& henv, _In_ const std::string& conn_str, _In_opt_ HashTable* options,
+                    _Out_writes_(SQLSRV_CONN_POOL_KEY_LEN) unsigned char* key );
+bool conn_pool_checkout( _Inout_ sqlsrv_conn* conn );
+void conn_pool_opened( _Inout_ sqlsrv_conn* conn, _In_ sqlsrv_context& henv );
+bool conn_pool_checkin( _Inout_ sqlsrv_conn* conn );
 
 }
 
@@ -100,6 +142,7 @@ sqlsrv_conn* core_sqlsrv_connect( _In_ sqlsrv_context& henv_cp, _In_ sqlsrv_cont
                                   _In_ void* driver, _In_z_ const char* driver_func )
 
 {
+    sqlsrv_trace_span span( SQLSRV_TRACE_CONNECT );
     SQLRETURN r;
     std::string conn_str;
     conn_str.reserve( DEFAULT_CONN_STR_LEN );
@@ -115,6 +158,17 @@ sqlsrv_conn* core_sqlsrv_connect( _In_ sqlsrv_context& henv_cp, _In_ sqlsrv_cont
 #endif // _WIN32
 
     try {
+        // the persistent option decides whether a connection is opened at all, so it is taken out of the options
+        // rather than processed with them
+        bool persistent = false;
+        if( options_ht ) {
+            zval* persistent_z = zend_hash_index_find( options_ht, SQLSRV_CONN_OPTION_PERSISTENT );
+            if( persistent_z ) {
+                persistent = ( Z_TYPE_P( persistent_z ) == IS_STRING ) ? core_str_zval_is_true( persistent_z ) != 0 : zend_is_true( persistent_z );
+                zend_hash_index_del( options_ht, SQLSRV_CONN_OPTION_PERSISTENT );
+            }
+        }
+
         // Due to the limitations on connection pooling in unixODBC 2.3.1 driver manager, we do not consider
         // the connection string attributes to set (enable/disable) connection pooling.
         // Instead, MSPHPSQL connection pooling is set according to the ODBCINST.INI file in [ODBC] section.
@@ -155,6 +209,23 @@ sqlsrv_conn* core_sqlsrv_connect( _In_ sqlsrv_context& henv_cp, _In_ sqlsrv_cont
 
     build_connection_string_and_set_conn_attr( conn, server, uid, pwd, options_ht, valid_conn_opts, driver, conn_str );
 
+    // a persistent connection reuses an idle connection opened with the same connection string and options
+    if( persistent ) {
+        conn_pool_key( *henv, conn_str, options_ht, conn->pool_key );
+        if( conn_pool_checkout( conn )) {
+            if( conn->azure_ad_access_token ) {
+                memset( conn->azure_ad_access_token->data, 0, conn->azure_ad_access_token->dataSize );
+                conn->azure_ad_access_token.reset();
+            }
+            conn->ce_option.akv_reset();
+            conn_str.clear();
+
+            sqlsrv_conn* return_conn = conn;
+            conn.transferred();
+            return return_conn;
+        }
+    }
+
     // In non-Windows environment, unixODBC 2.3.4 and unixODBC 2.3.1 return different error states when an ODBC driver exists or not
     // Therefore, it is unreliable to check for a certain sql state error
     // In Windows, we try to connect with ODBC driver first and rely on the returned error code to try connecting with other supported ODBC drivers
@@ -254,6 +325,10 @@ sqlsrv_conn* core_sqlsrv_connect( _In_ sqlsrv_context& henv_cp, _In_ sqlsrv_cont
 #ifndef _WIN32
     }
 #endif // !_WIN32
+
+    if( persistent ) {
+        conn_pool_opened( conn, *henv );
+    }
     }
     catch( std::bad_alloc& ) {
         conn_str.clear();
@@ -331,6 +406,8 @@ SQLRETURN core_odbc_connect( _Inout_ sqlsrv_conn* conn, _Inout_ std::string& con
         throw core::CoreException();
     }
 
+    core_sqlsrv_trace_count( SQLSRV_TRACE_ROUND_TRIPS );
+
     SQLSMALLINT output_conn_size;
 #ifndef _WIN32
     // unixODBC 2.3.1 requires a non-wide SQLDriverConnect call while pooling enabled.
@@ -448,10 +525,17 @@ void core_sqlsrv_close( _Inout_opt_ sqlsrv_conn* conn )
         LOG( SEV_ERROR, "Transaction rollback failed when closing the connection." );
     }
 
-    // disconnect from the server
-    SQLRETURN r = SQLDisconnect( conn->handle() );
-    if( !SQL_SUCCEEDED( r )) {
-        LOG( SEV_ERROR, "Disconnect failed when closing the connection." );
+    // free the cached statement handles while the connection is still open
+    core_sqlsrv_stmt_cache_free( conn );
+
+    // a persistent connection goes back to the pool rather than being disconnected
+    if( !conn->persistent || !conn_pool_checkin( conn )) {
+
+        // disconnect from the server
+        SQLRETURN r = SQLDisconnect( conn->handle() );
+        if( !SQL_SUCCEEDED( r )) {
+            LOG( SEV_ERROR, "Disconnect failed when closing the connection." );
+        }
     }
 
     // free the connection handle
@@ -460,6 +544,65 @@ void core_sqlsrv_close( _Inout_opt_ sqlsrv_conn* conn )
     sqlsrv_free( conn );
 }
 
+// core_sqlsrv_conn_pool_set_max_idle_time
+// Sets how long a persistent connection may stay idle in the pool before it is disconnected.
+// Parameters:
+// seconds - the maximum idle time, 0 or less for no limit
+
+void core_sqlsrv_conn_pool_set_max_idle_time( _In_ zend_long seconds )
+{
+    std::lock_guard<std::mutex> guard( persistent_pool.lock );
+    persistent_pool.max_idle_time = ( seconds > 0 ) ? seconds : 0;
+}
+
+// core_sqlsrv_conn_pool_free
+// Disconnects the idle persistent connections allocated from an environment, which must be done before the
+// environment is freed.
+// Parameters:
+// henv - the environment being freed
+
+void core_sqlsrv_conn_pool_free( _In_ sqlsrv_context& henv )
+{
+    std::vector<SQLHANDLE> handles;
+    {
+        std::lock_guard<std::mutex> guard( persistent_pool.lock );
+        for( auto it = persistent_pool.idle.begin(); it != persistent_pool.idle.end(); ) {
+            if( it->second.henv == henv.handle() ) {
+                handles.push_back( it->second.handle );
+                it = persistent_pool.idle.erase( it );
+            }
+            else {
+                ++it;
+            }
+        }
+    }
+
+    for( SQLHANDLE handle : handles ) {
+        ::SQLDisconnect( handle );
+        ::SQLFreeHandle( SQL_HANDLE_DBC, handle );
+    }
+}
+
+// core_sqlsrv_get_conn_pool_info
+// Returns the number of idle and active persistent connections of the process and the counters of the pool.
+// Parameters:
+// info - zval for returning the array of values
+
+void core_sqlsrv_get_conn_pool_info( _Out_ zval* info )
+{
+    std::lock_guard<std::mutex> guard( persistent_pool.lock );
+
+    array_init( info );
+
+    add_assoc_long( info, "Idle", static_cast<zend_long>( persistent_pool.idle.size() ));
+    add_assoc_long( info, "Active", persistent_pool.active );
+    add_assoc_long( info, "Hits", persistent_pool.hits );
+    add_assoc_long( info, "Misses", persistent_pool.misses );
+    add_assoc_long( info, "Expired", persistent_pool.expired );
+    add_assoc_long( info, "Discarded", persistent_pool.discarded );
+    add_assoc_long( info, "MaxIdleTime", persistent_pool.max_idle_time );
+}
+
 // core_sqlsrv_prepare
 // Create a statement object and prepare the SQL query passed in for execution at a later time.
 // Parameters:
@@ -469,6 +612,13 @@ void core_sqlsrv_close( _Inout_opt_ sqlsrv_conn* conn )
 
 void core_sqlsrv_prepare( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql, _In_ SQLLEN sql_len )
 {
+    sqlsrv_trace_span span( SQLSRV_TRACE_PREPARE );
+
+    // kept for the slow query log, since the executions of a prepared statement don't have the query
+    if( stmt->slow_query && sql != NULL ) {
+        stmt->slow_query->sql.assign( sql, sql_len );
+    }
+
     try {
 
         // convert the string from its encoding to UTf-16
@@ -494,7 +644,24 @@ void core_sqlsrv_prepare( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) c
              }
         }
 
+        // reuse a handle prepared earlier on this connection with the same text and attributes
+        if( core_sqlsrv_stmt_cache_lookup( stmt, wsql_string.get(), wsql_len )) {
+            return;
+        }
+
+        // a statement executed once costs a single round trip when its first execution is sent directly, so it
+        // is prepared by its second execution.  Always Encrypted describes the parameters when the statement is
+        // prepared, so its statements are always prepared now.
+        if( stmt->defer_prepare && !stmt->conn->ce_option.enabled ) {
+            stmt->deferred_sql = wsql_string.get();
+            stmt->deferred_sql_len = wsql_len;
+            stmt->deferred_executed = false;
+            wsql_string.transferred();
+            return;
+        }
+
         // prepare our wide char query string
+        core_sqlsrv_trace_count( SQLSRV_TRACE_ROUND_TRIPS );
         core::SQLPrepareW( stmt, reinterpret_cast<SQLWCHAR*>( wsql_string.get() ), wsql_len );
 
         // if AE is enabled, get meta data for all parameters before binding them
@@ -512,10 +679,38 @@ void core_sqlsrv_prepare( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) c
     }
     catch( core::CoreException& ) {
 
+        // a statement that failed to prepare must not leave its handle in the statement cache
+        if( stmt->cache_key ) {
+            zend_string_release( stmt->cache_key );
+            stmt->cache_key = NULL;
+        }
+
         throw;
     }
 }
 
+// core_sqlsrv_prepare_deferred
+// Prepares a statement whose prepare was deferred by core_sqlsrv_prepare, before it is executed again or its
+// columns are described.  Does nothing if the statement is prepared already.
+// Parameters:
+// stmt - statement to be prepared
+
+void core_sqlsrv_prepare_deferred( _Inout_ sqlsrv_stmt* stmt )
+{
+    if( !stmt->deferred_sql ) {
+        return;
+    }
+
+    sqlsrv_trace_span span( SQLSRV_TRACE_PREPARE );
+
+    core_sqlsrv_trace_count( SQLSRV_TRACE_ROUND_TRIPS );
+    core::SQLPrepareW( stmt, stmt->deferred_sql.get(), stmt->deferred_sql_len );
+
+    stmt->deferred_sql.reset();
+    stmt->deferred_sql_len = 0;
+    ++stmt->conn->deferred_prepares;
+}
+
 // core_sqlsrv_get_server_version
 // Determines the vesrion of the SQL Server we are connected to. Calls a helper function
 // get_server_version to get the version of SQL Server.
@@ -1013,6 +1208,183 @@ bool core_search_odbc_driver_unix(_In_ ODBC_DRIVER driver)
 }
 #endif // !_WIN32
 
+// computes the key of a persistent connection.  Some options are set as connection attributes rather than put in the
+// connection string, so the options are part of the key along with the connection string and the environment.
+void conn_pool_key( _In_ sqlsrv_context& henv, _In_ const std::string& conn_str, _In_opt_ HashTable* options,
+                    _Out_writes_(SQLSRV_CONN_POOL_KEY_LEN) unsigned char* key )
+{
+    PHP_SHA1_CTX context;
+    SQLHANDLE henv_handle = henv.handle();
+
+    PHP_SHA1Init( &context );
+    PHP_SHA1Update( &context, reinterpret_cast<const unsigned char*>( &henv_handle ), sizeof( henv_handle ));
+    PHP_SHA1Update( &context, reinterpret_cast<const unsigned char*>( conn_str.c_str() ), conn_str.length() + 1 );
+
+    if( options ) {
+        zend_ulong index = 0;
+        zval* value_z = NULL;
+
+        ZEND_HASH_FOREACH_NUM_KEY_VAL( options, index, value_z ) {
+            zend_string* value = zval_get_string( value_z );
+            PHP_SHA1Update( &context, reinterpret_cast<const unsigned char*>( &index ), sizeof( index ));
+            PHP_SHA1Update( &context, reinterpret_cast<const unsigned char*>( ZSTR_VAL( value )), ZSTR_LEN( value ) + 1 );
+            zend_string_release( value );
+        } ZEND_HASH_FOREACH_END();
+    }
+
+    PHP_SHA1Final( key, &context );
+}
+
+// disconnects a connection that is no longer in the pool
+void conn_pool_disconnect( _In_ SQLHANDLE handle )
+{
+    ::SQLDisconnect( handle );
+    ::SQLFreeHandle( SQL_HANDLE_DBC, handle );
+}
+
+// takes the connection with the given key that was released last out of the pool, after removing the connections
+// idle for longer than the maximum idle time.  Returns false if the pool has no connection for the key.
+bool conn_pool_take( _In_ const std::string& key, _Out_ conn_pool_entry& entry )
+{
+    std::vector<SQLHANDLE> expired;
+    bool found = false;
+    {
+        std::lock_guard<std::mutex> guard( persistent_pool.lock );
+
+        if( persistent_pool.max_idle_time > 0 ) {
+            time_t oldest = time( NULL ) - static_cast<time_t>( persistent_pool.max_idle_time );
+            for( auto it = persistent_pool.idle.begin(); it != persistent_pool.idle.end(); ) {
+                if( it->second.released < oldest ) {
+                    expired.push_back( it->second.handle );
+                    it = persistent_pool.idle.erase( it );
+                    ++persistent_pool.expired;
+                }
+                else {
+                    ++it;
+                }
+            }
+        }
+
+        auto range = persistent_pool.idle.equal_range( key );
+        auto latest = range.second;
+        for( auto it = range.first; it != range.second; ++it ) {
+            if( latest == range.second || it->second.released > latest->second.released ) {
+                latest = it;
+            }
+        }
+
+        if( latest != range.second ) {
+            entry = latest->second;
+            persistent_pool.idle.erase( latest );
+            found = true;
+        }
+        else {
+            ++persistent_pool.misses;
+        }
+    }
+
+    // disconnecting may wait on the network, so it is done without holding the lock
+    for( SQLHANDLE handle : expired ) {
+        conn_pool_disconnect( handle );
+    }
+
+    return found;
+}
+
+// pings the server on a connection taken out of the pool and has the server reset the session left by the previous
+// user with the next request.  Returns false if the connection can't be used.
+bool conn_pool_reset( _In_ SQLHANDLE handle )
+{
+    SQLUINTEGER dead = SQL_CD_TRUE;
+    SQLRETURN r = ::SQLGetConnectAttr( handle, SQL_COPT_SS_CONNECTION_DEAD, &dead, SQL_IS_UINTEGER, NULL );
+    if( !SQL_SUCCEEDED( r ) || dead != SQL_CD_FALSE ) {
+        return false;
+    }
+
+    r = ::SQLSetConnectAttr( handle, SQL_COPT_SS_RESET_CONNECTION, reinterpret_cast<SQLPOINTER>( SQL_RESET_CONNECTION_YES ), SQL_IS_UINTEGER );
+    return SQL_SUCCEEDED( r );
+}
+
+// hands a healthy connection from the pool to a persistent connection, whose own handle was only used to build the
+// connection string.  Returns false if the pool has no connection for the key of the connection.
+bool conn_pool_checkout( _Inout_ sqlsrv_conn* conn )
+{
+    std::string key( reinterpret_cast<const char*>( conn->pool_key ), SQLSRV_CONN_POOL_KEY_LEN );
+    conn_pool_entry entry;
+
+    while( conn_pool_take( key, entry )) {
+
+        if( conn_pool_reset( entry.handle )) {
+
+            ::SQLFreeHandle( SQL_HANDLE_DBC, conn->exchange_handle( entry.handle ));
+            conn->server_version = entry.server_version;
+            conn->driver_version = entry.driver_version;
+            conn->persistent = true;
+            conn->pool_henv = entry.henv;
+
+            core_sqlsrv_trace_count( SQLSRV_TRACE_CACHE_HITS );
+
+            std::lock_guard<std::mutex> guard( persistent_pool.lock );
+            ++persistent_pool.hits;
+            ++persistent_pool.active;
+            return true;
+        }
+
+        LOG( SEV_NOTICE, "Disconnecting a persistent connection that failed its health check." );
+        conn_pool_disconnect( entry.handle );
+
+        std::lock_guard<std::mutex> guard( persistent_pool.lock );
+        ++persistent_pool.discarded;
+    }
+
+    return false;
+}
+
+// marks a connection just opened as persistent, so that it goes to the pool when it is closed
+void conn_pool_opened( _Inout_ sqlsrv_conn* conn, _In_ sqlsrv_context& henv )
+{
+    conn->persistent = true;
+    conn->pool_henv = henv.handle();
+
+    std::lock_guard<std::mutex> guard( persistent_pool.lock );
+    ++persistent_pool.active;
+}
+
+// returns a persistent connection to the pool.  The drivers expect a connection to start in auto-commit mode, and a
+// connection the ODBC driver knows to be broken is not kept.  Returns false if the connection must be disconnected.
+bool conn_pool_checkin( _Inout_ sqlsrv_conn* conn )
+{
+    SQLUINTEGER dead = SQL_CD_TRUE;
+    SQLRETURN r = ::SQLSetConnectAttr( conn->handle(), SQL_ATTR_AUTOCOMMIT, reinterpret_cast<SQLPOINTER>( SQL_AUTOCOMMIT_ON ), SQL_IS_UINTEGER );
+    if( SQL_SUCCEEDED( r )) {
+        r = ::SQLGetConnectAttr( conn->handle(), SQL_ATTR_CONNECTION_DEAD, &dead, SQL_IS_UINTEGER, NULL );
+    }
+
+    std::lock_guard<std::mutex> guard( persistent_pool.lock );
+    --persistent_pool.active;
+
+    if( SQL_SUCCEEDED( r ) && dead == SQL_CD_FALSE ) {
+        try {
+            conn_pool_entry entry;
+            entry.handle = conn->handle();
+            entry.henv = conn->pool_henv;
+            entry.server_version = conn->server_version;
+            entry.driver_version = conn->driver_version;
+            entry.released = time( NULL );
+
+            persistent_pool.idle.emplace( std::string( reinterpret_cast<const char*>( conn->pool_key ), SQLSRV_CONN_POOL_KEY_LEN ), entry );
+            conn->exchange_handle( SQL_NULL_HANDLE );
+            return true;
+        }
+        catch( std::bad_alloc& ) {
+            LOG( SEV_ERROR, "Failed to return a persistent connection to the pool." );
+        }
+    }
+
+    ++persistent_pool.discarded;
+    return false;
+}
+
 }   // namespace
 
 // simply add the parsed value to the connection string
@@ -1081,6 +1453,39 @@ void column_encryption_set_func::func( _In_ connection_option const* option, _In
     conn_str += ";";
 }
 
+void stmt_cache_set_func::func( _In_ connection_option const* option, _In_ zval* value, _Inout_ sqlsrv_conn* conn, std::string& /*conn_str*/ )
+{
+    // sqlsrv passes an integer and PDO passes the string from the DSN
+    zend_long limit = -1;
+    if( Z_TYPE_P( value ) == IS_LONG ) {
+        limit = Z_LVAL_P( value );
+    }
+    else if( Z_TYPE_P( value ) == IS_STRING && Z_STRLEN_P( value ) > 0 ) {
+        char* end = NULL;
+        errno = 0;
+        limit = ZEND_STRTOL( Z_STRVAL_P( value ), &end, 10 );
+        if( errno != 0 || *end != '\0' || !isdigit( static_cast<unsigned char>( Z_STRVAL_P( value )[0] ))) {
+            limit = -1;
+        }
+    }
+
+    CHECK_CUSTOM_ERROR( limit < 0, conn, SQLSRV_ERROR_INVALID_STMT_CACHE_OPTION, option->sqlsrv_name, NULL ) {
+        throw core::CoreException();
+    }
+
+    if( option->conn_option_key == SQLSRV_CONN_OPTION_STMT_CACHE_SIZE ) {
+        conn->stmt_cache_size = limit;
+    }
+    else {
+        conn->stmt_cache_max_kb_size = limit;
+    }
+}
+
+void defer_prepare_set_func::func( _In_ connection_option const* /*option*/, _In_ zval* value, _Inout_ sqlsrv_conn* conn, std::string& /*conn_str*/ )
+{
+    conn->defer_prepare = zend_is_true( value );
+}
+
 void ce_akv_str_set_func::func(_In_ connection_option const* option, _In_ zval* value, _Inout_ sqlsrv_conn* conn, _Inout_ std::string& conn_str)
 {
     SQLSRV_ASSERT(Z_TYPE_P(value) == IS_STRING, "Azure Key Vault keywords accept only strings.");
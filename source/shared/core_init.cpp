@@ -138,6 +138,13 @@ void core_sqlsrv_minit( _Outptr_ sqlsrv_context** henv_cp, _Inout_ sqlsrv_contex
 // henv_ncp - Non-pooled environment handle.
 void core_sqlsrv_mshutdown( _Inout_ sqlsrv_context& henv_cp, _Inout_ sqlsrv_context& henv_ncp )
 {
+    // the statements are all freed by now, so the lines left in the slow query log are final
+    core_sqlsrv_slow_query_shutdown();
+
+    // the persistent connections must be freed before the environments they were allocated from
+    core_sqlsrv_conn_pool_free( henv_ncp );
+    core_sqlsrv_conn_pool_free( henv_cp );
+
     if( henv_ncp != SQL_NULL_HANDLE ) {
 
         henv_ncp.invalidate();
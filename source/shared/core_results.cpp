@@ -18,13 +18,19 @@
 //---------------------------------------------------------------------------------------------------------------------------------
 
 #include "core_sqlsrv.h"
+#include "php_open_temporary_file.h"
 
+#include <condition_variable>
 #include <functional>
-
+#include <mutex>
 #include <sstream>
+#include <thread>
+#include <vector>
 
 #ifndef _WIN32
 #include <type_traits>
+#else
+#include <io.h>
 #endif // !_WIN32
 
 
@@ -42,6 +48,13 @@ namespace {
 
 const int INITIAL_LOB_FIELD_LEN = 2048;      // base allocation size when retrieving a LOB field
 
+const SQLULEN CHUNK_ROWS = 64;                          // rows in each chunk of a buffered result set
+const SQLULEN CHUNK_NULL_BYTES = CHUNK_ROWS / 8;        // size of the NULL bitmap of a column in a chunk
+const SQLULEN SLAB_MIN_SIZE = 16 * 1024;                // size of the first slab of variable length data
+const SQLULEN SLAB_MAX_SIZE = 1024 * 1024;              // slabs double in size until they reach this size
+const SQLULEN BLOCK_LIST_MIN_SIZE = 8;                  // initial number of entries in a list of chunks or slabs
+const unsigned int SPILL_IO_MAX = 1024 * 1024 * 1024;   // largest read or write of the temporary file in a single call
+
 // *** internal functions ***
 
 // return an integral type rounded up to a certain number
@@ -80,8 +93,67 @@ bool get_bit( _In_ void* ptr, _In_ unsigned int bit )
 SQLPOINTER read_lob_field( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_index, _In_ sqlsrv_buffered_result_set::meta_data& meta,
                            _In_ zend_long mem_used );
 
-// dtor for each row in the cache
-void cache_row_dtor( _In_ zval* data );
+// add an entry to a list of blocks or pages, growing the list by doubling it
+template <typename T>
+void append_block( _Inout_ T*& list, _Inout_ SQLULEN& count, _In_ const T& block )
+{
+    if( count == 0 || ( count >= BLOCK_LIST_MIN_SIZE && ( count & ( count - 1 )) == 0 )) {
+        SQLULEN new_size = ( count == 0 ) ? BLOCK_LIST_MIN_SIZE : count * 2;
+        list = static_cast<T*>( sqlsrv_realloc( list, new_size * sizeof( T )));
+    }
+    list[count++] = block;
+}
+
+// space after the data of a string or binary field for its terminator
+SQLULEN field_terminator( _In_ SQLSMALLINT c_type )
+{
+    switch( c_type ) {
+        case SQL_C_WCHAR:
+            return sizeof( WCHAR );
+        case SQL_C_CHAR:
+            return sizeof( char );
+        default:
+            return 0;
+    }
+}
+
+// size of a length prefixed field, including its terminator
+SQLULEN field_data_size( _In_ unsigned char* field_data, _In_ SQLSMALLINT c_type )
+{
+    return sizeof( SQLULEN ) + *reinterpret_cast<SQLULEN*>( field_data ) + field_terminator( c_type );
+}
+
+// write to and read from the temporary file of a spilled result set
+bool spill_write( _In_ int fd, _In_reads_bytes_(size) const unsigned char* buffer, _In_ SQLULEN size )
+{
+    while( size > 0 ) {
+        unsigned int to_write = ( size > SPILL_IO_MAX ) ? SPILL_IO_MAX : static_cast<unsigned int>( size );
+        auto written = write( fd, buffer, to_write );
+        if( written <= 0 ) {
+            return false;
+        }
+        buffer += written;
+        size -= written;
+    }
+    return true;
+}
+
+bool spill_read( _In_ int fd, _In_ zend_off_t offset, _Out_writes_bytes_(size) unsigned char* buffer, _In_ SQLULEN size )
+{
+    if( zend_lseek( fd, offset, SEEK_SET ) != offset ) {
+        return false;
+    }
+    while( size > 0 ) {
+        unsigned int to_read = ( size > SPILL_IO_MAX ) ? SPILL_IO_MAX : static_cast<unsigned int>( size );
+        auto bytes_read = read( fd, buffer, to_read );
+        if( bytes_read <= 0 ) {
+            return false;
+        }
+        buffer += bytes_read;
+        size -= bytes_read;
+    }
+    return true;
+}
 
 size_t get_float_precision( _In_ SQLLEN buffer_length, _In_ size_t unitsize)
 {
@@ -162,6 +234,26 @@ SQLRETURN number_to_string( _In_ Number* number_data, _Out_writes_bytes_to_opt_(
 {
     size_t precision = 0;
 
+    // integers are formatted by hand, as the streams would without a locale
+    if ( std::is_integral<Number>::value )
+    {
+        char digits[MAX_INTEGER_STRING_LEN];
+        size_t len = format_integer( static_cast<long long>( *number_data ), digits );
+
+        if ( len * sizeof( Char ) > static_cast<size_t>( buffer_length )) {
+            last_error = new ( sqlsrv_malloc(sizeof( sqlsrv_error ))) sqlsrv_error(( SQLCHAR* ) "HY090", ( SQLCHAR* ) "Buffer length too small to hold number as string", -1 );
+            return SQL_ERROR;
+        }
+
+        Char* out = reinterpret_cast<Char*>( buffer );
+        for ( size_t i = 0; i < len; ++i ) {
+            out[i] = static_cast<Char>( digits[i] );
+        }
+        *out_buffer_length = len * sizeof( Char );
+
+        return SQL_SUCCESS;
+    }
+
 #ifdef _WIN32
     std::basic_ostringstream<Char> os;
     precision = get_float_precision( buffer_length, sizeof( Char ));
@@ -189,16 +281,8 @@ SQLRETURN number_to_string( _In_ Number* number_data, _Out_writes_bytes_to_opt_(
     std::basic_string<char> str_num;
     SQLRETURN r;
 
-    if ( std::is_integral<Number>::value )
-    {
-        long num_data = *number_data;
-        r = get_string_from_stream<long>( num_data, str_num, precision, last_error );
-    }
-    else
-    {
-        precision = get_float_precision( buffer_length, sizeof( Char ));
-        r = get_string_from_stream<double>( *number_data, str_num, precision, last_error );
-    }
+    precision = get_float_precision( buffer_length, sizeof( Char ));
+    r = get_string_from_stream<double>( *number_data, str_num, precision, last_error );
 
     if ( r == SQL_ERROR ) return SQL_ERROR;
 
@@ -262,18 +346,6 @@ std::string getUTF8StringFromString( _In_z_ const char* source )
 
 #endif // !_WIN32
 
-// "closure" for the hash table destructor
-struct row_dtor_closure {
-
-    sqlsrv_buffered_result_set* results;
-    BYTE* row_data;
-
-    row_dtor_closure( _In_ sqlsrv_buffered_result_set* st, _In_ BYTE* row ) :
-        results( st ), row_data( row )
-    {
-    }
-};
-
 sqlsrv_error* odbc_get_diag_rec( _In_ sqlsrv_stmt* odbc, _In_ SQLSMALLINT record_number )
 {
     SQLWCHAR wsql_state[SQL_SQLSTATE_BUFSIZE] = {L'\0'};
@@ -373,14 +445,38 @@ SQLLEN sqlsrv_odbc_result_set::row_count( void )
 // This class holds a result set in memory
 
 sqlsrv_buffered_result_set::sqlsrv_buffered_result_set( _Inout_ sqlsrv_stmt* stmt ) :
+    sqlsrv_buffered_result_set( stmt, true )
+{
+}
+
+sqlsrv_buffered_result_set::sqlsrv_buffered_result_set( _Inout_ sqlsrv_stmt* stmt, _In_ bool buffer_rows ) :
     sqlsrv_result_set( stmt ),
-    cache(NULL),
+    chunks(NULL),
+    chunk_count(0),
+    chunk_size(0),
+    blocks(NULL),
+    block_count(0),
+    slab_next(NULL),
+    slab_end(NULL),
+    slab_size(0),
+    num_rows(0),
+    spill(stmt->buffered_query_spill),
+    spill_fd(-1),
+    spill_path(NULL),
+    spill_size(0),
+    spill_start(0),
+    pages(NULL),
+    block_mark(0),
+    next_resident(0),
     col_count(0),
+    row_size(0),
     current(0),
     last_field_index(-1),
     read_so_far(0),
     temp_length(0)
 {
+    memset( resident, 0, sizeof( resident ));
+
     col_count = core::SQLNumResultCols( stmt );
     // there is no result set to buffer
     if( col_count == 0 ) {
@@ -562,31 +658,47 @@ sqlsrv_buffered_result_set::sqlsrv_buffered_result_set( _Inout_ sqlsrv_stmt* stm
                 break;
         }
 
+        // numbers are kept in the column vector, everything else is a pointer to its data
+        if( meta[i].c_type == SQL_C_LONG || meta[i].c_type == SQL_C_DOUBLE ) {
+            meta[i].width = meta[i].length;
+        }
+        else {
+            meta[i].width = sizeof( SQLPOINTER );
+        }
+        meta[i].column_offset = chunk_size;
+        chunk_size += align_to<sizeof(SQLPOINTER)>( CHUNK_NULL_BYTES + CHUNK_ROWS * meta[i].width );
+    }
+
+    // offset from the above loop has the size of the row buffer necessary
+    row_size = offset;
+    if( !buffer_rows ) {
+        return;
     }
 
-    // read the data into the cache
-    // (offset from the above loop has the size of the row buffer necessary)
+    // read the data into the column vectors
     zend_long mem_used = 0;
-    size_t row_count = 0;
-    // 10 is an arbitrary number for now for the initial size of the cache
-    ALLOC_HASHTABLE( cache );
-    core::sqlsrv_zend_hash_init( *stmt, cache, 10 /* # of buckets */, cache_row_dtor /*dtor*/, 0 /*persistent*/ );
 
     try {
         while( core::SQLFetchScroll( stmt, SQL_FETCH_NEXT, 0 ) != SQL_NO_DATA ) {
 
-            // allocate the row buffer
-            sqlsrv_malloc_auto_ptr<unsigned char> rowAuto;
-            rowAuto = static_cast<unsigned char*>( sqlsrv_malloc( offset ));
-            unsigned char* row = rowAuto.get();
-            memset( row, 0, offset );
+            SQLSRV_ASSERT( num_rows < INT_MAX, "Hard maximum of 2 billion rows exceeded in a buffered query" );
+
+            // start a new chunk every CHUNK_ROWS rows
+            SQLULEN chunk_row = static_cast<SQLULEN>( num_rows ) % CHUNK_ROWS;
+            if( chunk_row == 0 ) {
+                unsigned char* new_chunk = static_cast<unsigned char*>( sqlsrv_malloc( chunk_size ));
+                memset( new_chunk, 0, chunk_size );
+                append_block( chunks, chunk_count, new_chunk );
+            }
+            unsigned char* chunk = chunks[chunk_count - 1];
 
-            // read the fields into the row buffer
+            // read the fields into the column vectors
             for( SQLSMALLINT i = 0; i < col_count; ++i ) {
 
-                SQLLEN out_buffer_temp = SQL_NULL_DATA;
-                SQLPOINTER buffer;
-                SQLLEN* out_buffer_length = &out_buffer_temp;
+                unsigned char* column = chunk + meta[i].column_offset;
+                unsigned char* field = column + CHUNK_NULL_BYTES + chunk_row * meta[i].width;
+                SQLLEN field_len = SQL_NULL_DATA;
+                mem_used += meta[i].width;
 
                 switch( meta[i].c_type ) {
 
@@ -595,48 +707,41 @@ sqlsrv_buffered_result_set::sqlsrv_buffered_result_set( _Inout_ sqlsrv_stmt* stm
                     case SQL_C_BINARY:
                         if( meta[i].length == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
 
-                            out_buffer_length = &out_buffer_temp;
-                            SQLPOINTER* lob_addr = reinterpret_cast<SQLPOINTER*>( &row[meta[i].offset] );
-                            *lob_addr = read_lob_field( stmt, i, meta[i], mem_used );
-                            // a NULL pointer means NULL field
-                            if( *lob_addr == NULL ) {
-                                *out_buffer_length = SQL_NULL_DATA;
-                            }
-                            else {
-                                *out_buffer_length = **reinterpret_cast<SQLLEN**>( lob_addr );
-                                mem_used += *out_buffer_length;
+                            // the LOB buffer is kept with the slabs, a NULL pointer means NULL field.  When spilling
+                            // is enabled, only each LOB on its own must fit within the limit.
+                            unsigned char* lob = static_cast<unsigned char*>( read_lob_field( stmt, i, meta[i], spill ? 0 : mem_used ));
+                            if( lob != NULL ) {
+                                append_block( blocks, block_count, lob );
+                                *reinterpret_cast<unsigned char**>( field ) = lob;
+                                field_len = *reinterpret_cast<SQLLEN*>( lob );
+                                mem_used += field_len;
                             }
                         }
                         else {
 
-    						mem_used += meta[i].length;
-                            CHECK_CUSTOM_ERROR( mem_used > stmt->buffered_query_limit * 1024, stmt,
-                                                SQLSRV_ERROR_BUFFER_LIMIT_EXCEEDED, stmt->buffered_query_limit, NULL) {
-
-                                throw core::CoreException();
+                            // read the field straight into the slab and keep only the space it used
+                            unsigned char* data = reserve_slab( meta[i].length );
+                            core::SQLGetData( stmt, i + 1, meta[i].c_type, data + sizeof( SQLULEN ), meta[i].length - sizeof( SQLULEN ),
+                                              &field_len, false );
+                            if( field_len != SQL_NULL_DATA ) {
+
+                                SQLLEN capacity = meta[i].length - sizeof( SQLULEN ) - field_terminator( meta[i].c_type );
+                                if( field_len == SQL_NO_TOTAL || field_len > capacity ) {
+                                    field_len = capacity;
+                                }
+                                *reinterpret_cast<SQLLEN*>( data ) = field_len;
+                                *reinterpret_cast<unsigned char**>( field ) = data;
+
+                                SQLULEN used = align_to<sizeof(SQLULEN)>( field_data_size( data, meta[i].c_type ));
+                                slab_next += used;
+                                mem_used += used;
                             }
-
-                            buffer = row + meta[i].offset + sizeof( SQLULEN );
-                            out_buffer_length = reinterpret_cast<SQLLEN*>( row + meta[i].offset );
-                            core::SQLGetData( stmt, i + 1, meta[i].c_type, buffer, meta[i].length, out_buffer_length,
-                                              false );
                         }
                         break;
 
                     case SQL_C_LONG:
                     case SQL_C_DOUBLE:
-                        {
-                            mem_used += meta[i].length;
-                            CHECK_CUSTOM_ERROR( mem_used > stmt->buffered_query_limit * 1024, stmt,
-                                                SQLSRV_ERROR_BUFFER_LIMIT_EXCEEDED, stmt->buffered_query_limit, NULL) {
-
-                                throw core::CoreException();
-                            }
-                            buffer = row + meta[i].offset;
-                            out_buffer_length = &out_buffer_temp;
-                            core::SQLGetData( stmt, i + 1, meta[i].c_type, buffer, meta[i].length, out_buffer_length,
-                                              false );
-                        }
+                        core::SQLGetData( stmt, i + 1, meta[i].c_type, field, meta[i].length, &field_len, false );
                         break;
 
                     default:
@@ -644,40 +749,245 @@ sqlsrv_buffered_result_set::sqlsrv_buffered_result_set( _Inout_ sqlsrv_stmt* stm
                         break;
                 }
 
-                if( *out_buffer_length == SQL_NULL_DATA ) {
-                    set_bit( row, i );
+                if( !spill ) {
+                    CHECK_CUSTOM_ERROR( mem_used > stmt->buffered_query_limit * 1024, stmt,
+                                        SQLSRV_ERROR_BUFFER_LIMIT_EXCEEDED, stmt->buffered_query_limit, NULL) {
+
+                        throw core::CoreException();
+                    }
+                }
+                else if( spill_fd < 0 && mem_used > stmt->buffered_query_limit * 1024 ) {
+                    begin_spill();
+                }
+
+                if( field_len == SQL_NULL_DATA ) {
+                    set_bit( column, static_cast<unsigned int>( chunk_row ));
                 }
             }
 
-            row_count++;
-            SQLSRV_ASSERT( row_count < INT_MAX, "Hard maximum of 2 billion rows exceeded in a buffered query" );
+            ++num_rows;
+
+            // once spilling has begun, each chunk goes to the temporary file as soon as it's filled
+            if( spill_fd >= 0 && static_cast<SQLULEN>( num_rows ) % CHUNK_ROWS == 0 ) {
+                spill_chunk( chunk_count - 1 );
+            }
+        }
 
-            // add it to the cache
-            row_dtor_closure cl( this, row );
-            sqlsrv_zend_hash_next_index_insert_mem( *stmt, cache, &cl, sizeof(row_dtor_closure) );
-            rowAuto.transferred();
+        if( spill_fd >= 0 && static_cast<SQLULEN>( num_rows ) % CHUNK_ROWS != 0 ) {
+            spill_chunk( chunk_count - 1 );
         }
     }
     catch( core::CoreException& ) {
-        // free the rows
-        if( cache ) {
-            zend_hash_destroy( cache );
-            FREE_HASHTABLE( cache );
-            cache = NULL;
-        }
+        free_rows();
         throw;
     }
-
 }
 
 sqlsrv_buffered_result_set::~sqlsrv_buffered_result_set( void )
 {
-    // free the rows
-    if( cache ) {
-        zend_hash_destroy( cache );
-        FREE_HASHTABLE( cache );
-        cache = NULL;
+    free_rows();
+}
+
+void sqlsrv_buffered_result_set::free_rows( void )
+{
+    // spilled chunks are only in memory while they're resident
+    for( SQLULEN i = 0; i < chunk_count; ++i ) {
+        if( chunks[i] ) {
+            sqlsrv_free( chunks[i] );
+        }
+    }
+    for( SQLULEN i = 0; i < block_count; ++i ) {
+        sqlsrv_free( blocks[i] );
+    }
+    if( chunks ) {
+        sqlsrv_free( chunks );
+    }
+    if( blocks ) {
+        sqlsrv_free( blocks );
+    }
+    if( pages ) {
+        sqlsrv_free( pages );
+    }
+
+    if( spill_fd >= 0 ) {
+        close( spill_fd );
+#ifdef _WIN32
+        // an open file can't be removed on Windows, so it's removed once it's closed
+        VCWD_UNLINK( ZSTR_VAL( spill_path ));
+#endif // _WIN32
+    }
+    if( spill_path ) {
+        zend_string_release( spill_path );
+    }
+
+    chunks = NULL;
+    chunk_count = 0;
+    blocks = NULL;
+    block_count = 0;
+    slab_next = slab_end = NULL;
+    slab_size = 0;
+    num_rows = 0;
+    spill_fd = -1;
+    spill_path = NULL;
+    spill_size = 0;
+    pages = NULL;
+    memset( resident, 0, sizeof( resident ));
+    next_resident = 0;
+}
+
+void sqlsrv_buffered_result_set::begin_spill( void )
+{
+    spill_fd = php_open_temporary_fd( NULL, "sqlsrv", &spill_path );
+    CHECK_CUSTOM_ERROR( spill_fd < 0, odbc, SQLSRV_ERROR_BUFFER_SPILL_FAILED ) {
+        throw core::CoreException();
+    }
+#ifndef _WIN32
+    // the file is removed as soon as it's closed, even if the process ends abruptly
+    unlink( ZSTR_VAL( spill_path ));
+#endif // !_WIN32
+
+    // the data of the current chunk from here on goes into new slabs, freed once the chunk is spilled
+    spill_start = chunk_count - 1;
+    block_mark = block_count;
+    slab_next = slab_end = NULL;
+}
+
+void sqlsrv_buffered_result_set::spill_chunk( _In_ SQLULEN chunk_index )
+{
+    unsigned char* chunk = chunks[chunk_index];
+    SQLULEN rows = static_cast<SQLULEN>( num_rows ) - chunk_index * CHUNK_ROWS;
+    if( rows > CHUNK_ROWS ) {
+        rows = CHUNK_ROWS;
+    }
+
+    // the page holds the chunk followed by the data of its variable length fields
+    SQLULEN page_size = chunk_size;
+    for( SQLSMALLINT i = 0; i < col_count; ++i ) {
+
+        if( meta[i].c_type == SQL_C_LONG || meta[i].c_type == SQL_C_DOUBLE ) {
+            continue;
+        }
+        unsigned char* column = chunk + meta[i].column_offset;
+        unsigned char** fields = reinterpret_cast<unsigned char**>( column + CHUNK_NULL_BYTES );
+        for( SQLULEN r = 0; r < rows; ++r ) {
+            if( !get_bit( column, static_cast<unsigned int>( r ))) {
+                page_size += align_to<sizeof(SQLULEN)>( field_data_size( fields[r], meta[i].c_type ));
+            }
+        }
+    }
+
+    sqlsrv_malloc_auto_ptr<unsigned char> page;
+    page = static_cast<unsigned char*>( sqlsrv_malloc( page_size ));
+    memcpy_s( page.get(), page_size, chunk, chunk_size );
+
+    // the fields point to their data by its offset within the page
+    SQLULEN page_used = chunk_size;
+    for( SQLSMALLINT i = 0; i < col_count; ++i ) {
+
+        if( meta[i].c_type == SQL_C_LONG || meta[i].c_type == SQL_C_DOUBLE ) {
+            continue;
+        }
+        unsigned char* column = page.get() + meta[i].column_offset;
+        unsigned char** fields = reinterpret_cast<unsigned char**>( column + CHUNK_NULL_BYTES );
+        for( SQLULEN r = 0; r < rows; ++r ) {
+            if( !get_bit( column, static_cast<unsigned int>( r ))) {
+                SQLULEN size = field_data_size( fields[r], meta[i].c_type );
+                memcpy_s( page.get() + page_used, page_size - page_used, fields[r], size );
+                *reinterpret_cast<SQLULEN*>( &fields[r] ) = page_used;
+                page_used += align_to<sizeof(SQLULEN)>( size );
+            }
+        }
+    }
+
+    CHECK_CUSTOM_ERROR( !spill_write( spill_fd, page.get(), page_size ), odbc, SQLSRV_ERROR_BUFFER_SPILL_FAILED ) {
+        throw core::CoreException();
+    }
+
+    spill_page location = { spill_size, page_size };
+    SQLULEN page_count = chunk_index - spill_start;
+    append_block( pages, page_count, location );
+    spill_size += page_size;
+
+    // free the chunk and the slabs and LOB buffers that held its data
+    sqlsrv_free( chunk );
+    chunks[chunk_index] = NULL;
+    for( SQLULEN i = block_mark; i < block_count; ++i ) {
+        sqlsrv_free( blocks[i] );
+    }
+    block_count = block_mark;
+    slab_next = slab_end = NULL;
+}
+
+bool sqlsrv_buffered_result_set::page_in( void )
+{
+    if( chunks == NULL ) {
+        return true;
+    }
+
+    SQLULEN chunk_index = static_cast<SQLULEN>( current - 1 ) / CHUNK_ROWS;
+    if( chunks[chunk_index] != NULL ) {
+        return true;
+    }
+
+    // replace the spilled chunk that was read back the longest time ago
+    if( resident[next_resident] != 0 ) {
+        sqlsrv_free( chunks[resident[next_resident] - 1] );
+        chunks[resident[next_resident] - 1] = NULL;
+        resident[next_resident] = 0;
+    }
+
+    spill_page& location = pages[chunk_index - spill_start];
+    sqlsrv_malloc_auto_ptr<unsigned char> page;
+    page = static_cast<unsigned char*>( sqlsrv_malloc( location.size ));
+    if( !spill_read( spill_fd, location.offset, page.get(), location.size )) {
+        return false;
     }
+
+    // turn the offsets of the variable length data back into pointers
+    SQLULEN rows = static_cast<SQLULEN>( num_rows ) - chunk_index * CHUNK_ROWS;
+    if( rows > CHUNK_ROWS ) {
+        rows = CHUNK_ROWS;
+    }
+    for( SQLSMALLINT i = 0; i < col_count; ++i ) {
+
+        if( meta[i].c_type == SQL_C_LONG || meta[i].c_type == SQL_C_DOUBLE ) {
+            continue;
+        }
+        unsigned char* column = page.get() + meta[i].column_offset;
+        unsigned char** fields = reinterpret_cast<unsigned char**>( column + CHUNK_NULL_BYTES );
+        for( SQLULEN r = 0; r < rows; ++r ) {
+            if( !get_bit( column, static_cast<unsigned int>( r ))) {
+                fields[r] = page.get() + *reinterpret_cast<SQLULEN*>( &fields[r] );
+            }
+        }
+    }
+
+    chunks[chunk_index] = page.get();
+    page.transferred();
+    resident[next_resident] = chunk_index + 1;
+    next_resident = ( next_resident + 1 ) % SPILL_RESIDENT_CHUNKS;
+
+    return true;
+}
+
+unsigned char* sqlsrv_buffered_result_set::reserve_slab( _In_ SQLULEN size )
+{
+    size = align_to<sizeof(SQLULEN)>( size );
+    if( static_cast<SQLULEN>( slab_end - slab_next ) < size ) {
+
+        // each slab is twice the size of the previous one, up to a maximum, and always holds the field
+        slab_size = ( slab_size == 0 ) ? SLAB_MIN_SIZE : (( slab_size < SLAB_MAX_SIZE ) ? slab_size * 2 : SLAB_MAX_SIZE );
+        if( slab_size < size ) {
+            slab_size = size;
+        }
+
+        unsigned char* slab = static_cast<unsigned char*>( sqlsrv_malloc( slab_size ));
+        append_block( blocks, block_count, slab );
+        slab_next = slab;
+        slab_end = slab + slab_size;
+    }
+
+    return slab_next;
 }
 
 SQLRETURN sqlsrv_buffered_result_set::fetch( _Inout_ SQLSMALLINT orientation, _Inout_opt_ SQLLEN offset )
@@ -746,10 +1056,14 @@ SQLRETURN sqlsrv_buffered_result_set::get_data( _In_ SQLUSMALLINT field_index, _
         read_so_far = 0;
     }
 
-    unsigned char* row = get_row();
+    if( !page_in() ) {
+        last_error = new ( sqlsrv_malloc( sizeof( sqlsrv_error )))
+            sqlsrv_error( (SQLCHAR*) "IMSSP", (SQLCHAR*) "Failed to read the rows of a buffered query from a temporary file", -1 );
+        return SQL_ERROR;
+    }
 
     // if the field is null, then return SQL_NULL_DATA
-    if( get_bit( row, field_index )) {
+    if( is_null( field_index )) {
         *out_buffer_length = SQL_NULL_DATA;
         return SQL_SUCCESS;
     }
@@ -841,12 +1155,27 @@ SQLRETURN sqlsrv_buffered_result_set::get_diag_field( _In_ SQLSMALLINT record_nu
     return SQL_SUCCESS;
 }
 
-unsigned char* sqlsrv_buffered_result_set::get_row( void )
+unsigned char* sqlsrv_buffered_result_set::current_chunk( void )
+{
+    SQLSRV_ASSERT( current > 0 && current <= num_rows, "Failed to find row %1!d! in the cache", current );
+    return chunks[static_cast<SQLULEN>( current - 1 ) / CHUNK_ROWS];
+}
+
+unsigned char* sqlsrv_buffered_result_set::get_field( _In_ SQLSMALLINT field_index )
 {
-    row_dtor_closure* cl_ptr;
-	cl_ptr = reinterpret_cast<row_dtor_closure*>(zend_hash_index_find_ptr(cache, static_cast<zend_ulong>(current - 1)));
-	SQLSRV_ASSERT(cl_ptr != NULL, "Failed to find row %1!d! in the cache", current);
-    return cl_ptr->row_data;
+    SQLULEN chunk_row = static_cast<SQLULEN>( current - 1 ) % CHUNK_ROWS;
+    unsigned char* field = current_chunk() + meta[field_index].column_offset + CHUNK_NULL_BYTES + chunk_row * meta[field_index].width;
+
+    if( meta[field_index].c_type == SQL_C_LONG || meta[field_index].c_type == SQL_C_DOUBLE ) {
+        return field;
+    }
+    return *reinterpret_cast<unsigned char**>( field );
+}
+
+bool sqlsrv_buffered_result_set::is_null( _In_ SQLSMALLINT field_index )
+{
+    SQLULEN chunk_row = static_cast<SQLULEN>( current - 1 ) % CHUNK_ROWS;
+    return get_bit( current_chunk() + meta[field_index].column_offset, static_cast<unsigned int>( chunk_row ));
 }
 
 sqlsrv_error* sqlsrv_buffered_result_set::get_diag_rec( _In_ SQLSMALLINT record_number )
@@ -867,8 +1196,8 @@ SQLLEN sqlsrv_buffered_result_set::row_count( void )
 {
     last_error = NULL;
 
-	if ( cache ) {
-		return zend_hash_num_elements( cache );
+	if ( col_count > 0 ) {
+		return num_rows;
 	}
 	else {
 		// returning -1 to represent getting the rowcount of an empty result set
@@ -876,6 +1205,423 @@ SQLLEN sqlsrv_buffered_result_set::row_count( void )
 	}
 }
 
+
+// Block result set
+// This class binds the columns of a forward only result set and fetches its rows a block at a time
+
+// The ring of blocks shared by a block result set and its read-ahead thread.  The thread fills the blocks in
+// order, and the result set takes them in the same order.  The thread never fills the block being read, and it
+// stops after the first fetch that doesn't return SQL_SUCCESS so that the diagnostics of that fetch are still on
+// the handle when the result set reports them.  No PHP function is called by the thread.
+struct sqlsrv_block_result_set::read_ahead_ring {
+
+    SQLHSTMT handle;
+    SQLULEN slots;                      // number of blocks in the ring
+    SQLULEN slot_bytes;                 // size of each block
+    SQLULEN bind_offset;                // offset of the block being filled, read by ODBC (SQL_ATTR_ROW_BIND_OFFSET_PTR)
+    SQLULEN fetched;                    // rows in the block being filled, set by ODBC (SQL_ATTR_ROWS_FETCHED_PTR)
+    std::vector<SQLULEN> rows;          // rows in each block of the ring
+    std::vector<SQLRETURN> returns;     // return of the fetch of each block of the ring
+    SQLULEN filled;                     // blocks fetched by the thread so far
+    SQLULEN taken;                      // blocks taken by the result set so far
+    bool stopping;                      // set by the result set to stop the thread
+    bool finished;                      // the thread stopped after a fetch that didn't return SQL_SUCCESS
+    bool discarded;                     // the ring was dropped and the blocks are fetched without the thread
+    std::mutex lock;
+    std::condition_variable wake;
+    std::thread reader;
+
+    read_ahead_ring( _In_ SQLHSTMT h, _In_ SQLULEN count, _In_ SQLULEN bytes ) :
+        handle( h ), slots( count ), slot_bytes( bytes ), bind_offset( 0 ), fetched( 0 ), rows( count, 0 ),
+        returns( count, SQL_NO_DATA ), filled( 0 ), taken( 0 ), stopping( false ), finished( false ), discarded( false )
+    {
+    }
+
+    void run( void )
+    {
+        std::unique_lock<std::mutex> guard( lock );
+
+        while( true ) {
+
+            // the block before the next one taken is still being read, so one block of the ring is always left alone
+            wake.wait( guard, [this] { return stopping || filled - taken < slots - 1; } );
+            if( stopping ) {
+                return;
+            }
+
+            SQLULEN slot = filled % slots;
+            bind_offset = slot * slot_bytes;
+            guard.unlock();
+
+            SQLRETURN r = ::SQLFetchScroll( handle, SQL_FETCH_NEXT, 0 );
+
+            guard.lock();
+            rows[slot] = SQL_SUCCEEDED( r ) ? fetched : 0;
+            returns[slot] = r;
+            ++filled;
+            if( r != SQL_SUCCESS ) {
+                finished = true;
+            }
+            wake.notify_all();
+
+            if( finished ) {
+                return;
+            }
+        }
+    }
+};
+
+sqlsrv_block_result_set::sqlsrv_block_result_set( _Inout_ sqlsrv_stmt* stmt, _In_ SQLULEN size, _In_ SQLULEN read_ahead ) :
+    sqlsrv_buffered_result_set( stmt, false /*buffer_rows*/ ),
+    row_stride( 0 ),
+    ind_offset( 0 ),
+    block_size( size ),
+    rows_fetched( 0 ),
+    block_row( 0 ),
+    block_offset( 0 ),
+    ahead( NULL )
+{
+    SQLSRV_ASSERT( col_count > 0, "sqlsrv_block_result_set: no columns to bind" );
+
+    // the variable length fields use their length prefix as the indicator, the indicators of the
+    // fixed size fields are kept in an array after the fields
+    ind_offset = align_to<sizeof(SQLLEN)>( row_size );
+    row_stride = align_to<sizeof(SQLLEN)>( ind_offset + col_count * sizeof( SQLLEN ));
+
+    // keep the block within the memory a buffered query is allowed to use
+    zend_long limit = ( stmt->buffered_query_limit > sqlsrv_buffered_result_set::BUFFERED_QUERY_LIMIT_INVALID ) ?
+        stmt->buffered_query_limit : sqlsrv_buffered_result_set::BUFFERED_QUERY_LIMIT_DEFAULT;
+    SQLULEN max_rows = static_cast<SQLULEN>( limit ) * 1024 / row_stride;
+    if( block_size > max_rows ) {
+        block_size = ( max_rows > 0 ) ? max_rows : 1;
+    }
+
+    // the ring holds the block being read and the blocks read ahead of it, and it is kept within the same limit
+    // by reading fewer blocks ahead.  Read-ahead is off if there isn't room for two blocks.
+    SQLULEN block_bytes = block_size * row_stride;
+    SQLULEN slots = 1;
+    if( read_ahead > 0 ) {
+        SQLULEN max_slots = static_cast<SQLULEN>( limit ) * 1024 / block_bytes;
+        slots = ( read_ahead + 1 < max_slots ) ? read_ahead + 1 : max_slots;
+        if( slots < 2 ) {
+            slots = 1;
+        }
+    }
+
+    block = static_cast<unsigned char*>( sqlsrv_malloc( slots, block_bytes, 0 ));
+    memset( block.get(), 0, slots * block_bytes );
+
+    try {
+        core::SQLSetStmtAttr( stmt, SQL_ATTR_ROW_BIND_TYPE, reinterpret_cast<SQLPOINTER>( row_stride ), SQL_IS_UINTEGER );
+        core::SQLSetStmtAttr( stmt, SQL_ATTR_ROW_ARRAY_SIZE, reinterpret_cast<SQLPOINTER>( block_size ), SQL_IS_UINTEGER );
+
+        if( slots > 1 ) {
+            ahead = new ( sqlsrv_malloc( sizeof( read_ahead_ring ))) read_ahead_ring( stmt->handle(), slots, block_bytes );
+            core::SQLSetStmtAttr( stmt, SQL_ATTR_ROW_BIND_OFFSET_PTR, &ahead->bind_offset, SQL_IS_POINTER );
+            core::SQLSetStmtAttr( stmt, SQL_ATTR_ROWS_FETCHED_PTR, &ahead->fetched, SQL_IS_POINTER );
+        }
+        else {
+            core::SQLSetStmtAttr( stmt, SQL_ATTR_ROWS_FETCHED_PTR, &rows_fetched, SQL_IS_POINTER );
+        }
+
+        // bind the fields of the first row, the rows that follow are found using the row stride
+        unsigned char* row = block.get();
+        SQLLEN* fixed_ind = reinterpret_cast<SQLLEN*>( row + ind_offset );
+
+        for( SQLSMALLINT i = 0; i < col_count; ++i ) {
+
+            switch( meta[i].c_type ) {
+
+                case SQL_C_CHAR:
+                case SQL_C_WCHAR:
+                case SQL_C_BINARY:
+                    core::SQLBindCol( stmt, i + 1, meta[i].c_type, row + meta[i].offset + sizeof( SQLULEN ),
+                                      meta[i].length - sizeof( SQLULEN ), reinterpret_cast<SQLLEN*>( row + meta[i].offset ));
+                    break;
+
+                case SQL_C_LONG:
+                case SQL_C_DOUBLE:
+                    core::SQLBindCol( stmt, i + 1, meta[i].c_type, row + meta[i].offset, meta[i].length, &fixed_ind[i] );
+                    break;
+
+                default:
+                    SQLSRV_ASSERT( false, "Unknown C type" );
+                    break;
+            }
+        }
+    }
+    catch( core::CoreException& ) {
+        unbind();
+        throw;
+    }
+}
+
+sqlsrv_block_result_set::~sqlsrv_block_result_set( void )
+{
+    unbind();
+}
+
+void sqlsrv_block_result_set::unbind( void )
+{
+    // the thread must be done with the handle and the ring before either is released
+    if( ahead != NULL ) {
+        stop_read_ahead( true );
+    }
+
+    // the statement handle is reused by the next result set, so the errors are ignored
+    if( odbc->handle() != SQL_NULL_HANDLE ) {
+        ::SQLFreeStmt( odbc->handle(), SQL_UNBIND );
+        ::SQLSetStmtAttr( odbc->handle(), SQL_ATTR_ROWS_FETCHED_PTR, NULL, SQL_IS_POINTER );
+        ::SQLSetStmtAttr( odbc->handle(), SQL_ATTR_ROW_BIND_OFFSET_PTR, NULL, SQL_IS_POINTER );
+        ::SQLSetStmtAttr( odbc->handle(), SQL_ATTR_ROW_ARRAY_SIZE, reinterpret_cast<SQLPOINTER>( static_cast<SQLULEN>( 1 )), SQL_IS_UINTEGER );
+        ::SQLSetStmtAttr( odbc->handle(), SQL_ATTR_ROW_BIND_TYPE, reinterpret_cast<SQLPOINTER>( SQL_BIND_BY_COLUMN ), SQL_IS_UINTEGER );
+    }
+
+    if( ahead != NULL ) {
+        ahead->~read_ahead_ring();
+        sqlsrv_free( ahead );
+        ahead = NULL;
+    }
+}
+
+void sqlsrv_block_result_set::stop_read_ahead( _In_ bool discard )
+{
+    if( ahead == NULL || ahead->discarded ) {
+        return;
+    }
+
+    {
+        std::lock_guard<std::mutex> guard( ahead->lock );
+        ahead->stopping = true;
+    }
+    ahead->wake.notify_all();
+
+    if( ahead->reader.joinable() ) {
+        ahead->reader.join();
+    }
+    ahead->stopping = false;
+
+    if( discard ) {
+        ahead->discarded = true;
+        ahead->bind_offset = 0;
+        rows_fetched = 0;
+        block_row = 0;
+        block_offset = 0;
+    }
+}
+
+bool sqlsrv_block_result_set::can_bind( _Inout_ sqlsrv_stmt* stmt )
+{
+    // use the ODBC functions directly since this only decides which result set to create.  The
+    // statement may still need data for stream parameters, in which case the columns aren't known yet.
+    SQLSMALLINT cols = 0;
+    SQLRETURN r = ::SQLNumResultCols( stmt->handle(), &cols );
+    if( !SQL_SUCCEEDED( r ) || cols == 0 ) {
+        return false;
+    }
+
+    for( SQLSMALLINT i = 1; i <= cols; ++i ) {
+
+        SQLSMALLINT type = 0;
+        SQLULEN size = 0;
+        r = ::SQLDescribeColW( stmt->handle(), i, NULL, 0, NULL, &type, &size, NULL, NULL );
+        if( !SQL_SUCCEEDED( r )) {
+            return false;
+        }
+
+        switch( type ) {
+
+            // these types have a size known from the metadata unless they are (max) types
+            case SQL_CHAR:
+            case SQL_VARCHAR:
+            case SQL_SS_VARIANT:
+            case SQL_BINARY:
+            case SQL_SS_UDT:
+            case SQL_VARBINARY:
+            case SQL_WCHAR:
+            case SQL_WVARCHAR:
+                if( size == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
+                    return false;
+                }
+                break;
+
+            case SQL_BIGINT:
+            case SQL_DECIMAL:
+            case SQL_GUID:
+            case SQL_NUMERIC:
+            case SQL_DATETIME:
+            case SQL_TYPE_DATE:
+            case SQL_SS_TIME2:
+            case SQL_SS_TIMESTAMPOFFSET:
+            case SQL_TYPE_TIMESTAMP:
+            case SQL_BIT:
+            case SQL_INTEGER:
+            case SQL_SMALLINT:
+            case SQL_TINYINT:
+            case SQL_REAL:
+            case SQL_FLOAT:
+                break;
+
+            // LOBs are read in pieces with SQLGetData, which isn't available with a block cursor
+            default:
+                return false;
+        }
+    }
+
+    return true;
+}
+
+SQLRETURN sqlsrv_block_result_set::fetch( _Inout_ SQLSMALLINT orientation, _Inout_opt_ SQLLEN offset )
+{
+    last_error = NULL;
+    last_field_index = -1;
+    read_so_far = 0;
+
+    // move within the current block if we can
+    if( orientation == SQL_FETCH_NEXT && block_row + 1 < rows_fetched ) {
+        ++block_row;
+        return SQL_SUCCESS;
+    }
+
+    SQLRETURN r = SQL_SUCCESS;
+    block_row = 0;
+
+    if( ahead != NULL && !ahead->discarded && orientation == SQL_FETCH_NEXT ) {
+
+        r = fetch_ahead();
+        CHECK_SQL_ERROR_OR_WARNING( r, odbc, NULL ) {
+            rows_fetched = 0;
+            throw core::CoreException();
+        }
+    }
+    else {
+
+        // other orientations are left to ODBC to reject for a forward only cursor
+        if( ahead != NULL ) {
+            stop_read_ahead( true );
+        }
+        r = core::SQLFetchScroll( odbc, orientation, offset );
+        if( ahead != NULL ) {
+            rows_fetched = ahead->fetched;
+        }
+    }
+
+    if( r == SQL_NO_DATA ) {
+        rows_fetched = 0;
+        return r;
+    }
+
+    prepare_block( block.get() + block_offset, rows_fetched );
+    return r;
+}
+
+SQLRETURN sqlsrv_block_result_set::fetch_ahead( void )
+{
+    std::unique_lock<std::mutex> guard( ahead->lock );
+
+    // the thread is started by the first fetch, and again after it stopped at a warning or was paused
+    if( !ahead->reader.joinable() && !ahead->finished ) {
+        try {
+            ahead->reader = std::thread( &read_ahead_ring::run, ahead );
+        }
+        catch( std::system_error& ) {
+            LOG( SEV_ERROR, "sqlsrv_block_result_set::fetch: failed to start the read-ahead thread" );
+
+            // the blocks filled before the thread was paused are handed out first, and starting the thread is
+            // tried again by the next fetch.  Only an empty ring is dropped to fetch the block directly.
+            if( ahead->filled == ahead->taken ) {
+                guard.unlock();
+                stop_read_ahead( true );
+                block_offset = 0;
+                SQLRETURN r = ::SQLFetchScroll( odbc->handle(), SQL_FETCH_NEXT, 0 );
+                rows_fetched = SQL_SUCCEEDED( r ) ? ahead->fetched : 0;
+                return r;
+            }
+        }
+    }
+
+    ahead->wake.wait( guard, [this] { return ahead->filled > ahead->taken; } );
+
+    SQLULEN slot = ahead->taken % ahead->slots;
+    ++ahead->taken;
+    rows_fetched = ahead->rows[slot];
+    block_offset = slot * ahead->slot_bytes;
+    SQLRETURN r = ahead->returns[slot];
+    guard.unlock();
+
+    // the block read before this one is done with, so the thread may fill it
+    ahead->wake.notify_all();
+
+    // the thread stopped after this block, so the diagnostics are still on the handle once it has returned
+    if( r != SQL_SUCCESS ) {
+        if( ahead->reader.joinable() ) {
+            ahead->reader.join();
+        }
+        ahead->finished = false;
+    }
+
+    return r;
+}
+
+// set the NULL flags of each row in the block and make sure a length never points past its field
+void sqlsrv_block_result_set::prepare_block( _Inout_ unsigned char* rows, _In_ SQLULEN count )
+{
+    SQLULEN null_bytes = ( col_count / 8 ) + 1;
+    for( SQLULEN n = 0; n < count; ++n ) {
+
+        unsigned char* row = rows + n * row_stride;
+        SQLLEN* fixed_ind = reinterpret_cast<SQLLEN*>( row + ind_offset );
+        memset( row, 0, null_bytes );
+
+        for( SQLSMALLINT i = 0; i < col_count; ++i ) {
+
+            if( meta[i].c_type == SQL_C_LONG || meta[i].c_type == SQL_C_DOUBLE ) {
+                if( fixed_ind[i] == SQL_NULL_DATA ) {
+                    set_bit( row, i );
+                }
+                continue;
+            }
+
+            SQLLEN* field_len = reinterpret_cast<SQLLEN*>( row + meta[i].offset );
+            if( *field_len == SQL_NULL_DATA ) {
+                set_bit( row, i );
+                continue;
+            }
+
+            SQLLEN terminator = ( meta[i].c_type == SQL_C_WCHAR ) ? sizeof( WCHAR ) : (( meta[i].c_type == SQL_C_CHAR ) ? sizeof( char ) : 0 );
+            SQLLEN capacity = meta[i].length - sizeof( SQLULEN ) - terminator;
+            if( *field_len == SQL_NO_TOTAL || *field_len > capacity ) {
+                *field_len = capacity;
+            }
+        }
+    }
+}
+
+SQLLEN sqlsrv_block_result_set::row_count( void )
+{
+    SQLSRV_ASSERT( odbc != NULL, "Invalid statement handle" );
+
+    // the thread is paused while the handle is used, and the blocks it fetched are kept
+    stop_read_ahead( false );
+    return core::SQLRowCount( odbc );
+}
+
+unsigned char* sqlsrv_block_result_set::get_row( void )
+{
+    SQLSRV_ASSERT( block_row < rows_fetched, "Failed to find row %1!d! in the current block", block_row );
+    return block.get() + block_offset + block_row * row_stride;
+}
+
+unsigned char* sqlsrv_block_result_set::get_field( _In_ SQLSMALLINT field_index )
+{
+    return get_row() + meta[field_index].offset;
+}
+
+bool sqlsrv_block_result_set::is_null( _In_ SQLSMALLINT field_index )
+{
+    return get_bit( get_row(), field_index );
+}
+
 // private functions
 template <typename Char>
 SQLRETURN binary_to_string( _Inout_ SQLCHAR* field_data, _Inout_ SQLLEN& read_so_far,  _Out_writes_z_(*out_buffer_length) void* buffer,
@@ -944,17 +1690,7 @@ SQLRETURN binary_to_string( _Inout_ SQLCHAR* field_data, _Inout_ SQLLEN& read_so
 SQLRETURN sqlsrv_buffered_result_set::binary_to_system_string( _In_ SQLSMALLINT field_index, _Out_writes_z_(*out_buffer_length) void* buffer, _In_ SQLLEN buffer_length,
                                                                _Inout_ SQLLEN* out_buffer_length )
 {
-    SQLCHAR* row = get_row();
-    SQLCHAR* field_data = NULL;
-
-    if( meta[field_index].length == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
-
-        field_data = *reinterpret_cast<SQLCHAR**>( &row[meta[field_index].offset] ) + sizeof( SQLULEN );
-    }
-    else {
-
-        field_data = &row[meta[field_index].offset] + sizeof( SQLULEN );
-    }
+    SQLCHAR* field_data = get_field( field_index ) + sizeof( SQLULEN );
 
     return binary_to_string<char>( field_data, read_so_far, buffer, buffer_length, out_buffer_length, last_error );
 }
@@ -962,17 +1698,7 @@ SQLRETURN sqlsrv_buffered_result_set::binary_to_system_string( _In_ SQLSMALLINT
 SQLRETURN sqlsrv_buffered_result_set::binary_to_wide_string( _In_ SQLSMALLINT field_index, _Out_writes_z_(*out_buffer_length) void* buffer, _In_ SQLLEN buffer_length,
                                                              _Inout_ SQLLEN* out_buffer_length )
 {
-    SQLCHAR* row = get_row();
-    SQLCHAR* field_data = NULL;
-
-    if( meta[field_index].length == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
-
-        field_data = *reinterpret_cast<SQLCHAR**>( &row[meta[field_index].offset] ) + sizeof( SQLULEN );
-    }
-    else {
-
-        field_data = &row[meta[field_index].offset] + sizeof( SQLULEN );
-    }
+    SQLCHAR* field_data = get_field( field_index ) + sizeof( SQLULEN );
 
     return binary_to_string<WCHAR>( field_data, read_so_far, buffer, buffer_length, out_buffer_length, last_error );
 }
@@ -985,8 +1711,7 @@ SQLRETURN sqlsrv_buffered_result_set::double_to_long( _In_ SQLSMALLINT field_ind
     SQLSRV_ASSERT( buffer_length >= sizeof(SQLLEN), "Buffer length must be able to find a long in "
                    "sqlsrv_buffered_result_set::double_to_long" );
 
-    unsigned char* row = get_row();
-    double* double_data = reinterpret_cast<double*>( &row[meta[field_index].offset] );
+    double* double_data = reinterpret_cast<double*>( get_field( field_index ));
     LONG* long_data = reinterpret_cast<LONG*>( buffer );
 
     if( *double_data < double( LONG_MIN ) || *double_data > double( LONG_MAX )) {
@@ -1013,8 +1738,7 @@ SQLRETURN sqlsrv_buffered_result_set::double_to_system_string( _In_ SQLSMALLINT
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_DOUBLE, "Invalid conversion to system string" );
     SQLSRV_ASSERT( buffer_length > 0, "Buffer length must be > 0 in sqlsrv_buffered_result_set::double_to_system_string" );
 
-    unsigned char* row = get_row();
-    double* double_data = reinterpret_cast<double*>( &row[meta[field_index].offset] );
+    double* double_data = reinterpret_cast<double*>( get_field( field_index ));
     SQLRETURN r = SQL_SUCCESS;
 #ifdef _WIN32
     r = number_to_string<char>( double_data, buffer, buffer_length, out_buffer_length, last_error );
@@ -1030,9 +1754,8 @@ SQLRETURN sqlsrv_buffered_result_set::long_to_double( _In_ SQLSMALLINT field_ind
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_LONG, "Invalid conversion to long" );
     SQLSRV_ASSERT( buffer_length >= sizeof(double), "Buffer length must be able to find a long in sqlsrv_buffered_result_set::double_to_long" );
 
-    unsigned char* row = get_row();
     double* double_data = reinterpret_cast<double*>( buffer );
-    LONG* long_data = reinterpret_cast<LONG*>( &row[meta[field_index].offset] );
+    LONG* long_data = reinterpret_cast<LONG*>( get_field( field_index ));
 
     *double_data = static_cast<LONG>( *long_data );
     *out_buffer_length = sizeof( double );
@@ -1045,8 +1768,7 @@ SQLRETURN sqlsrv_buffered_result_set::long_to_system_string( _In_ SQLSMALLINT fi
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_LONG, "Invalid conversion to system string" );
     SQLSRV_ASSERT( buffer_length > 0, "Buffer length must be > 0 in sqlsrv_buffered_result_set::long_to_system_string" );
 
-    unsigned char* row = get_row();
-    LONG* long_data = reinterpret_cast<LONG*>( &row[meta[field_index].offset] );
+    LONG* long_data = reinterpret_cast<LONG*>( get_field( field_index ));
     SQLRETURN r = SQL_SUCCESS;
 #ifdef _WIN32
     r = number_to_string<char>( long_data, buffer, buffer_length, out_buffer_length, last_error );
@@ -1062,8 +1784,7 @@ SQLRETURN sqlsrv_buffered_result_set::string_to_double( _In_ SQLSMALLINT field_i
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_CHAR, "Invalid conversion from string to double" );
     SQLSRV_ASSERT( buffer_length >= sizeof( double ), "Buffer needs to be big enough to hold a double" );
 
-    unsigned char* row = get_row();
-    char* string_data = reinterpret_cast<char*>( &row[meta[field_index].offset] ) + sizeof( SQLULEN );
+    char* string_data = reinterpret_cast<char*>( get_field( field_index )) + sizeof( SQLULEN );
 
     double* number_data = reinterpret_cast<double*>(buffer);
     try {
@@ -1083,8 +1804,7 @@ SQLRETURN sqlsrv_buffered_result_set::wstring_to_double( _In_ SQLSMALLINT field_
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_WCHAR, "Invalid conversion from wide string to double" );
     SQLSRV_ASSERT( buffer_length >= sizeof( double ), "Buffer needs to be big enough to hold a double" );
 
-    unsigned char* row = get_row();
-    SQLWCHAR* string_data = reinterpret_cast<SQLWCHAR*>( &row[meta[field_index].offset] ) + sizeof( SQLULEN ) / sizeof( SQLWCHAR );
+    SQLWCHAR* string_data = reinterpret_cast<SQLWCHAR*>( get_field( field_index )) + sizeof( SQLULEN ) / sizeof( SQLWCHAR );
 
     double* number_data = reinterpret_cast<double*>(buffer);
     try {
@@ -1108,8 +1828,7 @@ SQLRETURN sqlsrv_buffered_result_set::string_to_long( _In_ SQLSMALLINT field_ind
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_CHAR, "Invalid conversion from string to long" );
     SQLSRV_ASSERT( buffer_length >= sizeof( LONG ), "Buffer needs to be big enough to hold a long" );
 
-    unsigned char* row = get_row();
-    char* string_data = reinterpret_cast<char*>( &row[meta[field_index].offset] ) + sizeof( SQLULEN );
+    char* string_data = reinterpret_cast<char*>( get_field( field_index )) + sizeof( SQLULEN );
 
     LONG* number_data = reinterpret_cast<LONG*>(buffer);
     try {
@@ -1129,8 +1848,7 @@ SQLRETURN sqlsrv_buffered_result_set::wstring_to_long( _In_ SQLSMALLINT field_in
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_WCHAR, "Invalid conversion from wide string to long" );
     SQLSRV_ASSERT( buffer_length >= sizeof( LONG ), "Buffer needs to be big enough to hold a long" );
 
-    unsigned char* row = get_row();
-    SQLWCHAR* string_data = reinterpret_cast<SQLWCHAR*>( &row[meta[field_index].offset] ) + sizeof( SQLULEN ) / sizeof( SQLWCHAR );
+    SQLWCHAR* string_data = reinterpret_cast<SQLWCHAR*>( get_field( field_index )) + sizeof( SQLULEN ) / sizeof( SQLWCHAR );
 
     LONG* number_data = reinterpret_cast<LONG*>(buffer);
     try {
@@ -1155,21 +1873,10 @@ SQLRETURN sqlsrv_buffered_result_set::system_to_wide_string( _In_ SQLSMALLINT fi
     SQLSRV_ASSERT( buffer_length % 2 == 0, "Odd buffer length passed to sqlsrv_buffered_result_set::system_to_wide_string" );
 
     SQLRETURN r = SQL_ERROR;
-    unsigned char* row = get_row();
-
-    SQLCHAR* field_data = NULL;
-    SQLULEN field_len = 0;
+    unsigned char* field = get_field( field_index );
 
-    if( meta[field_index].length == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
-
-        field_len = **reinterpret_cast<SQLLEN**>( &row[meta[field_index].offset] );
-        field_data = *reinterpret_cast<SQLCHAR**>( &row[meta[field_index].offset] ) + sizeof( SQLULEN ) + read_so_far;
-    }
-    else {
-
-        field_len = *reinterpret_cast<SQLLEN*>( &row[meta[field_index].offset] );
-        field_data = &row[meta[field_index].offset] + sizeof( SQLULEN ) + read_so_far;
-    }
+    SQLULEN field_len = *reinterpret_cast<SQLLEN*>( field );
+    SQLCHAR* field_data = field + sizeof( SQLULEN ) + read_so_far;
 
     // all fields will be treated as ODBC returns varchar(max) fields:
     // the entire length of the string is returned the first
@@ -1254,7 +1961,6 @@ SQLRETURN sqlsrv_buffered_result_set::to_same_string( _In_ SQLSMALLINT field_ind
     SQLSRV_ASSERT( last_error == 0, "Pending error for sqlsrv_buffered_results_set::to_same_string" );
 
     SQLRETURN r = SQL_ERROR;
-    unsigned char* row = get_row();
 
     // Set the amount of space necessary for null characters at the end of the data.
     SQLSMALLINT extra = 0;
@@ -1274,16 +1980,7 @@ SQLRETURN sqlsrv_buffered_result_set::to_same_string( _In_ SQLSMALLINT field_ind
             break;
     }
 
-    SQLCHAR* field_data = NULL;
-
-    if( meta[field_index].length == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
-
-        field_data = *reinterpret_cast<SQLCHAR**>( &row[meta[field_index].offset] ) + sizeof( SQLULEN );
-    }
-    else {
-
-        field_data = &row[meta[field_index].offset] + sizeof( SQLULEN );
-    }
+    SQLCHAR* field_data = get_field( field_index ) + sizeof( SQLULEN );
 
     // all fields will be treated as ODBC returns varchar(max) fields:
     // the entire length of the string is returned the first
@@ -1324,10 +2021,6 @@ SQLRETURN sqlsrv_buffered_result_set::wide_to_system_string( _In_ SQLSMALLINT fi
     SQLSRV_ASSERT( last_error == 0, "Pending error for sqlsrv_buffered_results_set::wide_to_system_string" );
 
     SQLRETURN r = SQL_ERROR;
-    unsigned char* row = get_row();
-
-    SQLCHAR* field_data = NULL;
-    SQLLEN field_len = 0;
 
     // if this is the first time called for this field, just convert the entire string to system first then
     // use that to read from instead of converting chunk by chunk.  This is because it's impossible to know
@@ -1337,16 +2030,9 @@ SQLRETURN sqlsrv_buffered_result_set::wide_to_system_string( _In_ SQLSMALLINT fi
 
     if( read_so_far == 0 ) {
 
-        if( meta[field_index].length == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
-
-            field_len = **reinterpret_cast<SQLLEN**>( &row[meta[field_index].offset] );
-            field_data = *reinterpret_cast<SQLCHAR**>( &row[meta[field_index].offset] ) + sizeof( SQLULEN ) + read_so_far;
-        }
-        else {
-
-            field_len = *reinterpret_cast<SQLLEN*>( &row[meta[field_index].offset] );
-            field_data = &row[meta[field_index].offset] + sizeof( SQLULEN ) + read_so_far;
-        }
+        unsigned char* field = get_field( field_index );
+        SQLLEN field_len = *reinterpret_cast<SQLLEN*>( field );
+        SQLCHAR* field_data = field + sizeof( SQLULEN );
 
         if ( field_len == 0 ) { // empty string, no need for conversion
             *out_buffer_length = 0;
@@ -1424,8 +2110,7 @@ SQLRETURN sqlsrv_buffered_result_set::to_long( _In_ SQLSMALLINT field_index, _Ou
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_LONG, "Invalid conversion to long" );
     SQLSRV_ASSERT( buffer_length >= sizeof( LONG ), "Buffer too small for SQL_C_LONG" );    // technically should ignore this
 
-    unsigned char* row = get_row();
-    LONG* long_data = reinterpret_cast<LONG*>( &row[meta[field_index].offset] );
+    LONG* long_data = reinterpret_cast<LONG*>( get_field( field_index ));
     memcpy_s( buffer, buffer_length, long_data, sizeof( LONG ));
     *out_buffer_length = sizeof( LONG );
 
@@ -1438,8 +2123,7 @@ SQLRETURN sqlsrv_buffered_result_set::to_double( _In_ SQLSMALLINT field_index, _
     SQLSRV_ASSERT( meta[field_index].c_type == SQL_C_DOUBLE, "Invalid conversion to double" );
     SQLSRV_ASSERT( buffer_length >= sizeof( double ), "Buffer too small for SQL_C_DOUBLE" );  // technically should ignore this
 
-    unsigned char* row = get_row();
-    double* double_data = reinterpret_cast<double*>( &row[meta[field_index].offset] );
+    double* double_data = reinterpret_cast<double*>( get_field( field_index ));
     memcpy_s( buffer, buffer_length, double_data, sizeof( double ));
     *out_buffer_length = sizeof( double );
 
@@ -1448,27 +2132,6 @@ SQLRETURN sqlsrv_buffered_result_set::to_double( _In_ SQLSMALLINT field_index, _
 
 namespace {
 
-// called for each row in the cache when the cache is destroyed in the destructor
-void cache_row_dtor( _In_ zval* data )
-{
-    row_dtor_closure* cl = reinterpret_cast<row_dtor_closure*>( Z_PTR_P( data ) );
-    BYTE* row = cl->row_data;
-    // don't release this here, since this is called from the destructor of the result_set
-    sqlsrv_buffered_result_set* result_set = cl->results;
-
-    for( SQLSMALLINT i = 0; i < result_set->column_count(); ++i ) {
-
-        if( result_set->col_meta_data(i).length == sqlsrv_buffered_result_set::meta_data::SIZE_UNKNOWN ) {
-
-            void* out_of_row_data = *reinterpret_cast<void**>( &row[result_set->col_meta_data(i).offset] );
-            sqlsrv_free( out_of_row_data );
-        }
-    }
-
-    sqlsrv_free( row );
-	sqlsrv_free( cl );
-}
-
 SQLPOINTER read_lob_field( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_index, _In_ sqlsrv_buffered_result_set::meta_data& meta,
                            _In_ zend_long mem_used )
 {
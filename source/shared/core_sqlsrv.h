@@ -146,6 +146,8 @@ OACR_WARNING_POP
 #undef inline
 #endif
 
+#include <atomic>
+#include <chrono>
 #include <deque>
 #include <map>
 #include <string>
@@ -308,6 +310,80 @@ void die( _In_opt_ const char* msg, ... );
 #define DIE( msg, ... ) { die( msg, ## __VA_ARGS__ ); }
 
 
+//*********************************************************************************************************************************
+// Tracing
+//*********************************************************************************************************************************
+// Spans time the calls into the driver with a monotonic clock and counters count the work done, both per process, and
+// core_sqlsrv_get_trace_info returns them to the script.  Tracing is turned on once by MINIT from the INI settings, and
+// costs the test of a flag where it is off.  Each span is also written as a line of JSON to the sink, if one is set,
+// which is a file or a tcp://, udp://, unix:// or udg:// socket.  The lines are buffered and written when the request
+// ends or the buffer is full, so that a slow sink delays the requests as little as possible.
+
+enum sqlsrv_trace_span_kind {
+    SQLSRV_TRACE_CONNECT,
+    SQLSRV_TRACE_PREPARE,
+    SQLSRV_TRACE_EXECUTE,
+    SQLSRV_TRACE_FETCH,
+    SQLSRV_TRACE_GET_DATA,
+    SQLSRV_TRACE_STREAM_READ,
+    SQLSRV_TRACE_SPAN_COUNT
+};
+
+enum sqlsrv_trace_counter {
+    SQLSRV_TRACE_ROUND_TRIPS,           // connections, prepares, executions and moves to the next result
+    SQLSRV_TRACE_BYTES_FETCHED,         // bytes of the fields and streams fetched
+    SQLSRV_TRACE_ROWS,                  // rows fetched
+    SQLSRV_TRACE_CONVERSIONS,           // strings converted from or to UTF-16
+    SQLSRV_TRACE_CACHE_HITS,            // statements and persistent connections taken from their caches
+    SQLSRV_TRACE_COUNTER_COUNT
+};
+
+extern bool g_sqlsrv_trace_enabled;
+
+void core_sqlsrv_trace_init( _In_ bool enabled, _In_opt_z_ const char* sink );
+void core_sqlsrv_trace_add( _In_ sqlsrv_trace_counter counter, _In_ zend_long value );
+void core_sqlsrv_trace_end_span( _In_ sqlsrv_trace_span_kind kind, _In_ std::chrono::steady_clock::time_point start );
+void core_sqlsrv_trace_flush( void );
+void core_sqlsrv_get_trace_info( _Out_ zval* info );
+
+inline void core_sqlsrv_trace_count( _In_ sqlsrv_trace_counter counter, _In_ zend_long value = 1 )
+{
+    if( g_sqlsrv_trace_enabled ) {
+        core_sqlsrv_trace_add( counter, value );
+    }
+}
+
+// times the scope in which it is declared when tracing is on
+class sqlsrv_trace_span {
+
+public:
+
+    explicit sqlsrv_trace_span( _In_ sqlsrv_trace_span_kind kind ) : kind( kind ), traced( g_sqlsrv_trace_enabled )
+    {
+        if( traced ) {
+            start = std::chrono::steady_clock::now();
+        }
+    }
+
+    ~sqlsrv_trace_span( void )
+    {
+        if( traced ) {
+            core_sqlsrv_trace_end_span( kind, start );
+        }
+    }
+
+private:
+
+    sqlsrv_trace_span_kind kind;
+    bool traced;
+    std::chrono::steady_clock::time_point start;
+
+    // disallow copying
+    sqlsrv_trace_span( _In_ const sqlsrv_trace_span& );
+    sqlsrv_trace_span& operator=( _In_ const sqlsrv_trace_span& );
+};
+
+
 //*********************************************************************************************************************************
 // Resource/Memory Management
 //*********************************************************************************************************************************
@@ -753,6 +829,36 @@ private:
     zval_auto_ptr( _In_ const zval_auto_ptr& src );
 };
 
+
+// a buffer kept by a statement for conversions whose results are copied elsewhere, so that converting each
+// field doesn't allocate a buffer of its own.  Buffers larger than SCRATCH_BUFFER_MAX are not kept.
+
+const SQLLEN SCRATCH_BUFFER_MAX = 256 * 1024;
+
+struct sqlsrv_scratch_buffer {
+
+    sqlsrv_malloc_auto_ptr<char> buffer;
+    SQLLEN size;
+
+    sqlsrv_scratch_buffer( void ) :
+        size( 0 )
+    {
+    }
+
+    // returns a buffer of at least len bytes, or NULL if len is more than SCRATCH_BUFFER_MAX
+    char* reserve( _In_ SQLLEN len )
+    {
+        if( len > SCRATCH_BUFFER_MAX ) {
+            return NULL;
+        }
+        if( len > size ) {
+            size = ( len < SCRATCH_BUFFER_MAX / 2 && size * 2 > len ) ? size * 2 : len;
+            buffer = static_cast<char*>( sqlsrv_malloc( size ));
+        }
+        return buffer.get();
+    }
+};
+
 #pragma pop_macro( "max" )
 
 
@@ -988,6 +1094,15 @@ class sqlsrv_context {
         return handle_ != SQL_NULL_HANDLE;
     }
 
+    // adopts another ODBC handle of the same type and returns the handle held until now, which the caller
+    // becomes responsible for
+    SQLHANDLE exchange_handle( _In_ SQLHANDLE h )
+    {
+        SQLHANDLE old = handle_;
+        handle_ = h;
+        return old;
+    }
+
     SQLSRV_ENCODING encoding( void ) const
     {
         return encoding_;
@@ -1094,6 +1209,11 @@ struct col_encryption_option {
 
 // *** connection resource structure ***
 // this is the resource structure returned when a connection is made.
+struct sqlsrv_stmt_cache;
+
+// length of the key of a persistent connection, a SHA-1 digest
+const int SQLSRV_CONN_POOL_KEY_LEN = 20;
+
 struct sqlsrv_conn : public sqlsrv_context {
 
     // instance variables
@@ -1104,12 +1224,34 @@ struct sqlsrv_conn : public sqlsrv_context {
 
     sqlsrv_malloc_auto_ptr<ACCESSTOKEN> azure_ad_access_token;
 
+    zend_long stmt_cache_size;          // maximum number of prepared statements kept by the statement cache (0 disables the cache)
+    zend_long stmt_cache_max_kb_size;   // maximum memory used by the statement cache in KB (0 for no limit)
+    sqlsrv_stmt_cache* stmt_cache;      // the statement cache, allocated by the first prepare that looks it up
+
+    bool defer_prepare;                 // default of the statements: prepare on the second execution and execute the first one directly
+    zend_long direct_executes;          // executions of prepared statements sent directly since their prepare was deferred
+    zend_long deferred_prepares;        // statements prepared on their second execution
+    zend_long prepared_executes;        // executions of prepared statements
+
+    bool persistent;                    // the connection goes back to the persistent connection pool when it is closed
+    SQLHANDLE pool_henv;                // environment the connection handle was allocated from
+    unsigned char pool_key[SQLSRV_CONN_POOL_KEY_LEN];  // hash of the connection string and options
+
     // initialize with default values
     sqlsrv_conn( _In_ SQLHANDLE h, _In_ error_callback e, _In_opt_ void* drv, _In_ SQLSRV_ENCODING encoding ) :
         sqlsrv_context( h, SQL_HANDLE_DBC, e, drv, encoding )
     {
         server_version = SERVER_VERSION_UNKNOWN;
         driver_version = ODBC_DRIVER::VER_UNKNOWN;
+        stmt_cache_size = 0;
+        stmt_cache_max_kb_size = 0;
+        stmt_cache = NULL;
+        defer_prepare = false;
+        direct_executes = 0;
+        deferred_prepares = 0;
+        prepared_executes = 0;
+        persistent = false;
+        pool_henv = SQL_NULL_HANDLE;
     }
 
     // sqlsrv_conn has no destructor since its allocated using placement new, which requires that the destructor be
@@ -1128,6 +1270,11 @@ enum SQLSRV_STMT_OPTIONS {
    SQLSRV_STMT_OPTION_FORMAT_DECIMALS,
    SQLSRV_STMT_OPTION_DECIMAL_PLACES,
    SQLSRV_STMT_OPTION_DATA_CLASSIFICATION,
+   SQLSRV_STMT_OPTION_FETCH_BLOCK_SIZE,
+   SQLSRV_STMT_OPTION_CLIENT_BUFFER_SPILL,
+   SQLSRV_STMT_OPTION_STREAM_CHUNK_SIZE,
+   SQLSRV_STMT_OPTION_DEFER_PREPARE,
+   SQLSRV_STMT_OPTION_READ_AHEAD,
 
    // Driver specific connection options
    SQLSRV_STMT_OPTION_DRIVER_SPECIFIC = 1000,
@@ -1208,6 +1355,10 @@ enum SQLSRV_CONN_OPTIONS {
     SQLSRV_CONN_OPTION_CONN_RETRY_INTERVAL,
     SQLSRV_CONN_OPTION_COMPUTE_POOL,
     SQLSRV_CONN_OPTION_HOSTNAME_IN_CERT,
+    SQLSRV_CONN_OPTION_STMT_CACHE_SIZE,
+    SQLSRV_CONN_OPTION_STMT_CACHE_MAX_KB_SIZE,
+    SQLSRV_CONN_OPTION_PERSISTENT,
+    SQLSRV_CONN_OPTION_DEFER_PREPARE,
 
    // Driver specific connection options
    SQLSRV_CONN_OPTION_DRIVER_SPECIFIC = 1000,
@@ -1271,6 +1422,16 @@ struct access_token_set_func {
     static void func( _In_ connection_option const* option, _In_ zval* value, _Inout_ sqlsrv_conn* conn, _Inout_ std::string& conn_str );
 };
 
+// sets the limits of the statement cache, which are not part of the connection string
+struct stmt_cache_set_func {
+    static void func( _In_ connection_option const* option, _In_ zval* value, _Inout_ sqlsrv_conn* conn, std::string& /*conn_str*/ );
+};
+
+// sets whether the statements of the connection defer their prepare, which is not part of the connection string
+struct defer_prepare_set_func {
+    static void func( _In_ connection_option const* option, _In_ zval* value, _Inout_ sqlsrv_conn* conn, std::string& /*conn_str*/ );
+};
+
 
 // factory to create a connection (since they are subclassed to instantiate statements)
 typedef sqlsrv_conn* (*driver_conn_factory)( _In_ SQLHANDLE h, _In_ error_callback e, _In_ void* drv );
@@ -1283,6 +1444,7 @@ sqlsrv_conn* core_sqlsrv_connect( _In_ sqlsrv_context& henv_cp, _In_ sqlsrv_cont
 SQLRETURN core_odbc_connect( _Inout_ sqlsrv_conn* conn, _Inout_ std::string& conn_str, _In_ bool is_pooled );
 void core_sqlsrv_close( _Inout_opt_ sqlsrv_conn* conn );
 void core_sqlsrv_prepare( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql, _In_ SQLLEN sql_len );
+void core_sqlsrv_prepare_deferred( _Inout_ sqlsrv_stmt* stmt );
 void core_sqlsrv_begin_transaction( _Inout_ sqlsrv_conn* conn );
 void core_sqlsrv_commit( _Inout_ sqlsrv_conn* conn );
 void core_sqlsrv_rollback( _Inout_ sqlsrv_conn* conn );
@@ -1337,6 +1499,31 @@ struct stmt_option_data_classification : public stmt_option_functor {
     virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* opt, _In_ zval* value_z );
 };
 
+struct stmt_option_fetch_block_size : public stmt_option_functor {
+
+    virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* opt, _In_ zval* value_z );
+};
+
+struct stmt_option_buffered_query_spill : public stmt_option_functor {
+
+    virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* opt, _In_ zval* value_z );
+};
+
+struct stmt_option_stream_chunk_size : public stmt_option_functor {
+
+    virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* opt, _In_ zval* value_z );
+};
+
+struct stmt_option_defer_prepare : public stmt_option_functor {
+
+    virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* opt, _In_ zval* value_z );
+};
+
+struct stmt_option_read_ahead : public stmt_option_functor {
+
+    virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* opt, _In_ zval* value_z );
+};
+
 // used to hold the table for statment options
 struct stmt_option {
 
@@ -1355,13 +1542,17 @@ struct sqlsrv_stream {
     SQLUSMALLINT field_index;
     SQLSMALLINT sql_type;
     sqlsrv_stmt* stmt;
+    size_t chunk_size;          // largest number of bytes read per call to SQLGetData
+    char* wide_buffer;          // holds the UTF-16 data of a chunk before it is converted, allocated on the first read
 
     sqlsrv_stream( _In_opt_ zval* str_z, _In_ SQLSRV_ENCODING enc ) :
-        stream_z( str_z ), encoding( enc ), field_index( 0 ), sql_type( SQL_UNKNOWN_TYPE ), stmt( NULL )
+        stream_z( str_z ), encoding( enc ), field_index( 0 ), sql_type( SQL_UNKNOWN_TYPE ), stmt( NULL ),
+        chunk_size( PHP_STREAM_BUFFER_SIZE ), wide_buffer( NULL )
     {
     }
 
-    sqlsrv_stream() : stream_z( NULL ), encoding( SQLSRV_ENCODING_INVALID ), field_index( 0 ), sql_type( SQL_UNKNOWN_TYPE ), stmt( NULL )
+    sqlsrv_stream() : stream_z( NULL ), encoding( SQLSRV_ENCODING_INVALID ), field_index( 0 ), sql_type( SQL_UNKNOWN_TYPE ), stmt( NULL ),
+        chunk_size( PHP_STREAM_BUFFER_SIZE ), wide_buffer( NULL )
     {
     }
 };
@@ -1416,10 +1607,15 @@ struct sqlsrv_param
     zval*           param_ptr_z;    // NULL by default - points to the original parameter or its reference
     std::size_t     num_bytes_read; // 0 by default - number of bytes processed so far (for an empty PHP stream, an empty string is sent to the server)
     php_stream*     param_stream;   // NULL by default - used to send stream data from an input parameter to the server
+    std::size_t     stream_chunk;   // 0 by default - number of bytes read from param_stream per SQLPutData call
+    char*           stream_buffer;  // NULL by default - holds a chunk read from param_stream, followed by its UTF-16 conversion for a UTF-8 stream
+    char*           stream_map;     // NULL by default - param_stream mapped into memory when it is a plain file sent without conversion
+    std::size_t     stream_map_len; // 0 by default - number of bytes mapped
 
     sqlsrv_param(_In_ SQLUSMALLINT param_num, _In_ SQLSMALLINT dir, _In_ SQLSRV_ENCODING enc, _In_ SQLSMALLINT sql_type, _In_ SQLULEN col_size, _In_ SQLSMALLINT dec_digits) :
         c_data_type(0), buffer(NULL), buffer_length(0), strlen_or_indptr(0), param_pos(param_num), direction(dir), encoding(enc), sql_data_type(sql_type),
-        column_size(col_size), decimal_digits(dec_digits), param_php_type(0), was_null(false), param_ptr_z(NULL), num_bytes_read(0), param_stream(NULL)
+        column_size(col_size), decimal_digits(dec_digits), param_php_type(0), was_null(false), param_ptr_z(NULL), num_bytes_read(0), param_stream(NULL),
+        stream_chunk(0), stream_buffer(NULL), stream_map(NULL), stream_map_len(0)
     {
         ZVAL_UNDEF(&placeholder_z);
     }
@@ -1451,6 +1647,8 @@ struct sqlsrv_param
     // The following methods are used to supply data to the server via SQLPutData
     virtual void init_data_from_zval(_Inout_ sqlsrv_stmt* stmt);
     virtual bool send_data_packet(_Inout_ sqlsrv_stmt* stmt);
+    bool send_mapped_packet(_Inout_ sqlsrv_stmt* stmt);
+    void release_stream_data();
 };
 
 // *** output / inout parameter struct used for SQLBindParameter, inheriting sqlsrv_param ***
@@ -1651,6 +1849,8 @@ namespace data_classification {
 struct sqlsrv_result_set;
 struct field_meta_data;
 
+struct sqlsrv_slow_query;
+
 // *** Statement resource structure ***
 struct sqlsrv_stmt : public sqlsrv_context {
 
@@ -1680,10 +1880,14 @@ struct sqlsrv_stmt : public sqlsrv_context {
     long row_count;                       // Number of rows in the current result set obtained from SQLRowCount
     unsigned long query_timeout;          // maximum allowed statement execution time
     zend_long buffered_query_limit;       // maximum allowed memory for a buffered query (measured in KB)
+    bool buffered_query_spill;            // false by default, when true a buffered query that outgrows its limit is spilled to a temporary file
+    SQLULEN stream_chunk_size;            // bytes read per SQLGetData call by streams, and sent per SQLPutData call by stream parameters (0 by default, which keeps PHP's stream buffer size)
     bool date_as_string;                  // false by default but the user can set this to true to retrieve datetime values as strings
     bool format_decimals;                 // false by default but the user can set this to true to add the missing leading zeroes and/or control number of decimal digits to show
     short decimal_places;                 // indicates number of decimals shown in fetched results (-1 by default, which means no change to number of decimal digits)
     bool data_classification;             // false by default but the user can set this to true to retrieve data classification sensitivity metadata
+    SQLULEN fetch_block_size;             // rows fetched per ODBC call by forward only cursors without LOB columns (1 disables block fetching)
+    SQLULEN read_ahead;                   // blocks fetched by a background thread ahead of the block being read (0 by default, which disables read-ahead)
 
     bool send_streams_at_exec;            // send all stream data right after execution before returning
     zval field_cache;                     // cache for a single row of fields, to allow multiple and out of order retrievals
@@ -1692,6 +1896,22 @@ struct sqlsrv_stmt : public sqlsrv_context {
 
     sqlsrv_params_container params_container;       // holds all parameters and references used for SQLBindParameter
 
+    zend_string* cache_key;               // key of the prepared statement in the connection's statement cache, NULL if it isn't cached
+    bool cache_meta_data;                 // whether the metadata may be kept in the statement cache, false once past the first result set
+    bool meta_data_from_cache;            // the metadata was taken from the statement cache and is checked by the next execution
+
+    bool defer_prepare;                   // false by default, when true the first execution is sent directly and the statement is prepared by the second
+    sqlsrv_malloc_auto_ptr<SQLWCHAR> deferred_sql;  // text of a statement whose prepare is deferred, NULL once it is prepared
+    unsigned int deferred_sql_len;        // number of characters in deferred_sql
+    bool deferred_executed;               // the statement whose prepare is deferred was executed directly
+
+    bool async_executing;                 // an execution started by core_sqlsrv_execute_async has not completed yet
+    sqlsrv_malloc_auto_ptr<SQLWCHAR> async_sql;     // text of a direct query executing asynchronously, passed again when it is polled
+
+    sqlsrv_scratch_buffer conversion_buffer;        // reused to convert the fields fetched as UTF-16
+
+    sqlsrv_slow_query* slow_query;        // the execution being timed for the slow query log, NULL if the log is off
+
     // meta data for current result set
     std::vector<field_meta_data*, sqlsrv_allocator<field_meta_data*>> current_meta_data;
 
@@ -1745,6 +1965,21 @@ const int SQLSRV_DEFAULT_SIZE = -1;     // size given for an output parameter th
 // uninitialized query timeout value
 const unsigned int QUERY_TIMEOUT_INVALID = 0xffffffff;
 
+// default and maximum number of rows fetched per ODBC call by the block result set
+const SQLULEN FETCH_BLOCK_SIZE_DEFAULT = 1;
+const SQLULEN FETCH_BLOCK_SIZE_MAX = 65535;
+
+// largest number of blocks fetched ahead of the block being read
+const SQLULEN READ_AHEAD_MAX = 64;
+
+// smallest and largest number of bytes read per SQLGetData call by a stream with a chunk size
+const SQLULEN STREAM_CHUNK_SIZE_MIN = 1024;
+const SQLULEN STREAM_CHUNK_SIZE_MAX = 64 * 1024 * 1024;
+
+// default and maximum number of rows sent per ODBC call by core_sqlsrv_execute_batch
+const SQLULEN EXECUTE_BATCH_SIZE_DEFAULT = 1000;
+const SQLULEN EXECUTE_BATCH_SIZE_MAX = 65535;
+
 // special buffered query constant
 #ifndef _WIN32
 const size_t SQLSRV_CURSOR_BUFFERED = 42; // arbitrary number that doesn't map to any other SQL_CURSOR_* constant
@@ -1762,6 +1997,11 @@ void core_sqlsrv_bind_param( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT param_
                              _In_ SQLSRV_PHPTYPE php_out_type, _Inout_ SQLSRV_ENCODING encoding, _Inout_ SQLSMALLINT sql_type, _Inout_ SQLULEN column_size,
                              _Inout_ SQLSMALLINT decimal_digits);
 SQLRETURN core_sqlsrv_execute( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql = NULL, _In_ int sql_len = 0 );
+void core_sqlsrv_execute_batch( _Inout_ sqlsrv_stmt* stmt, _In_ HashTable* rows, _In_ zend_long batch_size, _Out_ zval* status_z );
+void core_sqlsrv_build_query_batch( _Inout_ sqlsrv_context& ctx, _In_ HashTable* queries, _Out_ std::string& sql, _Out_ zval& params_z );
+SQLRETURN core_sqlsrv_execute_async( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql = NULL, _In_ int sql_len = 0 );
+SQLRETURN core_sqlsrv_poll( _Inout_ sqlsrv_stmt* stmt );
+void core_sqlsrv_cancel_async( _Inout_ sqlsrv_stmt* stmt );
 field_meta_data* core_sqlsrv_field_metadata( _Inout_ sqlsrv_stmt* stmt, _In_ SQLSMALLINT colno );
 bool core_sqlsrv_fetch( _Inout_ sqlsrv_stmt* stmt, _In_ SQLSMALLINT fetch_orientation, _In_ SQLULEN fetch_offset );
 void core_sqlsrv_get_field( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_index, _In_ sqlsrv_phptype sqlsrv_phptype, _In_ bool prefer_string,
@@ -1775,8 +2015,84 @@ bool core_sqlsrv_send_stream_packet( _Inout_ sqlsrv_stmt* stmt, _In_opt_ bool ge
 void core_sqlsrv_set_buffered_query_limit( _Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z );
 void core_sqlsrv_set_buffered_query_limit( _Inout_ sqlsrv_stmt* stmt, _In_ SQLLEN limit );
 void core_sqlsrv_set_decimal_places(_Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z);
+void core_sqlsrv_set_fetch_block_size( _Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z );
+void core_sqlsrv_set_stream_chunk_size( _Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z );
+void core_sqlsrv_set_read_ahead( _Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z );
+void core_sqlsrv_stop_read_ahead( _Inout_ sqlsrv_stmt* stmt, _In_ bool discard );
 void core_sqlsrv_sensitivity_metadata( _Inout_ sqlsrv_stmt* stmt );
 
+// *** persistent connections ***
+// Persistent connections are not disconnected when they are closed.  Their handles are kept by a pool shared by the
+// requests of the process, keyed by a hash of the connection string and options, and handed to the next persistent
+// connection opened with the same key once the server answers a ping.  The server resets the session of a handle
+// taken from the pool with its next request, and handles idle for longer than the maximum idle time are disconnected.
+
+#define INI_PERSISTENT_MAX_IDLE_TIME_DEFAULT    "300"   // default used by the php.ini settings, in seconds
+
+void core_sqlsrv_conn_pool_set_max_idle_time( _In_ zend_long seconds );
+void core_sqlsrv_conn_pool_free( _In_ sqlsrv_context& henv );
+void core_sqlsrv_get_conn_pool_info( _Out_ zval* info );
+
+// *** statement cache ***
+// Prepared statement handles are kept by the connection when their statements are freed, along with the metadata
+// of their first result set, and handed to the next statement prepared with the same text and handle attributes.
+// Handles are taken out of the cache while a statement uses them, so the order of the entries is the order in
+// which they were last released and the least recently used entry is evicted first.
+
+struct sqlsrv_stmt_cache_entry {
+
+    SQLHANDLE handle;
+    std::vector<field_meta_data*, sqlsrv_allocator<field_meta_data*>> meta_data;
+    size_t bytes;                       // memory charged to the cache for this entry
+
+    sqlsrv_stmt_cache_entry( void ) : handle( SQL_NULL_HANDLE ), bytes( 0 )
+    {
+    }
+};
+
+struct sqlsrv_stmt_cache {
+
+    HashTable entries;                  // sqlsrv_stmt_cache_entry by key, least recently used first
+    size_t bytes;                       // memory used by all the entries
+    zend_long hits;
+    zend_long misses;
+    zend_long evictions;                // entries removed to stay within the limits of the cache
+    zend_long invalidations;            // handles dropped because the schema of their statement changed
+};
+
+bool core_sqlsrv_stmt_cache_lookup( _Inout_ sqlsrv_stmt* stmt, _In_reads_(wsql_len) const SQLWCHAR* wsql, _In_ unsigned int wsql_len );
+void core_sqlsrv_stmt_cache_release( _Inout_ sqlsrv_stmt* stmt );
+void core_sqlsrv_stmt_cache_check_meta_data( _Inout_ sqlsrv_stmt* stmt );
+void core_sqlsrv_stmt_cache_check_error( _Inout_ sqlsrv_stmt* stmt );
+void core_sqlsrv_stmt_cache_free( _Inout_ sqlsrv_conn* conn );
+void core_sqlsrv_get_stmt_cache_info( _Inout_ sqlsrv_conn* conn, _Out_ zval* info );
+
+// *** slow query log ***
+// Executions that take longer than a threshold, from the start of the execution until the last row of its first result
+// set is fetched, are sampled to a log file as lines of JSON.  Each line has the fingerprint of the query, the query with
+// its literals replaced by ?, the execution and fetch times, the rows and bytes fetched and the types of the parameters.
+// The lines are queued by the requests and written by a thread of the process so that the requests never wait on the
+// disk, and the file is renamed to <log>.1 when it would grow past its maximum size.
+
+struct sqlsrv_slow_query {
+
+    std::string sql;                                    // the query prepared or executed
+    std::string param_types;                            // PHP types of the parameters as a JSON array
+    std::chrono::steady_clock::time_point fetch_start;  // when the execution completed
+    zend_long execute_time;                             // in microseconds
+    zend_long rows;
+    zend_long bytes;
+    bool pending;                                       // an execution completed and was not sampled yet
+
+    sqlsrv_slow_query( void ) : execute_time( 0 ), rows( 0 ), bytes( 0 ), pending( false )
+    {
+    }
+};
+
+void core_sqlsrv_slow_query_init( _In_opt_z_ const char* path, _In_ zend_long threshold_ms, _In_ double sample_rate, _In_ zend_long max_kb_size );
+void core_sqlsrv_slow_query_end( _Inout_ sqlsrv_stmt* stmt );
+void core_sqlsrv_slow_query_shutdown( void );
+
 //*********************************************************************************************************************************
 // Result Set
 //*********************************************************************************************************************************
@@ -1823,6 +2139,9 @@ struct sqlsrv_odbc_result_set : public sqlsrv_result_set {
     virtual sqlsrv_error* get_diag_rec( _In_ SQLSMALLINT record_number );
     virtual SQLLEN row_count( void );
 
+    // the columns whose record in the application row descriptor is set to read them as SQL_NUMERIC_STRUCTs
+    std::vector<bool> numeric_columns;
+
  private:
     // prevent invalid instantiations and assignments
     sqlsrv_odbc_result_set( void );
@@ -1835,9 +2154,11 @@ struct sqlsrv_buffered_result_set : public sqlsrv_result_set {
     struct meta_data {
         SQLSMALLINT type;
         SQLSMALLINT c_type;     // convenience
-        SQLULEN offset;         // in bytes
+        SQLULEN offset;         // in bytes, of the field within a bound row
         SQLULEN length;         // in bytes
         SQLSMALLINT scale;
+        SQLULEN column_offset;  // in bytes, of the column's NULL flags and values within a chunk
+        SQLULEN width;          // in bytes, of each value in the column's vector
 
         static const SQLULEN SIZE_UNKNOWN = 0;
     };
@@ -1846,6 +2167,14 @@ struct sqlsrv_buffered_result_set : public sqlsrv_result_set {
     #define INI_BUFFERED_QUERY_LIMIT_DEFAULT    "10240" // default used by the php.ini settings
     static const zend_long BUFFERED_QUERY_LIMIT_DEFAULT = 10240;   // measured in KB
     static const zend_long BUFFERED_QUERY_LIMIT_INVALID = 0;
+    // number of spilled chunks read back into memory at a time
+    static const SQLULEN SPILL_RESIDENT_CHUNKS = 4;
+
+    // location of a spilled chunk in the temporary file
+    struct spill_page {
+        zend_off_t offset;      // in bytes, from the start of the file
+        SQLULEN size;           // in bytes, of the chunk followed by its variable length data
+    };
 
     explicit sqlsrv_buffered_result_set( _Inout_ sqlsrv_stmt* odbc );
     virtual ~sqlsrv_buffered_result_set( void );
@@ -1872,15 +2201,39 @@ struct sqlsrv_buffered_result_set : public sqlsrv_result_set {
         return meta[i];
     }
 
- private:
-    // prevent invalid instantiations and assignments
-    sqlsrv_buffered_result_set( void );
-    sqlsrv_buffered_result_set( sqlsrv_buffered_result_set& );
-    sqlsrv_buffered_result_set& operator=( sqlsrv_buffered_result_set& );
+ protected:
+    // describes the columns without reading any rows when buffer_rows is false
+    sqlsrv_buffered_result_set( _Inout_ sqlsrv_stmt* odbc, _In_ bool buffer_rows );
+
+    // the rows are kept by column in chunks of a fixed number of rows.  Each column of a chunk has a
+    // NULL bitmap followed by a vector of fixed width values: numbers are kept in the vector and the
+    // other fields are pointers to their length prefixed data in the slabs.
+    unsigned char** chunks;             // column vectors of the rows
+    SQLULEN chunk_count;                // number of chunks allocated
+    SQLULEN chunk_size;                 // size of a chunk in bytes
+    unsigned char** blocks;             // slabs of variable length data and the buffers of LOB fields
+    SQLULEN block_count;                // number of slabs and LOB buffers allocated
+    unsigned char* slab_next;           // first free byte in the current slab
+    unsigned char* slab_end;            // end of the current slab
+    SQLULEN slab_size;                  // size of the current slab in bytes
+    SQLLEN num_rows;                    // number of rows in the result set
+
+    // when spilling is enabled and the rows outgrow the buffered query limit, each chunk that follows is
+    // written to a temporary file with its variable length data once it's filled.  Only a few spilled
+    // chunks are read back into memory at a time.
+    bool spill;                         // spilling to a temporary file is enabled for the statement
+    int spill_fd;                       // temporary file holding the spilled chunks, -1 until spilling begins
+    zend_string* spill_path;            // path of the temporary file
+    zend_off_t spill_size;              // size of the temporary file in bytes
+    SQLULEN spill_start;                // index of the first spilled chunk
+    spill_page* pages;                  // location of each spilled chunk, starting with spill_start
+    SQLULEN block_mark;                 // slabs and LOB buffers from this index on hold the data of the chunk being spilled
+    SQLULEN resident[SPILL_RESIDENT_CHUNKS];    // spilled chunks in memory (chunk index + 1, 0 if unused)
+    SQLULEN next_resident;              // entry of resident to replace next
 
-    HashTable* cache;                   // rows of data kept in index based hash table
     SQLSMALLINT col_count;            // number of columns in the current result set
     sqlsrv_malloc_auto_ptr<meta_data> meta;  // metadata for fields in the cache
+    SQLULEN row_size;                   // size of a row buffer in bytes, including the NULL flags
     SQLLEN current;                     // 1 based, 0 means before first row
     sqlsrv_error_auto_ptr last_error;   // if an error occurred, it is kept here
     SQLUSMALLINT last_field_index;      // the last field data retrieved from
@@ -1888,6 +2241,25 @@ struct sqlsrv_buffered_result_set : public sqlsrv_result_set {
     sqlsrv_malloc_auto_ptr<SQLCHAR> temp_string;   // temp buffer to hold a converted field while in use
     SQLLEN temp_length;                 // number of bytes in the temp conversion buffer
 
+ private:
+    // prevent invalid instantiations and assignments
+    sqlsrv_buffered_result_set( void );
+    sqlsrv_buffered_result_set( sqlsrv_buffered_result_set& );
+    sqlsrv_buffered_result_set& operator=( sqlsrv_buffered_result_set& );
+
+    // free the chunks and slabs holding the rows
+    void free_rows( void );
+    // return space for a variable length field in the current slab, starting a new slab if necessary
+    unsigned char* reserve_slab( _In_ SQLULEN size );
+    // return the chunk holding the current row
+    unsigned char* current_chunk( void );
+    // create the temporary file and keep the data of the chunks that follow apart from the chunks in memory
+    void begin_spill( void );
+    // write a filled chunk and its variable length data to the temporary file and free them
+    void spill_chunk( _In_ SQLULEN chunk_index );
+    // read the chunk of the current row back from the temporary file if it was spilled
+    bool page_in( void );
+
     // string conversion functions
     SQLRETURN binary_to_wide_string( _In_ SQLSMALLINT field_index, _Out_writes_z_(*out_buffer_length) void* buffer, _In_ SQLLEN buffer_length,
                                      _Inout_ SQLLEN* out_buffer_length );
@@ -1931,8 +2303,69 @@ struct sqlsrv_buffered_result_set : public sqlsrv_result_set {
     SQLRETURN wstring_to_long( _In_ SQLSMALLINT field_index, _Out_writes_bytes_(*out_buffer_length) void* buffer, _In_ SQLLEN buffer_length,
                                _Inout_ SQLLEN* out_buffer_length );
 
+ protected:
     // utility functions for conversions
+    // return the value of a number field, or the length prefixed data of any other field, in the current row
+    virtual unsigned char* get_field( _In_ SQLSMALLINT field_index );
+    virtual bool is_null( _In_ SQLSMALLINT field_index );
+};
+
+// Block result set
+// Used for forward only result sets without LOB columns.  The columns are bound once with SQLBindCol and
+// rows are fetched a block at a time (SQL_ATTR_ROW_ARRAY_SIZE).  Each row in the block holds its NULL flags
+// followed by the fields at the offsets in the column metadata, and the fields are retrieved with the
+// buffered conversions.
+//
+// With read-ahead, a ring of blocks is allocated and a thread owned by the result set fetches the blocks that
+// follow the one being read into it (SQL_ATTR_ROW_BIND_OFFSET_PTR), so the network waits overlap the work of
+// the script.  The thread waits while the ring is full, and it stops after the last block, after an error or
+// warning, and whenever the statement handle is needed for anything else.
+
+struct sqlsrv_block_result_set : public sqlsrv_buffered_result_set {
+
+    sqlsrv_block_result_set( _Inout_ sqlsrv_stmt* odbc, _In_ SQLULEN block_size, _In_ SQLULEN read_ahead );
+    virtual ~sqlsrv_block_result_set( void );
+
+    virtual SQLRETURN fetch( _Inout_ SQLSMALLINT fetch_orientation, _Inout_opt_ SQLLEN fetch_offset );
+    virtual SQLLEN row_count( void );
+
+    // true if every column of the current result set has a fixed size and may be bound
+    static bool can_bind( _Inout_ sqlsrv_stmt* odbc );
+
+    // stop the read-ahead thread so the handle may be used by the statement.  When discard is true, the blocks
+    // fetched ahead are dropped and the rows that follow are fetched without read-ahead.  Otherwise the thread
+    // is started again by the next fetch.
+    void stop_read_ahead( _In_ bool discard );
+
+ protected:
+    virtual unsigned char* get_field( _In_ SQLSMALLINT field_index );
+    virtual bool is_null( _In_ SQLSMALLINT field_index );
+
+ private:
+    // prevent invalid instantiations and assignments
+    sqlsrv_block_result_set( void );
+    sqlsrv_block_result_set( sqlsrv_block_result_set& );
+    sqlsrv_block_result_set& operator=( sqlsrv_block_result_set& );
+
+    struct read_ahead_ring;
+
+    // unbind the columns and restore the single row fetch attributes of the statement
+    void unbind( void );
+    // return the current row of the block
     unsigned char* get_row( void );
+    // set the NULL flags of the rows of a block that was fetched
+    void prepare_block( _Inout_ unsigned char* rows, _In_ SQLULEN count );
+    // take the next block fetched by the read-ahead thread
+    SQLRETURN fetch_ahead( void );
+
+    sqlsrv_malloc_auto_ptr<unsigned char> block;    // bound rows of the current block, or the ring of blocks with read-ahead
+    SQLULEN row_stride;                 // size of a row in the block, including the indicators
+    SQLULEN ind_offset;                 // offset of the indicators of the fixed size columns within a row
+    SQLULEN block_size;                 // number of rows requested per fetch
+    SQLULEN rows_fetched;               // number of rows in the current block
+    SQLULEN block_row;                  // 0 based position of the current row within the block
+    SQLULEN block_offset;               // offset of the current block in the ring
+    read_ahead_ring* ahead;             // state shared with the read-ahead thread, NULL without read-ahead
 };
 
 //*********************************************************************************************************************************
@@ -1947,11 +2380,30 @@ struct sqlsrv_buffered_result_set : public sqlsrv_result_set {
 #define MEMCHECK_SILENT 1
 
 // utility functions shared by multiple callers across files
-bool convert_string_from_utf16_inplace( _In_ SQLSRV_ENCODING encoding, _Inout_updates_z_(len) char** string, _Inout_ SQLLEN& len);
+bool convert_string_from_utf16_inplace( _In_ SQLSRV_ENCODING encoding, _Inout_updates_z_(len) char** string, _Inout_ SQLLEN& len,
+                                        _Inout_opt_ sqlsrv_scratch_buffer* scratch = NULL );
 bool validate_string( _In_ char* string, _In_ SQLLEN& len);
 bool convert_string_from_utf16( _In_ SQLSRV_ENCODING encoding, _In_reads_bytes_(cchInLen) const SQLWCHAR* inString, _In_ SQLINTEGER cchInLen, _Inout_updates_bytes_(cchOutLen) char** outString, _Out_ SQLLEN& cchOutLen );
 SQLWCHAR* utf16_string_from_mbcs_string( _In_ SQLSRV_ENCODING php_encoding, _In_reads_bytes_(mbcs_len) const char* mbcs_string, _In_ unsigned int mbcs_len, _Out_ unsigned int* utf16_len, bool use_strict_conversion = false );
 
+// ASCII fast paths of the conversions.  ASCII characters are the same in UTF-8 and in the system code pages,
+// so they are copied from and to UTF-16 without the system converters, 8 or 16 characters at a time with SSE2.
+size_t utf16_ascii_len( _In_reads_(len) const SQLWCHAR* str, _In_ size_t len );
+size_t mbcs_ascii_len( _In_reads_(len) const char* str, _In_ size_t len );
+void ascii_from_utf16( _In_reads_(len) const SQLWCHAR* in, _In_ size_t len, _Out_writes_(len) char* out );
+void ascii_to_utf16( _In_reads_(len) const char* in, _In_ size_t len, _Out_writes_(len) SQLWCHAR* out );
+
+// Formatting of integers, and of decimal, numeric, date and datetime values read in their ODBC structures, in the
+// same form as the ODBC driver converts them to strings.  The buffers must hold the longest string of each type,
+// and the strings are not null terminated.
+const size_t MAX_INTEGER_STRING_LEN = 20;       // sign and 19 digits
+const size_t MAX_NUMERIC_STRING_LEN = 41;       // sign, the 39 digits of 128 bits and decimal point
+const size_t MAX_TIMESTAMP_STRING_LEN = 29;     // yyyy-mm-dd hh:mm:ss.fffffffff
+size_t format_integer( _In_ long long value, _Out_writes_(MAX_INTEGER_STRING_LEN) char* out );
+size_t format_numeric( _In_ const SQL_NUMERIC_STRUCT& value, _Out_writes_(MAX_NUMERIC_STRING_LEN) char* out );
+size_t format_timestamp( _In_ const SQL_TIMESTAMP_STRUCT& value, _In_ SQLSMALLINT scale, _In_ bool date_only,
+                         _Out_writes_(MAX_TIMESTAMP_STRING_LEN) char* out );
+
 void convert_datetime_string_to_zval(_Inout_ sqlsrv_stmt* stmt, _In_opt_ char* input, _In_ SQLLEN length, _Inout_ zval& out_zval);
 
 //*********************************************************************************************************************************
@@ -2025,6 +2477,19 @@ enum SQLSRV_ERROR_CODES {
     SQLSRV_ERROR_TVP_ROW_NOT_ARRAY,
     SQLSRV_ERROR_TVP_ROWS_UNEXPECTED_SIZE,
     SQLSRV_ERROR_TVP_INPUT_PARAM_ONLY,
+    SQLSRV_ERROR_INVALID_FETCH_BLOCK_SIZE,
+    SQLSRV_ERROR_INVALID_BATCH_SIZE,
+    SQLSRV_ERROR_BATCH_NO_PARAMS,
+    SQLSRV_ERROR_BATCH_INVALID_ROW,
+    SQLSRV_ERROR_BATCH_INVALID_VALUE,
+    SQLSRV_ERROR_BUFFER_SPILL_FAILED,
+    SQLSRV_ERROR_INVALID_STMT_CACHE_OPTION,
+    SQLSRV_ERROR_INVALID_STREAM_CHUNK_SIZE,
+    SQLSRV_ERROR_ASYNC_EXECUTING,
+    SQLSRV_ERROR_ASYNC_STREAM_PARAMS,
+    SQLSRV_ERROR_INVALID_READ_AHEAD,
+    SQLSRV_ERROR_QUERY_BATCH_EMPTY,
+    SQLSRV_ERROR_INVALID_BATCH_QUERY,
 
     // Driver specific error codes starts from here.
     SQLSRV_ERROR_DRIVER_SPECIFIC = 1000,
@@ -2256,6 +2721,16 @@ namespace core {
         }
     }
 
+    inline void SQLBindCol( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT column_number, _In_ SQLSMALLINT target_type,
+                            _Inout_opt_ SQLPOINTER target_value, _In_ SQLLEN buffer_length, _Inout_opt_ SQLLEN* str_len_or_ind )
+    {
+        SQLRETURN r = ::SQLBindCol( stmt->handle(), column_number, target_type, target_value, buffer_length, str_len_or_ind );
+
+        CHECK_SQL_ERROR_OR_WARNING( r, stmt, NULL ) {
+            throw CoreException();
+        }
+    }
+
     inline void SQLBindParameter( _Inout_ sqlsrv_stmt*          stmt,
                                   _In_ SQLUSMALLINT             ParameterNumber,
                                   _In_ SQLSMALLINT              InputOutputType,
@@ -2498,6 +2973,14 @@ namespace core {
     {
         SQLRETURN r;
         SQLSMALLINT num_cols;
+
+        // the columns of a statement whose prepare is deferred are only known once it is prepared or executed
+        if( stmt->deferred_sql && !stmt->deferred_executed ) {
+            core_sqlsrv_prepare_deferred( stmt );
+        }
+
+        // the handle is used, so a thread reading ahead is paused and the blocks it fetched are kept
+        core_sqlsrv_stop_read_ahead( stmt, false );
         r = ::SQLNumResultCols( stmt->handle(), &num_cols );
 
         CHECK_SQL_ERROR_OR_WARNING( r, stmt, NULL ) {
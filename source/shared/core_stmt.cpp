@@ -19,9 +19,15 @@
 
 #include "core_sqlsrv.h"
 
+#include <condition_variable>
+#include <cstdio>
+#include <mutex>
 #include <sstream>
+#include <thread>
 #include <vector>
 
+#include "ext/standard/sha1.h"
+
 namespace {
 
 // certain drivers using this layer will call for repeated or out of order field retrievals.  To allow this, we cache the
@@ -64,8 +70,67 @@ struct col_cache {
     }
 };
 
+// Describes how one parameter is bound by core_sqlsrv_execute_batch.  The types are chosen from the values
+// given for the parameter in all the rows, and the offsets locate its parameter array and length/indicator
+// array in the batch buffer.
+struct batch_column {
+    SQLSMALLINT c_type;
+    SQLSMALLINT sql_type;
+    SQLULEN column_size;
+    SQLLEN width;                   // size in bytes of each element of the parameter array
+    size_t max_len;                 // length in bytes of the longest string value
+    size_t values_offset;
+    size_t indicators_offset;
+    bool has_string;
+    bool has_double;
+    bool has_long;
+};
+
 const int INITIAL_FIELD_STRING_LEN = 2048;          // base allocation size when retrieving a string field
 
+// SQL Server errors raised when the objects used by a prepared statement changed since it was prepared:
+// invalid column name, invalid object name, column count mismatch, definition of object changed, and
+// table schema changed after a cursor was declared
+const SQLINTEGER STMT_CACHE_SCHEMA_ERRORS[] = { 207, 208, 213, 2801, 16943 };
+
+// length of the attributes at the start of the key of a statement in the statement cache
+const size_t STMT_CACHE_KEY_ATTRS_LEN = sizeof( SQLULEN ) + sizeof( unsigned long ) + sizeof( SQLSRV_ENCODING );
+
+// The slow query log of the process.  The settings are set by MINIT only, and the queue of lines is shared by the
+// requests and the thread that writes them.
+struct slow_query_log {
+
+    std::string path;                   // empty when the log is off
+    zend_long threshold;                // in microseconds
+    double sample_rate;                 // share of the slow executions written to the log
+    long long max_size;                 // in bytes, 0 to never rotate the log
+    std::atomic<long long> slow;        // slow executions seen so far, which decide the ones sampled
+    std::mutex lock;
+    std::condition_variable wake;
+    std::deque<std::string> lines;      // lines waiting to be written
+    std::thread writer;
+    bool stopping;
+
+    slow_query_log( void ) : threshold( 0 ), sample_rate( 1.0 ), max_size( 0 ), slow( 0 ), stopping( false )
+    {
+    }
+};
+
+slow_query_log slow_queries;
+
+// lines are dropped rather than queued once this many are waiting, if the disk can't keep up
+const size_t SLOW_QUERY_QUEUE_MAX = 10000;
+
+// length of the part of the SHA-1 digest of a normalized query used as its fingerprint
+const size_t SLOW_QUERY_FINGERPRINT_LEN = 16;
+
+// upper bound of the length of an integer or float converted to a string when it is sent in a string column of a batch
+const size_t BATCH_NUMBER_STRING_LEN = 64;
+
+// how often and for how long a canceled asynchronous execution is polled until the driver acknowledges the cancel
+const std::chrono::milliseconds ASYNC_CANCEL_POLL_INTERVAL( 1 );
+const std::chrono::seconds ASYNC_CANCEL_WAIT_MAX( 30 );
+
 const char  DECIMAL_POINT = '.';
 const int   SQL_SERVER_DECIMAL_MAXIMUM_PRECISION = 38;            // 38 is the maximum length of a stringified decimal number
 
@@ -100,11 +165,34 @@ size_t calc_utf8_missing( _Inout_ sqlsrv_stmt* stmt, _In_reads_(buffer_end) cons
 void core_get_field_common(_Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_index, _Inout_ sqlsrv_phptype
                            sqlsrv_php_type, _Inout_updates_bytes_(*field_len) void*& field_value, _Inout_ SQLLEN* field_len);
 void col_cache_dtor( _Inout_ zval* data_z );
+void copy_batch_value( _Inout_ sqlsrv_stmt* stmt, _In_ batch_column const& column, _In_ SQLSMALLINT param_num, _In_ SQLSRV_ENCODING encoding,
+                       _Inout_ char* buffer, _In_ SQLULEN row, _In_ zval* value_z );
+void derive_batch_column_types( _Inout_ batch_column& column, _In_ SQLSRV_ENCODING encoding );
+void execute_batch_rows( _Inout_ sqlsrv_stmt* stmt, _In_ SQLULEN num_rows, _In_reads_(num_rows) SQLUSMALLINT const* statuses,
+                         _In_ SQLULEN const& processed, _Inout_ zval* status_z );
+void reset_batch_params( _Inout_ sqlsrv_stmt* stmt );
+void query_to_utf16( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql, _In_ int sql_len,
+                     _Inout_ sqlsrv_malloc_auto_ptr<SQLWCHAR>& wsql_string );
+void execute_completed( _Inout_ sqlsrv_stmt* stmt, _In_ SQLRETURN r );
+void execute_failed( _Inout_ sqlsrv_stmt* stmt );
+void async_completed( _Inout_ sqlsrv_stmt* stmt, _In_ SQLRETURN r );
+void stmt_cache_key_attrs( _In_ sqlsrv_stmt* stmt, _Out_writes_bytes_(STMT_CACHE_KEY_ATTRS_LEN) char* attrs );
+zend_string* stmt_cache_key( _In_ sqlsrv_stmt* stmt, _In_reads_(wsql_len) const SQLWCHAR* wsql, _In_ unsigned int wsql_len );
+bool stmt_cache_key_matches( _In_ sqlsrv_stmt* stmt );
+void stmt_cache_entry_dtor( _Inout_ zval* data_z );
+void stmt_cache_evict( _Inout_ sqlsrv_conn* conn );
+void slow_query_started( _Inout_ sqlsrv_stmt* stmt, _In_ std::chrono::steady_clock::time_point execute_start );
+void slow_query_fingerprint( _In_ const std::string& sql, _Out_ std::string& normalized );
+void slow_query_literal( _Inout_ std::string& normalized );
+void slow_query_json_string( _Inout_ std::string& line, _In_ const std::string& value );
+void slow_query_write( void );
 void field_cache_dtor( _Inout_ zval* data_z );
 int round_up_decimal_numbers(_Inout_ char* buffer, _In_ int decimal_pos, _In_ int decimals_places, _In_ int offset, _In_ int lastpos);
 void format_decimal_numbers(_In_ SQLSMALLINT decimals_places, _In_ SQLSMALLINT field_scale, _Inout_updates_bytes_(*field_len) char*& field_value, _Inout_ SQLLEN* field_len);
 void get_field_as_string( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_index, _Inout_ sqlsrv_phptype sqlsrv_php_type,
                           _Inout_updates_bytes_(*field_len) void*& field_value, _Inout_ SQLLEN* field_len );
+bool get_typed_field_as_string( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_index, _In_ SQLSMALLINT sql_type,
+                                _Inout_updates_bytes_(*field_len) void*& field_value, _Inout_ SQLLEN* field_len );
 stmt_option const* get_stmt_option( sqlsrv_conn const* conn, _In_ zend_ulong key, _In_ const stmt_option stmt_opts[] );
 bool is_valid_sqlsrv_phptype( _In_ sqlsrv_phptype type );
 void adjustDecimalPrecision(_Inout_ zval* param_z, _In_ SQLSMALLINT decimal_digits);
@@ -131,8 +219,20 @@ sqlsrv_stmt::sqlsrv_stmt( _In_ sqlsrv_conn* c, _In_ SQLHANDLE handle, _In_ error
     format_decimals(false),       // no formatting needed
     decimal_places(NO_CHANGE_DECIMAL_PLACES),     // the default is no formatting to resultset required
     data_classification(false),
+    fetch_block_size( FETCH_BLOCK_SIZE_DEFAULT ),
+    read_ahead( 0 ),
     buffered_query_limit( sqlsrv_buffered_result_set::BUFFERED_QUERY_LIMIT_INVALID ),
-    send_streams_at_exec( true )
+    buffered_query_spill( false ),
+    stream_chunk_size( 0 ),
+    send_streams_at_exec( true ),
+    cache_key( NULL ),
+    cache_meta_data( true ),
+    meta_data_from_cache( false ),
+    defer_prepare( false ),
+    deferred_sql_len( 0 ),
+    deferred_executed( false ),
+    async_executing( false ),
+    slow_query( NULL )
 {
     ZVAL_UNDEF( &active_stream );
 
@@ -148,6 +248,16 @@ sqlsrv_stmt::sqlsrv_stmt( _In_ sqlsrv_conn* c, _In_ SQLHANDLE handle, _In_ error
 // desctructor for sqlsrv statement.
 sqlsrv_stmt::~sqlsrv_stmt( void )
 {
+    // the handle can't be freed or reused while it is still executing
+    core_sqlsrv_cancel_async( this );
+
+    if( slow_query ) {
+        core_sqlsrv_slow_query_end( this );
+        slow_query->~sqlsrv_slow_query();
+        sqlsrv_free( slow_query );
+        slow_query = NULL;
+    }
+
     if( Z_TYPE( active_stream ) != IS_UNDEF ) {
         close_active_stream( this );
     }
@@ -162,6 +272,15 @@ sqlsrv_stmt::~sqlsrv_stmt( void )
     // delete sensivity data
     clean_up_sensitivity_metadata();
 
+    // keep the prepared handle and its metadata for the next statement with the same text
+    if( cache_key ) {
+        if( conn ) {
+            core_sqlsrv_stmt_cache_release( this );
+        }
+        zend_string_release( cache_key );
+        cache_key = NULL;
+    }
+
     // clean up metadata
     clean_up_results_metadata();
 
@@ -220,6 +339,13 @@ void sqlsrv_stmt::new_result_set( void )
         current_results = result.get();
         result.transferred();
     }
+    else if( cursor_type == SQL_CURSOR_FORWARD_ONLY && fetch_block_size > 1 && sqlsrv_block_result_set::can_bind( this )) {
+        sqlsrv_malloc_auto_ptr<sqlsrv_block_result_set> result;
+        result = reinterpret_cast<sqlsrv_block_result_set*> ( sqlsrv_malloc( sizeof( sqlsrv_block_result_set ) ) );
+        new ( result.get() ) sqlsrv_block_result_set( this, fetch_block_size, read_ahead );
+        current_results = result.get();
+        result.transferred();
+    }
     else {
         current_results = new (sqlsrv_malloc( sizeof( sqlsrv_odbc_result_set ))) sqlsrv_odbc_result_set( this );
     }
@@ -246,6 +372,10 @@ void sqlsrv_stmt::clean_up_results_metadata()
     std::for_each(current_meta_data.begin(), current_meta_data.end(), meta_data_free);
     current_meta_data.clear();
 
+    // metadata described from now on belongs to a later result set
+    cache_meta_data = false;
+    meta_data_from_cache = false;
+
     column_count = ACTIVE_NUM_COLS_INVALID;
     row_count = ACTIVE_NUM_ROWS_INVALID;
 }
@@ -286,6 +416,7 @@ sqlsrv_stmt* core_sqlsrv_create_stmt( _Inout_ sqlsrv_conn* conn, _In_ driver_stm
         stmt = stmt_factory( conn, stmt_h, err, driver );
 
         stmt->conn = conn;
+        stmt->defer_prepare = conn->defer_prepare;
 
         // handle has been set in the constructor of ss_sqlsrv_stmt, so we set it to NULL to prevent a double free
         // in the catch block below.
@@ -320,6 +451,10 @@ sqlsrv_stmt* core_sqlsrv_create_stmt( _Inout_ sqlsrv_conn* conn, _In_ driver_stm
         // In any case, set query timeout using the latest value
         stmt->set_query_timeout();
 
+        if( !slow_queries.path.empty() ) {
+            stmt->slow_query = new ( sqlsrv_malloc( sizeof( sqlsrv_slow_query ))) sqlsrv_slow_query();
+        }
+
         return_stmt = stmt;
         stmt.transferred();
     }
@@ -469,66 +604,500 @@ void core_sqlsrv_bind_param( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT param_
 
 SQLRETURN core_sqlsrv_execute( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql, _In_ int sql_len )
 {
+    sqlsrv_trace_span span( SQLSRV_TRACE_EXECUTE );
     SQLRETURN r = SQL_ERROR;
 
     try {
 
+    CHECK_CUSTOM_ERROR( stmt->async_executing, stmt, SQLSRV_ERROR_ASYNC_EXECUTING ) {
+        throw core::CoreException();
+    }
+
     // close the stream to release the resource
     close_active_stream( stmt );
+    core_sqlsrv_stop_read_ahead( stmt, true );
 
+    std::chrono::steady_clock::time_point execute_start;
+    if( stmt->slow_query ) {
+        core_sqlsrv_slow_query_end( stmt );
+        if( sql ) {
+            stmt->slow_query->sql.assign( sql, sql_len );
+        }
+        execute_start = std::chrono::steady_clock::now();
+    }
+
+    core_sqlsrv_trace_count( SQLSRV_TRACE_ROUND_TRIPS );
     if( sql ) {
 
         sqlsrv_malloc_auto_ptr<SQLWCHAR> wsql_string;
-        unsigned int wsql_len = 0;
-        if( sql_len == 0 || ( sql[0] == '\0' && sql_len == 1 )) {
-            wsql_string = reinterpret_cast<SQLWCHAR*>( sqlsrv_malloc( sizeof( SQLWCHAR )));
-            wsql_string[0] = L'\0';
-            wsql_len = 0;
-        }
-        else {
-            SQLSRV_ENCODING encoding = (( stmt->encoding() == SQLSRV_ENCODING_DEFAULT ) ? stmt->conn->encoding() : stmt->encoding() );
-            wsql_string = utf16_string_from_mbcs_string( encoding, reinterpret_cast<const char*>( sql ),
-                                                         sql_len, &wsql_len );
-            CHECK_CUSTOM_ERROR( wsql_string == 0, stmt, SQLSRV_ERROR_QUERY_STRING_ENCODING_TRANSLATE,
-                                get_last_error_message(), NULL) {
-                throw core::CoreException();
-            }
-        }
+        query_to_utf16( stmt, sql, sql_len, wsql_string );
         r = core::SQLExecDirectW( stmt, wsql_string );
     }
+    else if( stmt->deferred_sql && !stmt->deferred_executed ) {
+
+        // the first execution of a statement whose prepare is deferred is sent directly with its parameters, which
+        // the ODBC driver sends as a call to sp_executesql.  The flag is set first so the results aren't described
+        // by preparing the statement.
+        stmt->deferred_executed = true;
+        ++stmt->conn->direct_executes;
+        r = core::SQLExecDirectW( stmt, stmt->deferred_sql );
+    }
     else {
+        core_sqlsrv_prepare_deferred( stmt );
+        ++stmt->conn->prepared_executes;
         r = core::SQLExecute( stmt );
     }
 
-    // if data is needed (streams were bound) and they should be sent at execute time, then do so now
-    if( r == SQL_NEED_DATA && stmt->send_streams_at_exec ) {
-        core_sqlsrv_send_stream_packet(stmt, true);
+    execute_completed( stmt, r );
+
+    if( stmt->slow_query ) {
+        slow_query_started( stmt, execute_start );
     }
 
-    stmt->new_result_set();
-    stmt->executed = true;
+    return r;
+    }
+    catch( core::CoreException& e ) {
 
-    // if all the data has been sent and no data was returned then finalize the output parameters
-    if( stmt->send_streams_at_exec && ( r == SQL_NO_DATA || !core_sqlsrv_has_any_result( stmt ))) {
-        stmt->params_container.finalize_output_parameters();
+        execute_failed( stmt );
+        throw e;
     }
+}
 
-    return r;
+// core_sqlsrv_execute_async
+// Starts executing the statement in the ODBC asynchronous polling mode (SQL_ATTR_ASYNC_ENABLE) and returns
+// without waiting for the server.  core_sqlsrv_poll is called until the execution completes, so several
+// statements, on different connections or on one connection with MARS, may run at the same time.  Streams
+// are not supported as parameters since their data would be sent at execution.
+// Parameters:
+// stmt    - the core sqlsrv_stmt structure that contains the ODBC handle
+// sql     - the query to execute directly, or NULL to execute the statement previously prepared
+// sql_len - length of the query
+// Return:
+// SQL_STILL_EXECUTING if the execution has not completed, otherwise the same as core_sqlsrv_execute
+
+SQLRETURN core_sqlsrv_execute_async( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql, _In_ int sql_len )
+{
+    SQLRETURN r = SQL_ERROR;
+
+    try {
+
+        CHECK_CUSTOM_ERROR( stmt->async_executing, stmt, SQLSRV_ERROR_ASYNC_EXECUTING ) {
+            throw core::CoreException();
+        }
+
+        std::map<SQLUSMALLINT, sqlsrv_param*>::iterator it;
+        for( it = stmt->params_container.input_params.begin(); it != stmt->params_container.input_params.end(); ++it ) {
+            CHECK_CUSTOM_ERROR( it->second->param_php_type == SQLSRV_PHPTYPE_STREAM, stmt, SQLSRV_ERROR_ASYNC_STREAM_PARAMS ) {
+                throw core::CoreException();
+            }
+        }
+
+        // close the stream to release the resource
+        close_active_stream( stmt );
+        core_sqlsrv_stop_read_ahead( stmt, true );
+
+        // the results of a previous execution are gone, and the new ones are set up when the execution completes
+        stmt->executed = false;
+
+        // the query is kept by the statement since polling calls SQLExecDirect again with the same arguments
+        if( sql ) {
+            query_to_utf16( stmt, sql, sql_len, stmt->async_sql );
+        }
+        else {
+            core_sqlsrv_prepare_deferred( stmt );
+            ++stmt->conn->prepared_executes;
+        }
+
+        core::SQLSetStmtAttr( stmt, SQL_ATTR_ASYNC_ENABLE, reinterpret_cast<SQLPOINTER>( SQL_ASYNC_ENABLE_ON ), SQL_IS_UINTEGER );
+
+        core_sqlsrv_trace_count( SQLSRV_TRACE_ROUND_TRIPS );
+        if( stmt->async_sql ) {
+            r = ::SQLExecDirectW( stmt->handle(), stmt->async_sql, SQL_NTS );
+        }
+        else {
+            r = ::SQLExecute( stmt->handle() );
+        }
+
+        if( r == SQL_STILL_EXECUTING ) {
+            stmt->async_executing = true;
+            return r;
+        }
+
+        async_completed( stmt, r );
+
+        return r;
     }
     catch( core::CoreException& e ) {
 
-        // if the statement executed but failed in a subsequent operation before returning,
-        // we need to remove all the parameters and cancel the statement
-        stmt->params_container.clean_up_param_data();
-        if( stmt->executed ) {
-            SQLCancel( stmt->handle() );
-            // stmt->executed = false; should this be reset if something fails?
+        execute_failed( stmt );
+        throw e;
+    }
+}
+
+// core_sqlsrv_poll
+// Checks whether the execution started by core_sqlsrv_execute_async has completed.  Once it has, the statement
+// returns to the synchronous mode and its results are read as if it was executed by core_sqlsrv_execute.
+// Parameters:
+// stmt - the core sqlsrv_stmt structure that contains the ODBC handle
+// Return:
+// SQL_STILL_EXECUTING if the execution has not completed, otherwise the same as core_sqlsrv_execute
+
+SQLRETURN core_sqlsrv_poll( _Inout_ sqlsrv_stmt* stmt )
+{
+    SQLSRV_ASSERT( stmt->async_executing, "core_sqlsrv_poll: the statement is not executing asynchronously" );
+
+    SQLRETURN r = SQL_ERROR;
+
+    try {
+
+        if( stmt->async_sql ) {
+            r = ::SQLExecDirectW( stmt->handle(), stmt->async_sql, SQL_NTS );
+        }
+        else {
+            r = ::SQLExecute( stmt->handle() );
         }
 
+        if( r == SQL_STILL_EXECUTING ) {
+            return r;
+        }
+
+        async_completed( stmt, r );
+
+        return r;
+    }
+    catch( core::CoreException& e ) {
+
+        execute_failed( stmt );
         throw e;
     }
 }
 
+// core_sqlsrv_cancel_async
+// Cancels an execution started by core_sqlsrv_execute_async that has not completed, and waits for the
+// driver to acknowledge it so that the handle may be freed or used again.  The driver is polled every
+// ASYNC_CANCEL_POLL_INTERVAL for at most ASYNC_CANCEL_WAIT_MAX, after which the execution is abandoned.
+// No errors are returned.
+// Parameters:
+// stmt - the core sqlsrv_stmt structure that contains the ODBC handle
+
+void core_sqlsrv_cancel_async( _Inout_ sqlsrv_stmt* stmt )
+{
+    if( !stmt->async_executing ) {
+        return;
+    }
+
+    ::SQLCancel( stmt->handle() );
+
+    // the canceled function returns an error (HY008) when it is called again
+    std::chrono::steady_clock::time_point deadline = std::chrono::steady_clock::now() + ASYNC_CANCEL_WAIT_MAX;
+    SQLRETURN r = SQL_STILL_EXECUTING;
+    while( true ) {
+        if( stmt->async_sql ) {
+            r = ::SQLExecDirectW( stmt->handle(), stmt->async_sql, SQL_NTS );
+        }
+        else {
+            r = ::SQLExecute( stmt->handle() );
+        }
+        if( r != SQL_STILL_EXECUTING || std::chrono::steady_clock::now() >= deadline ) {
+            break;
+        }
+        std::this_thread::sleep_for( ASYNC_CANCEL_POLL_INTERVAL );
+    }
+
+    ::SQLSetStmtAttr( stmt->handle(), SQL_ATTR_ASYNC_ENABLE, reinterpret_cast<SQLPOINTER>( SQL_ASYNC_ENABLE_OFF ), SQL_IS_UINTEGER );
+    stmt->async_executing = false;
+    stmt->async_sql.reset();
+}
+
+// core_sqlsrv_stop_read_ahead
+// Stops the thread reading blocks ahead of the current result set, if there is one, so the handle may be used
+// by the calling thread.  The thread is started again by the next fetch unless the blocks read ahead are
+// discarded, which is done before the result set is replaced or canceled.
+// Parameters:
+// stmt    - the core sqlsrv_stmt structure that contains the ODBC handle
+// discard - true to drop the blocks read ahead and fetch the rest of the result set without the thread
+
+void core_sqlsrv_stop_read_ahead( _Inout_ sqlsrv_stmt* stmt, _In_ bool discard )
+{
+    sqlsrv_block_result_set* results = dynamic_cast<sqlsrv_block_result_set*>( stmt->current_results );
+    if( results != NULL ) {
+        results->stop_read_ahead( discard );
+    }
+}
+
+
+// core_sqlsrv_execute_batch
+// Executes the statement previously prepared once for each row of parameter values.  The values are bound
+// as column-wise parameter arrays and sent batch_size rows at a time using SQL_ATTR_PARAMSET_SIZE, so each
+// batch is a single round trip to the server instead of one per row.
+// Parameters:
+// stmt       - the core sqlsrv_stmt structure that contains the ODBC handle
+// rows       - array of rows, each an array with a value for each parameter of the statement
+// batch_size - the maximum number of rows sent with each execution
+// status_z   - initialized to an array that receives true or false for each row, depending on whether the row succeeded
+// Return:
+// Nothing, exception thrown if an error occurs.  Errors for individual rows are reported as warnings.
+
+void core_sqlsrv_execute_batch( _Inout_ sqlsrv_stmt* stmt, _In_ HashTable* rows, _In_ zend_long batch_size, _Out_ zval* status_z )
+{
+    array_init( status_z );
+
+    try {
+
+    CHECK_CUSTOM_ERROR( stmt->async_executing, stmt, SQLSRV_ERROR_ASYNC_EXECUTING ) {
+        throw core::CoreException();
+    }
+
+    CHECK_CUSTOM_ERROR( batch_size <= 0 || static_cast<zend_ulong>( batch_size ) > EXECUTE_BATCH_SIZE_MAX, stmt, SQLSRV_ERROR_INVALID_BATCH_SIZE,
+                        static_cast<int>( EXECUTE_BATCH_SIZE_MAX ), NULL ) {
+        throw core::CoreException();
+    }
+
+    // close the stream to release the resource
+    close_active_stream( stmt );
+    core_sqlsrv_stop_read_ahead( stmt, true );
+
+    // the rows are sent with SQLExecute, so a statement whose prepare is deferred is prepared now
+    core_sqlsrv_prepare_deferred( stmt );
+
+    SQLSMALLINT num_params = 0;
+    core::SQLNumParams( stmt, &num_params );
+    CHECK_CUSTOM_ERROR( num_params == 0, stmt, SQLSRV_ERROR_BATCH_NO_PARAMS ) {
+        throw core::CoreException();
+    }
+
+    SQLULEN num_rows = zend_hash_num_elements( rows );
+    if( num_rows == 0 ) {
+        return;
+    }
+
+    SQLSRV_ENCODING encoding = (( stmt->encoding() == SQLSRV_ENCODING_DEFAULT ) ? stmt->conn->encoding() : stmt->encoding() );
+
+    sqlsrv_malloc_auto_ptr<batch_column> columns;
+    columns = reinterpret_cast<batch_column*>( sqlsrv_malloc( num_params, sizeof( batch_column ), 0 ));
+    memset( columns.get(), 0, num_params * sizeof( batch_column ));
+
+    // validate the rows and find the types and lengths of the values given for each parameter
+    int row_index = 0;
+    zval* row_z = NULL;
+    ZEND_HASH_FOREACH_VAL( rows, row_z ) {
+
+        ZVAL_DEREF( row_z );
+        CHECK_CUSTOM_ERROR( Z_TYPE_P( row_z ) != IS_ARRAY || zend_hash_num_elements( Z_ARRVAL_P( row_z )) != static_cast<uint32_t>( num_params ),
+                            stmt, SQLSRV_ERROR_BATCH_INVALID_ROW, row_index, static_cast<int>( num_params ), NULL ) {
+            throw core::CoreException();
+        }
+
+        SQLSMALLINT param_num = 0;
+        zval* value_z = NULL;
+        ZEND_HASH_FOREACH_VAL( Z_ARRVAL_P( row_z ), value_z ) {
+
+            ZVAL_DEREF( value_z );
+            batch_column& column = columns.get()[param_num];
+            switch( Z_TYPE_P( value_z )) {
+                case IS_NULL:
+                    break;
+                case IS_FALSE:
+                case IS_TRUE:
+                case IS_LONG:
+                    column.has_long = true;
+                    break;
+                case IS_DOUBLE:
+                    column.has_double = true;
+                    break;
+                case IS_STRING:
+                    column.has_string = true;
+                    column.max_len = ( Z_STRLEN_P( value_z ) > column.max_len ) ? Z_STRLEN_P( value_z ) : column.max_len;
+                    break;
+                default:
+                {
+                    THROW_CORE_ERROR( stmt, SQLSRV_ERROR_BATCH_INVALID_VALUE, static_cast<int>( param_num + 1 ), row_index );
+                }
+            }
+            ++param_num;
+        } ZEND_HASH_FOREACH_END();
+
+        ++row_index;
+    } ZEND_HASH_FOREACH_END();
+
+    // lay out the parameter arrays followed by their length/indicator arrays in a single buffer.  Widths are
+    // multiples of sizeof( SQLLEN ) so every array stays aligned.
+    SQLULEN row_width = 0;
+    for( SQLSMALLINT i = 0; i < num_params; ++i ) {
+
+        derive_batch_column_types( columns.get()[i], encoding );
+        row_width += columns.get()[i].width + sizeof( SQLLEN );
+    }
+
+    // keep the buffer within the client buffer limit, as the buffered result sets do
+    zend_long limit = ( stmt->buffered_query_limit > sqlsrv_buffered_result_set::BUFFERED_QUERY_LIMIT_INVALID ) ?
+        stmt->buffered_query_limit : sqlsrv_buffered_result_set::BUFFERED_QUERY_LIMIT_DEFAULT;
+    SQLULEN max_rows = static_cast<SQLULEN>( limit ) * 1024 / row_width;
+    SQLULEN batch_rows = ( num_rows < static_cast<SQLULEN>( batch_size )) ? num_rows : static_cast<SQLULEN>( batch_size );
+    if( batch_rows > max_rows ) {
+        batch_rows = ( max_rows > 0 ) ? max_rows : 1;
+    }
+
+    size_t offset = 0;
+    for( SQLSMALLINT i = 0; i < num_params; ++i ) {
+
+        batch_column& column = columns.get()[i];
+        column.values_offset = offset;
+        offset += column.width * batch_rows;
+        column.indicators_offset = offset;
+        offset += sizeof( SQLLEN ) * batch_rows;
+    }
+
+    sqlsrv_malloc_auto_ptr<char> buffer;
+    buffer = static_cast<char*>( sqlsrv_malloc( batch_rows, row_width, 0 ));
+    sqlsrv_malloc_auto_ptr<SQLUSMALLINT> statuses;
+    statuses = static_cast<SQLUSMALLINT*>( sqlsrv_malloc( batch_rows, sizeof( SQLUSMALLINT ), 0 ));
+    SQLULEN processed = 0;
+
+    try {
+
+        // replace the parameters bound for a single execution with the parameter arrays
+        ::SQLFreeStmt( stmt->handle(), SQL_RESET_PARAMS );
+        core::SQLSetStmtAttr( stmt, SQL_ATTR_PARAM_BIND_TYPE, reinterpret_cast<SQLPOINTER>( static_cast<SQLULEN>( SQL_PARAM_BIND_BY_COLUMN )), SQL_IS_UINTEGER );
+        core::SQLSetStmtAttr( stmt, SQL_ATTR_PARAM_STATUS_PTR, statuses.get(), SQL_IS_POINTER );
+        core::SQLSetStmtAttr( stmt, SQL_ATTR_PARAMS_PROCESSED_PTR, &processed, SQL_IS_POINTER );
+
+        for( SQLSMALLINT i = 0; i < num_params; ++i ) {
+
+            batch_column const& column = columns.get()[i];
+            core::SQLBindParameter( stmt, i + 1, SQL_PARAM_INPUT, column.c_type, column.sql_type, column.column_size, 0,
+                                    buffer.get() + column.values_offset, column.width,
+                                    reinterpret_cast<SQLLEN*>( buffer.get() + column.indicators_offset ));
+        }
+
+        SQLULEN row = 0;
+        ZEND_HASH_FOREACH_VAL( rows, row_z ) {
+
+            ZVAL_DEREF( row_z );
+            SQLSMALLINT param_num = 0;
+            zval* value_z = NULL;
+            ZEND_HASH_FOREACH_VAL( Z_ARRVAL_P( row_z ), value_z ) {
+
+                ZVAL_DEREF( value_z );
+                copy_batch_value( stmt, columns.get()[param_num], param_num, encoding, buffer.get(), row, value_z );
+                ++param_num;
+            } ZEND_HASH_FOREACH_END();
+
+            if( ++row == batch_rows ) {
+                execute_batch_rows( stmt, row, statuses.get(), processed, status_z );
+                row = 0;
+            }
+        } ZEND_HASH_FOREACH_END();
+
+        if( row > 0 ) {
+            execute_batch_rows( stmt, row, statuses.get(), processed, status_z );
+        }
+    }
+    catch( core::CoreException& ) {
+
+        reset_batch_params( stmt );
+        throw;
+    }
+
+    reset_batch_params( stmt );
+
+    // the results of the batch were consumed, so there is nothing left to fetch until the next execution
+    stmt->executed = true;
+    stmt->past_next_result_end = true;
+    }
+    catch( core::CoreException& ) {
+
+        zval_ptr_dtor( status_z );
+        ZVAL_NULL( status_z );
+        throw;
+    }
+}
+
+
+// core_sqlsrv_build_query_batch
+// Joins the queries of a batch into the text of one statement, and their parameters into one array, so that the
+// whole batch is sent to the server in a single round trip and each query returns its own result set, read in
+// order with core_sqlsrv_next_result.  The parameters are bound by position in the order of the queries, so they
+// must be given for ? placeholders.  The semicolons and whitespace that end a query are replaced by a single
+// semicolon, so the next query starts a new statement even when it begins with a common table expression.
+// Parameters:
+// ctx      - the connection that receives the error if a query is invalid
+// queries  - the queries of the batch, each a string or an array with a string and an array of parameters
+// sql      - receives the text of the batch
+// params_z - initialized to an array that receives the parameters of every query
+// Return:
+// Nothing, exception thrown if the batch is empty or one of its queries is invalid.
+
+void core_sqlsrv_build_query_batch( _Inout_ sqlsrv_context& ctx, _In_ HashTable* queries, _Out_ std::string& sql, _Out_ zval& params_z )
+{
+    array_init( &params_z );
+
+    try {
+
+        CHECK_CUSTOM_ERROR( zend_hash_num_elements( queries ) == 0, ctx, SQLSRV_ERROR_QUERY_BATCH_EMPTY ) {
+            throw core::CoreException();
+        }
+
+        int position = 0;
+        zval* query_z = NULL;
+        ZEND_HASH_FOREACH_VAL( queries, query_z ) {
+
+            ZVAL_DEREF( query_z );
+            zval* text_z = query_z;
+            zval* query_params_z = NULL;
+
+            if( Z_TYPE_P( query_z ) == IS_ARRAY ) {
+
+                HashTable* query_ht = Z_ARRVAL_P( query_z );
+                text_z = zend_hash_index_find( query_ht, 0 );
+                query_params_z = zend_hash_index_find( query_ht, 1 );
+                if( text_z != NULL ) {
+                    ZVAL_DEREF( text_z );
+                }
+                if( query_params_z != NULL ) {
+                    ZVAL_DEREF( query_params_z );
+                }
+                // anything else in the array is most likely a parameter given outside of the parameter array
+                if( zend_hash_num_elements( query_ht ) != ( query_params_z != NULL ? 2u : 1u )) {
+                    text_z = NULL;
+                }
+            }
+
+            size_t len = ( text_z != NULL && Z_TYPE_P( text_z ) == IS_STRING ) ? Z_STRLEN_P( text_z ) : 0;
+            const char* text = ( len > 0 ) ? Z_STRVAL_P( text_z ) : NULL;
+            while( len > 0 && ( text[len - 1] == ';' || isspace( static_cast<unsigned char>( text[len - 1] )))) {
+                --len;
+            }
+
+            CHECK_CUSTOM_ERROR( len == 0 || ( query_params_z != NULL && Z_TYPE_P( query_params_z ) != IS_ARRAY ), ctx,
+                                SQLSRV_ERROR_INVALID_BATCH_QUERY, position ) {
+                throw core::CoreException();
+            }
+
+            sql.append( text, len );
+            sql.append( ";\n" );
+
+            if( query_params_z != NULL ) {
+
+                // references are kept, so output parameters are still written to the variables of the caller
+                zval* param_z = NULL;
+                ZEND_HASH_FOREACH_VAL( Z_ARRVAL_P( query_params_z ), param_z ) {
+                    Z_TRY_ADDREF_P( param_z );
+                    zend_hash_next_index_insert( Z_ARRVAL( params_z ), param_z );
+                } ZEND_HASH_FOREACH_END();
+            }
+
+            ++position;
+        } ZEND_HASH_FOREACH_END();
+    }
+    catch( core::CoreException& ) {
+
+        zval_ptr_dtor( &params_z );
+        ZVAL_NULL( &params_z );
+        throw;
+    }
+}
+
 
 // core_sqlsrv_fetch
 // Moves the cursor according to the parameters (by default, moves to the next row)
@@ -546,7 +1115,13 @@ bool core_sqlsrv_fetch( _Inout_ sqlsrv_stmt* stmt, _In_ SQLSMALLINT fetch_orient
     SQLSRV_ASSERT( fetch_orientation >= SQL_FETCH_NEXT || fetch_orientation <= SQL_FETCH_RELATIVE,
                    "core_sqlsrv_fetch: Invalid value provided for fetch_orientation parameter." );
 
+    sqlsrv_trace_span span( SQLSRV_TRACE_FETCH );
+
     try {
+        CHECK_CUSTOM_ERROR( stmt->async_executing, stmt, SQLSRV_ERROR_ASYNC_EXECUTING ) {
+            throw core::CoreException();
+        }
+
         // first check if the end of all results has been reached
         CHECK_CUSTOM_ERROR(stmt->past_next_result_end, stmt, SQLSRV_ERROR_NEXT_RESULT_PAST_END) {
             throw core::CoreException();
@@ -585,6 +1160,10 @@ bool core_sqlsrv_fetch( _Inout_ sqlsrv_stmt* stmt, _In_ SQLSMALLINT fetch_orient
         // fetch_called, this must be the first time we've called sqlsrv_fetch.
         if( stmt->cursor_type == SQL_CURSOR_FORWARD_ONLY && stmt->has_rows && !stmt->fetch_called ) {
             stmt->fetch_called = true;
+            core_sqlsrv_trace_count( SQLSRV_TRACE_ROWS );
+            if( stmt->slow_query ) {
+                ++stmt->slow_query->rows;
+            }
             return true;
         }
 
@@ -598,6 +1177,7 @@ bool core_sqlsrv_fetch( _Inout_ sqlsrv_stmt* stmt, _In_ SQLSMALLINT fetch_orient
                 stmt->past_fetch_end = true;
             }
             stmt->fetch_called = false; // reset this flag
+            core_sqlsrv_slow_query_end( stmt );
             return false;
         }
 
@@ -605,6 +1185,10 @@ bool core_sqlsrv_fetch( _Inout_ sqlsrv_stmt* stmt, _In_ SQLSMALLINT fetch_orient
         stmt->fetch_called = true;
         stmt->last_field_index = -1;
         stmt->has_rows = true;  // since we made it this far, we must have at least one row
+        core_sqlsrv_trace_count( SQLSRV_TRACE_ROWS );
+        if( stmt->slow_query ) {
+            ++stmt->slow_query->rows;
+        }
     }
     catch (core::CoreException& e) {
         throw e;
@@ -721,6 +1305,8 @@ void core_sqlsrv_sensitivity_metadata( _Inout_ sqlsrv_stmt* stmt )
             throw core::CoreException();
         }
 
+        core_sqlsrv_stop_read_ahead( stmt, false );
+
         // Reference: https://docs.microsoft.com/sql/connect/odbc/data-classification
         // To retrieve sensitivity classfication data, the first step is to retrieve the IRD(Implementation Row Descriptor) handle by
         // calling SQLGetStmtAttr with SQL_ATTR_IMP_ROW_DESC statement attribute
@@ -822,6 +1408,10 @@ void core_sqlsrv_get_field( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_i
 {
     try {
 
+        CHECK_CUSTOM_ERROR( stmt->async_executing, stmt, SQLSRV_ERROR_ASYNC_EXECUTING ) {
+            throw core::CoreException();
+        }
+
         // close the stream to release the resource
         close_active_stream(stmt);
 
@@ -906,7 +1496,16 @@ void core_sqlsrv_get_field( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_i
             *sqlsrv_php_type_out = static_cast<SQLSRV_PHPTYPE>( sqlsrv_php_type.typeinfo.type );
 
         // Retrieve the data
-        core_get_field_common( stmt, field_index, sqlsrv_php_type, field_value, field_len );
+        {
+            sqlsrv_trace_span span( SQLSRV_TRACE_GET_DATA );
+            core_get_field_common( stmt, field_index, sqlsrv_php_type, field_value, field_len );
+        }
+        if( field_value != NULL && sqlsrv_php_type.typeinfo.type != SQLSRV_PHPTYPE_STREAM ) {
+            core_sqlsrv_trace_count( SQLSRV_TRACE_BYTES_FETCHED, *field_len );
+            if( stmt->slow_query ) {
+                stmt->slow_query->bytes += *field_len;
+            }
+        }
 
         // if the user wants us to cache the field, we'll do it
         if( cache_field ) {
@@ -965,6 +1564,10 @@ void core_sqlsrv_next_result( _Inout_ sqlsrv_stmt* stmt, _In_ bool finalize_outp
 {
     try {
 
+        CHECK_CUSTOM_ERROR( stmt->async_executing, stmt, SQLSRV_ERROR_ASYNC_EXECUTING ) {
+            throw core::CoreException();
+        }
+
         // make sure that the statement has been executed.
         CHECK_CUSTOM_ERROR( !stmt->executed, stmt, SQLSRV_ERROR_STATEMENT_NOT_EXECUTED ) {
             throw core::CoreException();
@@ -975,10 +1578,12 @@ void core_sqlsrv_next_result( _Inout_ sqlsrv_stmt* stmt, _In_ bool finalize_outp
         }
 
         close_active_stream( stmt );
+        core_sqlsrv_stop_read_ahead( stmt, true );
 
         //Clear column sql types and sql display sizes.
         zend_hash_clean( Z_ARRVAL( stmt->col_cache ));
 
+        core_sqlsrv_trace_count( SQLSRV_TRACE_ROUND_TRIPS );
         SQLRETURN r;
         if( throw_on_errors ) {
             r = core::SQLMoreResults( stmt );
@@ -1117,6 +1722,38 @@ void core_sqlsrv_set_decimal_places(_Inout_ sqlsrv_stmt* stmt, _In_ zval* value_
     }
 }
 
+void core_sqlsrv_set_fetch_block_size( _Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z )
+{
+    if( Z_TYPE_P( value_z ) != IS_LONG || Z_LVAL_P( value_z ) <= 0 || static_cast<zend_ulong>( Z_LVAL_P( value_z )) > FETCH_BLOCK_SIZE_MAX ) {
+
+        THROW_CORE_ERROR( stmt, SQLSRV_ERROR_INVALID_FETCH_BLOCK_SIZE, static_cast<int>( FETCH_BLOCK_SIZE_MAX ));
+    }
+
+    stmt->fetch_block_size = static_cast<SQLULEN>( Z_LVAL_P( value_z ));
+}
+
+void core_sqlsrv_set_read_ahead( _Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z )
+{
+    if( Z_TYPE_P( value_z ) != IS_LONG || Z_LVAL_P( value_z ) < 0 || static_cast<zend_ulong>( Z_LVAL_P( value_z )) > READ_AHEAD_MAX ) {
+
+        THROW_CORE_ERROR( stmt, SQLSRV_ERROR_INVALID_READ_AHEAD, static_cast<int>( READ_AHEAD_MAX ));
+    }
+
+    stmt->read_ahead = static_cast<SQLULEN>( Z_LVAL_P( value_z ));
+}
+
+void core_sqlsrv_set_stream_chunk_size( _Inout_ sqlsrv_stmt* stmt, _In_ zval* value_z )
+{
+    if( Z_TYPE_P( value_z ) != IS_LONG || Z_LVAL_P( value_z ) < static_cast<zend_long>( STREAM_CHUNK_SIZE_MIN ) ||
+        static_cast<zend_ulong>( Z_LVAL_P( value_z )) > STREAM_CHUNK_SIZE_MAX ) {
+
+        THROW_CORE_ERROR( stmt, SQLSRV_ERROR_INVALID_STREAM_CHUNK_SIZE, static_cast<int>( STREAM_CHUNK_SIZE_MIN ),
+                          static_cast<int>( STREAM_CHUNK_SIZE_MAX ));
+    }
+
+    stmt->stream_chunk_size = static_cast<SQLULEN>( Z_LVAL_P( value_z ));
+}
+
 // core_sqlsrv_send_stream_packet
 // send a single packet from a stream parameter to the database using
 // ODBC.  This will also handle the transition between parameters.  It
@@ -1197,6 +1834,361 @@ void stmt_option_data_classification:: operator()( _Inout_ sqlsrv_stmt* stmt, st
     stmt->data_classification = zend_is_true(value_z);
 }
 
+void stmt_option_fetch_block_size:: operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /**/, _In_ zval* value_z )
+{
+    core_sqlsrv_set_fetch_block_size( stmt, value_z );
+}
+
+void stmt_option_read_ahead:: operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /**/, _In_ zval* value_z )
+{
+    core_sqlsrv_set_read_ahead( stmt, value_z );
+}
+
+void stmt_option_buffered_query_spill:: operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /**/, _In_ zval* value_z )
+{
+    stmt->buffered_query_spill = zend_is_true( value_z );
+}
+
+void stmt_option_defer_prepare:: operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /**/, _In_ zval* value_z )
+{
+    stmt->defer_prepare = zend_is_true( value_z );
+}
+
+void stmt_option_stream_chunk_size:: operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /**/, _In_ zval* value_z )
+{
+    core_sqlsrv_set_stream_chunk_size( stmt, value_z );
+}
+
+// core_sqlsrv_stmt_cache_lookup
+// Looks up a prepared handle for the statement in the connection's statement cache, if the cache is enabled.
+// On a hit, the statement adopts the cached handle and the metadata of its first result set, and the handle
+// allocated for the statement is freed.  Either way the statement gets a key, so its handle is cached when
+// it is freed.  Statements are not cached when Always Encrypted is enabled, since their parameters are
+// described when they are prepared.
+// Parameters:
+// stmt - the statement being prepared
+// wsql - the UTF-16 text of the statement
+// wsql_len - the number of characters in wsql
+// Returns:
+// true if the statement adopted a prepared handle, false if it must be prepared.
+
+bool core_sqlsrv_stmt_cache_lookup( _Inout_ sqlsrv_stmt* stmt, _In_reads_(wsql_len) const SQLWCHAR* wsql, _In_ unsigned int wsql_len )
+{
+    sqlsrv_conn* conn = stmt->conn;
+
+    if( conn->stmt_cache_size <= 0 || conn->ce_option.enabled ) {
+        return false;
+    }
+
+    if( conn->stmt_cache == NULL ) {
+        conn->stmt_cache = reinterpret_cast<sqlsrv_stmt_cache*>( sqlsrv_malloc( sizeof( sqlsrv_stmt_cache )));
+        zend_hash_init( &conn->stmt_cache->entries, 8, NULL, stmt_cache_entry_dtor, 0 /*persistent*/ );
+        conn->stmt_cache->bytes = 0;
+        conn->stmt_cache->hits = 0;
+        conn->stmt_cache->misses = 0;
+        conn->stmt_cache->evictions = 0;
+        conn->stmt_cache->invalidations = 0;
+    }
+
+    sqlsrv_stmt_cache* cache = conn->stmt_cache;
+
+    if( stmt->cache_key ) {
+        zend_string_release( stmt->cache_key );
+    }
+    stmt->cache_key = stmt_cache_key( stmt, wsql, wsql_len );
+
+    sqlsrv_stmt_cache_entry* entry = static_cast<sqlsrv_stmt_cache_entry*>( zend_hash_find_ptr( &cache->entries, stmt->cache_key ));
+    if( entry == NULL ) {
+        ++cache->misses;
+        return false;
+    }
+
+    // take the handle and metadata out of the entry before it is removed, so they aren't freed with it
+    SQLSRV_ASSERT( stmt->current_meta_data.empty(), "core_sqlsrv_stmt_cache_lookup: A statement being prepared has metadata." );
+    ::SQLFreeHandle( SQL_HANDLE_STMT, stmt->exchange_handle( entry->handle ));
+    entry->handle = SQL_NULL_HANDLE;
+    stmt->current_meta_data.swap( entry->meta_data );
+    stmt->meta_data_from_cache = !stmt->current_meta_data.empty();
+
+    cache->bytes -= entry->bytes;
+    zend_hash_del( &cache->entries, stmt->cache_key );
+    ++cache->hits;
+    core_sqlsrv_trace_count( SQLSRV_TRACE_CACHE_HITS );
+
+    return true;
+}
+
+// core_sqlsrv_stmt_cache_release
+// Called when a statement with a cache key is freed.  The handle is closed and parked in the statement cache
+// with the metadata of its first result set, then entries are evicted, least recently used first, until the
+// cache is within its limits.  The handle is left to the statement to free if it can't be reset, if it was never
+// prepared since its prepare was deferred, if its attributes changed since it was prepared, or if another handle
+// for the same key was parked already.
+// Parameters:
+// stmt - the statement being freed
+
+void core_sqlsrv_stmt_cache_release( _Inout_ sqlsrv_stmt* stmt )
+{
+    sqlsrv_stmt_cache* cache = stmt->conn->stmt_cache;
+
+    if( cache == NULL || !stmt->valid() || stmt->deferred_sql || !stmt_cache_key_matches( stmt ) ||
+        zend_hash_exists( &cache->entries, stmt->cache_key )) {
+        return;
+    }
+
+    // close any open cursor and release the bound parameters and columns so the handle is like a newly prepared one
+    if( !SQL_SUCCEEDED( ::SQLFreeStmt( stmt->handle(), SQL_CLOSE )) ||
+        !SQL_SUCCEEDED( ::SQLFreeStmt( stmt->handle(), SQL_UNBIND )) ||
+        !SQL_SUCCEEDED( ::SQLFreeStmt( stmt->handle(), SQL_RESET_PARAMS ))) {
+        return;
+    }
+
+    sqlsrv_malloc_auto_ptr<sqlsrv_stmt_cache_entry> entry;
+    entry = new ( sqlsrv_malloc( sizeof( sqlsrv_stmt_cache_entry ))) sqlsrv_stmt_cache_entry();
+    entry->bytes = sizeof( sqlsrv_stmt_cache_entry ) + ZSTR_LEN( stmt->cache_key );
+
+    if( stmt->cache_meta_data ) {
+        entry->meta_data.swap( stmt->current_meta_data );
+        for( size_t i = 0; i < entry->meta_data.size(); ++i ) {
+            entry->bytes += sizeof( field_meta_data ) + entry->meta_data[i]->field_name_len + 1;
+        }
+    }
+    entry->handle = stmt->exchange_handle( SQL_NULL_HANDLE );
+
+    zend_hash_add_new_ptr( &cache->entries, stmt->cache_key, entry.get() );
+    cache->bytes += entry->bytes;
+    entry.transferred();
+
+    stmt_cache_evict( stmt->conn );
+}
+
+// core_sqlsrv_stmt_cache_check_meta_data
+// Called after the first execution of a statement whose metadata was taken from the statement cache.  The
+// metadata is discarded, and described again when needed, if the number or the types of the columns
+// returned differ from the cached ones, since the objects used by the statement may have changed.
+// Parameters:
+// stmt - the executed statement
+
+void core_sqlsrv_stmt_cache_check_meta_data( _Inout_ sqlsrv_stmt* stmt )
+{
+    stmt->meta_data_from_cache = false;
+
+    SQLSMALLINT num_cols = core::SQLNumResultCols( stmt );
+    bool matches = ( static_cast<size_t>( num_cols ) == stmt->current_meta_data.size() );
+
+    for( SQLSMALLINT i = 0; matches && i < num_cols; ++i ) {
+        SQLLEN sql_type = 0;
+        core::SQLColAttribute( stmt, i + 1, SQL_DESC_CONCISE_TYPE, NULL, 0, NULL, &sql_type );
+        matches = ( sql_type == stmt->current_meta_data[i]->field_type );
+    }
+
+    if( matches ) {
+        stmt->column_count = num_cols;
+        return;
+    }
+
+    stmt->clean_up_results_metadata();
+    stmt->cache_meta_data = true;
+
+    if( stmt->conn->stmt_cache ) {
+        ++stmt->conn->stmt_cache->invalidations;
+    }
+}
+
+// core_sqlsrv_stmt_cache_check_error
+// Called when the execution of a statement with a cache key fails.  If the server reported that the objects
+// used by the statement changed, the statement is no longer cached and any handle parked for the same key
+// is freed.
+// Parameters:
+// stmt - the statement that failed
+
+void core_sqlsrv_stmt_cache_check_error( _Inout_ sqlsrv_stmt* stmt )
+{
+    const size_t num_schema_errors = sizeof( STMT_CACHE_SCHEMA_ERRORS ) / sizeof( STMT_CACHE_SCHEMA_ERRORS[0] );
+    SQLINTEGER native_error = 0;
+    bool schema_changed = false;
+
+    // the diagnostic records of the failed execution are still on the handle
+    for( SQLSMALLINT rec = 1; !schema_changed; ++rec ) {
+        SQLRETURN r = ::SQLGetDiagField( SQL_HANDLE_STMT, stmt->handle(), rec, SQL_DIAG_NATIVE, &native_error, SQL_IS_INTEGER, NULL );
+        if( !SQL_SUCCEEDED( r )) {
+            break;
+        }
+        for( size_t i = 0; i < num_schema_errors; ++i ) {
+            if( native_error == STMT_CACHE_SCHEMA_ERRORS[i] ) {
+                schema_changed = true;
+            }
+        }
+    }
+
+    if( !schema_changed ) {
+        return;
+    }
+
+    sqlsrv_stmt_cache* cache = stmt->conn->stmt_cache;
+    if( cache ) {
+        sqlsrv_stmt_cache_entry* entry = static_cast<sqlsrv_stmt_cache_entry*>( zend_hash_find_ptr( &cache->entries, stmt->cache_key ));
+        if( entry ) {
+            cache->bytes -= entry->bytes;
+            zend_hash_del( &cache->entries, stmt->cache_key );
+        }
+        ++cache->invalidations;
+    }
+
+    zend_string_release( stmt->cache_key );
+    stmt->cache_key = NULL;
+}
+
+// core_sqlsrv_stmt_cache_free
+// Frees the statement cache and the handles in it.  Must be called before the connection is closed.
+// Parameters:
+// conn - the connection that owns the cache
+
+void core_sqlsrv_stmt_cache_free( _Inout_ sqlsrv_conn* conn )
+{
+    if( conn->stmt_cache == NULL ) {
+        return;
+    }
+
+    zend_hash_destroy( &conn->stmt_cache->entries );
+    sqlsrv_free( conn->stmt_cache );
+    conn->stmt_cache = NULL;
+}
+
+// core_sqlsrv_get_stmt_cache_info
+// Returns the number of entries and bytes in the statement cache of a connection and its counters, with the counters
+// of the executions of the prepared statements of the connection by path: sent directly since their prepare was
+// deferred, prepared by their second execution, and executed as prepared statements.
+// Parameters:
+// conn - the connection that owns the cache
+// info - zval for returning the array of values
+
+void core_sqlsrv_get_stmt_cache_info( _Inout_ sqlsrv_conn* conn, _Out_ zval* info )
+{
+    sqlsrv_stmt_cache* cache = conn->stmt_cache;
+
+    array_init( info );
+
+    add_assoc_long( info, "Entries", cache ? zend_hash_num_elements( &cache->entries ) : 0 );
+    add_assoc_long( info, "Bytes", cache ? static_cast<zend_long>( cache->bytes ) : 0 );
+    add_assoc_long( info, "Hits", cache ? cache->hits : 0 );
+    add_assoc_long( info, "Misses", cache ? cache->misses : 0 );
+    add_assoc_long( info, "Evictions", cache ? cache->evictions : 0 );
+    add_assoc_long( info, "Invalidations", cache ? cache->invalidations : 0 );
+    add_assoc_long( info, "DirectExecutes", conn->direct_executes );
+    add_assoc_long( info, "DeferredPrepares", conn->deferred_prepares );
+    add_assoc_long( info, "PreparedExecutes", conn->prepared_executes );
+}
+
+// core_sqlsrv_slow_query_init
+// Turns on the slow query log of the process.  Called by MINIT, before any statement is created.
+// Parameters:
+// path - the file of the log, or NULL or empty to leave the log off.  Relative paths are relative to the working
+//        directory of the process, so an absolute path is best.
+// threshold_ms - executions that take at least this long, in milliseconds, are slow
+// sample_rate - the share of the slow executions written to the log, between 0 and 1
+// max_kb_size - size in KB past which the log is rotated to <path>.1, or 0 to never rotate it
+
+void core_sqlsrv_slow_query_init( _In_opt_z_ const char* path, _In_ zend_long threshold_ms, _In_ double sample_rate,
+                                  _In_ zend_long max_kb_size )
+{
+    slow_queries.path = ( path != NULL ) ? path : "";
+    slow_queries.threshold = ( threshold_ms > 0 ) ? threshold_ms * 1000 : 0;
+    slow_queries.sample_rate = ( sample_rate < 0.0 ) ? 0.0 : (( sample_rate > 1.0 ) ? 1.0 : sample_rate );
+    slow_queries.max_size = ( max_kb_size > 0 ) ? static_cast<long long>( max_kb_size ) * 1024 : 0;
+}
+
+// core_sqlsrv_slow_query_end
+// Ends the timing of the last execution of a statement, once the last row of its first result set is fetched or
+// before the statement is executed again or freed, and queues a line for the log if the execution was slow and
+// sampled.  The line is a JSON object with the fingerprint and normalized text of the query, the times spent
+// executing it and fetching its rows in microseconds, the number of rows and bytes fetched and the PHP types of
+// its parameters.
+// Parameters:
+// stmt - the statement executed
+
+void core_sqlsrv_slow_query_end( _Inout_ sqlsrv_stmt* stmt )
+{
+    sqlsrv_slow_query* query = stmt->slow_query;
+    if( query == NULL || !query->pending ) {
+        return;
+    }
+    query->pending = false;
+
+    zend_long fetch_time = static_cast<zend_long>( std::chrono::duration_cast<std::chrono::microseconds>(
+                                                       std::chrono::steady_clock::now() - query->fetch_start ).count() );
+    if( query->execute_time + fetch_time < slow_queries.threshold ) {
+        return;
+    }
+
+    // every slow execution is counted, so that the ones sampled are spread evenly at the sample rate
+    long long seen = slow_queries.slow.fetch_add( 1, std::memory_order_relaxed );
+    if( static_cast<long long>(( seen + 1 ) * slow_queries.sample_rate ) == static_cast<long long>( seen * slow_queries.sample_rate )) {
+        return;
+    }
+
+    std::string normalized;
+    slow_query_fingerprint( query->sql, normalized );
+
+    PHP_SHA1_CTX context;
+    unsigned char digest[20];
+    char fingerprint[41];
+    PHP_SHA1Init( &context );
+    PHP_SHA1Update( &context, reinterpret_cast<const unsigned char*>( normalized.data() ), normalized.length() );
+    PHP_SHA1Final( digest, &context );
+    make_sha1_digest( fingerprint, digest );
+
+    long long timestamp = std::chrono::duration_cast<std::chrono::milliseconds>(
+                              std::chrono::system_clock::now().time_since_epoch() ).count();
+
+    std::string line( "{\"timestamp\":" );
+    line.append( std::to_string( timestamp ));
+    line.append( ",\"fingerprint\":\"" ).append( fingerprint, SLOW_QUERY_FINGERPRINT_LEN );
+    line.append( "\",\"query\":" );
+    slow_query_json_string( line, normalized );
+    line.append( ",\"execute_time\":" ).append( std::to_string( static_cast<long long>( query->execute_time )));
+    line.append( ",\"fetch_time\":" ).append( std::to_string( static_cast<long long>( fetch_time )));
+    line.append( ",\"rows\":" ).append( std::to_string( static_cast<long long>( query->rows )));
+    line.append( ",\"bytes\":" ).append( std::to_string( static_cast<long long>( query->bytes )));
+    line.append( ",\"param_types\":" ).append( query->param_types );
+    line.append( "}\n" );
+
+    std::lock_guard<std::mutex> guard( slow_queries.lock );
+    if( slow_queries.stopping || slow_queries.lines.size() >= SLOW_QUERY_QUEUE_MAX ) {
+        return;
+    }
+    slow_queries.lines.push_back( std::move( line ));
+
+    // the writer is started by the first slow query, so that processes that never log one don't run it
+    if( !slow_queries.writer.joinable() ) {
+        try {
+            slow_queries.writer = std::thread( slow_query_write );
+        }
+        catch( std::system_error& ) {
+            slow_queries.lines.clear();
+            LOG( SEV_ERROR, "core_sqlsrv_slow_query_end: failed to start the thread writing the slow query log" );
+            return;
+        }
+    }
+    slow_queries.wake.notify_one();
+}
+
+// core_sqlsrv_slow_query_shutdown
+// Writes the lines left in the queue of the slow query log and stops its writer.  Called by MSHUTDOWN.
+
+void core_sqlsrv_slow_query_shutdown( void )
+{
+    {
+        std::lock_guard<std::mutex> guard( slow_queries.lock );
+        slow_queries.stopping = true;
+    }
+    slow_queries.wake.notify_one();
+
+    if( slow_queries.writer.joinable() ) {
+        slow_queries.writer.join();
+    }
+}
+
 // internal function to release the active stream.  Called by each main API function
 // that will alter the statement and cancel any retrieval of data from a stream.
 void close_active_stream( _Inout_ sqlsrv_stmt* stmt )
@@ -1465,6 +2457,11 @@ void core_get_field_common( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_i
         // be returned as a zval.
         case SQLSRV_PHPTYPE_DATETIME:
         {
+            SQLSRV_ASSERT(stmt->current_meta_data.size() > field_index, "core_get_field_common - meta data vector not in sync" );
+            if( get_typed_field_as_string( stmt, field_index, stmt->current_meta_data[field_index]->field_type, field_value, field_len )) {
+                break;
+            }
+
             sqlsrv_malloc_auto_ptr<char> field_value_temp;
             SQLLEN field_len_temp = 0;
 
@@ -1521,6 +2518,16 @@ void core_get_field_common( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_i
             ss->sql_type = static_cast<SQLUSMALLINT>( sql_type );
             ss->encoding = static_cast<SQLSRV_ENCODING>( sqlsrv_php_type.typeinfo.encoding );
 
+            // with a chunk size, PHP reads the stream a chunk at a time.  Binary data needs no terminator or
+            // conversion, so it is read unbuffered, straight into the memory given to fread or stream_get_contents.
+            if( stmt->stream_chunk_size > 0 ) {
+                ss->chunk_size = static_cast<size_t>( stmt->stream_chunk_size );
+                php_stream_set_chunk_size( stream, ss->chunk_size );
+                if( ss->encoding == SQLSRV_ENCODING_BINARY ) {
+                    stream->flags |= PHP_STREAM_FLAG_NO_BUFFER;
+                }
+            }
+
             zval_auto_ptr return_value_z;
             return_value_z = ( zval * )sqlsrv_malloc( sizeof( zval ));
             ZVAL_UNDEF( return_value_z );
@@ -1559,6 +2566,131 @@ void col_cache_dtor( _Inout_ zval* data_z )
     sqlsrv_free( cache );
 }
 
+// Copies one value of a batch into the parameter array of its column.  Integers and floats sent in a string
+// column are converted to strings, and strings are converted to UTF-16 when the column is bound as wide characters.
+void copy_batch_value( _Inout_ sqlsrv_stmt* stmt, _In_ batch_column const& column, _In_ SQLSMALLINT param_num, _In_ SQLSRV_ENCODING encoding,
+                       _Inout_ char* buffer, _In_ SQLULEN row, _In_ zval* value_z )
+{
+    SQLLEN* indicator = reinterpret_cast<SQLLEN*>( buffer + column.indicators_offset ) + row;
+    char* value = buffer + column.values_offset + row * column.width;
+
+    if( Z_TYPE_P( value_z ) == IS_NULL ) {
+        *indicator = SQL_NULL_DATA;
+        return;
+    }
+
+    switch( column.c_type ) {
+        case SQL_C_SBIGINT:
+            *reinterpret_cast<SQLBIGINT*>( value ) = static_cast<SQLBIGINT>( zval_get_long( value_z ));
+            *indicator = sizeof( SQLBIGINT );
+            break;
+        case SQL_C_DOUBLE:
+            *reinterpret_cast<double*>( value ) = zval_get_double( value_z );
+            *indicator = sizeof( double );
+            break;
+        default:
+        {
+            zend_string* str = zval_get_string( value_z );
+            if( column.c_type == SQL_C_WCHAR && ZSTR_LEN( str ) > 0 ) {
+                sqlsrv_malloc_auto_ptr<SQLWCHAR> wide_buffer;
+                unsigned int wchar_size = 0;
+                wide_buffer = utf16_string_from_mbcs_string( encoding, ZSTR_VAL( str ), static_cast<unsigned int>( ZSTR_LEN( str )), &wchar_size, true );
+                zend_string_release( str );
+                CHECK_CUSTOM_ERROR( wide_buffer == 0, stmt, SQLSRV_ERROR_INPUT_PARAM_ENCODING_TRANSLATE, param_num + 1, get_last_error_message(), NULL ) {
+                    throw core::CoreException();
+                }
+                // a UTF-8 string never has more UTF-16 code units than bytes, so it fits in the width derived from the byte length
+                memcpy_s( value, column.width, wide_buffer.get(), wchar_size * sizeof( SQLWCHAR ));
+                *indicator = wchar_size * sizeof( SQLWCHAR );
+            }
+            else {
+                SQLSRV_ASSERT( static_cast<SQLLEN>( ZSTR_LEN( str )) <= column.width, "copy_batch_value: value is longer than its column." );
+                memcpy_s( value, column.width, ZSTR_VAL( str ), ZSTR_LEN( str ));
+                *indicator = ZSTR_LEN( str );
+                zend_string_release( str );
+            }
+            break;
+        }
+    }
+}
+
+// Chooses how a parameter of a batch is bound.  A parameter with any string value is bound as a string in the
+// statement encoding, otherwise a float makes it a float and integers and booleans make it a bigint.  A parameter
+// that is always null is bound as a string as well.
+void derive_batch_column_types( _Inout_ batch_column& column, _In_ SQLSRV_ENCODING encoding )
+{
+    if( !column.has_string && column.has_double ) {
+        column.c_type = SQL_C_DOUBLE;
+        column.sql_type = SQL_FLOAT;
+        column.width = sizeof( double );
+        return;
+    }
+    if( !column.has_string && column.has_long ) {
+        column.c_type = SQL_C_SBIGINT;
+        column.sql_type = SQL_BIGINT;
+        column.width = sizeof( SQLBIGINT );
+        return;
+    }
+
+    size_t len = column.max_len;
+    if(( column.has_double || column.has_long ) && len < BATCH_NUMBER_STRING_LEN ) {
+        len = BATCH_NUMBER_STRING_LEN;
+    }
+    len = ( len > 0 ) ? len : 1;
+
+    size_t char_size = sizeof( char );
+    if( encoding == SQLSRV_ENCODING_BINARY ) {
+        column.c_type = SQL_C_BINARY;
+        column.sql_type = SQL_VARBINARY;
+    }
+    else if( encoding == SQLSRV_ENCODING_UTF8 ) {
+        column.c_type = SQL_C_WCHAR;
+        column.sql_type = SQL_WVARCHAR;
+        char_size = sizeof( SQLWCHAR );
+    }
+    else {
+        column.c_type = SQL_C_CHAR;
+        column.sql_type = SQL_VARCHAR;
+    }
+
+    column.column_size = ( len * char_size > SQL_SERVER_MAX_FIELD_SIZE ) ? SQL_SERVER_MAX_TYPE_SIZE : len;
+    column.width = static_cast<SQLLEN>(( len * char_size + sizeof( SQLLEN ) - 1 ) / sizeof( SQLLEN ) * sizeof( SQLLEN ));
+}
+
+// Sends the rows copied into the parameter arrays and appends their status to status_z.  An error before any
+// row was processed fails the whole call, while errors in individual rows are reported as warnings.
+void execute_batch_rows( _Inout_ sqlsrv_stmt* stmt, _In_ SQLULEN num_rows, _In_reads_(num_rows) SQLUSMALLINT const* statuses,
+                         _In_ SQLULEN const& processed, _Inout_ zval* status_z )
+{
+    core::SQLSetStmtAttr( stmt, SQL_ATTR_PARAMSET_SIZE, reinterpret_cast<SQLPOINTER>( num_rows ), SQL_IS_UINTEGER );
+
+    SQLRETURN r = ::SQLExecute( stmt->handle() );
+    SQLSRV_ASSERT( r != SQL_INVALID_HANDLE, "Invalid handle returned." );
+    SQLSRV_ASSERT( r != SQL_NEED_DATA, "execute_batch_rows: no data at execution parameters are bound." );
+
+    if( r == SQL_ERROR && processed == 0 ) {
+        (void)call_error_handler( stmt, SQLSRV_ERROR_ODBC, /*warning*/0 );
+        throw core::CoreException();
+    }
+    if( r == SQL_ERROR || r == SQL_SUCCESS_WITH_INFO ) {
+        (void)call_error_handler( stmt, SQLSRV_ERROR_ODBC, /*warning*/1 );
+    }
+
+    // each row may return a row count, so skip them all before the status of every row is final
+    do {
+        r = ::SQLMoreResults( stmt->handle() );
+    } while( r == SQL_SUCCESS || r == SQL_SUCCESS_WITH_INFO );
+
+    if( r == SQL_ERROR ) {
+        (void)call_error_handler( stmt, SQLSRV_ERROR_ODBC, /*warning*/1 );
+        ::SQLFreeStmt( stmt->handle(), SQL_CLOSE );
+    }
+
+    for( SQLULEN i = 0; i < num_rows; ++i ) {
+        add_next_index_bool( status_z, i < processed && ( statuses[i] == SQL_PARAM_SUCCESS || statuses[i] == SQL_PARAM_SUCCESS_WITH_INFO ));
+    }
+}
+
 void field_cache_dtor( _Inout_ zval* data_z )
 {
     field_cache* cache = static_cast<field_cache*>( Z_PTR_P( data_z ));
@@ -1668,7 +2800,8 @@ void get_field_as_string(_Inout_ sqlsrv_stmt *stmt, _In_ SQLUSMALLINT field_inde
             SQLSRV_ASSERT(stmt->current_meta_data.size() > field_index, "get_field_as_string - meta data vector not in sync" );
             sql_field_type = stmt->current_meta_data[field_index]->field_type;
 
-            // Calculate the field size.
+            // Calculate the field size.  The handle is used, so a thread reading ahead is paused.
+            core_sqlsrv_stop_read_ahead( stmt, false );
             calc_string_size( stmt, field_index, sql_field_type, sql_display_size );
 
             col_cache cache( sql_field_type, sql_display_size );
@@ -1679,6 +2812,13 @@ void get_field_as_string(_Inout_ sqlsrv_stmt *stmt, _In_ SQLUSMALLINT field_inde
         if( sqlsrv_php_type.typeinfo.encoding == SQLSRV_ENCODING_DEFAULT ) {
             sqlsrv_php_type.typeinfo.encoding = stmt->conn->encoding();
         }
+
+        // the strings of decimal and date types are ASCII, so they are the same in every encoding but binary
+        if( sqlsrv_php_type.typeinfo.encoding != SQLSRV_ENCODING_BINARY &&
+            get_typed_field_as_string( stmt, field_index, static_cast<SQLSMALLINT>( sql_field_type ), field_value, field_len )) {
+            return;
+        }
+
         // Set the C type and account for null characters at the end of the data.
         if (sqlsrv_php_type.typeinfo.encoding == SQLSRV_ENCODING_BINARY) {
             c_type = SQL_C_BINARY;
@@ -1792,7 +2932,7 @@ void get_field_as_string(_Inout_ sqlsrv_stmt *stmt, _In_ SQLUSMALLINT field_inde
 
         if (c_type == SQL_C_WCHAR) {
             bool converted = convert_string_from_utf16_inplace(static_cast<SQLSRV_ENCODING>(sqlsrv_php_type.typeinfo.encoding),
-                &field_value_temp, field_len_temp);
+                &field_value_temp, field_len_temp, &stmt->conversion_buffer);
 
             CHECK_CUSTOM_ERROR(!converted, stmt, SQLSRV_ERROR_FIELD_ENCODING_TRANSLATE, get_last_error_message(), NULL) {
                 throw core::CoreException();
@@ -1829,6 +2969,109 @@ void get_field_as_string(_Inout_ sqlsrv_stmt *stmt, _In_ SQLUSMALLINT field_inde
     }
 }
 
+// Reads a decimal, numeric, date or datetime field in its ODBC structure and formats it as the ODBC driver converts
+// it to a string, which saves the conversion by the driver and, for UTF-8, the conversion from UTF-16.  Returns false
+// for the other types, and when the field is not read from the driver: the buffered and block result sets hold the
+// strings converted by the driver.  Encrypted columns are left to the conversions of the driver.
+bool get_typed_field_as_string( _Inout_ sqlsrv_stmt* stmt, _In_ SQLUSMALLINT field_index, _In_ SQLSMALLINT sql_type,
+                                _Inout_updates_bytes_(*field_len) void*& field_value, _Inout_ SQLLEN* field_len )
+{
+    if( sql_type != SQL_DECIMAL && sql_type != SQL_NUMERIC && sql_type != SQL_TYPE_TIMESTAMP && sql_type != SQL_TYPE_DATE ) {
+        return false;
+    }
+
+    sqlsrv_odbc_result_set* results = dynamic_cast<sqlsrv_odbc_result_set*>( stmt->current_results );
+    if( results == NULL || stmt->conn->ce_option.enabled ) {
+        return false;
+    }
+
+    field_meta_data* meta = stmt->current_meta_data[field_index];
+    sqlsrv_malloc_auto_ptr<char> field_value_temp;
+    SQLLEN field_len_temp = 0;
+    SQLRETURN r = SQL_SUCCESS;
+
+    if( sql_type == SQL_DECIMAL || sql_type == SQL_NUMERIC ) {
+
+        // SQLGetData reads the precision and scale of a SQL_NUMERIC_STRUCT from the application row descriptor,
+        // which is set once for each column of the result set
+        if( results->numeric_columns.size() <= field_index ) {
+            results->numeric_columns.resize( field_index + 1, false );
+        }
+        if( !results->numeric_columns[field_index] ) {
+            SQLHDESC ard = NULL;
+            core::SQLGetStmtAttr( stmt, SQL_ATTR_APP_ROW_DESC, &ard, 0, 0 );
+
+            r = ::SQLSetDescField( ard, field_index + 1, SQL_DESC_TYPE, reinterpret_cast<SQLPOINTER>( SQL_C_NUMERIC ), 0 );
+            if( SQL_SUCCEEDED( r )) {
+                r = ::SQLSetDescField( ard, field_index + 1, SQL_DESC_PRECISION, reinterpret_cast<SQLPOINTER>( meta->field_size ), 0 );
+            }
+            if( SQL_SUCCEEDED( r )) {
+                r = ::SQLSetDescField( ard, field_index + 1, SQL_DESC_SCALE, reinterpret_cast<SQLPOINTER>( static_cast<SQLLEN>( meta->field_scale )), 0 );
+            }
+            CHECK_SQL_ERROR_OR_WARNING( r, stmt, NULL ) {
+                throw core::CoreException();
+            }
+            results->numeric_columns[field_index] = true;
+        }
+
+        SQL_NUMERIC_STRUCT numeric;
+        r = results->get_data( field_index + 1, SQL_ARD_TYPE, &numeric, sizeof( numeric ), &field_len_temp, false /*handle_warning*/ );
+
+        CHECK_CUSTOM_ERROR(( r == SQL_NO_DATA ), stmt, SQLSRV_ERROR_NO_DATA, field_index, NULL ) {
+            throw core::CoreException();
+        }
+        CHECK_SQL_ERROR_OR_WARNING( r, stmt, NULL ) {
+            throw core::CoreException();
+        }
+
+        if( field_len_temp == SQL_NULL_DATA ) {
+            field_value = NULL;
+            *field_len = 0;
+            return true;
+        }
+
+        // leave room for the leading zero and the carry of the rounding by format_decimal_numbers
+        field_value_temp = static_cast<char*>( sqlsrv_malloc( MAX_NUMERIC_STRING_LEN + 3 ));
+        field_len_temp = format_numeric( numeric, field_value_temp );
+        field_value_temp[field_len_temp] = '\0';
+
+        if( stmt->format_decimals ) {
+            // number of decimal places only affect money / smallmoney fields
+            SQLSMALLINT decimal_places = ( meta->field_is_money_type ) ? stmt->decimal_places : NO_CHANGE_DECIMAL_PLACES;
+            char* formatted = field_value_temp.get();
+            format_decimal_numbers( decimal_places, meta->field_scale, formatted, &field_len_temp );
+        }
+    }
+    else {
+
+        SQL_TIMESTAMP_STRUCT timestamp;
+        r = results->get_data( field_index + 1, SQL_C_TYPE_TIMESTAMP, &timestamp, sizeof( timestamp ), &field_len_temp, false /*handle_warning*/ );
+
+        CHECK_CUSTOM_ERROR(( r == SQL_NO_DATA ), stmt, SQLSRV_ERROR_NO_DATA, field_index, NULL ) {
+            throw core::CoreException();
+        }
+        CHECK_SQL_ERROR_OR_WARNING( r, stmt, NULL ) {
+            throw core::CoreException();
+        }
+
+        if( field_len_temp == SQL_NULL_DATA ) {
+            field_value = NULL;
+            *field_len = 0;
+            return true;
+        }
+
+        field_value_temp = static_cast<char*>( sqlsrv_malloc( MAX_TIMESTAMP_STRING_LEN + 1 ));
+        field_len_temp = format_timestamp( timestamp, meta->field_scale, sql_type == SQL_TYPE_DATE, field_value_temp );
+        field_value_temp[field_len_temp] = '\0';
+    }
+
+    field_value = field_value_temp;
+    field_value_temp.transferred();
+    *field_len = field_len_temp;
+
+    return true;
+}
+
 // return the option from the stmt_opts array that matches the key.  If no option found,
 // NULL is returned.
 
@@ -2045,6 +3288,182 @@ void adjustDecimalPrecision(_Inout_ zval* param_z, _In_ SQLSMALLINT decimal_digi
     ZVAL_NEW_STR(param_z, zstr);
 }
 
+// Unbinds the parameter arrays of a batch so the statement can be executed with single parameters again
+void reset_batch_params( _Inout_ sqlsrv_stmt* stmt )
+{
+    // errors are ignored since the statement may be in any state here
+    ::SQLFreeStmt( stmt->handle(), SQL_RESET_PARAMS );
+    ::SQLSetStmtAttr( stmt->handle(), SQL_ATTR_PARAMSET_SIZE, reinterpret_cast<SQLPOINTER>( static_cast<SQLULEN>( 1 )), SQL_IS_UINTEGER );
+    ::SQLSetStmtAttr( stmt->handle(), SQL_ATTR_PARAM_STATUS_PTR, NULL, SQL_IS_POINTER );
+    ::SQLSetStmtAttr( stmt->handle(), SQL_ATTR_PARAMS_PROCESSED_PTR, NULL, SQL_IS_POINTER );
+}
+
+// Converts a query to UTF-16 in the encoding of the statement before it is executed directly.
+void query_to_utf16( _Inout_ sqlsrv_stmt* stmt, _In_reads_bytes_(sql_len) const char* sql, _In_ int sql_len,
+                     _Inout_ sqlsrv_malloc_auto_ptr<SQLWCHAR>& wsql_string )
+{
+    unsigned int wsql_len = 0;
+    if( sql_len == 0 || ( sql[0] == '\0' && sql_len == 1 )) {
+        wsql_string = reinterpret_cast<SQLWCHAR*>( sqlsrv_malloc( sizeof( SQLWCHAR )));
+        wsql_string[0] = L'\0';
+        wsql_len = 0;
+    }
+    else {
+        SQLSRV_ENCODING encoding = (( stmt->encoding() == SQLSRV_ENCODING_DEFAULT ) ? stmt->conn->encoding() : stmt->encoding() );
+        wsql_string = utf16_string_from_mbcs_string( encoding, reinterpret_cast<const char*>( sql ),
+                                                     sql_len, &wsql_len );
+        CHECK_CUSTOM_ERROR( wsql_string == 0, stmt, SQLSRV_ERROR_QUERY_STRING_ENCODING_TRANSLATE,
+                            get_last_error_message(), NULL) {
+            throw core::CoreException();
+        }
+    }
+}
+
+// Sets up the results of a statement whose execution returned r, after checking r for errors.
+void execute_completed( _Inout_ sqlsrv_stmt* stmt, _In_ SQLRETURN r )
+{
+    // if data is needed (streams were bound) and they should be sent at execute time, then do so now
+    if( r == SQL_NEED_DATA && stmt->send_streams_at_exec ) {
+        core_sqlsrv_send_stream_packet(stmt, true);
+    }
+
+    stmt->new_result_set();
+    stmt->executed = true;
+
+    // metadata taken from the statement cache is checked against the first results of the statement
+    if( stmt->meta_data_from_cache && r != SQL_NEED_DATA ) {
+        core_sqlsrv_stmt_cache_check_meta_data( stmt );
+    }
+
+    // if all the data has been sent and no data was returned then finalize the output parameters
+    if( stmt->send_streams_at_exec && ( r == SQL_NO_DATA || !core_sqlsrv_has_any_result( stmt ))) {
+        stmt->params_container.finalize_output_parameters();
+    }
+}
+
+// Cleans up after an execution that failed.
+void execute_failed( _Inout_ sqlsrv_stmt* stmt )
+{
+    // a prepared statement that failed because the objects it uses changed is no longer cached
+    if( stmt->cache_key ) {
+        core_sqlsrv_stmt_cache_check_error( stmt );
+    }
+
+    // if the statement executed but failed in a subsequent operation before returning,
+    // we need to remove all the parameters and cancel the statement
+    stmt->params_container.clean_up_param_data();
+    if( stmt->executed ) {
+        SQLCancel( stmt->handle() );
+        // stmt->executed = false; should this be reset if something fails?
+    }
+}
+
+// Returns a statement to the synchronous mode once its asynchronous execution returned r, then sets up its results.
+void async_completed( _Inout_ sqlsrv_stmt* stmt, _In_ SQLRETURN r )
+{
+    stmt->async_executing = false;
+    stmt->async_sql.reset();
+
+    // the diagnostics of the execution are read before setting the attribute clears them
+    bool failed = false;
+    try {
+        core::check_for_mars_error( stmt, r );
+
+        CHECK_SQL_ERROR_OR_WARNING( r, stmt, NULL ) {
+            failed = true;
+        }
+    }
+    catch( core::CoreException& ) {
+        failed = true;
+    }
+
+    SQLRETURN rset = ::SQLSetStmtAttr( stmt->handle(), SQL_ATTR_ASYNC_ENABLE, reinterpret_cast<SQLPOINTER>( SQL_ASYNC_ENABLE_OFF ),
+                                       SQL_IS_UINTEGER );
+    if( failed ) {
+        throw core::CoreException();
+    }
+    CHECK_SQL_ERROR_OR_WARNING( rset, stmt, NULL ) {
+        throw core::CoreException();
+    }
+
+    execute_completed( stmt, r );
+}
+
+// Writes the attributes of a statement that are part of its key in the statement cache: the cursor type and the
+// query timeout, since they are set on the handle before it is prepared, and the encoding of the column names.
+void stmt_cache_key_attrs( _In_ sqlsrv_stmt* stmt, _Out_writes_bytes_(STMT_CACHE_KEY_ATTRS_LEN) char* attrs )
+{
+    SQLULEN cursor_type = stmt->cursor_type;
+    unsigned long query_timeout = stmt->query_timeout;
+    SQLSRV_ENCODING encoding = ( stmt->encoding() == SQLSRV_ENCODING_DEFAULT ) ? stmt->conn->encoding() : stmt->encoding();
+
+    memcpy_s( attrs, sizeof( cursor_type ), &cursor_type, sizeof( cursor_type ));
+    attrs += sizeof( cursor_type );
+    memcpy_s( attrs, sizeof( query_timeout ), &query_timeout, sizeof( query_timeout ));
+    attrs += sizeof( query_timeout );
+    memcpy_s( attrs, sizeof( encoding ), &encoding, sizeof( encoding ));
+}
+
+// Builds the key of a statement in the statement cache from its attributes and its text.
+zend_string* stmt_cache_key( _In_ sqlsrv_stmt* stmt, _In_reads_(wsql_len) const SQLWCHAR* wsql, _In_ unsigned int wsql_len )
+{
+    size_t text_len = wsql_len * sizeof( SQLWCHAR );
+
+    zend_string* key = zend_string_alloc( STMT_CACHE_KEY_ATTRS_LEN + text_len, 0 /*persistent*/ );
+    stmt_cache_key_attrs( stmt, ZSTR_VAL( key ));
+    memcpy_s( ZSTR_VAL( key ) + STMT_CACHE_KEY_ATTRS_LEN, text_len, wsql, text_len );
+    ZSTR_VAL( key )[STMT_CACHE_KEY_ATTRS_LEN + text_len] = '\0';
+
+    return key;
+}
+
+// Checks that the attributes of a statement are still those in its key, as they may be changed after the statement
+// is prepared.
+bool stmt_cache_key_matches( _In_ sqlsrv_stmt* stmt )
+{
+    char attrs[STMT_CACHE_KEY_ATTRS_LEN];
+    stmt_cache_key_attrs( stmt, attrs );
+
+    return memcmp( ZSTR_VAL( stmt->cache_key ), attrs, STMT_CACHE_KEY_ATTRS_LEN ) == 0;
+}
+
+void stmt_cache_entry_dtor( _Inout_ zval* data_z )
+{
+    sqlsrv_stmt_cache_entry* entry = static_cast<sqlsrv_stmt_cache_entry*>( Z_PTR_P( data_z ));
+
+    if( entry->handle != SQL_NULL_HANDLE ) {
+        ::SQLFreeHandle( SQL_HANDLE_STMT, entry->handle );
+    }
+    std::for_each( entry->meta_data.begin(), entry->meta_data.end(), meta_data_free );
+    entry->~sqlsrv_stmt_cache_entry();
+    sqlsrv_free( entry );
+}
+
+// Evicts the least recently used entries of the statement cache until it holds no more than the configured
+// number of statements and bytes.
+void stmt_cache_evict( _Inout_ sqlsrv_conn* conn )
+{
+    sqlsrv_stmt_cache* cache = conn->stmt_cache;
+    size_t max_bytes = static_cast<size_t>( conn->stmt_cache_max_kb_size ) * 1024;
+
+    while( zend_hash_num_elements( &cache->entries ) > 0 &&
+           ( static_cast<zend_long>( zend_hash_num_elements( &cache->entries )) > conn->stmt_cache_size ||
+             ( max_bytes > 0 && cache->bytes > max_bytes ))) {
+
+        HashPosition pos;
+        zend_string* key = NULL;
+        zend_ulong index = 0;
+
+        zend_hash_internal_pointer_reset_ex( &cache->entries, &pos );
+        zend_hash_get_current_key_ex( &cache->entries, &key, &index, &pos );
+        sqlsrv_stmt_cache_entry* entry = static_cast<sqlsrv_stmt_cache_entry*>( zend_hash_get_current_data_ptr_ex( &cache->entries, &pos ));
+
+        cache->bytes -= entry->bytes;
+        zend_hash_del( &cache->entries, key );
+        ++cache->evictions;
+    }
+}
+
 int round_up_decimal_numbers(_Inout_ char* buffer, _In_ int decimal_pos, _In_ int num_decimals, _In_ int offset, _In_ int lastpos)
 {
     // This helper method assumes the 'buffer' has some extra blank spaces at the beginning without the minus '-' sign.
@@ -2086,6 +3505,228 @@ int round_up_decimal_numbers(_Inout_ char* buffer, _In_ int decimal_pos, _In_ in
     // Do nothing and just return
     return lastpos;
 }
+
+// starts timing the fetch of the rows of a statement just executed, and keeps what the slow query log needs
+void slow_query_started( _Inout_ sqlsrv_stmt* stmt, _In_ std::chrono::steady_clock::time_point execute_start )
+{
+    sqlsrv_slow_query* query = stmt->slow_query;
+
+    query->fetch_start = std::chrono::steady_clock::now();
+    query->execute_time = static_cast<zend_long>( std::chrono::duration_cast<std::chrono::microseconds>(
+                                                      query->fetch_start - execute_start ).count() );
+    query->rows = 0;
+    query->bytes = 0;
+
+    // the parameters are listed in the order of their placeholders, whatever their direction
+    std::map<SQLUSMALLINT, int> types;
+    for( auto it = stmt->params_container.input_params.begin(); it != stmt->params_container.input_params.end(); ++it ) {
+        types[it->first] = it->second->param_php_type;
+    }
+    for( auto it = stmt->params_container.output_params.begin(); it != stmt->params_container.output_params.end(); ++it ) {
+        types[it->first] = it->second->param_php_type;
+    }
+
+    query->param_types.assign( "[" );
+    for( auto it = types.begin(); it != types.end(); ++it ) {
+        if( it != types.begin() ) {
+            query->param_types += ',';
+        }
+        const char* name = zend_get_type_by_const( it->second );
+        query->param_types.append( "\"" ).append( name ? name : "unknown" ).append( "\"" );
+    }
+    query->param_types += ']';
+
+    query->pending = true;
+}
+
+// Normalizes a query for its fingerprint: string, binary and number literals become ?, a list of literals becomes a
+// single ?, comments are dropped and each run of white space becomes a space, so that the executions of a query
+// with different values share a fingerprint.  Quoted identifiers are kept as they are.
+void slow_query_fingerprint( _In_ const std::string& sql, _Out_ std::string& normalized )
+{
+    size_t length = sql.length();
+    size_t i = 0;
+    bool space = false;
+
+    normalized.clear();
+    normalized.reserve( length );
+
+    while( i < length ) {
+
+        char c = sql[i];
+        char next = ( i + 1 < length ) ? sql[i + 1] : '\0';
+
+        if( isspace( static_cast<unsigned char>( c ))) {
+            ++i;
+            space = !normalized.empty();
+            continue;
+        }
+        if( c == '-' && next == '-' ) {
+            size_t end = sql.find( '\n', i );
+            i = ( end == std::string::npos ) ? length : end;
+            space = !normalized.empty();
+            continue;
+        }
+        if( c == '/' && next == '*' ) {
+            size_t end = sql.find( "*/", i + 2 );
+            i = ( end == std::string::npos ) ? length : end + 2;
+            space = !normalized.empty();
+            continue;
+        }
+        if( space ) {
+            normalized += ' ';
+            space = false;
+        }
+
+        // a literal can't continue an identifier, such as the digits of column1 or the N of column_N
+        char last = normalized.empty() ? ' ' : normalized.back();
+        bool after_word = isalnum( static_cast<unsigned char>( last )) || last == '_' || last == '@' || last == '#' || last == '$';
+
+        // string literals, Unicode ones included, with their quotes doubled inside
+        if( c == '\'' || (( c == 'N' || c == 'n' ) && next == '\'' && !after_word )) {
+            i += ( c == '\'' ) ? 1 : 2;
+            while( i < length ) {
+                if( sql[i] == '\'' ) {
+                    if( i + 1 < length && sql[i + 1] == '\'' ) {
+                        i += 2;
+                        continue;
+                    }
+                    ++i;
+                    break;
+                }
+                ++i;
+            }
+            slow_query_literal( normalized );
+            continue;
+        }
+
+        // binary and number literals, with their fractions and exponents
+        if( !after_word && ( isdigit( static_cast<unsigned char>( c )) || ( c == '.' && isdigit( static_cast<unsigned char>( next ))))) {
+            if( c == '0' && ( next == 'x' || next == 'X' )) {
+                i += 2;
+                while( i < length && isxdigit( static_cast<unsigned char>( sql[i] ))) {
+                    ++i;
+                }
+            }
+            else {
+                while( i < length && ( isdigit( static_cast<unsigned char>( sql[i] )) || sql[i] == '.' )) {
+                    ++i;
+                }
+                if( i < length && ( sql[i] == 'e' || sql[i] == 'E' )) {
+                    ++i;
+                    if( i < length && ( sql[i] == '+' || sql[i] == '-' )) {
+                        ++i;
+                    }
+                    while( i < length && isdigit( static_cast<unsigned char>( sql[i] ))) {
+                        ++i;
+                    }
+                }
+            }
+            slow_query_literal( normalized );
+            continue;
+        }
+
+        if( c == '"' || c == '[' ) {
+            size_t end = sql.find(( c == '[' ) ? ']' : '"', i + 1 );
+            end = ( end == std::string::npos ) ? length : end + 1;
+            normalized.append( sql, i, end - i );
+            i = end;
+            continue;
+        }
+
+        normalized += c;
+        ++i;
+    }
+}
+
+// appends the ? of a literal to a normalized query, unless the literal follows another one in a list
+void slow_query_literal( _Inout_ std::string& normalized )
+{
+    size_t length = normalized.length();
+
+    if( length >= 2 && normalized.compare( length - 2, 2, "?," ) == 0 ) {
+        normalized.erase( length - 1 );
+    }
+    else if( length >= 3 && normalized.compare( length - 3, 3, "?, " ) == 0 ) {
+        normalized.erase( length - 2 );
+    }
+    else {
+        normalized += '?';
+    }
+}
+
+// appends a value to a line of the log as a JSON string
+void slow_query_json_string( _Inout_ std::string& line, _In_ const std::string& value )
+{
+    static const char hex[] = "0123456789abcdef";
+
+    line += '"';
+    for( char c : value ) {
+        if( c == '"' || c == '\\' ) {
+            line += '\\';
+            line += c;
+        }
+        else if( static_cast<unsigned char>( c ) < 0x20 ) {
+            line.append( "\\u00" );
+            line += hex[( c >> 4 ) & 0xf];
+            line += hex[c & 0xf];
+        }
+        else {
+            line += c;
+        }
+    }
+    line += '"';
+}
+
+// The thread that writes the slow query log.  It takes all the lines queued at once, so that the requests are not
+// held by the lock while it writes them, and it stops once the queue is empty after core_sqlsrv_slow_query_shutdown.
+// The log is rotated to <path>.1 before a line would grow it past its maximum size.  Errors can't be reported from
+// this thread, so the lines that can't be written are dropped.
+void slow_query_write( void )
+{
+    std::unique_lock<std::mutex> guard( slow_queries.lock );
+
+    while( true ) {
+
+        slow_queries.wake.wait( guard, [] { return slow_queries.stopping || !slow_queries.lines.empty(); } );
+        if( slow_queries.lines.empty() ) {
+            return;
+        }
+
+        std::deque<std::string> lines;
+        lines.swap( slow_queries.lines );
+        guard.unlock();
+
+        FILE* file = fopen( slow_queries.path.c_str(), "ab" );
+        if( file != NULL ) {
+
+            fseek( file, 0, SEEK_END );
+            long long size = ftell( file );
+
+            for( const std::string& line : lines ) {
+                if( slow_queries.max_size > 0 && size > 0 && size + static_cast<long long>( line.length() ) > slow_queries.max_size ) {
+                    std::string rotated = slow_queries.path + ".1";
+                    fclose( file );
+                    remove( rotated.c_str() );
+                    rename( slow_queries.path.c_str(), rotated.c_str() );
+                    file = fopen( slow_queries.path.c_str(), "ab" );
+                    if( file == NULL ) {
+                        break;
+                    }
+                    size = 0;
+                }
+                fwrite( line.data(), 1, line.length(), file );
+                size += line.length();
+            }
+
+            if( file != NULL ) {
+                fclose( file );
+            }
+        }
+
+        guard.lock();
+    }
+}
 } // end of anonymous namespace
 
 ////////////////////////////////////////////////////////////////////////////////////////////////
@@ -2100,12 +3741,28 @@ void sqlsrv_param::release_data()
 
     ZVAL_UNDEF(&placeholder_z);
 
+    release_stream_data();
+
     buffer = NULL;
     param_stream = NULL;
     num_bytes_read = 0;
     param_ptr_z = NULL;
 }
 
+void sqlsrv_param::release_stream_data()
+{
+    if (stream_map != NULL) {
+        php_stream_mmap_unmap(param_stream);
+        stream_map = NULL;
+        stream_map_len = 0;
+    }
+
+    if (stream_buffer != NULL) {
+        sqlsrv_free(stream_buffer);
+        stream_buffer = NULL;
+    }
+}
+
 void sqlsrv_param::copy_param_meta_ae(_Inout_ zval* param_z, _In_ param_meta_data& meta)
 {
     // Always Encrypted (AE) enabled - copy the meta data from SQLDescribeParam()
@@ -2514,13 +4171,26 @@ void sqlsrv_param::bind_param(_Inout_ sqlsrv_stmt* stmt)
 void sqlsrv_param::init_data_from_zval(_Inout_ sqlsrv_stmt* stmt)
 {
     // Get the stream from the param zval value
+    release_stream_data();
     num_bytes_read = 0;
     param_stream = NULL;
     core::sqlsrv_php_stream_from_zval_no_verify(*stmt, param_stream, param_ptr_z);
+
+    stream_chunk = (stmt->stream_chunk_size > 0) ? static_cast<std::size_t>(stmt->stream_chunk_size) : PHP_STREAM_BUFFER_SIZE;
+
+    // A plain file read from its start whose data isn't converted is mapped into memory and sent from there without
+    // being copied. The mapping fails for an empty file, or one too large for the address space, which are read instead.
+    if (encoding != CP_UTF8 && php_stream_mmap_possible(param_stream) && php_stream_tell(param_stream) == 0) {
+        stream_map = php_stream_mmap_range(param_stream, 0, PHP_STREAM_MMAP_ALL, PHP_STREAM_MAP_MODE_SHARED_READONLY, &stream_map_len);
+    }
 }
 
 bool sqlsrv_param::send_data_packet(_Inout_ sqlsrv_stmt* stmt)
 {
+    if (stream_map != NULL) {
+        return send_mapped_packet(stmt);
+    }
+
     // Check EOF first
     if (php_stream_eof(param_stream)) {
         // But return to the very beginning of param_stream since SQLParamData() may ask for the same data again
@@ -2534,10 +4204,18 @@ bool sqlsrv_param::send_data_packet(_Inout_ sqlsrv_stmt* stmt)
 
         return false;
     } else {
+        // The buffer is allocated once per stream. For a UTF-8 stream it starts with the UTF-16 buffer, whose size is set
+        // for the worst case of UTF-8 to UTF-16 conversion, which is an expansion of 2x the UTF-8 size, followed by the
+        // chunk read with enough space for a cut off UTF-8 character. Other streams are sent as they are read.
+        std::size_t wbuffer_size = (encoding == CP_UTF8) ? stream_chunk + 3 : 0;
+        if (stream_buffer == NULL) {
+            stream_buffer = static_cast<char*>(sqlsrv_malloc(wbuffer_size * sizeof(SQLWCHAR) + stream_chunk + 3));
+        }
+        SQLWCHAR* wbuffer = reinterpret_cast<SQLWCHAR*>(stream_buffer);
+        char* buffer = stream_buffer + wbuffer_size * sizeof(SQLWCHAR);
+
         // Read the data from the stream, send it via SQLPutData and track how much is already sent.
-        char buffer[PHP_STREAM_BUFFER_SIZE + 1] = { '\0' };
-        std::size_t buffer_size = sizeof(buffer) - 3;   // -3 to preserve enough space for a cut off UTF-8 character
-        std::size_t read = php_stream_read(param_stream, buffer, buffer_size);
+        std::size_t read = php_stream_read(param_stream, buffer, stream_chunk);
 
         if (read > UINT_MAX) {
             LOG(SEV_ERROR, "PHP stream: buffer length exceeded.");
@@ -2557,17 +4235,12 @@ bool sqlsrv_param::send_data_packet(_Inout_ sqlsrv_stmt* stmt)
             // since all other MBCS supported by SQL Server are 2 byte maximum size.
 
             if (encoding == CP_UTF8) {
-                // The size of wbuffer is set for the worst case of UTF-8 to UTF-16 conversion, which is an
-                // expansion of 2x the UTF-8 size.
-                SQLWCHAR wbuffer[PHP_STREAM_BUFFER_SIZE + 1] = { L'\0' };
-                int wbuffer_size = static_cast<int>(sizeof(wbuffer) / sizeof(SQLWCHAR));
                 DWORD last_error_code = ERROR_SUCCESS;
 
-                // The buffer_size is the # of wchars.  Set to buffer_size / 2
 #ifndef _WIN32
-                int wsize = SystemLocale::ToUtf16Strict(encoding, buffer, static_cast<int>(read), wbuffer, wbuffer_size, &last_error_code);
+                int wsize = SystemLocale::ToUtf16Strict(encoding, buffer, static_cast<int>(read), wbuffer, static_cast<int>(wbuffer_size), &last_error_code);
 #else
-                int wsize = MultiByteToWideChar(encoding, MB_ERR_INVALID_CHARS, buffer, static_cast<int>(read), wbuffer, wbuffer_size);
+                int wsize = MultiByteToWideChar(encoding, MB_ERR_INVALID_CHARS, buffer, static_cast<int>(read), wbuffer, static_cast<int>(wbuffer_size));
                 last_error_code = GetLastError();
 #endif // !_WIN32
 
@@ -2584,9 +4257,9 @@ bool sqlsrv_param::send_data_packet(_Inout_ sqlsrv_stmt* stmt)
 
                     // Try the conversion again with the complete character
 #ifndef _WIN32
-                    wsize = SystemLocale::ToUtf16Strict(encoding, buffer, static_cast<int>(read + new_read), wbuffer, static_cast<int>(sizeof(wbuffer) / sizeof(SQLWCHAR)));
+                    wsize = SystemLocale::ToUtf16Strict(encoding, buffer, static_cast<int>(read + new_read), wbuffer, static_cast<int>(wbuffer_size));
 #else
-                    wsize = MultiByteToWideChar(encoding, MB_ERR_INVALID_CHARS, buffer, static_cast<int>(read + new_read), wbuffer, static_cast<int>(sizeof(wbuffer) / sizeof(wchar_t)));
+                    wsize = MultiByteToWideChar(encoding, MB_ERR_INVALID_CHARS, buffer, static_cast<int>(read + new_read), wbuffer, static_cast<int>(wbuffer_size));
 #endif //!_WIN32
                     // something else must be wrong if it failed
                     CHECK_CUSTOM_ERROR(wsize == 0, stmt, SQLSRV_ERROR_INPUT_STREAM_ENCODING_TRANSLATE, get_last_error_message(ERROR_NO_UNICODE_TRANSLATION), NULL) {
@@ -2603,6 +4276,24 @@ bool sqlsrv_param::send_data_packet(_Inout_ sqlsrv_stmt* stmt)
     } // NOT EOF
 }
 
+// Sends the next chunk of a stream parameter mapped into memory. Once the whole file is sent, it is unmapped and false is
+// returned. The position of the stream stays at its beginning, since SQLParamData() may ask for the same data again.
+bool sqlsrv_param::send_mapped_packet(_Inout_ sqlsrv_stmt* stmt)
+{
+    if (num_bytes_read == stream_map_len) {
+        release_stream_data();
+        num_bytes_read = 0;
+
+        return false;
+    }
+
+    std::size_t len = std::min(stream_chunk, stream_map_len - num_bytes_read);
+    core::SQLPutData(stmt, stream_map + num_bytes_read, static_cast<SQLLEN>(len));
+    num_bytes_read += len;
+
+    return true;
+}
+
 bool sqlsrv_param_inout::prepare_param(_In_ zval* param_ref, _Inout_ zval* param_z)
 {
     // Save the output param reference now
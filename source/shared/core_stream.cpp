@@ -34,6 +34,9 @@ int sqlsrv_stream_close( _Inout_ php_stream* stream, int /*close_handle*/ )
     // UNDEF the stream zval and delete our reference count to it.
     ZVAL_UNDEF( &( ss->stmt->active_stream ) );
 
+    if( ss->wide_buffer ) {
+        sqlsrv_free( ss->wide_buffer );
+    }
     sqlsrv_free( ss );
     stream->abstract = NULL;
 
@@ -53,11 +56,12 @@ size_t sqlsrv_stream_read(_Inout_ php_stream* stream, _Out_writes_bytes_(count)
 	SQLLEN read = 0;
     SQLSMALLINT c_type = SQL_C_CHAR;
     char* get_data_buffer = buf;
-    sqlsrv_malloc_auto_ptr<char> temp_buf;
 
     sqlsrv_stream* ss = static_cast<sqlsrv_stream*>( stream->abstract );
     SQLSRV_ASSERT( ss != NULL && ss->stmt != NULL, "sqlsrv_stream_read: sqlsrv_stream* ss is NULL." );
 
+    sqlsrv_trace_span span( SQLSRV_TRACE_STREAM_READ );
+
     try {
 
         if( stream->eof ) {
@@ -77,14 +81,16 @@ size_t sqlsrv_stream_read(_Inout_ php_stream* stream, _Out_writes_bytes_(count)
             {
                 c_type = SQL_C_WCHAR;
                 count /= 2;    // divide the number of bytes we read by 2 since converting to UTF-8 can cause an increase in bytes
-                if( count > PHP_STREAM_BUFFER_SIZE ) {
-                    count = PHP_STREAM_BUFFER_SIZE;
+                if( count > ss->chunk_size ) {
+                    count = ss->chunk_size;
                 }
 
-                // use a temporary buffer to retrieve from SQLGetData since we need to translate it to UTF-8 from UTF-16
-                temp_buf = static_cast<char*>( sqlsrv_malloc( PHP_STREAM_BUFFER_SIZE ));
-                memset(temp_buf, 0, PHP_STREAM_BUFFER_SIZE);
-                get_data_buffer = temp_buf;
+                // retrieve from SQLGetData into the stream's wide buffer since we need to translate it to UTF-8 from UTF-16.
+                // The buffer is kept for the life of the stream so each chunk is converted without a new allocation.
+                if( ss->wide_buffer == NULL ) {
+                    ss->wide_buffer = static_cast<char*>( sqlsrv_malloc( ss->chunk_size ));
+                }
+                get_data_buffer = ss->wide_buffer;
                 break;
             }
 
@@ -192,10 +198,10 @@ size_t sqlsrv_stream_read(_Inout_ php_stream* stream, _Out_writes_bytes_(count)
            }
 
 #ifndef _WIN32
-            int enc_len = SystemLocale::FromUtf16( ss->encoding, reinterpret_cast<LPCWSTR>( temp_buf.get() ),
+            int enc_len = SystemLocale::FromUtf16( ss->encoding, reinterpret_cast<LPCWSTR>( ss->wide_buffer ),
                                                    static_cast<int>(read >> 1), buf, static_cast<int>(count), NULL, NULL );
 #else
-            int enc_len = WideCharToMultiByte( ss->encoding, flags, reinterpret_cast<LPCWSTR>( temp_buf.get() ),
+            int enc_len = WideCharToMultiByte( ss->encoding, flags, reinterpret_cast<LPCWSTR>( ss->wide_buffer ),
                                                static_cast<int>(read >> 1), buf, static_cast<int>(count), NULL, NULL );
 #endif // !_WIN32
             if( enc_len == 0 ) {
@@ -207,6 +213,10 @@ size_t sqlsrv_stream_read(_Inout_ php_stream* stream, _Out_writes_bytes_(count)
             read = enc_len;
         }
 
+        core_sqlsrv_trace_count( SQLSRV_TRACE_BYTES_FETCHED, read );
+        if( ss->stmt->slow_query ) {
+            ss->stmt->slow_query->bytes += read;
+        }
         return static_cast<size_t>( read );
     }
     catch (core::CoreException&) {
@@ -256,8 +266,7 @@ static php_stream* sqlsrv_stream_opener( _In_opt_ php_stream_wrapper* wrapper, _
 
     sqlsrv_malloc_auto_ptr<sqlsrv_stream> ss;
 
-    ss = static_cast<sqlsrv_stream*>( sqlsrv_malloc( sizeof( sqlsrv_stream )));
-    memset( ss, 0, sizeof( sqlsrv_stream ));
+    ss = new ( sqlsrv_malloc( sizeof( sqlsrv_stream ))) sqlsrv_stream();
 
     // The function core_get_field_common() is changed to pass REPORT_ERRORS for
     // php_stream_open_wrapper(). Whether the error flag is toggled or cleared,
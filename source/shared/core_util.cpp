@@ -21,10 +21,43 @@
 
 #include "core_sqlsrv.h"
 
+#include <mutex>
+
+#if defined( __SSE2__ ) || defined( _M_X64 ) || ( defined( _M_IX86_FP ) && _M_IX86_FP >= 2 )
+#include <emmintrin.h>
+#define SQLSRV_ASCII_SSE2
+#endif
+
 namespace {
 
 severity_callback g_driver_severity;
 
+// *** tracing ***
+// The spans and counters are kept per process and updated by the threads of a thread safe build without a lock.
+
+struct trace_span_stats {
+    std::atomic<zend_long> count;
+    std::atomic<zend_long> total_time;      // in microseconds
+    std::atomic<zend_long> max_time;        // in microseconds
+};
+
+trace_span_stats trace_spans[SQLSRV_TRACE_SPAN_COUNT];
+std::atomic<zend_long> trace_counters[SQLSRV_TRACE_COUNTER_COUNT];
+
+const char* const TRACE_SPAN_NAMES[SQLSRV_TRACE_SPAN_COUNT] = { "Connect", "Prepare", "Execute", "Fetch", "GetData", "StreamRead" };
+const char* const TRACE_COUNTER_NAMES[SQLSRV_TRACE_COUNTER_COUNT] = { "RoundTrips", "BytesFetched", "Rows", "Conversions", "CacheHits" };
+
+// the lines are written to the sink once this many bytes are buffered, if the request has not ended before
+const size_t TRACE_BUFFER_SIZE = 64 * 1024;
+
+// the sink is set by MINIT only, while the buffer is shared by the requests of the process
+std::string trace_sink;
+std::mutex trace_lock;
+std::string trace_buffer;
+
+bool trace_sink_is_socket( void );
+bool trace_sink_is_datagram( void );
+
 // *** internal constants ***
 
 // buffer used to hold a formatted log message prior to actually logging it.
@@ -42,6 +75,11 @@ unsigned int convert_string_from_default_encoding( _In_ unsigned int php_encodin
                                                    _Out_writes_(utf16_len) __transfer( mbcs_in_string ) SQLWCHAR* utf16_out_string,
                                                    _In_ unsigned int utf16_len, bool use_strict_conversion = false );
 
+bool ascii_compatible( _In_ unsigned int encoding );
+SQLLEN mbcs_buffer_len( _In_ unsigned int encoding, _In_reads_(cchInLen) const SQLWCHAR* inString, _In_ SQLINTEGER cchInLen );
+int mbcs_from_utf16( _In_ unsigned int encoding, _In_reads_(cchInLen) const SQLWCHAR* inString, _In_ SQLINTEGER cchInLen,
+                     _Out_writes_bytes_(outLen) char* outString, _In_ SQLLEN outLen );
+
 // invoked by write_to_log() when the message severity qualifies to be logged
 // msg - the message to log in a FormatMessage style formatting
 // print_args - args to the message
@@ -90,12 +128,151 @@ void core_sqlsrv_register_severity_checker(_In_ severity_callback driver_checker
     g_driver_severity = driver_checker;
 }
 
+bool g_sqlsrv_trace_enabled = false;
+
+// core_sqlsrv_trace_init
+// Turns tracing on or off for the process, called by MINIT before any request.
+// Parameters:
+// enabled - whether the spans and counters are kept
+// sink - the file or socket to which the spans are written, or NULL or empty to keep them in memory only
+
+void core_sqlsrv_trace_init( _In_ bool enabled, _In_opt_z_ const char* sink )
+{
+    g_sqlsrv_trace_enabled = enabled;
+    trace_sink = ( enabled && sink != NULL ) ? sink : "";
+}
+
+void core_sqlsrv_trace_add( _In_ sqlsrv_trace_counter counter, _In_ zend_long value )
+{
+    trace_counters[counter].fetch_add( value, std::memory_order_relaxed );
+}
+
+// core_sqlsrv_trace_end_span
+// Adds a span that has ended to the statistics of its kind, and buffers its line for the sink.
+
+void core_sqlsrv_trace_end_span( _In_ sqlsrv_trace_span_kind kind, _In_ std::chrono::steady_clock::time_point start )
+{
+    zend_long elapsed = static_cast<zend_long>( std::chrono::duration_cast<std::chrono::microseconds>(
+                                                std::chrono::steady_clock::now() - start ).count() );
+
+    trace_span_stats& stats = trace_spans[kind];
+    stats.count.fetch_add( 1, std::memory_order_relaxed );
+    stats.total_time.fetch_add( elapsed, std::memory_order_relaxed );
+    zend_long max_time = stats.max_time.load( std::memory_order_relaxed );
+    while( elapsed > max_time && !stats.max_time.compare_exchange_weak( max_time, elapsed, std::memory_order_relaxed )) {
+    }
+
+    if( trace_sink.empty() ) {
+        return;
+    }
+
+    // the start is given in microseconds since the epoch so that the lines of several processes can be merged
+    long long started = static_cast<long long>( std::chrono::duration_cast<std::chrono::microseconds>(
+                                                std::chrono::system_clock::now().time_since_epoch() ).count() ) - elapsed;
+    std::string line( "{\"span\":\"" );
+    line.append( TRACE_SPAN_NAMES[kind] ).append( "\",\"start\":" ).append( std::to_string( started ));
+    line.append( ",\"duration\":" ).append( std::to_string( static_cast<long long>( elapsed ))).append( "}\n" );
+
+    bool full = false;
+    {
+        std::lock_guard<std::mutex> guard( trace_lock );
+        trace_buffer.append( line );
+        full = ( trace_buffer.length() >= TRACE_BUFFER_SIZE );
+    }
+
+    if( full ) {
+        core_sqlsrv_trace_flush();
+    }
+}
+
+// core_sqlsrv_trace_flush
+// Writes the buffered lines to the sink, called when a request ends and when the buffer is full.  The lines are lost
+// when the sink cannot be opened, rather than failing the request.  Each line is sent as its own datagram to a udp://
+// or udg:// socket.
+
+void core_sqlsrv_trace_flush( void )
+{
+    if( trace_sink.empty() ) {
+        return;
+    }
+
+    std::string lines;
+    {
+        std::lock_guard<std::mutex> guard( trace_lock );
+        lines.swap( trace_buffer );
+    }
+
+    if( lines.empty() ) {
+        return;
+    }
+
+    php_stream* stream = NULL;
+    if( trace_sink_is_socket() ) {
+        stream = php_stream_xport_create( trace_sink.c_str(), trace_sink.length(), 0, STREAM_XPORT_CLIENT | STREAM_XPORT_CONNECT,
+                                          NULL, NULL, NULL, NULL, NULL );
+    }
+    else {
+        stream = php_stream_open_wrapper( const_cast<char*>( trace_sink.c_str() ), "ab", 0, NULL );
+    }
+
+    if( stream == NULL ) {
+        LOG( SEV_WARNING, "Failed to open the trace sink %1!s!.", trace_sink.c_str() );
+        return;
+    }
+
+    if( trace_sink_is_datagram() ) {
+        size_t begin = 0;
+        while( begin < lines.length() ) {
+            size_t end = lines.find( '\n', begin ) + 1;
+            php_stream_write( stream, lines.data() + begin, end - begin );
+            begin = end;
+        }
+    }
+    else {
+        php_stream_write( stream, lines.data(), lines.length() );
+    }
+
+    php_stream_close( stream );
+}
+
+// core_sqlsrv_get_trace_info
+// Returns whether tracing is on, the number, total and maximum time in microseconds of each kind of span, and the counters.
+// Parameters:
+// info - zval for returning the array of values
+
+void core_sqlsrv_get_trace_info( _Out_ zval* info )
+{
+    array_init( info );
+
+    add_assoc_bool( info, "Enabled", g_sqlsrv_trace_enabled );
+
+    zval spans;
+    array_init( &spans );
+    for( int i = 0; i < SQLSRV_TRACE_SPAN_COUNT; ++i ) {
+        zval span;
+        array_init( &span );
+        add_assoc_long( &span, "Count", trace_spans[i].count.load( std::memory_order_relaxed ));
+        add_assoc_long( &span, "TotalTime", trace_spans[i].total_time.load( std::memory_order_relaxed ));
+        add_assoc_long( &span, "MaxTime", trace_spans[i].max_time.load( std::memory_order_relaxed ));
+        add_assoc_zval( &spans, TRACE_SPAN_NAMES[i], &span );
+    }
+    add_assoc_zval( info, "Spans", &spans );
+
+    zval counters;
+    array_init( &counters );
+    for( int i = 0; i < SQLSRV_TRACE_COUNTER_COUNT; ++i ) {
+        add_assoc_long( &counters, TRACE_COUNTER_NAMES[i], trace_counters[i].load( std::memory_order_relaxed ));
+    }
+    add_assoc_zval( info, "Counters", &counters );
+}
+
 // convert a string from utf-16 to the encoding and return the new string in the pointer parameter and new
 // length in the len parameter.  If no errors occurred during convertion, true is returned and the original
 // utf-16 string is released by this function if no errors occurred.  Otherwise the parameters are not changed
 // and false is returned.
 
-bool convert_string_from_utf16_inplace( _In_ SQLSRV_ENCODING encoding, _Inout_updates_z_(len) char** string, _Inout_ SQLLEN& len)
+bool convert_string_from_utf16_inplace( _In_ SQLSRV_ENCODING encoding, _Inout_updates_z_(len) char** string, _Inout_ SQLLEN& len,
+                                        _Inout_opt_ sqlsrv_scratch_buffer* scratch )
 {
     SQLSRV_ASSERT( string != NULL, "String must be specified" );
 
@@ -103,6 +280,38 @@ bool convert_string_from_utf16_inplace( _In_ SQLSRV_ENCODING encoding, _Inout_up
 		return true;
 	}
 
+    core_sqlsrv_trace_count( SQLSRV_TRACE_CONVERSIONS );
+
+    const SQLWCHAR* wstring = reinterpret_cast<const SQLWCHAR*>( *string );
+    SQLINTEGER wlen = static_cast<SQLINTEGER>( len / sizeof( SQLWCHAR ));
+
+    // an ASCII string is narrowed within its own buffer, without any allocation
+    if( ascii_compatible( encoding ) && utf16_ascii_len( wstring, wlen ) == static_cast<size_t>( wlen )) {
+        ascii_from_utf16( wstring, wlen, *string );
+        (*string)[wlen] = '\0';
+        len = wlen;
+        return true;
+    }
+
+    // other strings are converted into the scratch buffer, then copied back to their own buffer, which holds
+    // at least len + 1 bytes, unless they became longer
+    SQLLEN buffer_len = ( scratch != NULL ) ? mbcs_buffer_len( encoding, wstring, wlen ) : 0;
+    char* buffer = ( buffer_len > 0 ) ? scratch->reserve( buffer_len ) : NULL;
+    if( buffer != NULL ) {
+        int rc = mbcs_from_utf16( encoding, wstring, wlen, buffer, buffer_len );
+        if( rc == 0 ) {
+            return false;
+        }
+        if( rc > len ) {
+            sqlsrv_free( *string );
+            *string = reinterpret_cast<char*>( sqlsrv_malloc( rc + 1 ));
+        }
+        memcpy_s( *string, rc, buffer, rc );
+        (*string)[rc] = '\0';
+        len = rc;
+        return true;
+    }
+
     char* outString = NULL;
     SQLLEN outLen = 0;
 
@@ -139,6 +348,8 @@ bool convert_string_from_utf16( _In_ SQLSRV_ENCODING encoding, _In_reads_bytes_(
     SQLSRV_ASSERT( outString != NULL, "Output buffer pointer must be specified" );
     SQLSRV_ASSERT( *outString == NULL, "Output buffer pointer must not be set" );
 
+    core_sqlsrv_trace_count( SQLSRV_TRACE_CONVERSIONS );
+
     if (cchInLen == 0 && inString[0] == L'\0') {
         *outString = reinterpret_cast<char*>( sqlsrv_malloc ( 1 ) );
         *outString[0] = '\0';
@@ -146,51 +357,42 @@ bool convert_string_from_utf16( _In_ SQLSRV_ENCODING encoding, _In_reads_bytes_(
         return true;
     }
 
-#ifndef _WIN32
-    // Allocate enough space to hold the largest possible number of bytes for UTF-8 conversion
-    // instead of calling FromUtf16, for performance reasons
-    cchOutLen = 4 * cchInLen;
-#else
-    // flags set to 0 by default, which means that any invalid characters are dropped rather than causing
-    // an error.   This happens only on XP.
-    DWORD flags = 0;
-    if( encoding == CP_UTF8 && isVistaOrGreater ) {
-        // Vista (and later) will detect invalid UTF-16 characters and raise an error.
-        flags = WC_ERR_INVALID_CHARS;
-    }
-
-    // Calculate the number of output bytes required - no performance hit here because
-    // WideCharToMultiByte is highly optimised
-    cchOutLen = WideCharToMultiByte( encoding, flags,
-                                   inString, cchInLen,
-                                   NULL, 0, NULL, NULL );
-#endif // !_WIN32
-
-    if( cchOutLen == 0 ) {
-        return false;
+    // the leading ASCII characters, often the whole string, are copied without calling the system converter
+    size_t ascii_len = ascii_compatible( encoding ) ? utf16_ascii_len( inString, cchInLen ) : 0;
+    const SQLWCHAR* rest = inString + ascii_len;
+    SQLINTEGER cchRest = cchInLen - static_cast<SQLINTEGER>( ascii_len );
+
+    SQLLEN rest_len = 0;
+    if( cchRest > 0 ) {
+        rest_len = mbcs_buffer_len( encoding, rest, cchRest );
+        if( rest_len == 0 ) {
+            cchOutLen = 0;
+            return false;
+        }
     }
 
     // Create a buffer to fit the encoded string
-    char* newString = reinterpret_cast<char*>( sqlsrv_malloc( cchOutLen + 1 /* NULL char*/ ));
-    memset(newString, '\0', cchOutLen+1);
+    char* newString = reinterpret_cast<char*>( sqlsrv_malloc( ascii_len + rest_len + 1 /* NULL char*/ ));
+    ascii_from_utf16( inString, ascii_len, newString );
+
+    if( cchRest > 0 ) {
+        int rc = mbcs_from_utf16( encoding, rest, cchRest, newString + ascii_len, rest_len );
+        if( rc == 0 ) {
+            cchOutLen = 0;
+            sqlsrv_free( newString );
+            return false;
+        }
 
-#ifndef _WIN32
-    int rc = SystemLocale::FromUtf16Strict( encoding, inString, cchInLen, newString, static_cast<int>(cchOutLen));
-#else
-    int rc = WideCharToMultiByte( encoding, flags, inString, cchInLen, newString, static_cast<int>(cchOutLen), NULL, NULL );
-#endif // !_WIN32
-    if( rc == 0 ) {
-        cchOutLen = 0;
-        sqlsrv_free( newString );
-        return false;
+        // the buffer may have been sized for the largest possible number of bytes
+        if( rc < rest_len ) {
+            newString = reinterpret_cast<char*>( sqlsrv_realloc( newString, ascii_len + rc + 1 ));
+        }
+        rest_len = rc;
     }
-    char* newString2 = reinterpret_cast<char*>( sqlsrv_malloc( rc + 1 /* NULL char*/ ));
-    memset(newString2, '\0', rc+1);
-    memcpy_s(newString2, rc, newString, rc);
-    sqlsrv_free( newString );
 
-    *outString = newString2;
-    cchOutLen = rc;
+    cchOutLen = static_cast<SQLLEN>( ascii_len ) + rest_len;
+    newString[cchOutLen] = '\0';
+    *outString = newString;
 
     return true;
 }
@@ -201,6 +403,8 @@ bool convert_string_from_utf16( _In_ SQLSRV_ENCODING encoding, _In_reads_bytes_(
 SQLWCHAR* utf16_string_from_mbcs_string( _In_ SQLSRV_ENCODING php_encoding, _In_reads_bytes_(mbcs_len) const char* mbcs_string, _In_ unsigned int mbcs_len,
                                         _Out_ unsigned int* utf16_len, bool use_strict_conversion )
 {
+    core_sqlsrv_trace_count( SQLSRV_TRACE_CONVERSIONS );
+
     *utf16_len = (mbcs_len + 1);
     SQLWCHAR* utf16_string = reinterpret_cast<SQLWCHAR*>( sqlsrv_malloc( *utf16_len * sizeof( SQLWCHAR )));
     *utf16_len = convert_string_from_default_encoding( php_encoding, mbcs_string, mbcs_len, utf16_string, *utf16_len, use_strict_conversion );
@@ -216,6 +420,242 @@ SQLWCHAR* utf16_string_from_mbcs_string( _In_ SQLSRV_ENCODING php_encoding, _In_
     return utf16_string;
 }
 
+// Returns the number of leading ASCII characters in a UTF-16 string
+size_t utf16_ascii_len( _In_reads_(len) const SQLWCHAR* str, _In_ size_t len )
+{
+    static_assert( sizeof( SQLWCHAR ) == 2, "SQLWCHAR must be 2 bytes" );
+
+    size_t i = 0;
+#ifdef SQLSRV_ASCII_SSE2
+    const __m128i non_ascii = _mm_set1_epi16( static_cast<short>( 0xFF80 ));
+    const __m128i zero = _mm_setzero_si128();
+    for( ; i + 8 <= len; i += 8 ) {
+        __m128i chars = _mm_loadu_si128( reinterpret_cast<const __m128i*>( str + i ));
+        if( _mm_movemask_epi8( _mm_cmpeq_epi16( _mm_and_si128( chars, non_ascii ), zero )) != 0xFFFF ) {
+            break;
+        }
+    }
+#else
+    for( ; i + 4 <= len; i += 4 ) {
+        uint64_t chars;
+        memcpy( &chars, str + i, sizeof( chars ));
+        if( chars & 0xFF80FF80FF80FF80ULL ) {
+            break;
+        }
+    }
+#endif // SQLSRV_ASCII_SSE2
+    while( i < len && str[i] < 0x80 ) {
+        ++i;
+    }
+    return i;
+}
+
+// Returns the number of leading ASCII characters in a single or multibyte string
+size_t mbcs_ascii_len( _In_reads_(len) const char* str, _In_ size_t len )
+{
+    size_t i = 0;
+#ifdef SQLSRV_ASCII_SSE2
+    for( ; i + 16 <= len; i += 16 ) {
+        if( _mm_movemask_epi8( _mm_loadu_si128( reinterpret_cast<const __m128i*>( str + i ))) != 0 ) {
+            break;
+        }
+    }
+#else
+    for( ; i + 8 <= len; i += 8 ) {
+        uint64_t chars;
+        memcpy( &chars, str + i, sizeof( chars ));
+        if( chars & 0x8080808080808080ULL ) {
+            break;
+        }
+    }
+#endif // SQLSRV_ASCII_SSE2
+    while( i < len && static_cast<unsigned char>( str[i] ) < 0x80 ) {
+        ++i;
+    }
+    return i;
+}
+
+// Copies ASCII characters from UTF-16.  out may be the same buffer as in, since each block of characters
+// is read before it is written over.
+void ascii_from_utf16( _In_reads_(len) const SQLWCHAR* in, _In_ size_t len, _Out_writes_(len) char* out )
+{
+    size_t i = 0;
+#ifdef SQLSRV_ASCII_SSE2
+    for( ; i + 16 <= len; i += 16 ) {
+        __m128i low = _mm_loadu_si128( reinterpret_cast<const __m128i*>( in + i ));
+        __m128i high = _mm_loadu_si128( reinterpret_cast<const __m128i*>( in + i + 8 ));
+        _mm_storeu_si128( reinterpret_cast<__m128i*>( out + i ), _mm_packus_epi16( low, high ));
+    }
+#endif // SQLSRV_ASCII_SSE2
+    for( ; i < len; ++i ) {
+        out[i] = static_cast<char>( in[i] );
+    }
+}
+
+// Copies ASCII characters to UTF-16
+void ascii_to_utf16( _In_reads_(len) const char* in, _In_ size_t len, _Out_writes_(len) SQLWCHAR* out )
+{
+    size_t i = 0;
+#ifdef SQLSRV_ASCII_SSE2
+    const __m128i zero = _mm_setzero_si128();
+    for( ; i + 16 <= len; i += 16 ) {
+        __m128i chars = _mm_loadu_si128( reinterpret_cast<const __m128i*>( in + i ));
+        _mm_storeu_si128( reinterpret_cast<__m128i*>( out + i ), _mm_unpacklo_epi8( chars, zero ));
+        _mm_storeu_si128( reinterpret_cast<__m128i*>( out + i + 8 ), _mm_unpackhi_epi8( chars, zero ));
+    }
+#endif // SQLSRV_ASCII_SSE2
+    for( ; i < len; ++i ) {
+        out[i] = static_cast<SQLWCHAR>( static_cast<unsigned char>( in[i] ));
+    }
+}
+
+namespace {
+
+// Writes the digits of value right aligned in out, and returns the number of digits written
+size_t format_digits( _In_ unsigned long long value, _Out_writes_(MAX_INTEGER_STRING_LEN) char* out )
+{
+    char* p = out + MAX_INTEGER_STRING_LEN;
+    do {
+        *--p = static_cast<char>( '0' + value % 10 );
+        value /= 10;
+    } while( value != 0 );
+
+    return out + MAX_INTEGER_STRING_LEN - p;
+}
+
+// Writes value as exactly width digits, with leading zeroes
+char* format_fixed( _In_ unsigned int value, _In_ int width, _Out_writes_(width) char* out )
+{
+    for( int i = width - 1; i >= 0; --i ) {
+        out[i] = static_cast<char>( '0' + value % 10 );
+        value /= 10;
+    }
+
+    return out + width;
+}
+
+}
+
+// Formats an integer as the standard streams do without a locale, with a minus sign when negative
+size_t format_integer( _In_ long long value, _Out_writes_(MAX_INTEGER_STRING_LEN) char* out )
+{
+    char digits[MAX_INTEGER_STRING_LEN];
+    unsigned long long magnitude = ( value < 0 ) ? 0ULL - static_cast<unsigned long long>( value ) : value;
+    size_t len = format_digits( magnitude, digits );
+    size_t sign = 0;
+
+    if( value < 0 ) {
+        out[sign++] = '-';
+    }
+    memcpy( out + sign, digits + MAX_INTEGER_STRING_LEN - len, len );
+
+    return len + sign;
+}
+
+// Formats a decimal or numeric value as the ODBC driver does, with exactly scale decimals and no leading zero
+// before the decimal point, e.g. -.50 for a decimal(5, 2) of -0.5.  The 128 bit value is divided by 10^9 as four
+// 32 bit words, which gives its digits nine at a time.
+size_t format_numeric( _In_ const SQL_NUMERIC_STRUCT& value, _Out_writes_(MAX_NUMERIC_STRING_LEN) char* out )
+{
+    const unsigned int BILLION = 1000000000;
+
+    unsigned int words[4];
+    for( int i = 0; i < 4; ++i ) {
+        words[i] = value.val[i * 4] | ( value.val[i * 4 + 1] << 8 ) | ( value.val[i * 4 + 2] << 16 ) |
+                   ( static_cast<unsigned int>( value.val[i * 4 + 3] ) << 24 );
+    }
+
+    // the digits are written from the end of the buffer, nine for each division but the last
+    char digits[MAX_NUMERIC_STRING_LEN];
+    char* p = digits + MAX_NUMERIC_STRING_LEN;
+    int top = 3;
+    while( top >= 0 && words[top] == 0 ) {
+        --top;
+    }
+    while( top >= 0 ) {
+        unsigned long long remainder = 0;
+        for( int i = top; i >= 0; --i ) {
+            unsigned long long current = ( remainder << 32 ) | words[i];
+            words[i] = static_cast<unsigned int>( current / BILLION );
+            remainder = current % BILLION;
+        }
+        while( top >= 0 && words[top] == 0 ) {
+            --top;
+        }
+        unsigned int chunk = static_cast<unsigned int>( remainder );
+        if( top >= 0 ) {
+            p -= 9;
+            format_fixed( chunk, 9, p );
+        }
+        else {
+            while( chunk != 0 ) {
+                *--p = static_cast<char>( '0' + chunk % 10 );
+                chunk /= 10;
+            }
+        }
+    }
+
+    int scale = ( value.scale > 0 ) ? value.scale : 0;
+    int len = static_cast<int>( digits + MAX_NUMERIC_STRING_LEN - p );
+
+    // a value without decimals is at least 0, while the decimals are padded with leading zeroes
+    int min_len = ( scale > 0 ) ? scale : 1;
+    while( len < min_len ) {
+        *--p = '0';
+        ++len;
+    }
+
+    char* q = out;
+    bool is_zero = true;
+    for( int i = 0; i < 16 && is_zero; ++i ) {
+        is_zero = ( value.val[i] == 0 );
+    }
+    if( value.sign == 0 && !is_zero ) {
+        *q++ = '-';
+    }
+    memcpy( q, p, len - scale );
+    q += len - scale;
+    if( scale > 0 ) {
+        *q++ = '.';
+        memcpy( q, p + len - scale, scale );
+        q += scale;
+    }
+
+    return q - out;
+}
+
+// Formats a date or datetime value as the ODBC driver does, as yyyy-mm-dd for a date and yyyy-mm-dd hh:mm:ss
+// followed by scale digits of the fraction of a second for the datetime types.
+size_t format_timestamp( _In_ const SQL_TIMESTAMP_STRUCT& value, _In_ SQLSMALLINT scale, _In_ bool date_only,
+                         _Out_writes_(MAX_TIMESTAMP_STRING_LEN) char* out )
+{
+    char* p = format_fixed( value.year, 4, out );
+    *p++ = '-';
+    p = format_fixed( value.month, 2, p );
+    *p++ = '-';
+    p = format_fixed( value.day, 2, p );
+    if( date_only ) {
+        return p - out;
+    }
+
+    *p++ = ' ';
+    p = format_fixed( value.hour, 2, p );
+    *p++ = ':';
+    p = format_fixed( value.minute, 2, p );
+    *p++ = ':';
+    p = format_fixed( value.second, 2, p );
+    if( scale > 0 ) {
+        // the fraction is in nanoseconds, of which the first scale digits are kept
+        char fraction[9];
+        format_fixed( value.fraction, 9, fraction );
+        *p++ = '.';
+        memcpy( p, fraction, ( scale < 9 ) ? scale : 9 );
+        p += ( scale < 9 ) ? scale : 9;
+    }
+
+    return p - out;
+}
+
 // Converts an input (assuming a datetime string) to a zval containing a PHP DateTime object.
 // If the input is null, this simply returns a NULL zval. If anything wrong occurs during conversion,
 // an exception will be thrown.
@@ -460,6 +900,22 @@ unsigned int convert_string_from_default_encoding( _In_ unsigned int php_encodin
             win_encoding = php_encoding;
             break;
     }
+
+    // the leading ASCII characters, often the whole string, are copied without calling the system converter
+    unsigned int ascii_len = 0;
+    if( mbcs_len > 0 && ascii_compatible( php_encoding )) {
+        ascii_len = static_cast<unsigned int>( mbcs_ascii_len( mbcs_in_string, mbcs_len ));
+        ascii_to_utf16( mbcs_in_string, ascii_len, utf16_out_string );
+        if( ascii_len == mbcs_len ) {
+            utf16_out_string[ascii_len] = '\0';
+            return ascii_len;
+        }
+        mbcs_in_string += ascii_len;
+        mbcs_len -= ascii_len;
+        utf16_out_string += ascii_len;
+        utf16_len -= ascii_len;
+    }
+
 #ifndef _WIN32
     unsigned int required_len;
     if (use_strict_conversion) {
@@ -477,7 +933,64 @@ unsigned int convert_string_from_default_encoding( _In_ unsigned int php_encodin
     }
     utf16_out_string[required_len] = '\0';
 
-    return required_len;
+    return ascii_len + required_len;
+}
+
+// ASCII characters are the same in UTF-8 and in the code pages of the system
+bool ascii_compatible( _In_ unsigned int encoding )
+{
+    return ( encoding == SQLSRV_ENCODING_CHAR || encoding == CP_UTF8 || encoding == CP_ACP );
+}
+
+#ifdef _WIN32
+// flags set to 0 by default, which means that any invalid characters are dropped rather than causing
+// an error.   This happens only on XP.
+DWORD utf16_conversion_flags( _In_ unsigned int encoding )
+{
+    // Vista (and later) will detect invalid UTF-16 characters and raise an error.
+    return ( encoding == CP_UTF8 && isVistaOrGreater ) ? WC_ERR_INVALID_CHARS : 0;
+}
+#endif // _WIN32
+
+// returns the size in bytes of a buffer large enough for a UTF-16 string converted to the encoding,
+// or 0 if the string can't be converted
+SQLLEN mbcs_buffer_len( _In_ unsigned int encoding, _In_reads_(cchInLen) const SQLWCHAR* inString, _In_ SQLINTEGER cchInLen )
+{
+#ifndef _WIN32
+    // Allocate enough space to hold the largest possible number of bytes for UTF-8 conversion
+    // instead of calling FromUtf16, for performance reasons
+    SQLSRV_UNUSED( encoding );
+    SQLSRV_UNUSED( inString );
+    return 4 * static_cast<SQLLEN>( cchInLen );
+#else
+    // Calculate the number of output bytes required - no performance hit here because
+    // WideCharToMultiByte is highly optimised
+    return WideCharToMultiByte( encoding, utf16_conversion_flags( encoding ), inString, cchInLen, NULL, 0, NULL, NULL );
+#endif // !_WIN32
+}
+
+// converts a UTF-16 string to the encoding in a buffer of outLen bytes and returns the number of bytes
+// written, or 0 if the string can't be converted
+int mbcs_from_utf16( _In_ unsigned int encoding, _In_reads_(cchInLen) const SQLWCHAR* inString, _In_ SQLINTEGER cchInLen,
+                     _Out_writes_bytes_(outLen) char* outString, _In_ SQLLEN outLen )
+{
+#ifndef _WIN32
+    return static_cast<int>( SystemLocale::FromUtf16Strict( encoding, inString, cchInLen, outString, static_cast<int>( outLen )));
+#else
+    return WideCharToMultiByte( encoding, utf16_conversion_flags( encoding ), inString, cchInLen, outString, static_cast<int>( outLen ), NULL, NULL );
+#endif // !_WIN32
+}
+
+
+// a sink given as a URL of one of the socket transports of PHP is opened as a socket, and anything else as a file
+bool trace_sink_is_socket( void )
+{
+    return ( trace_sink.compare( 0, 6, "tcp://" ) == 0 || trace_sink.compare( 0, 7, "unix://" ) == 0 || trace_sink_is_datagram() );
+}
+
+bool trace_sink_is_datagram( void )
+{
+    return ( trace_sink.compare( 0, 6, "udp://" ) == 0 || trace_sink.compare( 0, 6, "udg://" ) == 0 );
 }
 
 }
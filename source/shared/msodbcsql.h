@@ -85,6 +85,7 @@
 #define SQL_COPT_SS_BASE_EX                         1240
 #define SQL_COPT_SS_WARN_ON_CP_ERROR                (SQL_COPT_SS_BASE_EX+3) // Issues warning when data from the server had a loss during code page conversion. 
 #define SQL_COPT_SS_CONNECTION_DEAD                 (SQL_COPT_SS_BASE_EX+4) // dbdead SQLGetConnectOption only. It will try to ping the server. Expensive connection check 
+#define SQL_COPT_SS_RESET_CONNECTION                (SQL_COPT_SS_BASE_EX+6) // When this attribute is set, the server resets the session state of the connection with the next request 
 #define SQL_COPT_SS_APPLICATION_INTENT              (SQL_COPT_SS_BASE_EX+7) // Application Intent 
 #define SQL_COPT_SS_MULTISUBNET_FAILOVER            (SQL_COPT_SS_BASE_EX+8) // Multi-subnet Failover 
 #define SQL_COPT_SS_TNIR                            (SQL_COPT_SS_BASE_EX+9) // Transparent Network IP Resolution 
@@ -198,6 +199,8 @@
 // SQL_COPT_SS_MARS_ENABLED 
 #define SQL_MARS_ENABLED_NO                 0L
 #define SQL_MARS_ENABLED_YES                1L
+// SQL_COPT_SS_RESET_CONNECTION 
+#define SQL_RESET_CONNECTION_YES            1L
 // SQL_TXN_ISOLATION_OPTION bitmasks 
 #define SQL_TXN_SS_SNAPSHOT                 0x00000020L
 
@@ -182,6 +182,9 @@ void add_conn_option_key( _Inout_ sqlsrv_context& ctx, _In_ zend_string* key, _I
 void add_stmt_option_key( _Inout_ sqlsrv_context& ctx, _In_ zend_string* key, _In_ size_t key_len, _Inout_ HashTable* options_ht, _Inout_ zval* data );
 int get_conn_option_key( _Inout_ sqlsrv_context& ctx, _In_ zend_string* key, _In_ size_t key_len, _Inout_ zval const* value_z );
 int get_stmt_option_key( _In_ zend_string* key, _In_ size_t key_len );
+void query_common( INTERNAL_FUNCTION_PARAMETERS, _In_ const char* _FN_, _In_ bool async );
+void execute_query( _Inout_ ss_sqlsrv_conn* conn, _In_reads_bytes_(sql_len) const char* sql, _In_ size_t sql_len, _In_opt_ zval* params_z,
+                    _In_opt_ zval* options_z, _In_ const char* _FN_, _In_ bool async, _Out_ zval* return_value );
 
 }
 
@@ -206,6 +209,11 @@ namespace SSStmtOptionNames {
     const char FORMAT_DECIMALS[] = "FormatDecimals";
     const char DECIMAL_PLACES[] = "DecimalPlaces";
     const char DATA_CLASSIFICATION[] = "DataClassification";
+    const char FETCH_BLOCK_SIZE[] = "FetchBlockSize";
+    const char CLIENT_BUFFER_SPILL[] = "ClientBufferSpill";
+    const char STREAM_CHUNK_SIZE[] = "StreamChunkSize";
+    const char DEFER_PREPARE[] = "DeferPrepare";
+    const char READ_AHEAD[] = "ReadAhead";
 }
 
 namespace SSConnOptionNames {
@@ -227,6 +235,7 @@ const char Database[] = "Database";
 const char DecimalPlaces[] = "DecimalPlaces";
 const char FormatDecimals[] = "FormatDecimals";
 const char DateAsString[] = "ReturnDatesAsStrings";
+const char DeferPrepare[] = "DeferPrepare";
 const char Driver[] = "Driver";
 const char Encrypt[] = "Encrypt";
 const char Failover_Partner[] = "Failover_Partner";
@@ -236,6 +245,7 @@ const char KeyStoreSecret[] = "KeyStoreSecret";
 const char LoginTimeout[] = "LoginTimeout";
 const char MARS_Option[] = "MultipleActiveResultSets";
 const char MultiSubnetFailover[] = "MultiSubnetFailover";
+const char Persistent[] = "Persistent";
 const char PWD[] = "PWD";
 const char QuotedId[] = "QuotedId";
 const char TraceFile[] = "TraceFile";
@@ -247,6 +257,8 @@ const char UID[] = "UID";
 const char WSID[] = "WSID";
 const char ComputePool[] = "ComputePool";
 const char HostNameInCertificate[] = "HostNameInCertificate";
+const char StatementCacheSize[] = "StatementCacheSize";
+const char StatementCacheMaxKBSize[] = "StatementCacheMaxKBSize";
 
 }
 
@@ -307,6 +319,36 @@ const stmt_option SS_STMT_OPTS[] = {
         SQLSRV_STMT_OPTION_DATA_CLASSIFICATION,
         std::unique_ptr<stmt_option_data_classification>( new stmt_option_data_classification )
     },
+    {
+        SSStmtOptionNames::FETCH_BLOCK_SIZE,
+        sizeof( SSStmtOptionNames::FETCH_BLOCK_SIZE ),
+        SQLSRV_STMT_OPTION_FETCH_BLOCK_SIZE,
+        std::unique_ptr<stmt_option_fetch_block_size>( new stmt_option_fetch_block_size )
+    },
+    {
+        SSStmtOptionNames::CLIENT_BUFFER_SPILL,
+        sizeof( SSStmtOptionNames::CLIENT_BUFFER_SPILL ),
+        SQLSRV_STMT_OPTION_CLIENT_BUFFER_SPILL,
+        std::unique_ptr<stmt_option_buffered_query_spill>( new stmt_option_buffered_query_spill )
+    },
+    {
+        SSStmtOptionNames::STREAM_CHUNK_SIZE,
+        sizeof( SSStmtOptionNames::STREAM_CHUNK_SIZE ),
+        SQLSRV_STMT_OPTION_STREAM_CHUNK_SIZE,
+        std::unique_ptr<stmt_option_stream_chunk_size>( new stmt_option_stream_chunk_size )
+    },
+    {
+        SSStmtOptionNames::DEFER_PREPARE,
+        sizeof( SSStmtOptionNames::DEFER_PREPARE ),
+        SQLSRV_STMT_OPTION_DEFER_PREPARE,
+        std::unique_ptr<stmt_option_defer_prepare>( new stmt_option_defer_prepare )
+    },
+    {
+        SSStmtOptionNames::READ_AHEAD,
+        sizeof( SSStmtOptionNames::READ_AHEAD ),
+        SQLSRV_STMT_OPTION_READ_AHEAD,
+        std::unique_ptr<stmt_option_read_ahead>( new stmt_option_read_ahead )
+    },
     { NULL, 0, SQLSRV_STMT_OPTION_INVALID, std::unique_ptr<stmt_option_functor>{} },
 };
 
@@ -610,6 +652,42 @@ const connection_option SS_CONN_OPTS[] = {
         CONN_ATTR_STRING,
         conn_str_append_func::func
     },
+    {
+        SSConnOptionNames::StatementCacheSize,
+        sizeof( SSConnOptionNames::StatementCacheSize ),
+        SQLSRV_CONN_OPTION_STMT_CACHE_SIZE,
+        SSConnOptionNames::StatementCacheSize,
+        sizeof( SSConnOptionNames::StatementCacheSize ),
+        CONN_ATTR_INT,
+        stmt_cache_set_func::func
+    },
+    {
+        SSConnOptionNames::StatementCacheMaxKBSize,
+        sizeof( SSConnOptionNames::StatementCacheMaxKBSize ),
+        SQLSRV_CONN_OPTION_STMT_CACHE_MAX_KB_SIZE,
+        SSConnOptionNames::StatementCacheMaxKBSize,
+        sizeof( SSConnOptionNames::StatementCacheMaxKBSize ),
+        CONN_ATTR_INT,
+        stmt_cache_set_func::func
+    },
+    {
+        SSConnOptionNames::Persistent,
+        sizeof( SSConnOptionNames::Persistent ),
+        SQLSRV_CONN_OPTION_PERSISTENT,
+        SSConnOptionNames::Persistent,
+        sizeof( SSConnOptionNames::Persistent ),
+        CONN_ATTR_BOOL,
+        conn_null_func::func
+    },
+    {
+        SSConnOptionNames::DeferPrepare,
+        sizeof( SSConnOptionNames::DeferPrepare ),
+        SQLSRV_CONN_OPTION_DEFER_PREPARE,
+        SSConnOptionNames::DeferPrepare,
+        sizeof( SSConnOptionNames::DeferPrepare ),
+        CONN_ATTR_BOOL,
+        defer_prepare_set_func::func
+    },
 
     { NULL, 0, SQLSRV_CONN_OPTION_INVALID, NULL, 0 , CONN_ATTR_INVALID, NULL },  //terminate the table
 };
@@ -1036,6 +1114,124 @@ PHP_FUNCTION( sqlsrv_server_info )
     }
 }
 
+// sqlsrv_statement_cache_info( resource $conn )
+//
+// Returns information about the statement cache of a connection, which is enabled
+// by the StatementCacheSize connection option.
+//
+// Parameters
+// $conn: The connection resource by which the client and server are connected.
+//
+// Return Value
+// An associative array with the following keys:
+//  Entries
+//      The number of prepared statements in the cache.
+//  Bytes
+//      The memory used by the cache.
+//  Hits
+//      The number of statements prepared with a handle taken from the cache.
+//  Misses
+//      The number of statements prepared that were not found in the cache.
+//  Evictions
+//      The number of statements removed to keep the cache within its limits.
+//  Invalidations
+//      The number of statements whose handle or metadata were discarded because
+//      the objects they use changed.
+//  DirectExecutes
+//      The number of first executions of statements with the DeferPrepare option,
+//      which were sent directly without preparing the statements.
+//  DeferredPrepares
+//      The number of statements with the DeferPrepare option prepared when they
+//      were executed a second time.
+//  PreparedExecutes
+//      The number of executions of prepared statements.
+
+PHP_FUNCTION( sqlsrv_statement_cache_info )
+{
+    try {
+        LOG_FUNCTION("sqlsrv_statement_cache_info");
+        ss_sqlsrv_conn* conn = NULL;
+        PROCESS_PARAMS(conn, "r", _FN_, 0);
+
+        core_sqlsrv_get_stmt_cache_info(conn, return_value);
+    } catch (core::CoreException&) {
+        RETURN_FALSE;
+    } catch (...) {
+        DIE("sqlsrv_statement_cache_info: Unknown exception caught.");
+    }
+}
+
+// sqlsrv_persistent_pool_info()
+//
+// Returns information about the pool of the connections opened with the Persistent
+// connection option.  The pool is shared by the requests served by the process.
+//
+// Return Value
+// An associative array with the following keys:
+//  Idle
+//      The number of connections in the pool.
+//  Active
+//      The number of persistent connections open in the process.
+//  Hits
+//      The number of persistent connections taken from the pool.
+//  Misses
+//      The number of persistent connections that were opened because the pool
+//      had none for their connection string and options.
+//  Expired
+//      The number of connections disconnected after staying idle for longer than
+//      the sqlsrv.PersistentMaxIdleTime setting.
+//  Discarded
+//      The number of connections disconnected because they failed a health check.
+//  MaxIdleTime
+//      The sqlsrv.PersistentMaxIdleTime setting, in seconds.
+
+PHP_FUNCTION( sqlsrv_persistent_pool_info )
+{
+    LOG_FUNCTION( "sqlsrv_persistent_pool_info" );
+
+    reset_errors();
+
+    if( zend_parse_parameters_none() == FAILURE ) {
+        RETURN_FALSE;
+    }
+
+    core_sqlsrv_get_conn_pool_info( return_value );
+}
+
+// sqlsrv_trace_info()
+//
+// Returns the spans and counters kept by the process when the sqlsrv.Trace setting is on.
+// Each connect, prepare, execute, fetch, retrieval of a field and read from a stream is a
+// span, and the spans are also written as lines of JSON to the sqlsrv.TraceSink file or
+// socket, if one is set.
+//
+// Return Value
+// An associative array with the following keys:
+//  Enabled
+//      The sqlsrv.Trace setting.
+//  Spans
+//      An array with an entry for each kind of span: Connect, Prepare, Execute, Fetch,
+//      GetData and StreamRead.  Each entry is an array of the number of spans (Count),
+//      and of their total and maximum duration in microseconds (TotalTime and MaxTime).
+//  Counters
+//      An array of the number of requests made to the server (RoundTrips), the bytes
+//      and rows fetched (BytesFetched and Rows), the strings converted from or to
+//      UTF-16 (Conversions) and the statements and persistent connections taken from
+//      their caches (CacheHits).
+
+PHP_FUNCTION( sqlsrv_trace_info )
+{
+    LOG_FUNCTION( "sqlsrv_trace_info" );
+
+    reset_errors();
+
+    if( zend_parse_parameters_none() == FAILURE ) {
+        RETURN_FALSE;
+    }
+
+    core_sqlsrv_get_trace_info( return_value );
+}
+
 
 // sqlsrv_prepare( resource $conn, string $tsql [, array $params [, array $options]])
 //
@@ -1193,93 +1389,117 @@ PHP_FUNCTION( sqlsrv_prepare )
 
 PHP_FUNCTION( sqlsrv_query )
 {
-
     LOG_FUNCTION( "sqlsrv_query" );
 
-    ss_sqlsrv_conn* conn = NULL;
-    sqlsrv_malloc_auto_ptr<ss_sqlsrv_stmt> stmt;
-    char* sql = NULL;
-    hash_auto_ptr ss_stmt_options_ht;
-    size_t sql_len = 0;
-    zval* options_z = NULL;
-    zval* params_z = NULL;
-    zval stmt_z;
-    ZVAL_UNDEF(&stmt_z);
+    query_common( INTERNAL_FUNCTION_PARAM_PASSTHRU, _FN_, false );
+}
 
-    PROCESS_PARAMS( conn, "rs|a!a!", _FN_, 4, &sql, &sql_len, &params_z, &options_z, NULL );
+// sqlsrv_query_async( resource $conn, string $tsql [, array $params [, array $options]])
+//
+// Creates a statement resource associated with the specified connection and starts
+// executing it without waiting for the server to return.  Call sqlsrv_poll until the
+// execution completes, then read the results of the statement as usual.  Several
+// statements may execute at the same time on different connections, or on a
+// connection with MARS enabled.
+//
+// Parameters
+// The same as sqlsrv_query.  Streams may not be given as parameters.
+//
+// Return Value
+// A statement resource. If the statement resource cannot be created or its execution
+// fails before it returns, false is returned.
 
-    try {
+PHP_FUNCTION( sqlsrv_query_async )
+{
+    LOG_FUNCTION( "sqlsrv_query_async" );
 
-        // check for statement options
-        if( options_z && zend_hash_num_elements( Z_ARRVAL_P( options_z )) > 0 ) {
+    query_common( INTERNAL_FUNCTION_PARAM_PASSTHRU, _FN_, true );
+}
 
-            // Initialize the options array to be passed to the core layer
-            ALLOC_HASHTABLE( ss_stmt_options_ht );
-            core::sqlsrv_zend_hash_init( *conn , ss_stmt_options_ht, 5 /* # of buckets */, ZVAL_PTR_DTOR,
-                                         0 /*persistent*/ );
+// sqlsrv_query_batch( resource $conn, array $queries [, array $options [, int $fetchType]] )
+//
+// Sends several queries to the server as a single batch, so they cost one round trip
+// instead of one each, and returns the result set of every query.
+//
+// Parameters
+// $conn: The connection resource associated with the statement.
+// $queries: An array with an element for each query, in the order they are executed.
+// Each element is a string of Transact-SQL, or an array of a string of Transact-SQL
+// and an array of its parameters, given as for sqlsrv_query.  The queries and their
+// parameters are joined into one parameterized query, so the parameters must be given
+// for ? placeholders.
+// $options [OPTIONAL]: An associative array that sets query properties, as for sqlsrv_query.
+// $fetchType [OPTIONAL]: A predefined constant. See SQLSRV_FETCH_TYPE in php_sqlsrv.h
+//
+// Return Value
+// Without $fetchType, a statement resource positioned on the first result set, whose
+// result sets are read in turn with sqlsrv_next_result.  With $fetchType, every
+// result set is fetched before the function returns, and an array is returned with an
+// element for each result set: an array of rows, each built as sqlsrv_fetch_array
+// builds it for $fetchType, or the number of rows modified for a result without
+// columns.  If the batch fails, false is returned.
+
+PHP_FUNCTION( sqlsrv_query_batch )
+{
+    LOG_FUNCTION( "sqlsrv_query_batch" );
 
-            validate_stmt_options( *conn, options_z, ss_stmt_options_ht );
-        }
+    ss_sqlsrv_conn* conn = NULL;
+    zval* queries_z = NULL;
+    zval* options_z = NULL;
+    zend_long fetch_type = SQLSRV_FETCH_BOTH;
+    std::string sql;
+    zval params_z;
+    ZVAL_UNDEF( &params_z );
 
-        if( params_z && Z_TYPE_P( params_z ) != IS_ARRAY ) {
-            THROW_SS_ERROR( conn, SS_SQLSRV_ERROR_INVALID_FUNCTION_PARAMETER, _FN_, NULL );
-        }
+    PROCESS_PARAMS( conn, "ra|a!l", _FN_, 3, &queries_z, &options_z, &fetch_type, NULL );
 
-        if( options_z && Z_TYPE_P( options_z ) != IS_ARRAY ) {
-            THROW_SS_ERROR( conn, SS_SQLSRV_ERROR_INVALID_FUNCTION_PARAMETER, _FN_, NULL );
-        }
+    bool fetch_results = ( ZEND_NUM_ARGS() > 3 );
 
-        if( sql == NULL ) {
+    try {
 
-            DIE( "sqlsrv_query: sql string was null." );
+        CHECK_CUSTOM_ERROR( fetch_results && ( fetch_type < MIN_SQLSRV_FETCH || fetch_type > MAX_SQLSRV_FETCH ), *conn,
+                            SS_SQLSRV_ERROR_INVALID_FETCH_TYPE ) {
+            throw ss::SSException();
         }
 
-        stmt = static_cast<ss_sqlsrv_stmt*>( core_sqlsrv_create_stmt( conn, core::allocate_stmt<ss_sqlsrv_stmt>,
-                                                                      ss_stmt_options_ht, SS_STMT_OPTS,
-                                                                      ss_error_handler, NULL ) );
+        core_sqlsrv_build_query_batch( *conn, Z_ARRVAL_P( queries_z ), sql, params_z );
+    }
+    catch( core::CoreException& ) {
 
-        if( params_z ) {
-            stmt->params_z = (zval *)sqlsrv_malloc(sizeof(zval));
-            ZVAL_COPY(stmt->params_z, params_z);
-        }
+        RETURN_FALSE;
+    }
+    catch( ... ) {
 
-        stmt->set_func( "sqlsrv_query" );
+        DIE( "sqlsrv_query_batch: Unknown exception caught." );
+    }
 
-        bind_params( stmt );
+    // the statement holds its own copy of the parameters
+    execute_query( conn, sql.c_str(), sql.length(), &params_z, options_z, _FN_, false, return_value );
+    zval_ptr_dtor( &params_z );
 
-        // execute the statement
-        core_sqlsrv_execute( stmt, sql, static_cast<int>( sql_len ) );
+    if( !fetch_results || Z_TYPE_P( return_value ) != IS_RESOURCE ) {
+        return;
+    }
 
-        // register the statement with the PHP runtime
-        ss::zend_register_resource(stmt_z, stmt, ss_sqlsrv_stmt::descriptor, ss_sqlsrv_stmt::resource_name);
-        // store the resource id with the connection so the connection
-        // can release this statement when it closes.
-        zend_ulong next_index = zend_hash_next_free_element( conn->stmts );
+    // the statement is only needed to fetch the result sets, so it is freed before returning them
+    zval stmt_z;
+    ZVAL_COPY_VALUE( &stmt_z, return_value );
+    ss_sqlsrv_stmt* stmt = static_cast<ss_sqlsrv_stmt*>( Z_RES_VAL( stmt_z ));
 
-        core::sqlsrv_zend_hash_index_update(*conn, conn->stmts, next_index, &stmt_z);
-        stmt->conn_index = next_index;
-        stmt.transferred();
+    try {
 
-        RETURN_RES(Z_RES(stmt_z));
+        fetch_batch_results( stmt, fetch_type, *return_value );
     }
-
     catch( core::CoreException& ) {
 
-        if( stmt ) {
-
-            stmt->conn = NULL;  // tell the statement that it isn't part of the connection so it doesn't try to remove itself
-            stmt->~ss_sqlsrv_stmt();
-        }
-        if (!Z_ISUNDEF(stmt_z)) {
-            free_stmt_resource(&stmt_z);
-        }
-
-        RETURN_FALSE;
+        ZVAL_FALSE( return_value );
     }
     catch( ... ) {
 
-        DIE( "sqlsrv_query: Unknown exception caught." );
+        DIE( "sqlsrv_query_batch: Unknown exception caught." );
     }
+
+    free_stmt_resource( &stmt_z );
 }
 
 void free_stmt_resource( _Inout_ zval* stmt_z )
@@ -1411,6 +1631,109 @@ int get_conn_option_key( _Inout_ sqlsrv_context& ctx, _In_ zend_string* key, _In
     return SQLSRV_CONN_OPTION_INVALID;
 }
 
+// creates a statement and executes it for sqlsrv_query and sqlsrv_query_async
+void query_common( INTERNAL_FUNCTION_PARAMETERS, _In_ const char* _FN_, _In_ bool async )
+{
+    ss_sqlsrv_conn* conn = NULL;
+    char* sql = NULL;
+    size_t sql_len = 0;
+    zval* options_z = NULL;
+    zval* params_z = NULL;
+
+    PROCESS_PARAMS( conn, "rs|a!a!", _FN_, 4, &sql, &sql_len, &params_z, &options_z, NULL );
+
+    if( sql == NULL ) {
+
+        DIE( "%1!s!: sql string was null.", _FN_ );
+    }
+
+    execute_query( conn, sql, sql_len, params_z, options_z, _FN_, async, return_value );
+}
+
+// Creates a statement for sql with the given parameters and options and executes it, or starts executing it.  On
+// success return_value is set to the statement resource, otherwise to false.
+void execute_query( _Inout_ ss_sqlsrv_conn* conn, _In_reads_bytes_(sql_len) const char* sql, _In_ size_t sql_len, _In_opt_ zval* params_z,
+                    _In_opt_ zval* options_z, _In_ const char* _FN_, _In_ bool async, _Out_ zval* return_value )
+{
+    sqlsrv_malloc_auto_ptr<ss_sqlsrv_stmt> stmt;
+    hash_auto_ptr ss_stmt_options_ht;
+    zval stmt_z;
+    ZVAL_UNDEF(&stmt_z);
+
+    try {
+
+        // check for statement options
+        if( options_z && zend_hash_num_elements( Z_ARRVAL_P( options_z )) > 0 ) {
+
+            // Initialize the options array to be passed to the core layer
+            ALLOC_HASHTABLE( ss_stmt_options_ht );
+            core::sqlsrv_zend_hash_init( *conn , ss_stmt_options_ht, 5 /* # of buckets */, ZVAL_PTR_DTOR,
+                                         0 /*persistent*/ );
+
+            validate_stmt_options( *conn, options_z, ss_stmt_options_ht );
+        }
+
+        if( params_z && Z_TYPE_P( params_z ) != IS_ARRAY ) {
+            THROW_SS_ERROR( conn, SS_SQLSRV_ERROR_INVALID_FUNCTION_PARAMETER, _FN_, NULL );
+        }
+
+        if( options_z && Z_TYPE_P( options_z ) != IS_ARRAY ) {
+            THROW_SS_ERROR( conn, SS_SQLSRV_ERROR_INVALID_FUNCTION_PARAMETER, _FN_, NULL );
+        }
+
+        stmt = static_cast<ss_sqlsrv_stmt*>( core_sqlsrv_create_stmt( conn, core::allocate_stmt<ss_sqlsrv_stmt>,
+                                                                      ss_stmt_options_ht, SS_STMT_OPTS,
+                                                                      ss_error_handler, NULL ) );
+
+        if( params_z ) {
+            stmt->params_z = (zval *)sqlsrv_malloc(sizeof(zval));
+            ZVAL_COPY(stmt->params_z, params_z);
+        }
+
+        stmt->set_func( _FN_ );
+
+        bind_params( stmt );
+
+        // execute the statement, or start executing it
+        if( async ) {
+            core_sqlsrv_execute_async( stmt, sql, static_cast<int>( sql_len ) );
+        }
+        else {
+            core_sqlsrv_execute( stmt, sql, static_cast<int>( sql_len ) );
+        }
+
+        // register the statement with the PHP runtime
+        ss::zend_register_resource(stmt_z, stmt, ss_sqlsrv_stmt::descriptor, ss_sqlsrv_stmt::resource_name);
+        // store the resource id with the connection so the connection
+        // can release this statement when it closes.
+        zend_ulong next_index = zend_hash_next_free_element( conn->stmts );
+
+        core::sqlsrv_zend_hash_index_update(*conn, conn->stmts, next_index, &stmt_z);
+        stmt->conn_index = next_index;
+        stmt.transferred();
+
+        RETURN_RES(Z_RES(stmt_z));
+    }
+
+    catch( core::CoreException& ) {
+
+        if( stmt ) {
+
+            stmt->conn = NULL;  // tell the statement that it isn't part of the connection so it doesn't try to remove itself
+            stmt->~ss_sqlsrv_stmt();
+        }
+        if (!Z_ISUNDEF(stmt_z)) {
+            free_stmt_resource(&stmt_z);
+        }
+
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "%1!s!: Unknown exception caught.", _FN_ );
+    }
+}
+
 int get_stmt_option_key( _In_ zend_string* key, _In_ size_t key_len )
 {
     for( int i = 0; SS_STMT_OPTS[i].key != SQLSRV_STMT_OPTION_INVALID; ++i )
@@ -96,6 +96,12 @@ ZEND_BEGIN_ARG_INFO_EX( sqlsrv_execute_arginfo, 0, 0, 1 )
     ZEND_ARG_INFO( 0, stmt )
 ZEND_END_ARG_INFO()
 
+ZEND_BEGIN_ARG_INFO_EX( sqlsrv_execute_batch_arginfo, 0, 0, 2 )
+    ZEND_ARG_INFO( 0, stmt )
+    ZEND_ARG_INFO( 0, rows )
+    ZEND_ARG_INFO( 0, batch_size )
+ZEND_END_ARG_INFO()
+
 ZEND_BEGIN_ARG_INFO_EX( sqlsrv_fetch_arginfo, 0, 0, 1 )
     ZEND_ARG_INFO( 0, stmt )
     ZEND_ARG_INFO( 0, row )
@@ -109,6 +115,11 @@ ZEND_BEGIN_ARG_INFO_EX( sqlsrv_fetch_array_arginfo, 0, 0, 1 )
     ZEND_ARG_INFO( 0, offset )
 ZEND_END_ARG_INFO()
 
+ZEND_BEGIN_ARG_INFO_EX( sqlsrv_fetch_all_arginfo, 0, 0, 1 )
+    ZEND_ARG_INFO( 0, stmt )
+    ZEND_ARG_INFO( 0, fetch_type )
+ZEND_END_ARG_INFO()
+
 ZEND_BEGIN_ARG_INFO_EX( sqlsrv_fetch_object_arginfo, 0, 0, 1 )
     ZEND_ARG_INFO( 0, stmt )
     ZEND_ARG_INFO( 0, class_name )
@@ -165,6 +176,24 @@ ZEND_BEGIN_ARG_INFO_EX( sqlsrv_query_arginfo, 0, 0, 2 )
     ZEND_ARG_INFO( 0, options )
 ZEND_END_ARG_INFO()
 
+ZEND_BEGIN_ARG_INFO_EX( sqlsrv_query_async_arginfo, 0, 0, 2 )
+    ZEND_ARG_INFO( 0, conn )
+    ZEND_ARG_INFO( 0, tsql )
+    ZEND_ARG_INFO( 0, params )
+    ZEND_ARG_INFO( 0, options )
+ZEND_END_ARG_INFO()
+
+ZEND_BEGIN_ARG_INFO_EX( sqlsrv_query_batch_arginfo, 0, 0, 2 )
+    ZEND_ARG_INFO( 0, conn )
+    ZEND_ARG_INFO( 0, queries )
+    ZEND_ARG_INFO( 0, options )
+    ZEND_ARG_INFO( 0, fetch_type )
+ZEND_END_ARG_INFO()
+
+ZEND_BEGIN_ARG_INFO_EX( sqlsrv_poll_arginfo, 0, 0, 1 )
+    ZEND_ARG_INFO( 0, stmt )
+ZEND_END_ARG_INFO()
+
 ZEND_BEGIN_ARG_INFO_EX( sqlsrv_rollback_arginfo, 0, 0, 1 )
     ZEND_ARG_INFO( 0, conn )
 ZEND_END_ARG_INFO()
@@ -181,6 +210,16 @@ ZEND_BEGIN_ARG_INFO( sqlsrv_server_info_arginfo, 0 )
     ZEND_ARG_INFO( 0, stmt )
 ZEND_END_ARG_INFO()
 
+ZEND_BEGIN_ARG_INFO( sqlsrv_statement_cache_info_arginfo, 0 )
+    ZEND_ARG_INFO( 0, conn )
+ZEND_END_ARG_INFO()
+
+ZEND_BEGIN_ARG_INFO( sqlsrv_persistent_pool_info_arginfo, 0 )
+ZEND_END_ARG_INFO()
+
+ZEND_BEGIN_ARG_INFO( sqlsrv_trace_info_arginfo, 0 )
+ZEND_END_ARG_INFO()
+
 ZEND_BEGIN_ARG_INFO( sqlsrv_sqltype_size_arginfo, 0 )
     ZEND_ARG_INFO( 0, size )
 ZEND_END_ARG_INFO()
@@ -206,10 +245,15 @@ zend_function_entry sqlsrv_functions[] = {
     PHP_FE( sqlsrv_get_config, sqlsrv_get_config_arginfo )
     PHP_FE( sqlsrv_prepare, sqlsrv_prepare_arginfo )
     PHP_FE( sqlsrv_execute, sqlsrv_execute_arginfo )
+    PHP_FE( sqlsrv_execute_batch, sqlsrv_execute_batch_arginfo )
     PHP_FE( sqlsrv_query, sqlsrv_query_arginfo )
+    PHP_FE( sqlsrv_query_async, sqlsrv_query_async_arginfo )
+    PHP_FE( sqlsrv_query_batch, sqlsrv_query_batch_arginfo )
+    PHP_FE( sqlsrv_poll, sqlsrv_poll_arginfo )
     PHP_FE( sqlsrv_fetch, sqlsrv_fetch_arginfo )
     PHP_FE( sqlsrv_get_field, sqlsrv_get_field_arginfo )
     PHP_FE( sqlsrv_fetch_array, sqlsrv_fetch_array_arginfo )
+    PHP_FE( sqlsrv_fetch_all, sqlsrv_fetch_all_arginfo )
     PHP_FE( sqlsrv_fetch_object, sqlsrv_fetch_object_arginfo )
     PHP_FE( sqlsrv_has_rows, sqlsrv_has_rows_arginfo )
     PHP_FE( sqlsrv_num_fields, sqlsrv_num_fields_arginfo )
@@ -220,6 +264,9 @@ zend_function_entry sqlsrv_functions[] = {
     PHP_FE( SQLSRV_PHPTYPE_STRING, sqlsrv_phptype_encoding_arginfo )
     PHP_FE( sqlsrv_client_info, sqlsrv_client_info_arginfo )
     PHP_FE( sqlsrv_server_info, sqlsrv_server_info_arginfo )
+    PHP_FE( sqlsrv_statement_cache_info, sqlsrv_statement_cache_info_arginfo )
+    PHP_FE( sqlsrv_persistent_pool_info, sqlsrv_persistent_pool_info_arginfo )
+    PHP_FE( sqlsrv_trace_info, sqlsrv_trace_info_arginfo )
     PHP_FE( sqlsrv_cancel, sqlsrv_cancel_arginfo )
     PHP_FE( sqlsrv_free_stmt, sqlsrv_free_stmt_arginfo )
     PHP_FE( sqlsrv_field_metadata, sqlsrv_field_metadata_arginfo )
@@ -563,6 +610,20 @@ PHP_MINIT_FUNCTION(sqlsrv)
     try {
         // retrieve the handles for the environments
         core_sqlsrv_minit( &g_ss_henv_cp, &g_ss_henv_ncp, ss_error_handler, "PHP_MINIT_FUNCTION for sqlsrv" );
+
+        char max_idle_time[] = INI_PREFIX INI_PERSISTENT_MAX_IDLE_TIME;
+        core_sqlsrv_conn_pool_set_max_idle_time( INI_INT( max_idle_time ));
+
+        char trace[] = INI_PREFIX INI_TRACE;
+        char trace_sink[] = INI_PREFIX INI_TRACE_SINK;
+        core_sqlsrv_trace_init( INI_BOOL( trace ) != 0, INI_STR( trace_sink ));
+
+        char slow_query_log[] = INI_PREFIX INI_SLOW_QUERY_LOG;
+        char slow_query_threshold[] = INI_PREFIX INI_SLOW_QUERY_THRESHOLD;
+        char slow_query_sample_rate[] = INI_PREFIX INI_SLOW_QUERY_SAMPLE_RATE;
+        char slow_query_log_max_size[] = INI_PREFIX INI_SLOW_QUERY_LOG_MAX_SIZE;
+        core_sqlsrv_slow_query_init( INI_STR( slow_query_log ), INI_INT( slow_query_threshold ), INI_FLT( slow_query_sample_rate ),
+                                     INI_INT( slow_query_log_max_size ));
     }
 
     catch( core::CoreException& ) {
@@ -698,6 +759,8 @@ PHP_RSHUTDOWN_FUNCTION(sqlsrv)
     LOG_FUNCTION( "PHP_RSHUTDOWN for php_sqlsrv" );
     reset_errors();
 
+    core_sqlsrv_trace_flush();
+
 	// destruction
     zval_ptr_dtor( &SQLSRV_G( errors ));
     zval_ptr_dtor( &SQLSRV_G( warnings ));
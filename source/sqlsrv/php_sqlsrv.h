@@ -89,14 +89,21 @@ PHP_FUNCTION(sqlsrv_client_info);
 PHP_FUNCTION(sqlsrv_close);
 PHP_FUNCTION(sqlsrv_commit);
 PHP_FUNCTION(sqlsrv_query);
+PHP_FUNCTION(sqlsrv_query_async);
+PHP_FUNCTION(sqlsrv_query_batch);
 PHP_FUNCTION(sqlsrv_prepare);
 PHP_FUNCTION(sqlsrv_rollback);
 PHP_FUNCTION(sqlsrv_server_info);
+PHP_FUNCTION(sqlsrv_statement_cache_info);
+PHP_FUNCTION(sqlsrv_persistent_pool_info);
+PHP_FUNCTION(sqlsrv_trace_info);
 
 PHP_FUNCTION(sqlsrv_cancel);
 PHP_FUNCTION(sqlsrv_execute);
+PHP_FUNCTION(sqlsrv_execute_batch);
 PHP_FUNCTION(sqlsrv_fetch);
 PHP_FUNCTION(sqlsrv_fetch_array);
+PHP_FUNCTION(sqlsrv_fetch_all);
 PHP_FUNCTION(sqlsrv_fetch_object);
 PHP_FUNCTION(sqlsrv_field_metadata);
 PHP_FUNCTION(sqlsrv_free_stmt);
@@ -105,6 +112,7 @@ PHP_FUNCTION(sqlsrv_has_rows);
 PHP_FUNCTION(sqlsrv_next_result);
 PHP_FUNCTION(sqlsrv_num_fields);
 PHP_FUNCTION(sqlsrv_num_rows);
+PHP_FUNCTION(sqlsrv_poll);
 PHP_FUNCTION(sqlsrv_rows_affected);
 PHP_FUNCTION(sqlsrv_send_stream_data);
 
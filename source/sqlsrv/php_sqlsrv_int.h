@@ -35,6 +35,13 @@
 #define INI_LOG_SEVERITY                "LogSeverity"
 #define INI_LOG_SUBSYSTEMS              "LogSubsystems"
 #define INI_BUFFERED_QUERY_LIMIT        "ClientBufferMaxKBSize"
+#define INI_PERSISTENT_MAX_IDLE_TIME    "PersistentMaxIdleTime"
+#define INI_TRACE                       "Trace"
+#define INI_TRACE_SINK                  "TraceSink"
+#define INI_SLOW_QUERY_LOG              "SlowQueryLog"
+#define INI_SLOW_QUERY_THRESHOLD        "SlowQueryThreshold"
+#define INI_SLOW_QUERY_SAMPLE_RATE      "SlowQuerySampleRate"
+#define INI_SLOW_QUERY_LOG_MAX_SIZE     "SlowQueryLogMaxKBSize"
 #define INI_PREFIX                      "sqlsrv."
 
 #ifndef _WIN32
@@ -50,6 +57,16 @@ PHP_INI_BEGIN()
                        sqlsrv_globals )
     STD_PHP_INI_ENTRY( INI_PREFIX INI_BUFFERED_QUERY_LIMIT, INI_BUFFERED_QUERY_LIMIT_DEFAULT, PHP_INI_ALL, OnUpdateLong, buffered_query_limit,
                        zend_sqlsrv_globals, sqlsrv_globals )
+    // read once by MINIT, since the persistent connection pool is shared by the requests of the process
+    PHP_INI_ENTRY( INI_PREFIX INI_PERSISTENT_MAX_IDLE_TIME, INI_PERSISTENT_MAX_IDLE_TIME_DEFAULT, PHP_INI_SYSTEM, NULL )
+    // read once by MINIT, since the spans and counters are kept for the process
+    PHP_INI_ENTRY( INI_PREFIX INI_TRACE, "0", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_TRACE_SINK, "", PHP_INI_SYSTEM, NULL )
+    // read once by MINIT, since the slow query log is written by a thread of the process
+    PHP_INI_ENTRY( INI_PREFIX INI_SLOW_QUERY_LOG, "", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_SLOW_QUERY_THRESHOLD, "1000", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_SLOW_QUERY_SAMPLE_RATE, "1", PHP_INI_SYSTEM, NULL )
+    PHP_INI_ENTRY( INI_PREFIX INI_SLOW_QUERY_LOG_MAX_SIZE, "10240", PHP_INI_SYSTEM, NULL )
 #ifndef _WIN32
     STD_PHP_INI_ENTRY(INI_PREFIX INI_SET_LOCALE_INFO, "2", PHP_INI_ALL, OnUpdateLong, set_locale_info,
                         zend_sqlsrv_globals, sqlsrv_globals)
@@ -109,12 +126,6 @@ void __cdecl sqlsrv_conn_dtor( _Inout_ zend_resource *rsrc );
 // Statement
 //*********************************************************************************************************************************
 
-// holds the field names for reuse by sqlsrv_fetch_array/object as keys
-struct sqlsrv_fetch_field_name {
-    char* name;
-    SQLLEN len;
-};
-
 struct stmt_option_ss_scrollable : public stmt_option_functor {
     virtual void operator()( _Inout_ sqlsrv_stmt* stmt, stmt_option const* /*opt*/, _In_ zval* value_z );
 };
@@ -133,7 +144,7 @@ struct ss_sqlsrv_stmt : public sqlsrv_stmt {
     bool prepared;                               // whether the statement has been prepared yet (used for error messages)
     zend_ulong conn_index;                       // index into the connection hash that contains this statement structure
     zval* params_z;                              // hold parameters passed to sqlsrv_prepare but not used until sqlsrv_execute
-    sqlsrv_fetch_field_name* fetch_field_names;  // field names for current results used by sqlsrv_fetch_array/object as keys
+    zend_string** fetch_field_names;    // field names of the current results, created once as the keys of sqlsrv_fetch_array/object
     int fetch_fields_count;
 
     // static variables used in process_params
@@ -168,6 +179,7 @@ bool sqlsrv_stmt_common_execute( sqlsrv_stmt* s, const SQLCHAR* sql_string, int
                                  );
 void free_odbc_resources( ss_sqlsrv_stmt* stmt );
 void free_stmt_resource( _Inout_ zval* stmt_z );
+void fetch_batch_results( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _Out_ zval& results );
 
 
 //*********************************************************************************************************************************
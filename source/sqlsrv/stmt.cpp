@@ -90,6 +90,11 @@ const char* NULLABLE = "Nullable";
 void convert_to_zval( _Inout_ sqlsrv_stmt* stmt, _In_ SQLSRV_PHPTYPE sqlsrv_php_type, _In_opt_ void* in_val, _In_ SQLLEN field_len, _Inout_ zval& out_zval );
 SQLSMALLINT get_resultset_meta_data(_Inout_ sqlsrv_stmt* stmt);
 void fetch_fields_common( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _Out_ zval& fields, _In_ bool allow_empty_field_names );
+void get_fetch_field_names( _Inout_ ss_sqlsrv_stmt* stmt, _In_ SQLSMALLINT num_cols );
+void init_fetch_row( _In_ zend_long fetch_type, _In_ SQLSMALLINT num_cols, _Out_ zval& row );
+void fetch_all_common( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _Out_ zval& rows, _In_ bool allow_empty_field_names );
+void add_fetch_field( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _In_ int field_index, _Inout_ zval& row,
+                      _In_ bool allow_empty_field_names );
 bool determine_column_size_or_precision( sqlsrv_stmt const* stmt, _In_ sqlsrv_sqltype sqlsrv_type, _Inout_ SQLULEN* column_size,
  _Out_ SQLSMALLINT* decimal_digits );
 sqlsrv_phptype determine_sqlsrv_php_type( sqlsrv_stmt const* stmt, SQLINTEGER sql_type, SQLUINTEGER size, bool prefer_string );
@@ -140,7 +145,7 @@ ss_sqlsrv_stmt::~ss_sqlsrv_stmt( void )
 
         for( int i=0; i < fetch_fields_count; ++i ) {
 
-            sqlsrv_free( fetch_field_names[i].name );
+            zend_string_release( fetch_field_names[i] );
         }
         sqlsrv_free( fetch_field_names );
     }
@@ -158,7 +163,7 @@ void ss_sqlsrv_stmt::new_result_set( void )
 
         for( int i=0; i < fetch_fields_count; ++i ) {
 
-            sqlsrv_free( fetch_field_names[i].name );
+            zend_string_release( fetch_field_names[i] );
         }
         sqlsrv_free( fetch_field_names );
     }
@@ -316,6 +321,107 @@ PHP_FUNCTION( sqlsrv_execute )
 }
 
 
+// sqlsrv_execute_batch( resource $stmt, array $rows [, int $batchSize] )
+//
+// Executes a previously prepared statement once for each row of parameter
+// values.  The rows are sent to the server in batches of parameter arrays, so a
+// batch costs a single round trip rather than one round trip per row.
+//
+// Parameters
+// $stmt: A resource specifying the statement to be executed.  The statement must
+// be prepared with sqlsrv_prepare.
+// $rows: An array of rows, each an array with a value for each parameter of the
+// statement.  Values may be null, boolean, integer, float or string.
+// $batchSize (optional): The maximum number of rows sent per batch.  The default is 1000.
+//
+// Return Value
+// An array with true or false for each row, depending on whether the row was
+// executed successfully, or false if the batch could not be executed.  Errors for
+// individual rows are reported as warnings.
+
+PHP_FUNCTION( sqlsrv_execute_batch )
+{
+    LOG_FUNCTION( "sqlsrv_execute_batch" );
+
+    ss_sqlsrv_stmt* stmt = NULL;
+    zval* rows_z = NULL;
+    zend_long batch_size = EXECUTE_BATCH_SIZE_DEFAULT;
+
+    try {
+
+        PROCESS_PARAMS( stmt, "ra|l", _FN_, 2, &rows_z, &batch_size, NULL );
+        CHECK_CUSTOM_ERROR(( !stmt->prepared ), stmt, SS_SQLSRV_ERROR_STATEMENT_NOT_PREPARED ) {
+            throw ss::SSException();
+        }
+
+        // prepare for the next execution by flushing anything remaining in the result set
+        if( stmt->executed ) {
+
+            while( stmt->past_next_result_end == false ) {
+
+                core_sqlsrv_next_result( stmt, false, false );
+            }
+        }
+
+        core_sqlsrv_execute_batch( stmt, Z_ARRVAL_P( rows_z ), batch_size, return_value );
+    }
+    catch( core::CoreException& ) {
+
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "sqlsrv_execute_batch: Unknown exception caught." );
+    }
+}
+
+
+// sqlsrv_poll( resource $stmt )
+//
+// Checks whether a statement executed by sqlsrv_query_async has completed.  Once
+// it has, the results of the statement are read as usual.  The execution of a
+// statement may be canceled with sqlsrv_cancel or sqlsrv_free_stmt.
+//
+// Parameters
+// $stmt: A statement resource returned by sqlsrv_query_async.
+//
+// Return Value
+// true if the execution has completed successfully, or if the statement was not
+// executed asynchronously.  null if the statement is still executing.  false if
+// the execution failed.
+
+PHP_FUNCTION( sqlsrv_poll )
+{
+    LOG_FUNCTION( "sqlsrv_poll" );
+
+    ss_sqlsrv_stmt* stmt = NULL;
+
+    PROCESS_PARAMS( stmt, "r", _FN_, 0 );
+
+    try {
+
+        if( !stmt->async_executing ) {
+            RETURN_TRUE;
+        }
+
+        SQLRETURN r = core_sqlsrv_poll( stmt );
+        if( r == SQL_STILL_EXECUTING ) {
+            RETURN_NULL();
+        }
+
+        RETURN_TRUE;
+    }
+    catch( core::CoreException& ) {
+
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "sqlsrv_poll: Unknown exception caught." );
+    }
+}
+
+
 // sqlsrv_fetch( resource $stmt )
 //
 // Makes the next row of a result set available for reading. Use
@@ -428,6 +534,58 @@ PHP_FUNCTION( sqlsrv_fetch_array )
     }
 }
 
+// sqlsrv_fetch_all( resource $stmt [, int $fetchType] )
+//
+// Retrieves the remaining rows of the active result set as an array of rows.
+//
+// Parameters
+// $stmt: A statement resource corresponding to an executed statement.
+// $fetchType [OPTIONAL]: A predefined constant. See SQLSRV_FETCH_TYPE in php_sqlsrv.h
+//
+// Return Value
+// An array with one element for each row, each built as sqlsrv_fetch_array builds
+// it for $fetchType. If there are no more rows, an empty array is returned. If an
+// error occurs, false is returned.
+//
+// Remarks
+// The rows are fetched and converted in a single call, without returning to PHP for
+// each row. Field names are created once for the result set and shared by the keys
+// of every row, and the array is sized for the rows up front when the cursor knows
+// how many there are (static, keyset and client buffered cursors). A field without a
+// name is reported as sqlsrv_fetch_object reports it, with a warning, and is then
+// returned with its numeric key only.
+
+PHP_FUNCTION( sqlsrv_fetch_all )
+{
+    LOG_FUNCTION( "sqlsrv_fetch_all" );
+
+    ss_sqlsrv_stmt* stmt = NULL;
+    zend_long fetch_type = SQLSRV_FETCH_BOTH; // default value for parameter if one isn't supplied
+
+    PROCESS_PARAMS( stmt, "r|l", _FN_, 1, &fetch_type, NULL );
+
+    try {
+
+        CHECK_CUSTOM_ERROR(( fetch_type < MIN_SQLSRV_FETCH || fetch_type > MAX_SQLSRV_FETCH ), stmt,
+                           SS_SQLSRV_ERROR_INVALID_FETCH_TYPE ) {
+            throw ss::SSException();
+        }
+
+        zval rows;
+        ZVAL_UNDEF( &rows );
+        fetch_all_common( stmt, fetch_type, rows, false /*allow_empty_field_names*/ );
+        RETURN_ARR( Z_ARRVAL( rows ));
+    }
+
+    catch( core::CoreException& ) {
+        RETURN_FALSE;
+    }
+    catch( ... ) {
+
+        DIE( "sqlsrv_fetch_all: Unknown exception caught." );
+    }
+}
+
 // sqlsrv_field_metadata( resource $stmt )
 //
 // Retrieves metadata for the fields of a prepared statement. For information
@@ -1273,6 +1431,39 @@ void bind_params( _Inout_ ss_sqlsrv_stmt* stmt )
     }
 }
 
+// Fetches every remaining result set of a statement executed by sqlsrv_query_batch into results, an array with
+// the rows of each result set as fetch_all_common builds them, or the number of rows modified by a result
+// without columns.
+void fetch_batch_results( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _Out_ zval& results )
+{
+    array_init( &results );
+
+    try {
+
+        while( !stmt->past_next_result_end ) {
+
+            zval result;
+            ZVAL_UNDEF( &result );
+            if( core::SQLNumResultCols( stmt ) > 0 ) {
+                fetch_all_common( stmt, fetch_type, result, false /*allow_empty_field_names*/ );
+            }
+            else {
+                ZVAL_LONG( &result, core::SQLRowCount( stmt ));
+            }
+            zend_hash_next_index_insert_new( Z_ARRVAL( results ), &result );
+
+            core_sqlsrv_next_result( stmt );
+            stmt->clean_up_results_metadata();
+        }
+    }
+    catch( core::CoreException& ) {
+
+        zval_ptr_dtor( &results );
+        ZVAL_NULL( &results );
+        throw;
+    }
+}
+
 // sqlsrv_cancel( resource $stmt )
 //
 // Cancels a statement. This means that any pending results for the statement
@@ -1299,7 +1490,15 @@ PHP_FUNCTION( sqlsrv_cancel )
         // close the stream to release the resource
         close_active_stream( stmt );
 
+        // an asynchronous execution is canceled and the statement returns to the synchronous mode
+        if( stmt->async_executing ) {
+            core_sqlsrv_cancel_async( stmt );
+            RETURN_TRUE;
+        }
+
+        // the cancel interrupts a block being read ahead, and the thread is stopped before the handle is used again
         SQLRETURN r = SQLCancel( stmt->handle() );
+        core_sqlsrv_stop_read_ahead( stmt, true );
         CHECK_SQL_ERROR_OR_WARNING( r, stmt, NULL ) {
             throw ss::SSException();
         }
@@ -1787,7 +1986,7 @@ void determine_stmt_has_rows( _Inout_ ss_sqlsrv_stmt* stmt )
         // flag and simply skips the first fetch, knowing it was already done.  It records its own
         // flags to know if it should fetch on subsequent calls.
 
-        r = core::SQLFetchScroll( stmt, SQL_FETCH_NEXT, 0 );
+        r = stmt->current_results->fetch( SQL_FETCH_NEXT, 0 );
         if( SQL_SUCCEEDED( r )) {
 
             stmt->has_rows = true;
@@ -1835,11 +2034,6 @@ SQLSMALLINT get_resultset_meta_data(_Inout_ sqlsrv_stmt * stmt)
 
 void fetch_fields_common( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _Out_ zval& fields, _In_ bool allow_empty_field_names )
 {
-	void* field_value = NULL;
-	sqlsrv_phptype sqlsrv_php_type;
-	sqlsrv_php_type.typeinfo.type = SQLSRV_PHPTYPE_INVALID;
-	SQLSRV_PHPTYPE sqlsrv_php_type_out = SQLSRV_PHPTYPE_INVALID;
-
 	// make sure that the fetch type is legal
 	CHECK_CUSTOM_ERROR((fetch_type < MIN_SQLSRV_FETCH || fetch_type > MAX_SQLSRV_FETCH), stmt, SS_SQLSRV_ERROR_INVALID_FETCH_TYPE, stmt->func(), NULL) {
 		throw ss::SSException();
@@ -1850,66 +2044,143 @@ void fetch_fields_common( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_typ
 
 	// if this is the first fetch in a new result set, then get the field names and
 	// store them off for successive fetches.
-    if ((fetch_type & SQLSRV_FETCH_ASSOC) && stmt->fetch_field_names == NULL) {
+    if( fetch_type & SQLSRV_FETCH_ASSOC ) {
+        get_fetch_field_names( stmt, num_cols );
+    }
 
-        SQLLEN field_name_len = 0;
-        sqlsrv_malloc_auto_ptr<sqlsrv_fetch_field_name> field_names;
-        field_names = static_cast<sqlsrv_fetch_field_name*>(sqlsrv_malloc(num_cols * sizeof(sqlsrv_fetch_field_name)));
-        for (int i = 0; i < num_cols; ++i) {
-            // The meta data field name is already null-terminated, and the field name len is correct.
-            field_name_len = stmt->current_meta_data[i]->field_name_len;
-            field_names[i].name = static_cast<char*>(sqlsrv_malloc(field_name_len, sizeof(char), 1));
-            memcpy_s((void*)field_names[i].name, (field_name_len * sizeof(char)), (void*)stmt->current_meta_data[i]->field_name, field_name_len);
-            field_names[i].name[field_name_len] = '\0';     // null terminate the field name after the memcpy
-            field_names[i].len = field_name_len;            // field_name_len should not need to include the null char
-        }
+    init_fetch_row( fetch_type, num_cols, fields );
 
-        stmt->fetch_field_names = field_names;
-        stmt->fetch_fields_count = num_cols;
-        field_names.transferred();
+    for( int i = 0; i < num_cols; ++i ) {
+        add_fetch_field( stmt, fetch_type, i, fields, allow_empty_field_names );
     }
+}
 
-    int zr = SUCCESS;
-    array_init(&fields);
+// Fetches the remaining rows of the current result set into rows, one array per row as
+// fetch_fields_common builds it.
+void fetch_all_common( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _Out_ zval& rows, _In_ bool allow_empty_field_names )
+{
+    if( !core_sqlsrv_fetch( stmt, SQL_FETCH_NEXT, 0 )) {
+        array_init( &rows );
+        return;
+    }
 
-    for( int i = 0; i < num_cols; ++i ) {
-        SQLLEN field_len = -1;
+    SQLSMALLINT num_cols = get_resultset_meta_data( stmt );
 
-        core_sqlsrv_get_field( stmt, i, sqlsrv_php_type, true /*prefer string*/,
-                                    field_value, &field_len, false /*cache_field*/, &sqlsrv_php_type_out );
+    // only cursors that count their rows can size the array up front.  Scrollable cursors
+    // may be positioned past the first row, so the count is an upper bound.
+    SQLLEN row_count = 0;
+    if( stmt->cursor_type != SQL_CURSOR_FORWARD_ONLY && stmt->cursor_type != SQL_CURSOR_DYNAMIC ) {
+        row_count = stmt->current_results->row_count();
+    }
+    array_init_size( &rows, ( row_count > 0 ) ? static_cast<uint32_t>( row_count ) : 0 );
 
-        zval field;
-        ZVAL_UNDEF( &field );
-        convert_to_zval( stmt, sqlsrv_php_type_out, field_value, field_len, field );
-        sqlsrv_free( field_value );
-        if( fetch_type & SQLSRV_FETCH_NUMERIC ) {
+    if( fetch_type & SQLSRV_FETCH_ASSOC ) {
+        get_fetch_field_names( stmt, num_cols );
+    }
 
-            zr = add_next_index_zval( &fields, &field );
-            CHECK_ZEND_ERROR( zr, stmt, SQLSRV_ERROR_ZEND_HASH ) {
-                throw ss::SSException();
-            }
-        }
+    try {
 
-        if( fetch_type & SQLSRV_FETCH_ASSOC ) {
+        do {
+            zval row;
+            init_fetch_row( fetch_type, num_cols, row );
+            // add the row before its fields so that it is freed with rows if a field fails
+            zend_hash_next_index_insert_new( Z_ARRVAL( rows ), &row );
 
-            CHECK_CUSTOM_WARNING_AS_ERROR(( stmt->fetch_field_names[i].len == 0 && !allow_empty_field_names ), stmt,
-                                            SS_SQLSRV_WARNING_FIELD_NAME_EMPTY, NULL) {
-                throw ss::SSException();
+            for( int i = 0; i < num_cols; ++i ) {
+                add_fetch_field( stmt, fetch_type, i, row, allow_empty_field_names );
             }
+        } while( core_sqlsrv_fetch( stmt, SQL_FETCH_NEXT, 0 ));
+    }
+    catch( core::CoreException& ) {
+
+        zval_ptr_dtor( &rows );
+        throw;
+    }
+}
 
-            if( stmt->fetch_field_names[i].len > 0 || allow_empty_field_names ) {
+// Gets a field of the current row and adds it to row with the keys of fetch_type.  A field without a name is a
+// warning unless empty names are allowed, and it is then added with its numeric key only.
+void add_fetch_field( _Inout_ ss_sqlsrv_stmt* stmt, _In_ zend_long fetch_type, _In_ int field_index, _Inout_ zval& row,
+                      _In_ bool allow_empty_field_names )
+{
+    void* field_value = NULL;
+    sqlsrv_phptype sqlsrv_php_type;
+    sqlsrv_php_type.typeinfo.type = SQLSRV_PHPTYPE_INVALID;
+    SQLSRV_PHPTYPE sqlsrv_php_type_out = SQLSRV_PHPTYPE_INVALID;
+    SQLLEN field_len = -1;
+
+    core_sqlsrv_get_field( stmt, field_index, sqlsrv_php_type, true /*prefer string*/,
+                           field_value, &field_len, false /*cache_field*/, &sqlsrv_php_type_out );
+
+    zval field;
+    ZVAL_UNDEF( &field );
+    convert_to_zval( stmt, sqlsrv_php_type_out, field_value, field_len, field );
+    sqlsrv_free( field_value );
+
+    bool field_added = false;
+    if( fetch_type & SQLSRV_FETCH_NUMERIC ) {
+
+        zend_hash_next_index_insert_new( Z_ARRVAL( row ), &field );
+        field_added = true;
+    }
 
-                add_assoc_zval(&fields, stmt->fetch_field_names[i].name, &field);
+    if( fetch_type & SQLSRV_FETCH_ASSOC ) {
+
+        zend_string* field_name = stmt->fetch_field_names[field_index];
+
+        CHECK_CUSTOM_WARNING_AS_ERROR(( ZSTR_LEN( field_name ) == 0 && !allow_empty_field_names ), stmt,
+                                        SS_SQLSRV_WARNING_FIELD_NAME_EMPTY, NULL) {
+            if( !field_added ) {
+                zval_ptr_dtor( &field );
             }
+            throw ss::SSException();
         }
-        //only addref when the fetch_type is BOTH because this is the only case when fields(hashtable)
-        //has 2 elements pointing to field. Do not addref if the type is NUMERIC or ASSOC because
-        //fields now only has 1 element pointing to field and we want the ref count to be only 1
-        if (fetch_type == SQLSRV_FETCH_BOTH) {
-            Z_TRY_ADDREF(field);
+
+        if( ZSTR_LEN( field_name ) > 0 || allow_empty_field_names ) {
+
+            // the field is in row twice when it has both keys, so it needs a second reference
+            if( field_added ) {
+                Z_TRY_ADDREF( field );
+            }
+            zend_symtable_update( Z_ARRVAL( row ), field_name, &field );
+            field_added = true;
         }
-    } //for loop
+    }
+
+    if( !field_added ) {
+        zval_ptr_dtor( &field );
+    }
+}
+
+// Creates the keys of the fields of the current result set, once per result set.  The keys are interned, so
+// their hashes are computed once and each row shares them instead of copying the field names.
+void get_fetch_field_names( _Inout_ ss_sqlsrv_stmt* stmt, _In_ SQLSMALLINT num_cols )
+{
+    if( stmt->fetch_field_names != NULL ) {
+        return;
+    }
+
+    sqlsrv_malloc_auto_ptr<zend_string*> field_names;
+    field_names = static_cast<zend_string**>( sqlsrv_malloc( num_cols, sizeof( zend_string* ), 0 ));
+    for( int i = 0; i < num_cols; ++i ) {
+        // the field name of the meta data is null-terminated, and its length does not include the null
+        field_names[i] = zend_new_interned_string( zend_string_init( reinterpret_cast<char*>( stmt->current_meta_data[i]->field_name.get() ),
+                                                                     stmt->current_meta_data[i]->field_name_len, 0 ));
+    }
+
+    stmt->fetch_field_names = field_names;
+    stmt->fetch_fields_count = num_cols;
+    field_names.transferred();
+}
+
+// Initializes the array of a row with room for all its fields, so it is never grown or rehashed while they
+// are added.  Rows fetched with numeric keys only are packed arrays.
+void init_fetch_row( _In_ zend_long fetch_type, _In_ SQLSMALLINT num_cols, _Out_ zval& row )
+{
+    uint32_t row_size = ( fetch_type == SQLSRV_FETCH_BOTH ) ? num_cols * 2 : num_cols;
 
+    array_init_size( &row, row_size );
+    zend_hash_real_init( Z_ARRVAL( row ), fetch_type == SQLSRV_FETCH_NUMERIC );
 }
 
 zval* parse_param_array(_Inout_ ss_sqlsrv_stmt* stmt, _Inout_ HashTable* param_ht, zend_ulong index, _Out_ SQLSMALLINT& direction,
@@ -473,6 +473,59 @@ ss_error SS_ERRORS[] = {
         SQLSRV_ERROR_TVP_INPUT_PARAM_ONLY,
         { IMSSP, (SQLCHAR*) "You cannot return data in a table-valued parameter. Table-valued parameters are input-only.", -130, false }
     },
+    {
+        SQLSRV_ERROR_INVALID_FETCH_BLOCK_SIZE,
+        { IMSSP, (SQLCHAR*) "The fetch block size must be an integer between 1 and %1!d!.", -131, true }
+    },
+    {
+        SQLSRV_ERROR_INVALID_BATCH_SIZE,
+        { IMSSP, (SQLCHAR*) "The batch size must be an integer between 1 and %1!d!.", -132, true }
+    },
+    {
+        SQLSRV_ERROR_BATCH_NO_PARAMS,
+        { IMSSP, (SQLCHAR*) "Only statements with parameters can be executed in a batch.", -133, false }
+    },
+    {
+        SQLSRV_ERROR_BATCH_INVALID_ROW,
+        { IMSSP, (SQLCHAR*) "The row at index %1!d! of the batch must be an array with a value for each of the %2!d! parameters of the statement.", -134, true }
+    },
+    {
+        SQLSRV_ERROR_BATCH_INVALID_VALUE,
+        { IMSSP, (SQLCHAR*) "Invalid value for parameter %1!d! in the row at index %2!d! of the batch. Only null, boolean, integer, float and string values can be executed in a batch.", -135, true }
+    },
+    {
+        SQLSRV_ERROR_BUFFER_SPILL_FAILED,
+        { IMSSP, (SQLCHAR*) "Failed to write the rows of a buffered query to a temporary file.", -136, false }
+    },
+    {
+        SQLSRV_ERROR_INVALID_STMT_CACHE_OPTION,
+        { IMSSP, (SQLCHAR*) "Invalid value for the connection option %1!s!. The value must be a non-negative integer.", -137, true }
+    },
+    {
+        SQLSRV_ERROR_INVALID_STREAM_CHUNK_SIZE,
+        { IMSSP, (SQLCHAR*) "The stream chunk size must be an integer between %1!d! and %2!d!.", -138, true }
+    },
+    {
+        SQLSRV_ERROR_ASYNC_EXECUTING,
+        { IMSSP, (SQLCHAR*) "The statement is still executing. Poll the statement until the execution completes.", -139, false }
+    },
+    {
+        SQLSRV_ERROR_ASYNC_STREAM_PARAMS,
+        { IMSSP, (SQLCHAR*) "Stream parameters cannot be sent by a statement executed asynchronously.", -140, false }
+    },
+    {
+        SQLSRV_ERROR_INVALID_READ_AHEAD,
+        { IMSSP, (SQLCHAR*) "The number of blocks read ahead must be an integer between 0 and %1!d!.", -141, true }
+    },
+    {
+        SQLSRV_ERROR_QUERY_BATCH_EMPTY,
+        { IMSSP, (SQLCHAR*) "A batch must contain at least one query.", -142, false }
+    },
+    {
+        SQLSRV_ERROR_INVALID_BATCH_QUERY,
+        { IMSSP, (SQLCHAR*) "The query at position %1!d! of the batch must be a non-empty string, or an array with a non-empty "
+          "string and an array of parameters.", -143, true }
+    },
 
     // terminate the list of errors/warnings
     { UINT_MAX, {} }
@@ -0,0 +1,81 @@
+<?php
+
+use SqlsrvPerfTest\SqlsrvUtil;
+/**
+ * @Iterations(10)
+ * @BeforeMethods({"connect", "setTableName", "createTable"})
+ * @AfterMethods({ "dropTable", "disconnect"})
+ */
+class SqlsrvFetchArrayBench
+{
+
+    private $conn;
+    private $tableName;
+
+    // many narrow rows, so the cost of building each row array outweighs the cost of its fields
+    private $rows = 20000;
+
+    public function setTableName()
+    {
+        $this->tableName = "fetch_array_".rand();
+    }
+
+    public function connect()
+    {
+        $this->conn = SqlsrvUtil::connect();
+    }
+
+    public function createTable()
+    {
+        SqlsrvUtil::createTable( $this->conn, $this->tableName, "id INT, code CHAR(4), amount INT, flag BIT, name NVARCHAR(20)" );
+        $sql = "INSERT INTO $this->tableName SELECT TOP ($this->rows) ROW_NUMBER() OVER (ORDER BY a.object_id), 'abcd', 42, 1, N'name' FROM sys.all_columns a CROSS JOIN sys.all_columns b";
+        $stmt = sqlsrv_query( $this->conn, $sql );
+        if( $stmt === false )
+        {
+            die( print_r( sqlsrv_errors(), true));
+        }
+    }
+
+    /*
+    * Each iteration fetches every row as an array with numeric keys
+    */
+    public function benchFetchArrayNumeric()
+    {
+        $this->fetchArray( SQLSRV_FETCH_NUMERIC );
+    }
+
+    /*
+    * Each iteration fetches every row as an array with the field names as keys
+    */
+    public function benchFetchArrayAssoc()
+    {
+        $this->fetchArray( SQLSRV_FETCH_ASSOC );
+    }
+
+    /*
+    * Each iteration fetches every row as an array with both numeric keys and the field names as keys
+    */
+    public function benchFetchArrayBoth()
+    {
+        $this->fetchArray( SQLSRV_FETCH_BOTH );
+    }
+
+    private function fetchArray( $fetchType )
+    {
+        $stmt = SqlsrvUtil::query( $this->conn, "SELECT id, code, amount, flag, name FROM $this->tableName" );
+        while( sqlsrv_fetch_array( $stmt, $fetchType ))
+        {
+        }
+        sqlsrv_free_stmt( $stmt );
+    }
+
+    public function dropTable()
+    {
+        SqlsrvUtil::dropTable( $this->conn, $this->tableName );
+    }
+
+    public function disconnect()
+    {
+        SqlsrvUtil::disconnect( $this->conn );
+    }
+}
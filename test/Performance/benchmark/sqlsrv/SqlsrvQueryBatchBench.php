@@ -0,0 +1,76 @@
+<?php
+
+use SqlsrvPerfTest\SqlsrvUtil;
+/**
+ * @Iterations(100)
+ * @BeforeMethods({"connect", "setTableName", "createTable", "insertRows"})
+ * @AfterMethods({ "dropTable", "disconnect"})
+ */
+class SqlsrvQueryBatchBench
+{
+
+    private $conn;
+    private $tableName;
+
+    // number of small independent queries run by each iteration, as a page loading its data would
+    private $queryCount = 10;
+
+    public function setTableName()
+    {
+        $this->tableName = "query_batch_".rand();
+    }
+
+    public function connect()
+    {
+        $this->conn = SqlsrvUtil::connect();
+    }
+
+    public function createTable()
+    {
+        SqlsrvUtil::createTable( $this->conn, $this->tableName, "id INT, name NVARCHAR(50)" );
+    }
+
+    public function insertRows()
+    {
+        for( $i = 0; $i < $this->queryCount; $i++ )
+        {
+            SqlsrvUtil::query( $this->conn, "INSERT INTO $this->tableName VALUES ($i, N'name $i')" );
+        }
+    }
+
+    /*
+    * Each iteration runs the queries one at a time, with a round trip for each
+    */
+    public function benchSeparateQueries()
+    {
+        for( $i = 0; $i < $this->queryCount; $i++ )
+        {
+            $stmt = sqlsrv_query( $this->conn, "SELECT id, name FROM $this->tableName WHERE id = ?", array( $i ));
+            sqlsrv_fetch_all( $stmt, SQLSRV_FETCH_ASSOC );
+            sqlsrv_free_stmt( $stmt );
+        }
+    }
+
+    /*
+    * Each iteration runs the queries in a single batch, with one round trip for all of them
+    */
+    public function benchQueryBatch()
+    {
+        $queries = array();
+        for( $i = 0; $i < $this->queryCount; $i++ )
+        {
+            $queries[] = array( "SELECT id, name FROM $this->tableName WHERE id = ?", array( $i ));
+        }
+        sqlsrv_query_batch( $this->conn, $queries, array(), SQLSRV_FETCH_ASSOC );
+    }
+
+    public function dropTable()
+    {
+        SqlsrvUtil::dropTable( $this->conn, $this->tableName );
+    }
+
+    public function disconnect()
+    {
+        SqlsrvUtil::disconnect( $this->conn );
+    }
+}
@@ -0,0 +1,93 @@
+<?php
+
+use SqlsrvPerfTest\SqlsrvUtil;
+/**
+ * @Iterations(10)
+ * @BeforeMethods({"connect", "setTableName", "createTable"})
+ * @AfterMethods({ "dropTable", "disconnect"})
+ */
+class SqlsrvStreamReadBench
+{
+
+    private $conn;
+    private $tableName;
+
+    // size in bytes of each LOB field read as a stream
+    private $fieldSize = 16777216;
+
+    // the default chunk size is the size of the PHP stream buffer (8 KB)
+    private $largeChunkSize = 1048576;
+
+    public function setTableName()
+    {
+        $this->tableName = "stream_read_".rand();
+    }
+
+    public function connect()
+    {
+        $this->conn = SqlsrvUtil::connect();
+    }
+
+    public function createTable()
+    {
+        SqlsrvUtil::createTable( $this->conn, $this->tableName, "vbin VARBINARY(MAX), nvstring NVARCHAR(MAX)" );
+        $sql = "INSERT INTO $this->tableName VALUES (CONVERT(VARBINARY(MAX), REPLICATE(CONVERT(VARCHAR(MAX), 'b'), $this->fieldSize)), " .
+               "REPLICATE(CONVERT(NVARCHAR(MAX), N'ü'), " . ( $this->fieldSize / 2 ) . "))";
+        SqlsrvUtil::query( $this->conn, $sql );
+    }
+
+    /*
+    * Each iteration reads the binary field through a stream with the default chunk size
+    */
+    public function benchBinaryDefaultChunk()
+    {
+        $this->readStream( 0, SQLSRV_PHPTYPE_STREAM( SQLSRV_ENC_BINARY ), array());
+    }
+
+    /*
+    * Each iteration reads the binary field through a stream with a large chunk size
+    */
+    public function benchBinaryLargeChunk()
+    {
+        $this->readStream( 0, SQLSRV_PHPTYPE_STREAM( SQLSRV_ENC_BINARY ), array( "StreamChunkSize" => $this->largeChunkSize ));
+    }
+
+    /*
+    * Each iteration reads the nvarchar field through a UTF-8 stream with the default chunk size
+    */
+    public function benchUtf8DefaultChunk()
+    {
+        $this->readStream( 1, SQLSRV_PHPTYPE_STREAM( "UTF-8" ), array());
+    }
+
+    /*
+    * Each iteration reads the nvarchar field through a UTF-8 stream with a large chunk size
+    */
+    public function benchUtf8LargeChunk()
+    {
+        $this->readStream( 1, SQLSRV_PHPTYPE_STREAM( "UTF-8" ), array( "StreamChunkSize" => $this->largeChunkSize ));
+    }
+
+    private function readStream( $index, $type, $options )
+    {
+        $stmt = sqlsrv_query( $this->conn, "SELECT vbin, nvstring FROM $this->tableName", array(), $options );
+        if( $stmt === false )
+        {
+            die( print_r( sqlsrv_errors(), true));
+        }
+        SqlsrvUtil::fetch( $stmt );
+        $stream = sqlsrv_get_field( $stmt, $index, $type );
+        stream_get_contents( $stream );
+        sqlsrv_free_stmt( $stmt );
+    }
+
+    public function dropTable()
+    {
+        SqlsrvUtil::dropTable( $this->conn, $this->tableName );
+    }
+
+    public function disconnect()
+    {
+        SqlsrvUtil::disconnect( $this->conn );
+    }
+}
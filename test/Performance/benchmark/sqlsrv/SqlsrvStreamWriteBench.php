@@ -0,0 +1,147 @@
+<?php
+
+use SqlsrvPerfTest\SqlsrvUtil;
+/**
+ * @Iterations(10)
+ * @BeforeMethods({"connect", "setTableName", "createTable", "createFiles"})
+ * @AfterMethods({ "dropTable", "deleteFiles", "disconnect", "reportCpuTime"})
+ */
+class SqlsrvStreamWriteBench
+{
+
+    private $conn;
+    private $tableName;
+    private $binaryFile;
+    private $utf8File;
+
+    // size in bytes of each file sent as a stream parameter, so the throughput is 64 / time MB/s
+    // and the time per GB uploaded is 16 times the time of an iteration
+    private $fileSize = 67108864;
+
+    // the default chunk size is the size of the PHP stream buffer (8 KB)
+    private $largeChunkSize = 1048576;
+
+    // CPU time in seconds used by the process to send the files of an iteration, and the bytes sent,
+    // which reportCpuTime appends to $cpuTimeFile as the CPU seconds used per GB uploaded by the subject
+    private $cpuTime = 0.0;
+    private $bytesSent = 0;
+    private $subject;
+    private $cpuTimeFile = "sqlsrv_stream_write_cpu.csv";
+
+    public function setTableName()
+    {
+        $this->tableName = "stream_write_".rand();
+    }
+
+    public function connect()
+    {
+        $this->conn = SqlsrvUtil::connect();
+    }
+
+    public function createTable()
+    {
+        SqlsrvUtil::createTable( $this->conn, $this->tableName, "vbin VARBINARY(MAX), nvstring NVARCHAR(MAX)" );
+    }
+
+    public function createFiles()
+    {
+        $this->binaryFile = tempnam( sys_get_temp_dir(), "stream_write" );
+        file_put_contents( $this->binaryFile, str_repeat( "binary\x00\xff\x7f", $this->fileSize / 10 ));
+        $this->utf8File = tempnam( sys_get_temp_dir(), "stream_write" );
+        file_put_contents( $this->utf8File, str_repeat( "ünicode", $this->fileSize / 8 ));
+    }
+
+    /*
+    * Each iteration sends a binary file, which is mapped into memory, with the default chunk size
+    */
+    public function benchBinaryFileDefaultChunk()
+    {
+        $this->sendFile( __FUNCTION__, "vbin", $this->binaryFile, SQLSRV_PHPTYPE_STREAM( SQLSRV_ENC_BINARY ), array());
+    }
+
+    /*
+    * Each iteration sends a binary file, which is mapped into memory, with a large chunk size
+    */
+    public function benchBinaryFileLargeChunk()
+    {
+        $this->sendFile( __FUNCTION__, "vbin", $this->binaryFile, SQLSRV_PHPTYPE_STREAM( SQLSRV_ENC_BINARY ), array( "StreamChunkSize" => $this->largeChunkSize ));
+    }
+
+    /*
+    * Each iteration sends a binary file through a stream that can't be mapped, with a large chunk size
+    */
+    public function benchBinaryFilteredLargeChunk()
+    {
+        $this->sendFile( __FUNCTION__, "vbin", "php://filter/read=string.rot13|string.rot13/resource=$this->binaryFile", SQLSRV_PHPTYPE_STREAM( SQLSRV_ENC_BINARY ),
+                         array( "StreamChunkSize" => $this->largeChunkSize ));
+    }
+
+    /*
+    * Each iteration sends a UTF-8 file, which is converted to UTF-16 a chunk at a time, with the default chunk size
+    */
+    public function benchUtf8FileDefaultChunk()
+    {
+        $this->sendFile( __FUNCTION__, "nvstring", $this->utf8File, SQLSRV_PHPTYPE_STREAM( "UTF-8" ), array());
+    }
+
+    /*
+    * Each iteration sends a UTF-8 file, which is converted to UTF-16 a chunk at a time, with a large chunk size
+    */
+    public function benchUtf8FileLargeChunk()
+    {
+        $this->sendFile( __FUNCTION__, "nvstring", $this->utf8File, SQLSRV_PHPTYPE_STREAM( "UTF-8" ), array( "StreamChunkSize" => $this->largeChunkSize ));
+    }
+
+    private function sendFile( $subject, $column, $fileName, $type, $options )
+    {
+        $usage = getrusage();
+        $stream = fopen( $fileName, "rb" );
+        $sqlType = ( $column == "vbin" ) ? SQLSRV_SQLTYPE_VARBINARY( "max" ) : SQLSRV_SQLTYPE_NVARCHAR( "max" );
+        $params = array( array( &$stream, SQLSRV_PARAM_IN, $type, $sqlType ));
+        $stmt = sqlsrv_query( $this->conn, "INSERT INTO $this->tableName ($column) VALUES (?)", $params, $options );
+        if( $stmt === false )
+        {
+            die( print_r( sqlsrv_errors(), true));
+        }
+        sqlsrv_free_stmt( $stmt );
+        fclose( $stream );
+        $this->cpuTime += $this->cpuSeconds( getrusage() ) - $this->cpuSeconds( $usage );
+        $this->bytesSent += $this->fileSize;
+        $this->subject = $subject;
+        SqlsrvUtil::query( $this->conn, "TRUNCATE TABLE $this->tableName" );
+    }
+
+    private function cpuSeconds( $usage )
+    {
+        return $usage["ru_utime.tv_sec"] + $usage["ru_utime.tv_usec"] / 1e6 + $usage["ru_stime.tv_sec"] + $usage["ru_stime.tv_usec"] / 1e6;
+    }
+
+    /*
+    * Appends the CPU time per GB of the iteration to a CSV file in the temporary directory, since PHPBench
+    * only reports the wall time
+    */
+    public function reportCpuTime()
+    {
+        if( $this->bytesSent > 0 )
+        {
+            $perGb = $this->cpuTime * 1073741824 / $this->bytesSent;
+            file_put_contents( sys_get_temp_dir() . DIRECTORY_SEPARATOR . $this->cpuTimeFile, sprintf( "%s,%s,%.3f\n", date( "c" ), $this->subject, $perGb ), FILE_APPEND );
+        }
+    }
+
+    public function dropTable()
+    {
+        SqlsrvUtil::dropTable( $this->conn, $this->tableName );
+    }
+
+    public function deleteFiles()
+    {
+        unlink( $this->binaryFile );
+        unlink( $this->utf8File );
+    }
+
+    public function disconnect()
+    {
+        SqlsrvUtil::disconnect( $this->conn );
+    }
+}
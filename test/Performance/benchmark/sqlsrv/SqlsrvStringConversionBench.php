@@ -0,0 +1,90 @@
+<?php
+
+use SqlsrvPerfTest\SqlsrvUtil;
+/**
+ * @Iterations(10)
+ * @BeforeMethods({"connect", "setTableName", "createTable"})
+ * @AfterMethods({ "dropTable", "disconnect"})
+ */
+class SqlsrvStringConversionBench
+{
+
+    private $conn;
+    private $tableName;
+
+    private $rows = 2000;
+
+    // ASCII strings are converted from UTF-16 without the system converters, other strings
+    // are converted by them
+    private $asciiText = "The quick brown fox jumps over the lazy dog 0123456789";
+    private $unicodeText = "Příliš žluťoučký kůň úpěl ďábelské ódy 0123456789";
+
+    public function setTableName()
+    {
+        $this->tableName = "string_conversion_".rand();
+    }
+
+    public function connect()
+    {
+        $this->conn = SqlsrvUtil::connect();
+    }
+
+    public function createTable()
+    {
+        SqlsrvUtil::createTable( $this->conn, $this->tableName, "ascii_text NVARCHAR(200), unicode_text NVARCHAR(200)" );
+        $sql = "INSERT INTO $this->tableName SELECT TOP ($this->rows) ?, ? FROM sys.all_columns a CROSS JOIN sys.all_columns b";
+        $stmt = sqlsrv_query( $this->conn, $sql, array( $this->asciiText, array( $this->unicodeText, SQLSRV_PARAM_IN, SQLSRV_PHPTYPE_STRING( "UTF-8" ))));
+        if( $stmt === false )
+        {
+            die( print_r( sqlsrv_errors(), true));
+        }
+    }
+
+    /*
+    * Each iteration fetches the ASCII field of every row as a UTF-8 string
+    */
+    public function benchFetchAscii()
+    {
+        $this->fetchField( 0 );
+    }
+
+    /*
+    * Each iteration fetches the non-ASCII field of every row as a UTF-8 string
+    */
+    public function benchFetchUnicode()
+    {
+        $this->fetchField( 1 );
+    }
+
+    /*
+    * Each iteration executes a query with a long ASCII text, which is converted to UTF-16
+    */
+    public function benchLongQueryText()
+    {
+        $sql = "SELECT 1 /* " . str_repeat( $this->asciiText, 2000 ) . " */";
+        for( $i = 0; $i < 100; $i++ )
+        {
+            sqlsrv_free_stmt( SqlsrvUtil::query( $this->conn, $sql ));
+        }
+    }
+
+    private function fetchField( $index )
+    {
+        $stmt = SqlsrvUtil::query( $this->conn, "SELECT ascii_text, unicode_text FROM $this->tableName" );
+        while( SqlsrvUtil::fetch( $stmt ))
+        {
+            sqlsrv_get_field( $stmt, $index, SQLSRV_PHPTYPE_STRING( "UTF-8" ));
+        }
+        sqlsrv_free_stmt( $stmt );
+    }
+
+    public function dropTable()
+    {
+        SqlsrvUtil::dropTable( $this->conn, $this->tableName );
+    }
+
+    public function disconnect()
+    {
+        SqlsrvUtil::disconnect( $this->conn );
+    }
+}
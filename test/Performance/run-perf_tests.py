@@ -129,6 +129,11 @@ def get_test_name( name ):
         , 'SqlsrvDeleteBench': 'crud-delete'
         , 'SqlsrvFetchLargeBench': 'large'
         , 'SqlsrvSelectVersionBench': 'version'
+        , 'SqlsrvStreamReadBench': 'stream-read'
+        , 'SqlsrvStreamWriteBench': 'stream-write'
+        , 'SqlsrvStringConversionBench': 'string-conversion'
+        , 'SqlsrvFetchArrayBench': 'fetch-array'
+        , 'SqlsrvQueryBatchBench': 'query-batch'
         , 'PDOConnectionBench': 'connection'
         , 'PDOCreateDbTableProcBench': 'create'
         , 'PDOCRUDBench': 'crud'
@@ -1,5 +1,5 @@
 --TEST--
-Exception is thrown if the unsupported attribute ATTR_PERSISTENT is put into the connection options
+A persistent connection is made if ATTR_PERSISTENT is put into the connection options
 --SKIPIF--
 <?php require('skipif_mid-refactor.inc'); ?>
 --FILE--
@@ -12,17 +12,18 @@ require_once("MsCommon_mid-refactor.inc");
 // require investigation for the difference in behaviors
 try {
     echo "Testing a connection with ATTR_PERSISTENT...\n";
-    // setting PDO::ATTR_PERSISTENT in PDO constructor returns an exception
+    // setting PDO::ATTR_PERSISTENT in PDO constructor opens a persistent connection
     $dsn = getDSN($server, $databaseName, $driver);
     $attr = array(PDO::ATTR_PERSISTENT => true);
     $conn = new PDO($dsn, $uid, $pwd, $attr);
+    var_dump($conn->getAttribute(PDO::ATTR_PERSISTENT));
     //free the connection
     unset($conn);
 } catch (PDOException $e) {
-    echo "Exception from unsupported attribute (ATTR_PERSISTENT) is caught\n";
+    var_dump($e->errorInfo);
 }
 try {
-    echo "\nTesting new connection after exception thrown in previous connection...\n";
+    echo "\nTesting new connection after the persistent connection...\n";
     $tableName1 = getTableName('tab1');
     $conn = connect();
     createTable($conn, $tableName1, array("c1" => "int", "c2" => "varchar(10)"));
@@ -42,7 +43,7 @@ try {
 ?>
 --EXPECT--
 Testing a connection with ATTR_PERSISTENT...
-Exception from unsupported attribute (ATTR_PERSISTENT) is caught
+bool(true)
 
-Testing new connection after exception thrown in previous connection...
+Testing new connection after the persistent connection...
 Test successfully completed
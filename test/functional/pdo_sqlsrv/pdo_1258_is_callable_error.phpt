@@ -1,7 +1,7 @@
 --TEST--
 GitHub issue 1258 - is_callable() throws an exception if PDOStatement method does not exist
 --DESCRIPTION--
-The test shows is_callable() will return false if PDOStatement method does not exist instead of throwing an exception. The user can still check errorInfo() for the error message. See documentation https://www.php.net/manual/en/function.is-callable.php
+The test shows is_callable() will return false if PDOStatement method does not exist instead of throwing an exception, and that it leaves no error behind in errorInfo(). See documentation https://www.php.net/manual/en/function.is-callable.php
 --ENV--
 PHPT_EXEC=true
 --SKIPIF--
@@ -40,11 +40,11 @@ bool(false)
 Error INFO:
 array(3) {
   [0]=>
-  string(5) "IMSSP"
+  string(5) "00000"
   [1]=>
-  int(-58)
+  NULL
   [2]=>
-  string(48) "This function is not implemented by this driver."
+  NULL
 }
 Done
 
@@ -0,0 +1,102 @@
+--TEST--
+Test the PDO::SQLSRV_ATTR_CLIENT_BUFFER_SPILL statement attribute with buffered cursors
+--DESCRIPTION--
+Without spilling, a buffered cursor larger than PDO::SQLSRV_ATTR_CLIENT_BUFFER_MAX_KB_SIZE fails. With
+it, the rows past the limit are kept in a temporary file and the cursor is scrolled and counted as usual.
+The attribute is only supported on the statement.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function printRow($stmt, $orientation, $offset = 0)
+{
+    $row = $stmt->fetch(PDO::FETCH_NUM, $orientation, $offset);
+    if ($row === false) {
+        echo "No row\n";
+    } else {
+        echo $row[0] . " " . var_export($row[1], true) . " " . strlen((string) $row[2]) . "\n";
+    }
+}
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_buffered_spill');
+    createTable($conn, $tableName, array("c_int" => "int", "c_nvarchar" => "nvarchar(100)", "c_max" => "nvarchar(max)"));
+
+    $stmt = $conn->prepare("INSERT INTO $tableName VALUES (?, ?, ?)");
+    for ($i = 1; $i <= 200; $i++) {
+        if ($i % 9 == 0) {
+            $stmt->execute(array($i, null, null));
+        } else {
+            $stmt->execute(array($i, "ünicode $i", str_repeat('m', $i)));
+        }
+    }
+
+    $query = "SELECT * FROM $tableName ORDER BY c_int";
+    $expected = $conn->query($query)->fetchAll(PDO::FETCH_NUM);
+
+    $options = array(PDO::ATTR_CURSOR => PDO::CURSOR_SCROLL,
+                     PDO::SQLSRV_ATTR_CURSOR_SCROLL_TYPE => PDO::SQLSRV_CURSOR_BUFFERED,
+                     PDO::SQLSRV_ATTR_CLIENT_BUFFER_MAX_KB_SIZE => 2);
+    try {
+        $stmt = $conn->prepare($query, $options);
+        $stmt->execute();
+        echo "The buffered query should have exceeded its limit\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    $options[PDO::SQLSRV_ATTR_CLIENT_BUFFER_SPILL] = true;
+    $stmt = $conn->prepare($query, $options);
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_CLIENT_BUFFER_SPILL));
+    $stmt->execute();
+    echo "Number of rows: " . $stmt->rowCount() . "\n";
+
+    $actual = array();
+    while ($row = $stmt->fetch(PDO::FETCH_NUM, PDO::FETCH_ORI_NEXT)) {
+        $actual[] = $row;
+    }
+    if ($actual !== $expected) {
+        echo "The spilled rows differ from the forward only rows\n";
+        var_dump($actual);
+    }
+
+    printRow($stmt, PDO::FETCH_ORI_LAST);
+    printRow($stmt, PDO::FETCH_ORI_ABS, 0);
+    printRow($stmt, PDO::FETCH_ORI_ABS, 150);
+    printRow($stmt, PDO::FETCH_ORI_REL, -80);
+    printRow($stmt, PDO::FETCH_ORI_ABS, 197);
+    printRow($stmt, PDO::FETCH_ORI_PRIOR);
+    printRow($stmt, PDO::FETCH_ORI_ABS, 200);
+
+    // statement level only
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_CLIENT_BUFFER_SPILL, true);
+        echo "Setting the attribute on the connection should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    dropTable($conn, $tableName);
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+SQLSTATE[IMSSP]: Memory limit of 2 KB exceeded for buffered query
+bool(true)
+Number of rows: 200
+200 'ünicode 200' 200
+1 'ünicode 1' 1
+151 'ünicode 151' 151
+71 'ünicode 71' 71
+198 NULL 0
+197 'ünicode 197' 197
+No row
+SQLSTATE[IMSSP]: The given attribute is only supported on the PDOStatement object.
+Done
@@ -0,0 +1,80 @@
+--TEST--
+Test persistent connections opened with PDO::ATTR_PERSISTENT
+--DESCRIPTION--
+The connection of a persistent PDO object goes back to the pool of the process when the object is destroyed,
+unless another PDO object of the request shares it, and the next persistent PDO object with the same DSN takes
+it from the pool with its session reset. The pool counters are read with PDO::SQLSRV_ATTR_PERSISTENT_POOL_INFO.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsSetup.inc");
+require_once("MsCommon_mid-refactor.inc");
+
+function printPoolInfo($conn)
+{
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_PERSISTENT_POOL_INFO);
+    echo "Idle: " . $info['Idle'] . ", Active: " . $info['Active'] . ", Hits: " . $info['Hits'] .
+         ", Misses: " . $info['Misses'] . "\n";
+}
+
+function connectPersistent()
+{
+    global $server, $databaseName, $driver, $uid, $pwd;
+
+    $dsn = getDSN($server, $databaseName, $driver);
+    return new PDO($dsn, $uid, $pwd, array(PDO::ATTR_PERSISTENT => true, PDO::ATTR_ERRMODE => PDO::ERRMODE_EXCEPTION));
+}
+
+try {
+    // leave a temporary table and an open transaction behind
+    $conn = connectPersistent();
+    var_dump($conn->getAttribute(PDO::ATTR_PERSISTENT));
+    $spid = $conn->query("SELECT @@SPID")->fetchColumn();
+    $conn->exec("CREATE TABLE #persistent_conn (c1 int)");
+    $conn->beginTransaction();
+    $conn->exec("INSERT INTO #persistent_conn VALUES (1)");
+    printPoolInfo($conn);
+
+    // PDO objects opened at the same time share the connection
+    $conn2 = connectPersistent();
+    var_dump($conn2->query("SELECT @@SPID")->fetchColumn() == $spid);
+    unset($conn);
+    printPoolInfo($conn2);
+    unset($conn2);
+
+    // the connection is taken from the pool with its session reset
+    $conn = connectPersistent();
+    var_dump($conn->query("SELECT @@SPID")->fetchColumn() == $spid);
+    var_dump($conn->query("SELECT OBJECT_ID('tempdb..#persistent_conn')")->fetchColumn());
+    var_dump($conn->query("SELECT @@TRANCOUNT")->fetchColumn());
+    printPoolInfo($conn);
+
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_PERSISTENT_POOL_INFO, array());
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    unset($conn);
+    $conn = connect();
+    printPoolInfo($conn);
+    unset($conn);
+
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+bool(true)
+Idle: 0, Active: 1, Hits: 0, Misses: 1
+bool(true)
+Idle: 0, Active: 1, Hits: 0, Misses: 1
+bool(true)
+NULL
+string(1) "0"
+Idle: 0, Active: 1, Hits: 1, Misses: 1
+SQLSTATE[IMSSP]: A read-only attribute was designated on the PDO object.
+Idle: 1, Active: 0, Hits: 1, Misses: 1
+Done
@@ -0,0 +1,75 @@
+--TEST--
+Test the statements prepared with PDO::SQLSRV_ATTR_DEFER_PREPARE
+--DESCRIPTION--
+With PDO::SQLSRV_ATTR_DEFER_PREPARE, the first execution of a prepared statement is sent directly with its
+parameters and the statement is prepared by its second execution. The attribute is set on the connection or in
+the options of PDO::prepare, and the counters of each path are returned by PDO::SQLSRV_ATTR_STATEMENT_CACHE_INFO.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function printPaths($conn, $before)
+{
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_STATEMENT_CACHE_INFO);
+    echo "DirectExecutes: " . ($info['DirectExecutes'] - $before['DirectExecutes']) .
+         ", DeferredPrepares: " . ($info['DeferredPrepares'] - $before['DeferredPrepares']) .
+         ", PreparedExecutes: " . ($info['PreparedExecutes'] - $before['PreparedExecutes']) . "\n";
+    return $info;
+}
+
+try {
+    $conn = connect();
+    $conn->setAttribute(PDO::SQLSRV_ATTR_DEFER_PREPARE, true);
+    var_dump($conn->getAttribute(PDO::SQLSRV_ATTR_DEFER_PREPARE));
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_STATEMENT_CACHE_INFO);
+
+    // the first execution is sent directly and the second one prepares the statement
+    $stmt = $conn->prepare("SELECT ? + 1 AS c1");
+    for ($value = 1; $value <= 3; $value++) {
+        $stmt->execute(array($value));
+        echo $stmt->fetchColumn() . "\n";
+        $info = printPaths($conn, $info);
+    }
+
+    // the prepare option overrides the connection attribute
+    $stmt = $conn->prepare("SELECT 1", array(PDO::SQLSRV_ATTR_DEFER_PREPARE => false));
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_DEFER_PREPARE));
+    $stmt->execute();
+    $info = printPaths($conn, $info);
+
+    try {
+        $stmt->setAttribute(PDO::SQLSRV_ATTR_DEFER_PREPARE, true);
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    // the errors of a statement whose prepare is deferred are thrown by its first execution
+    $stmt = $conn->prepare("SELECT * FROM pdo_defer_prepare_missing_table");
+    try {
+        $stmt->execute();
+    } catch (PDOException $e) {
+        echo $e->getCode() . "\n";
+    }
+
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+bool(true)
+2
+DirectExecutes: 1, DeferredPrepares: 0, PreparedExecutes: 0
+3
+DirectExecutes: 0, DeferredPrepares: 1, PreparedExecutes: 1
+4
+DirectExecutes: 0, DeferredPrepares: 0, PreparedExecutes: 1
+bool(false)
+DirectExecutes: 0, DeferredPrepares: 0, PreparedExecutes: 1
+SQLSTATE[IMSSP]: The PDO::SQLSRV_ATTR_DEFER_PREPARE attribute may only be set on the PDO object or in the $driver_options array of PDO::prepare.
+42S02
+Done
@@ -0,0 +1,93 @@
+--TEST--
+Test the parsed DSN cache of the connections
+--DESCRIPTION--
+A connection opened again with the same DSN takes the values of its options from the cache of the process instead
+of parsing the DSN, and connects with the same options. A DSN that failed to parse is not cached. The counters are
+read with PDO::SQLSRV_ATTR_DSN_CACHE_INFO, and the least recently used DSNs are evicted past pdo_sqlsrv.dsn_cache_size.
+--INI--
+pdo_sqlsrv.dsn_cache_size=2
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsSetup.inc");
+require_once("MsCommon_mid-refactor.inc");
+
+function cacheDelta($conn, $before)
+{
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_DSN_CACHE_INFO);
+    echo "Hits: " . ($info['Hits'] - $before['Hits']) . ", Misses: " . ($info['Misses'] - $before['Misses']) . "\n";
+    return $info;
+}
+
+function connectWithApp($app)
+{
+    global $server, $databaseName, $driver, $uid, $pwd;
+
+    $dsn = getDSN($server, $databaseName, $driver) . "APP=$app";
+    $conn = new PDO($dsn, $uid, $pwd, array(PDO::ATTR_ERRMODE => PDO::ERRMODE_EXCEPTION));
+    echo $conn->query("SELECT APP_NAME()")->fetchColumn() . "\n";
+    return $conn;
+}
+
+try {
+    $conn = connectWithApp("pdo_dsn_cache1");
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_DSN_CACHE_INFO);
+    var_dump($info['MaxEntries']);
+
+    // the DSN is parsed the first time only, and the options are applied either way
+    $conn = connectWithApp("pdo_dsn_cache2");
+    $info = cacheDelta($conn, $info);
+    $conn = connectWithApp("pdo_dsn_cache2");
+    $info = cacheDelta($conn, $info);
+    var_dump($info['HitRate'] > 0 && $info['MemoryUsage'] > 0);
+
+    // a DSN that failed to parse is not cached
+    for ($i = 0; $i < 2; $i++) {
+        try {
+            $bad = new PDO("sqlsrv:Server=$server;InvalidKey=1", $uid, $pwd);
+            echo "The invalid DSN should have failed\n";
+        } catch (PDOException $e) {
+            echo $e->getMessage() . "\n";
+        }
+    }
+    $info = cacheDelta($conn, $info);
+
+    // the least recently used DSNs are evicted
+    $before = $info;
+    $conn = connectWithApp("pdo_dsn_cache3");
+    $conn = connectWithApp("pdo_dsn_cache4");
+    $info = cacheDelta($conn, $before);
+    echo "Entries: " . $info['Entries'] . "\n";
+    var_dump($info['Evictions'] - $before['Evictions'] == $before['Entries']);
+
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_DSN_CACHE_INFO, array());
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+pdo_dsn_cache1
+int(2)
+pdo_dsn_cache2
+Hits: 0, Misses: 1
+pdo_dsn_cache2
+Hits: 1, Misses: 0
+bool(true)
+SQLSTATE[IMSSP]: An invalid keyword 'InvalidKey' was specified in the DSN string.
+SQLSTATE[IMSSP]: An invalid keyword 'InvalidKey' was specified in the DSN string.
+Hits: 0, Misses: 2
+pdo_dsn_cache3
+pdo_dsn_cache4
+Hits: 0, Misses: 2
+Entries: 2
+bool(true)
+SQLSTATE[IMSSP]: A read-only attribute was designated on the PDO object.
+Done
@@ -0,0 +1,89 @@
+--TEST--
+Test PDOStatement::sqlsrvExecuteBatch with arrays of parameter values
+--DESCRIPTION--
+Rows of parameter values are sent in batches with positional and named placeholders. Each row gets
+a status in the returned array and a row that fails does not stop the other rows. Batches are
+rejected for emulated prepares and direct queries.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_execute_batch');
+    createTable($conn, $tableName, array(new ColumnMeta("int", "c_id", "NOT NULL PRIMARY KEY"), "c_name" => "nvarchar(50)", "c_price" => "float"));
+
+    $stmt = $conn->prepare("INSERT INTO $tableName VALUES (?, ?, ?)");
+    $rows = array();
+    for ($i = 1; $i <= 20; $i++) {
+        $rows[] = array($i, "ünicode $i", $i * 1.5);
+    }
+    $status = $stmt->sqlsrvExecuteBatch($rows, 8);
+    echo count($status) . " rows, " . count(array_filter($status)) . " succeeded\n";
+
+    // named placeholders are bound in the order they appear, and a duplicate key only fails its own row
+    $stmt = $conn->prepare("INSERT INTO $tableName (c_id, c_name) VALUES (:id, :name)");
+    var_dump($stmt->sqlsrvExecuteBatch(array(array(21, 'a'), array(5, 'duplicate'), array(22, null))));
+
+    $stmt = $conn->query("SELECT COUNT(*), COUNT(c_name), CAST(SUM(c_price) AS int) FROM $tableName");
+    var_dump($stmt->fetch(PDO::FETCH_NUM));
+
+    $stmt = $conn->query("SELECT c_name FROM $tableName WHERE c_id = 7");
+    var_dump($stmt->fetchColumn());
+
+    // invalid input
+    $stmt = $conn->prepare("INSERT INTO $tableName (c_id, c_name) VALUES (?, ?)");
+    foreach (array(array(array(30)), array(array(30, new stdClass()))) as $rows) {
+        try {
+            $stmt->sqlsrvExecuteBatch($rows);
+            echo "The batch should have failed\n";
+        } catch (PDOException $e) {
+            echo $e->getMessage() . "\n";
+        }
+    }
+
+    $options = array(array(PDO::ATTR_EMULATE_PREPARES => true), array(PDO::SQLSRV_ATTR_DIRECT_QUERY => true));
+    foreach ($options as $option) {
+        $stmt = $conn->prepare("INSERT INTO $tableName (c_id, c_name) VALUES (?, ?)", $option);
+        try {
+            $stmt->sqlsrvExecuteBatch(array(array(30, 'a')));
+            echo "The batch should have failed\n";
+        } catch (PDOException $e) {
+            echo $e->getMessage() . "\n";
+        }
+    }
+
+    dropTable($conn, $tableName);
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+20 rows, 20 succeeded
+array(3) {
+  [0]=>
+  bool(true)
+  [1]=>
+  bool(false)
+  [2]=>
+  bool(true)
+}
+array(3) {
+  [0]=>
+  string(2) "22"
+  [1]=>
+  string(2) "21"
+  [2]=>
+  string(3) "315"
+}
+string(10) "ünicode 7"
+SQLSTATE[IMSSP]: The row at index 0 of the batch must be an array with a value for each of the 2 parameters of the statement.
+SQLSTATE[IMSSP]: Invalid value for parameter 2 in the row at index 0 of the batch. Only null, boolean, integer, float and string values can be executed in a batch.
+SQLSTATE[IMSSP]: Batch execution is not supported with PDO::ATTR_EMULATE_PREPARES or PDO::SQLSRV_ATTR_DIRECT_QUERY.
+SQLSTATE[IMSSP]: Batch execution is not supported with PDO::ATTR_EMULATE_PREPARES or PDO::SQLSRV_ATTR_DIRECT_QUERY.
+Done
@@ -0,0 +1,107 @@
+--TEST--
+Test PDOStatement::sqlsrvFetchAll with each supported fetch mode
+--DESCRIPTION--
+The rows returned by PDOStatement::sqlsrvFetchAll must match the rows returned by PDOStatement::fetchAll
+for PDO::FETCH_ASSOC, PDO::FETCH_NUM and PDO::FETCH_BOTH, with forward only and client buffered cursors
+and with PDO::ATTR_CASE, PDO::ATTR_ORACLE_NULLS and PDO::ATTR_STRINGIFY_FETCHES. Other fetch modes are rejected.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function compareRows($conn, $query, $options, $mode)
+{
+    $stmt = $conn->prepare($query, $options);
+    $stmt->execute();
+    $expected = $stmt->fetchAll($mode);
+
+    $stmt = $conn->prepare($query, $options);
+    $stmt->execute();
+    $actual = $stmt->sqlsrvFetchAll($mode);
+    if ($actual !== $expected) {
+        echo "Rows differ with fetch mode $mode\n";
+        var_dump($actual);
+    } else {
+        echo "Fetched " . count($actual) . " rows with fetch mode $mode\n";
+    }
+}
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_fetch_all');
+
+    createTable($conn, $tableName, array("c_int" => "int", "c_float" => "float", "c_nvarchar" => "nvarchar(50)", "c_datetime" => "datetime", "c_max" => "nvarchar(max)"));
+    for ($i = 1; $i <= 20; $i++) {
+        if ($i % 6 == 0) {
+            $row = array("c_int" => $i, "c_float" => null, "c_nvarchar" => "", "c_datetime" => null, "c_max" => null);
+        } else {
+            $row = array("c_int" => $i, "c_float" => $i / 7, "c_nvarchar" => "ünicode $i", "c_datetime" => sprintf("2021-03-%02d 01:02:03.000", $i), "c_max" => str_repeat("max$i", 50));
+        }
+        insertRow($conn, $tableName, $row);
+    }
+
+    $query = "SELECT c_int, c_float, c_nvarchar, c_datetime, c_int AS [1], c_max FROM $tableName ORDER BY c_int";
+    foreach (array(PDO::FETCH_ASSOC, PDO::FETCH_NUM, PDO::FETCH_BOTH) as $mode) {
+        compareRows($conn, $query, array(), $mode);
+        compareRows($conn, $query, array(PDO::ATTR_CURSOR => PDO::CURSOR_SCROLL, PDO::SQLSRV_ATTR_CURSOR_SCROLL_TYPE => PDO::SQLSRV_CURSOR_BUFFERED), $mode);
+    }
+
+    // the conversions PDO applies to fetched values
+    $conn->setAttribute(PDO::ATTR_CASE, PDO::CASE_UPPER);
+    $conn->setAttribute(PDO::ATTR_ORACLE_NULLS, PDO::NULL_EMPTY_STRING);
+    $conn->setAttribute(PDO::ATTR_STRINGIFY_FETCHES, true);
+    compareRows($conn, $query, array(), PDO::FETCH_ASSOC);
+    $conn->setAttribute(PDO::ATTR_ORACLE_NULLS, PDO::NULL_TO_STRING);
+    compareRows($conn, $query, array(), PDO::FETCH_BOTH);
+    $conn->setAttribute(PDO::ATTR_CASE, PDO::CASE_NATURAL);
+    $conn->setAttribute(PDO::ATTR_ORACLE_NULLS, PDO::NULL_NATURAL);
+    $conn->setAttribute(PDO::ATTR_STRINGIFY_FETCHES, false);
+
+    // the default fetch mode of the statement and the rows left after the first one was fetched
+    $stmt = $conn->query("SELECT c_int FROM $tableName ORDER BY c_int");
+    $stmt->setFetchMode(PDO::FETCH_NUM);
+    $stmt->fetch();
+    $rows = $stmt->sqlsrvFetchAll();
+    echo count($rows) . " rows left\n";
+    var_dump($rows[0]);
+
+    // an empty result set
+    $stmt = $conn->query("SELECT c_int FROM $tableName WHERE c_int < 0");
+    var_dump($stmt->sqlsrvFetchAll(PDO::FETCH_ASSOC));
+
+    // unsupported fetch mode
+    try {
+        $stmt = $conn->query("SELECT c_int FROM $tableName");
+        $stmt->sqlsrvFetchAll(PDO::FETCH_OBJ);
+        echo "PDO::FETCH_OBJ should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    dropTable($conn, $tableName);
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+Fetched 20 rows with fetch mode 2
+Fetched 20 rows with fetch mode 2
+Fetched 20 rows with fetch mode 3
+Fetched 20 rows with fetch mode 3
+Fetched 20 rows with fetch mode 4
+Fetched 20 rows with fetch mode 4
+Fetched 20 rows with fetch mode 2
+Fetched 20 rows with fetch mode 4
+19 rows left
+array(1) {
+  [0]=>
+  string(1) "2"
+}
+array(0) {
+}
+SQLSTATE[IMSSP]: PDOStatement::sqlsrvFetchAll supports only the PDO::FETCH_ASSOC, PDO::FETCH_NUM and PDO::FETCH_BOTH fetch modes.
+Done
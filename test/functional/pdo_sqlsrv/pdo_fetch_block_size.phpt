@@ -0,0 +1,95 @@
+--TEST--
+Test the PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE statement attribute with forward only cursors
+--DESCRIPTION--
+Rows fetched a block at a time with bound columns must match the rows fetched one at a time,
+including NULL values. The attribute is set with PDO::prepare or PDOStatement::setAttribute,
+is rejected at the connection level and only accepts block sizes from 1 to 65535.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function fetchRows($conn, $query, $options)
+{
+    $stmt = $conn->prepare($query, $options);
+    $stmt->execute();
+    return $stmt->fetchAll(PDO::FETCH_ASSOC);
+}
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_fetch_block_size');
+
+    createTable($conn, $tableName, array("c_int" => "int", "c_float" => "float", "c_decimal" => "decimal(18,4)", "c_nvarchar" => "nvarchar(50)", "c_datetime" => "datetime"));
+    for ($i = 1; $i <= 30; $i++) {
+        if ($i % 5 == 0) {
+            $row = array("c_int" => $i, "c_float" => null, "c_decimal" => null, "c_nvarchar" => null, "c_datetime" => null);
+        } else {
+            $row = array("c_int" => $i, "c_float" => $i / 7, "c_decimal" => $i * 1.5, "c_nvarchar" => "ünicode $i", "c_datetime" => sprintf("2021-03-%02d 01:02:03.000", $i));
+        }
+        insertRow($conn, $tableName, $row);
+    }
+
+    $query = "SELECT * FROM $tableName ORDER BY c_int";
+    $expected = fetchRows($conn, $query, array());
+    foreach (array(1, 8, 64) as $blockSize) {
+        $actual = fetchRows($conn, $query, array(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE => $blockSize));
+        if ($actual !== $expected) {
+            echo "Rows differ with block size $blockSize\n";
+            var_dump($actual);
+        } else {
+            echo "Fetched " . count($actual) . " rows with block size $blockSize\n";
+        }
+    }
+
+    // set after prepare
+    $stmt = $conn->prepare($query);
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE));
+    $stmt->setAttribute(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE, 16);
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE));
+    $stmt->execute();
+    $numRows = 0;
+    while ($row = $stmt->fetch(PDO::FETCH_NUM)) {
+        $numRows++;
+    }
+    echo "Number of rows: $numRows\n";
+
+    // invalid values
+    foreach (array(0, 65536, 'abc') as $blockSize) {
+        try {
+            $stmt->setAttribute(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE, $blockSize);
+            echo "Block size $blockSize should have failed\n";
+        } catch (PDOException $e) {
+            echo $e->getMessage() . "\n";
+        }
+    }
+
+    // statement level only
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE, 10);
+        echo "Setting the attribute on the connection should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    dropTable($conn, $tableName);
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+Fetched 30 rows with block size 1
+Fetched 30 rows with block size 8
+Fetched 30 rows with block size 64
+int(1)
+int(16)
+Number of rows: 30
+SQLSTATE[IMSSP]: The fetch block size must be an integer between 1 and 65535.
+SQLSTATE[IMSSP]: The fetch block size must be an integer between 1 and 65535.
+SQLSTATE[IMSSP]: The fetch block size must be an integer between 1 and 65535.
+SQLSTATE[IMSSP]: The given attribute is only supported on the PDOStatement object.
+Done
@@ -0,0 +1,115 @@
+--TEST--
+Test executing statements with PDO::SQLSRV_ATTR_ASYNC_EXECUTE and polling them with sqlsrvPoll
+--DESCRIPTION--
+Statements executed asynchronously on separate connections run at the same time, and their columns
+and rows are available once PDOStatement::sqlsrvPoll returns true. The rows can't be fetched while the
+statement is executing. The attribute is only supported on the statement.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function pollAll($stmts)
+{
+    $pending = $stmts;
+    $polls = 0;
+    while (!empty($pending)) {
+        foreach ($pending as $key => $stmt) {
+            if ($stmt->sqlsrvPoll() === true) {
+                unset($pending[$key]);
+            }
+        }
+        $polls++;
+        usleep(10000);
+    }
+    return $polls;
+}
+
+try {
+    $query = "WAITFOR DELAY '00:00:02'; SELECT ? AS c_id, N'ünicode' AS c_name";
+    $options = array(PDO::SQLSRV_ATTR_ASYNC_EXECUTE => true);
+
+    $conns = array();
+    $stmts = array();
+    $start = microtime(true);
+    for ($i = 1; $i <= 3; $i++) {
+        $conns[$i] = connect("", array(PDO::ATTR_CASE => PDO::CASE_UPPER));
+        $stmt = $conns[$i]->prepare($query, $options);
+        $stmt->execute(array($i));
+        $stmts[] = $stmt;
+    }
+    var_dump($stmts[0]->getAttribute(PDO::SQLSRV_ATTR_ASYNC_EXECUTE));
+    $polls = pollAll($stmts);
+    $elapsed = microtime(true) - $start;
+    if ($elapsed > 5 || $polls < 2) {
+        echo "The statements did not run at the same time: $elapsed seconds, $polls polls\n";
+    }
+    foreach ($stmts as $stmt) {
+        echo $stmt->columnCount() . " columns: ";
+        echo implode(" ", $stmt->fetch(PDO::FETCH_ASSOC)) . "\n";
+    }
+    $meta = $stmts[0]->getColumnMeta(1);
+    echo $meta['name'] . "\n";
+
+    // a prepared statement is executed again, with a column bound by name
+    $stmt = $stmts[0];
+    $stmt->execute(array(4));
+    try {
+        $stmt->fetch();
+        echo "Fetching should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+    pollAll(array($stmt));
+    var_dump($stmt->sqlsrvPoll());
+    $stmt->bindColumn('C_NAME', $name);
+    $stmt->fetch(PDO::FETCH_BOUND);
+    echo $name . "\n";
+
+    // a statement that is still executing is canceled when the cursor is closed
+    $stmt = $conns[2]->prepare("WAITFOR DELAY '00:00:10'; SELECT 1", $options);
+    $stmt->execute();
+    var_dump($stmt->closeCursor());
+    var_dump($conns[2]->query("SELECT 2")->fetchColumn());
+
+    // errors are thrown when the execution completes
+    $stmt = $conns[3]->prepare("WAITFOR DELAY '00:00:01'; SELECT * FROM no_such_table_async", $options);
+    $stmt->execute();
+    try {
+        pollAll(array($stmt));
+        echo "Polling should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->errorInfo[0] . "\n";
+    }
+
+    // statement level only
+    try {
+        $conns[1]->setAttribute(PDO::SQLSRV_ATTR_ASYNC_EXECUTE, true);
+        echo "Setting the attribute on the connection should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    unset($stmt);
+    unset($stmts);
+    unset($conns);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+bool(true)
+2 columns: 1 ünicode
+2 columns: 2 ünicode
+2 columns: 3 ünicode
+C_NAME
+SQLSTATE[IMSSP]: The statement is still executing. Poll the statement until the execution completes.
+bool(true)
+ünicode
+bool(true)
+string(1) "2"
+42S02
+SQLSTATE[IMSSP]: The given attribute is only supported on the PDOStatement object.
+Done
@@ -0,0 +1,86 @@
+--TEST--
+Test PDO::sqlsrvQueryBatch with queries and parameters sent in a single batch
+--DESCRIPTION--
+The queries of a batch and their parameters are joined into one statement, whose rowsets are read in turn
+with PDOStatement::nextRowset, or fetched at once when a fetch mode is given. A rowset without columns returns
+the number of rows modified by its query. Empty batches and invalid queries are rejected, and an error in any
+query of the batch fails the fetch.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_query_batch');
+
+    createTable($conn, $tableName, array("c_int" => "int", "c_varchar" => "varchar(10)"));
+    $conn->exec("INSERT INTO $tableName VALUES (1, 'one'), (2, 'two'), (3, 'three'), (4, 'four'), (5, 'five')");
+
+    var_dump(is_callable(array($conn, 'sqlsrvQueryBatch')));
+
+    // a trailing semicolon is optional, and a common table expression may follow another query
+    $queries = array(array("SELECT c_int FROM $tableName WHERE c_int < ? ORDER BY c_int", array(3)),
+                     "SELECT COUNT(*) AS total FROM $tableName",
+                     array("UPDATE $tableName SET c_varchar = ? WHERE c_int = ?", array('deux?', 2)),
+                     "WITH cte AS (SELECT c_varchar FROM $tableName WHERE c_int = 2) SELECT c_varchar FROM cte; ");
+
+    // lazy: the statement is positioned on the first rowset
+    $stmt = $conn->sqlsrvQueryBatch($queries);
+    echo get_class($stmt) . "\n";
+    do {
+        if ($stmt->columnCount() > 0) {
+            echo json_encode($stmt->fetchAll(PDO::FETCH_ASSOC)) . "\n";
+        } else {
+            echo "rows affected: " . $stmt->rowCount() . "\n";
+        }
+    } while ($stmt->nextRowset());
+    unset($stmt);
+
+    // fetched: every rowset at once
+    echo json_encode($conn->sqlsrvQueryBatch($queries, PDO::FETCH_ASSOC)) . "\n";
+    echo json_encode($conn->sqlsrvQueryBatch($queries, PDO::FETCH_NUM)) . "\n";
+
+    // invalid batches
+    $batches = array(array(), array("SELECT 1", 42), array(" ; "), array(array("SELECT ?", 1)), array(array("SELECT ?", array(1), 2)));
+    foreach ($batches as $batch) {
+        try {
+            $conn->sqlsrvQueryBatch($batch);
+            echo "The batch should have failed\n";
+        } catch (PDOException $e) {
+            echo $e->getMessage() . "\n";
+        }
+    }
+
+    // an error in the second query fails the batch
+    try {
+        $conn->sqlsrvQueryBatch(array("SELECT 1 AS one", "SELECT 1 / 0 AS boom"), PDO::FETCH_ASSOC);
+        echo "The batch should have failed\n";
+    } catch (PDOException $e) {
+        var_dump(strpos($e->getMessage(), 'Divide by zero') !== false);
+    }
+
+    dropTable($conn, $tableName);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+bool(true)
+PDOStatement
+[{"c_int":"1"},{"c_int":"2"}]
+[{"total":"5"}]
+rows affected: 1
+[{"c_varchar":"deux?"}]
+[[{"c_int":"1"},{"c_int":"2"}],[{"total":"5"}],1,[{"c_varchar":"deux?"}]]
+[[["1"],["2"]],[["5"]],1,[["deux?"]]]
+SQLSTATE[IMSSP]: A batch must contain at least one query.
+SQLSTATE[IMSSP]: The query at position 1 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+SQLSTATE[IMSSP]: The query at position 0 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+SQLSTATE[IMSSP]: The query at position 0 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+SQLSTATE[IMSSP]: The query at position 0 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+bool(true)
+Done
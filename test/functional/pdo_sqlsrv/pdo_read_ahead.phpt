@@ -0,0 +1,115 @@
+--TEST--
+Test the PDO::SQLSRV_ATTR_READ_AHEAD statement attribute with blocks fetched on a background thread
+--DESCRIPTION--
+Rows of forward only cursors fetched a block at a time by a thread reading ahead must match the rows
+fetched one at a time. The thread is stopped by executing the statement again, by moving to the next rowset
+and by reading the metadata of a column in the middle of a result set. The attribute is set with PDO::prepare
+or PDOStatement::setAttribute, is rejected at the connection level and only accepts values from 0 to 64.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function fetchRows($conn, $query, $options)
+{
+    $stmt = $conn->prepare($query, $options);
+    $stmt->execute();
+    return $stmt->fetchAll(PDO::FETCH_ASSOC);
+}
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_read_ahead');
+
+    createTable($conn, $tableName, array("c_int" => "int", "c_float" => "float", "c_decimal" => "decimal(18,4)", "c_nvarchar" => "nvarchar(50)", "c_datetime" => "datetime"));
+    $sql = "INSERT INTO $tableName SELECT TOP (500) n, n / 7.0, n * 1.5, CASE WHEN n % 5 = 0 THEN NULL ELSE N'ünicode ' + CAST(n AS nvarchar(10)) END, " .
+           "DATEADD(minute, n, '2021-03-01') FROM (SELECT ROW_NUMBER() OVER (ORDER BY a.object_id) AS n FROM sys.all_columns a CROSS JOIN sys.all_columns b) AS numbers";
+    $conn->exec($sql);
+
+    $query = "SELECT * FROM $tableName ORDER BY c_int";
+    $expected = fetchRows($conn, $query, array());
+    foreach (array(array(8, 1), array(8, 16), array(100, 64)) as $config) {
+        list($blockSize, $readAhead) = $config;
+        $actual = fetchRows($conn, $query, array(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE => $blockSize, PDO::SQLSRV_ATTR_READ_AHEAD => $readAhead));
+        if ($actual !== $expected) {
+            echo "Rows differ with block size $blockSize and read ahead $readAhead\n";
+        } else {
+            echo "Fetched " . count($actual) . " rows with block size $blockSize and read ahead $readAhead\n";
+        }
+    }
+
+    // set after prepare, and executed again in the middle of the result set
+    $stmt = $conn->prepare($query, array(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE => 10));
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_READ_AHEAD));
+    $stmt->setAttribute(PDO::SQLSRV_ATTR_READ_AHEAD, 4);
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_READ_AHEAD));
+    $stmt->execute();
+    for ($i = 0; $i < 35; $i++) {
+        $stmt->fetch(PDO::FETCH_NUM);
+    }
+    $meta = $stmt->getColumnMeta(3);
+    echo $meta['sqlsrv:decl_type'] . "\n";
+    $row = $stmt->fetch(PDO::FETCH_NUM);
+    var_dump($row[0]);
+    $stmt->execute();
+    $numRows = 0;
+    while ($row = $stmt->fetch(PDO::FETCH_NUM)) {
+        $numRows++;
+    }
+    echo "Number of rows: $numRows\n";
+
+    // the next rowset is returned in the middle of the first one
+    $stmt = $conn->prepare("$query; SELECT c_int FROM $tableName WHERE c_int = 250", array(PDO::SQLSRV_ATTR_FETCH_BLOCK_SIZE => 10, PDO::SQLSRV_ATTR_READ_AHEAD => 4));
+    $stmt->execute();
+    for ($i = 0; $i < 25; $i++) {
+        $stmt->fetch(PDO::FETCH_NUM);
+    }
+    var_dump($stmt->nextRowset());
+    $row = $stmt->fetch(PDO::FETCH_NUM);
+    var_dump($row[0]);
+    unset($stmt);
+
+    // invalid values
+    $stmt = $conn->prepare($query);
+    foreach (array(-1, 65, 'abc') as $readAhead) {
+        try {
+            $stmt->setAttribute(PDO::SQLSRV_ATTR_READ_AHEAD, $readAhead);
+            echo "Read ahead $readAhead should have failed\n";
+        } catch (PDOException $e) {
+            echo $e->getMessage() . "\n";
+        }
+    }
+
+    // statement level only
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_READ_AHEAD, 4);
+        echo "Setting the attribute on the connection should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    dropTable($conn, $tableName);
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+Fetched 500 rows with block size 8 and read ahead 1
+Fetched 500 rows with block size 8 and read ahead 16
+Fetched 500 rows with block size 100 and read ahead 64
+int(0)
+int(4)
+nvarchar
+string(2) "36"
+Number of rows: 500
+bool(true)
+string(3) "250"
+SQLSTATE[IMSSP]: The number of blocks read ahead must be an integer between 0 and 64.
+SQLSTATE[IMSSP]: The number of blocks read ahead must be an integer between 0 and 64.
+SQLSTATE[IMSSP]: The number of blocks read ahead must be an integer between 0 and 64.
+SQLSTATE[IMSSP]: The given attribute is only supported on the PDOStatement object.
+Done
@@ -0,0 +1,73 @@
+--TEST--
+Test the lines written to the slow query log by PDO statements
+--DESCRIPTION--
+With pdo_sqlsrv.slow_query_threshold=0 every execution is slow, and a line is written to the
+pdo_sqlsrv.slow_query_log file once the rows of the query are fetched or the statement is freed. The query is
+normalized, so the executions with different literals share a fingerprint, and the PHP types of the parameters
+are listed.
+--INI--
+pdo_sqlsrv.slow_query_log={PWD}/pdo_slow_query.log
+pdo_sqlsrv.slow_query_threshold=0
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function findLines($file, $query, $count)
+{
+    // the log is written by a thread of the process, so the lines can take a moment to appear
+    for ($i = 0; $i < 100; $i++) {
+        $found = array();
+        if (file_exists($file)) {
+            foreach (file($file) as $line) {
+                $entry = json_decode($line, true);
+                if ($entry['query'] === $query) {
+                    $found[] = $entry;
+                }
+            }
+        }
+        if (count($found) >= $count) {
+            return $found;
+        }
+        usleep(50000);
+    }
+    return $found;
+}
+
+try {
+    $file = __DIR__ . '/pdo_slow_query.log';
+    $conn = connect();
+
+    foreach (array(10, 20) as $value) {
+        $stmt = $conn->prepare("SELECT ? AS c1, $value AS c2 /* comment */ WHERE 'a' IN ('a', 'b')");
+        $stmt->execute(array("abc"));
+        $stmt->fetchAll();
+    }
+    $entries = findLines($file, "SELECT ? AS c1, ? AS c2 WHERE ? IN (?)", 2);
+    echo count($entries) . "\n";
+    var_dump($entries[0]['fingerprint'] === $entries[1]['fingerprint']);
+    var_dump($entries[0]['param_types']);
+    var_dump($entries[0]['rows']);
+
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--CLEAN--
+<?php
+@unlink(__DIR__ . '/pdo_slow_query.log');
+@unlink(__DIR__ . '/pdo_slow_query.log.1');
+?>
+--EXPECT--
+2
+bool(true)
+array(1) {
+  [0]=>
+  string(6) "string"
+}
+int(1)
+Done
@@ -0,0 +1,128 @@
+--TEST--
+Test the parsed SQL cache of named placeholders
+--DESCRIPTION--
+A query prepared again takes its rewritten query and parameter names from the cache of the process, with and
+without emulated prepares, and binds its parameters by name as when it was parsed. The counters are read with
+PDO::SQLSRV_ATTR_SQL_CACHE_INFO, and the least recently used queries are evicted past pdo_sqlsrv.sql_cache_size or
+pdo_sqlsrv.sql_cache_max_kb_size. A query too large for the cache on its own is not cached.
+--INI--
+pdo_sqlsrv.sql_cache_size=4
+pdo_sqlsrv.sql_cache_max_kb_size=64
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function cacheDelta($conn, $before)
+{
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_SQL_CACHE_INFO);
+    echo "Hits: " . ($info['Hits'] - $before['Hits']) . ", Misses: " . ($info['Misses'] - $before['Misses']) . "\n";
+    return $info;
+}
+
+function selectRows($conn, $query, $options)
+{
+    $stmt = $conn->prepare($query, $options);
+    $stmt->bindValue(':second', 'two');
+    $stmt->bindValue(':first', 1);
+    $stmt->execute();
+    echo implode(',', $stmt->fetchAll(PDO::FETCH_COLUMN)) . "\n";
+}
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_sql_cache');
+    createTable($conn, $tableName, array("c_id" => "int", "c_name" => "varchar(10)"));
+    $conn->exec("INSERT INTO $tableName VALUES (1, 'one'), (2, 'two'), (3, 'three')");
+
+    $query = "SELECT c_id FROM $tableName WHERE c_id = :first OR c_name = :second ORDER BY c_id";
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_SQL_CACHE_INFO);
+    var_dump($info['MaxEntries']);
+
+    // the query is parsed the first time only
+    selectRows($conn, $query, array());
+    $info = cacheDelta($conn, $info);
+    selectRows($conn, $query, array());
+    $info = cacheDelta($conn, $info);
+
+    // emulated prepares are cached apart
+    selectRows($conn, $query, array(PDO::ATTR_EMULATE_PREPARES => true));
+    $info = cacheDelta($conn, $info);
+    selectRows($conn, $query, array(PDO::ATTR_EMULATE_PREPARES => true));
+    $info = cacheDelta($conn, $info);
+    var_dump($info['HitRate'] > 0 && $info['MemoryUsage'] > 0);
+
+    // queries that failed to parse are not cached
+    for ($i = 0; $i < 2; $i++) {
+        try {
+            $conn->prepare("SELECT c_id FROM $tableName WHERE c_id = :first OR c_id = ?");
+            echo "Mixed placeholders should have failed\n";
+        } catch (PDOException $e) {
+            echo "Failed to prepare\n";
+        }
+    }
+    $info = cacheDelta($conn, $info);
+
+    // the least recently used queries are evicted
+    for ($i = 1; $i <= 6; $i++) {
+        $conn->prepare("SELECT c_id FROM $tableName WHERE c_id = :id$i");
+    }
+    $before = $info;
+    $info = cacheDelta($conn, $before);
+    echo "Entries: " . $info['Entries'] . "\n";
+    var_dump($info['Evictions'] - $before['Evictions'] == $before['Entries'] + 6 - 4);
+
+    // the least recently used queries are evicted to keep the cache within its memory limit
+    $before = $info;
+    for ($i = 1; $i <= 4; $i++) {
+        $conn->prepare("SELECT c_id FROM $tableName WHERE c_id = :id$i AND c_name <> '" . str_repeat('x', 12000) . "'");
+    }
+    $info = cacheDelta($conn, $before);
+    var_dump($info['MemoryUsage'] <= 64 * 1024 && $info['Evictions'] > $before['Evictions']);
+
+    // a query larger than the cache is parsed every time
+    $query = "SELECT c_id FROM $tableName WHERE c_id = :id AND c_name <> '" . str_repeat('x', 70000) . "'";
+    for ($i = 0; $i < 2; $i++) {
+        $conn->prepare($query);
+    }
+    $before = $info;
+    $info = cacheDelta($conn, $before);
+    var_dump($info['Entries'] == $before['Entries'] && $info['MemoryUsage'] == $before['MemoryUsage']);
+
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_SQL_CACHE_INFO, array());
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    dropTable($conn, $tableName);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+int(4)
+1,2
+Hits: 0, Misses: 1
+1,2
+Hits: 1, Misses: 0
+1,2
+Hits: 0, Misses: 1
+1,2
+Hits: 1, Misses: 0
+bool(true)
+Failed to prepare
+Failed to prepare
+Hits: 0, Misses: 2
+Hits: 0, Misses: 6
+Entries: 4
+bool(true)
+Hits: 0, Misses: 4
+bool(true)
+Hits: 0, Misses: 2
+bool(true)
+SQLSTATE[IMSSP]: A read-only attribute was designated on the PDO object.
+Done
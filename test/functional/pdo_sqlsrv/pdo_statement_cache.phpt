@@ -0,0 +1,98 @@
+--TEST--
+Test the statement cache of a connection with the StatementCacheSize DSN keyword
+--DESCRIPTION--
+Prepared statements destroyed on a connection with StatementCacheSize are kept with their metadata and
+reused when the same query is prepared again. The least recently used statements are evicted past the
+limit, and the counters are returned by PDO::SQLSRV_ATTR_STATEMENT_CACHE_INFO, which is read only.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function printCacheInfo($conn)
+{
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_STATEMENT_CACHE_INFO);
+    echo "Entries: " . $info['Entries'] . ", Hits: " . $info['Hits'] . ", Misses: " . $info['Misses'] .
+         ", Evictions: " . $info['Evictions'] . ", Invalidations: " . $info['Invalidations'] . "\n";
+}
+
+function prepareAndFetch($conn, $query)
+{
+    $stmt = $conn->prepare($query);
+    $stmt->execute();
+    $names = array();
+    for ($i = 0; $i < $stmt->columnCount(); $i++) {
+        $names[] = $stmt->getColumnMeta($i)['name'];
+    }
+    $row = $stmt->fetch(PDO::FETCH_ASSOC);
+    echo implode(",", $names) . ": " . implode(",", $row) . "\n";
+    unset($stmt);
+}
+
+try {
+    // column encryption turns the cache off
+    $conn = connect("StatementCacheSize=2", array(), PDO::ERRMODE_EXCEPTION, true);
+    printCacheInfo($conn);
+
+    $tableName = getTableName('pdo_statement_cache');
+    createTable($conn, $tableName, array("c1" => "int", "c2" => "nvarchar(20)"));
+    $conn->exec("INSERT INTO $tableName VALUES (1, N'ünicode')");
+
+    $query = "SELECT * FROM $tableName";
+    for ($i = 0; $i < 3; $i++) {
+        prepareAndFetch($conn, $query);
+    }
+    printCacheInfo($conn);
+
+    // the first query is the least recently used one
+    prepareAndFetch($conn, "SELECT c1 FROM $tableName");
+    prepareAndFetch($conn, "SELECT c2 FROM $tableName");
+    prepareAndFetch($conn, $query);
+    printCacheInfo($conn);
+
+    // the cached metadata no longer matches the columns returned
+    $conn->exec("ALTER TABLE $tableName ADD c3 int NOT NULL DEFAULT 3");
+    prepareAndFetch($conn, $query);
+    prepareAndFetch($conn, $query);
+    printCacheInfo($conn);
+
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_STATEMENT_CACHE_INFO, array());
+        echo "Setting the attribute should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    dropTable($conn, $tableName);
+    unset($conn);
+
+    $conn = connect("StatementCacheSize=-1", array(), PDO::ERRMODE_EXCEPTION, true);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECTF--
+Entries: 0, Hits: 0, Misses: 0, Evictions: 0, Invalidations: 0
+c1,c2: 1,ünicode
+c1,c2: 1,ünicode
+c1,c2: 1,ünicode
+Entries: 1, Hits: 2, Misses: 1, Evictions: 0, Invalidations: 0
+c1: 1
+c2: ünicode
+c1,c2: 1,ünicode
+Entries: 2, Hits: 2, Misses: 4, Evictions: 2, Invalidations: 0
+c1,c2,c3: 1,ünicode,3
+c1,c2,c3: 1,ünicode,3
+Entries: 2, Hits: 4, Misses: 4, Evictions: 2, Invalidations: 1
+SQLSTATE[IMSSP]: A read-only attribute was designated on the PDO object.
+array(3) {
+  [0]=>
+  string(5) "IMSSP"
+  [1]=>
+  int(-114)
+  [2]=>
+  string(%d) "Invalid value for the connection option StatementCacheSize. The value must be a non-negative integer."
+}
+Done
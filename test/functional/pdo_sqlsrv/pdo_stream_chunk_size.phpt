@@ -0,0 +1,103 @@
+--TEST--
+Test reading large fields as streams with the PDO::SQLSRV_ATTR_STREAM_CHUNK_SIZE statement attribute
+--DESCRIPTION--
+Binary and UTF-8 LOB streams read with different chunk sizes must return the same data as the streams
+read with the default chunk size. The attribute is only supported on the statement.
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function readStreams($conn, $query, $options, $freadSize = 0)
+{
+    $stmt = $conn->prepare($query, $options);
+    $stmt->execute();
+    $stmt->bindColumn(1, $binary, PDO::PARAM_LOB, 0, PDO::SQLSRV_ENCODING_BINARY);
+    $stmt->bindColumn(2, $unicode, PDO::PARAM_LOB, 0, PDO::SQLSRV_ENCODING_UTF8);
+    $stmt->fetch(PDO::FETCH_BOUND);
+
+    $values = array();
+    foreach (array($binary, $unicode) as $stream) {
+        if ($freadSize > 0) {
+            $value = '';
+            while (!feof($stream)) {
+                $value .= fread($stream, $freadSize);
+            }
+        } else {
+            $value = stream_get_contents($stream);
+        }
+        $values[] = $value;
+    }
+    unset($stmt);
+
+    return $values;
+}
+
+try {
+    $conn = connect();
+    $tableName = getTableName('pdo_stream_chunk_size');
+    createTable($conn, $tableName, array("c_varbinary" => "varbinary(max)", "c_nvarchar" => "nvarchar(max)"));
+
+    $binary = '';
+    for ($i = 0; $i < 70000; $i++) {
+        $binary .= chr($i % 256);
+    }
+    $unicode = str_repeat('ünicode 文字 ', 15000);
+
+    $stmt = $conn->prepare("INSERT INTO $tableName VALUES (?, ?)");
+    $stmt->bindParam(1, $binary, PDO::PARAM_LOB, 0, PDO::SQLSRV_ENCODING_BINARY);
+    $stmt->bindParam(2, $unicode);
+    $stmt->execute();
+
+    $query = "SELECT c_varbinary, c_nvarchar FROM $tableName";
+    $expected = readStreams($conn, $query, array());
+    var_dump($expected === array($binary, $unicode));
+
+    foreach (array(1024, 1048576) as $chunkSize) {
+        $options = array(PDO::SQLSRV_ATTR_STREAM_CHUNK_SIZE => $chunkSize);
+        echo "Chunk size $chunkSize: ";
+        var_dump(readStreams($conn, $query, $options) === $expected);
+        echo "Chunk size $chunkSize with fread: ";
+        var_dump(readStreams($conn, $query, $options, 1000) === $expected);
+    }
+
+    $stmt = $conn->prepare($query);
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_STREAM_CHUNK_SIZE));
+    $stmt->setAttribute(PDO::SQLSRV_ATTR_STREAM_CHUNK_SIZE, 65536);
+    var_dump($stmt->getAttribute(PDO::SQLSRV_ATTR_STREAM_CHUNK_SIZE));
+
+    try {
+        $stmt->setAttribute(PDO::SQLSRV_ATTR_STREAM_CHUNK_SIZE, 100);
+        echo "Setting a chunk size that is too small should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    // statement level only
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_STREAM_CHUNK_SIZE, 65536);
+        echo "Setting the attribute on the connection should have failed\n";
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    dropTable($conn, $tableName);
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+bool(true)
+Chunk size 1024: bool(true)
+Chunk size 1024 with fread: bool(true)
+Chunk size 1048576: bool(true)
+Chunk size 1048576 with fread: bool(true)
+int(8192)
+int(65536)
+SQLSTATE[IMSSP]: The stream chunk size must be an integer between 1024 and 67108864.
+SQLSTATE[IMSSP]: The given attribute is only supported on the PDOStatement object.
+Done
@@ -0,0 +1,65 @@
+--TEST--
+Test the spans and counters read with PDO::SQLSRV_ATTR_TRACE_INFO
+--DESCRIPTION--
+With pdo_sqlsrv.trace on, each connect, prepare, execute, fetch and retrieval of a column adds a span to the
+statistics of the process, and the counters count the requests made to the server and the rows and bytes
+fetched. The values are compared before and after each step.
+--INI--
+pdo_sqlsrv.trace=1
+--SKIPIF--
+<?php require('skipif_mid-refactor.inc'); ?>
+--FILE--
+<?php
+require_once("MsCommon_mid-refactor.inc");
+
+function printDelta($conn, $before, $spans, $counters)
+{
+    $after = $conn->getAttribute(PDO::SQLSRV_ATTR_TRACE_INFO);
+    $values = array();
+    foreach ($spans as $span) {
+        $values[] = $span . ": " . ($after['Spans'][$span]['Count'] - $before['Spans'][$span]['Count']);
+    }
+    foreach ($counters as $counter) {
+        $values[] = $counter . ": " . ($after['Counters'][$counter] - $before['Counters'][$counter]);
+    }
+    echo implode(", ", $values) . "\n";
+    return $after;
+}
+
+try {
+    $conn = connect();
+    $info = $conn->getAttribute(PDO::SQLSRV_ATTR_TRACE_INFO);
+    var_dump($info['Enabled']);
+    var_dump($info['Spans']['Connect']['Count'] > 0);
+
+    $stmt = $conn->prepare("SELECT 'abc' AS c1 UNION ALL SELECT 'def'");
+    $info = printDelta($conn, $info, array('Prepare'), array('RoundTrips'));
+
+    $stmt->execute();
+    $info = printDelta($conn, $info, array('Execute'), array('RoundTrips'));
+
+    while ($stmt->fetch(PDO::FETCH_NUM)) {
+    }
+    $info = printDelta($conn, $info, array('Fetch', 'GetData'), array('Rows', 'BytesFetched'));
+
+    try {
+        $conn->setAttribute(PDO::SQLSRV_ATTR_TRACE_INFO, array());
+    } catch (PDOException $e) {
+        echo $e->getMessage() . "\n";
+    }
+
+    unset($stmt);
+    unset($conn);
+    echo "Done\n";
+} catch (PDOException $e) {
+    var_dump($e->errorInfo);
+}
+?>
+--EXPECT--
+bool(true)
+bool(true)
+Prepare: 1, RoundTrips: 1
+Execute: 1, RoundTrips: 1
+Fetch: 3, GetData: 2, Rows: 2, BytesFetched: 6
+SQLSTATE[IMSSP]: A read-only attribute was designated on the PDO object.
+Done
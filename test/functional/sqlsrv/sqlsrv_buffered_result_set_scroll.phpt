@@ -0,0 +1,108 @@
+--TEST--
+Test scrolling a client buffered result set with many rows of mixed types
+--DESCRIPTION--
+Rows of a client buffered result set with numbers, strings, binary and LOB columns, including NULLs,
+must match the rows of a forward only result set. The result set spans several chunks of rows and is
+scrolled by absolute and relative offsets in both directions.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function fetchRow($stmt, $orientation, $offset = 0)
+{
+    $row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC, $orientation, $offset);
+    if ($row === null) {
+        echo "No row\n";
+    } else {
+        echo $row[0] . " " . var_export($row[3], true) . " " . strlen((string) $row[6]) . "\n";
+    }
+}
+
+$conn = connect(array('CharacterSet' => 'UTF-8'));
+
+$tableName = 'buffered_result_set_scroll';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_int int, c_float float, c_bigint bigint, c_nvarchar nvarchar(50), c_varchar varchar(20), c_varbinary varbinary(10), c_max nvarchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$numRows = 150;
+for ($i = 1; $i <= $numRows; $i++) {
+    if ($i % 7 == 0) {
+        $params = array($i, null, null, null, null, null, null);
+    } else {
+        $params = array($i, $i / 8, $i * 10000000000, "ünicode $i", str_repeat('v', $i % 20), "bin$i", str_repeat("lob$i", $i));
+    }
+    $stmt = sqlsrv_query($conn, "INSERT INTO $tableName VALUES (?, ?, ?, ?, ?, CONVERT(varbinary(10), ?), ?)", $params);
+    if (!$stmt) {
+        fatalError("Failed to insert row $i");
+    }
+}
+
+$query = "SELECT * FROM $tableName ORDER BY c_int";
+
+$expected = array();
+$stmt = sqlsrv_query($conn, $query);
+while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC)) {
+    $expected[] = $row;
+}
+
+$stmt = sqlsrv_query($conn, $query, array(), array('Scrollable' => SQLSRV_CURSOR_CLIENT_BUFFERED));
+if (!$stmt) {
+    fatalError("Failed to run the buffered query");
+}
+echo "Number of rows: " . sqlsrv_num_rows($stmt) . "\n";
+
+$actual = array();
+while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC)) {
+    $actual[] = $row;
+}
+if ($actual !== $expected) {
+    echo "The buffered rows differ from the forward only rows\n";
+    var_dump($actual);
+}
+
+// jump back and forth across the chunks of rows, absolute offsets are 0 based
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 64);
+fetchRow($stmt, SQLSRV_SCROLL_NEXT);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 0);
+fetchRow($stmt, SQLSRV_SCROLL_LAST);
+fetchRow($stmt, SQLSRV_SCROLL_RELATIVE, -21);
+fetchRow($stmt, SQLSRV_SCROLL_PRIOR);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 62);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, $numRows - 1);
+fetchRow($stmt, SQLSRV_SCROLL_NEXT);
+
+// fields of a row are retrieved as different types
+sqlsrv_fetch($stmt, SQLSRV_SCROLL_ABSOLUTE, 128);
+var_dump(sqlsrv_get_field($stmt, 1, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_CHAR)));
+var_dump(sqlsrv_get_field($stmt, 2, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_CHAR)));
+var_dump(sqlsrv_get_field($stmt, 5, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_CHAR)));
+$stream = sqlsrv_get_field($stmt, 6, SQLSRV_PHPTYPE_STREAM('UTF-8'));
+var_dump(strlen(stream_get_contents($stream)));
+
+sqlsrv_free_stmt($stmt);
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+Number of rows: 150
+65 'ünicode 65' 325
+66 'ünicode 66' 330
+1 'ünicode 1' 4
+150 'ünicode 150' 1050
+129 'ünicode 129' 774
+128 'ünicode 128' 768
+63 NULL 0
+150 'ünicode 150' 1050
+No row
+string(6) "16.125"
+string(13) "1290000000000"
+string(12) "62696E313239"
+int(774)
+Done
@@ -0,0 +1,110 @@
+--TEST--
+Test the ClientBufferSpill option with client buffered result sets larger than ClientBufferMaxKBSize
+--DESCRIPTION--
+Without ClientBufferSpill a buffered query larger than ClientBufferMaxKBSize fails. With it, the rows
+past the limit are kept in a temporary file and the result set is scrolled and counted as usual.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function fetchRow($stmt, $orientation, $offset = 0)
+{
+    $row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC, $orientation, $offset);
+    if ($row === null) {
+        echo "No row\n";
+    } else {
+        echo $row[0] . " " . var_export($row[2], true) . " " . strlen((string) $row[3]) . "\n";
+    }
+}
+
+$conn = connect(array('CharacterSet' => 'UTF-8'));
+
+$tableName = 'buffered_spill';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_int int, c_float float, c_nvarchar nvarchar(100), c_max nvarchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$numRows = 300;
+for ($i = 1; $i <= $numRows; $i++) {
+    if ($i % 11 == 0) {
+        $params = array($i, null, null, null);
+    } else {
+        $params = array($i, $i / 4, "ünicode $i " . str_repeat('n', $i % 50), str_repeat('m', $i));
+    }
+    $stmt = sqlsrv_query($conn, "INSERT INTO $tableName VALUES (?, ?, ?, ?)", $params);
+    if (!$stmt) {
+        fatalError("Failed to insert row $i");
+    }
+}
+
+$query = "SELECT * FROM $tableName ORDER BY c_int";
+
+// the limit is exceeded without spilling
+$stmt = sqlsrv_query($conn, $query, array(), array('Scrollable' => SQLSRV_CURSOR_CLIENT_BUFFERED, 'ClientBufferMaxKBSize' => 2));
+if ($stmt === false) {
+    echo sqlsrv_errors()[0]['message'] . "\n";
+}
+
+$expected = array();
+$stmt = sqlsrv_query($conn, $query);
+while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC)) {
+    $expected[] = $row;
+}
+
+$options = array('Scrollable' => SQLSRV_CURSOR_CLIENT_BUFFERED, 'ClientBufferMaxKBSize' => 2, 'ClientBufferSpill' => true);
+$stmt = sqlsrv_query($conn, $query, array(), $options);
+if (!$stmt) {
+    fatalError("Failed to run the buffered query with spilling");
+}
+echo "Number of rows: " . sqlsrv_num_rows($stmt) . "\n";
+var_dump(sqlsrv_has_rows($stmt));
+
+$actual = array();
+while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC)) {
+    $actual[] = $row;
+}
+if ($actual !== $expected) {
+    echo "The spilled rows differ from the forward only rows\n";
+    var_dump($actual);
+}
+
+// scroll across more chunks than are kept in memory
+fetchRow($stmt, SQLSRV_SCROLL_LAST);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 0);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 199);
+fetchRow($stmt, SQLSRV_SCROLL_RELATIVE, -120);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 263);
+fetchRow($stmt, SQLSRV_SCROLL_PRIOR);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 131);
+fetchRow($stmt, SQLSRV_SCROLL_ABSOLUTE, 1);
+
+sqlsrv_fetch($stmt, SQLSRV_SCROLL_ABSOLUTE, 249);
+var_dump(sqlsrv_get_field($stmt, 1));
+$stream = sqlsrv_get_field($stmt, 3, SQLSRV_PHPTYPE_STREAM('UTF-8'));
+var_dump(strlen(stream_get_contents($stream)));
+
+sqlsrv_free_stmt($stmt);
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+Memory limit of 2 KB exceeded for buffered query
+Number of rows: 300
+bool(true)
+300 'ünicode 300 ' 300
+1 'ünicode 1 n' 1
+200 'ünicode 200 ' 200
+80 'ünicode 80 nnnnnnnnnnnnnnnnnnnnnnnnnnnnnn' 80
+264 NULL 0
+263 'ünicode 263 nnnnnnnnnnnnn' 263
+132 NULL 0
+2 'ünicode 2 nn' 2
+float(62.5)
+int(250)
+Done
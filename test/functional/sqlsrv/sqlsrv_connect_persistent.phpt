@@ -0,0 +1,77 @@
+--TEST--
+Test persistent connections opened with the Persistent connection option
+--DESCRIPTION--
+A persistent connection goes back to the pool of the process when it is closed, and the next persistent
+connection opened with the same connection string and options takes it from the pool. The session left by
+the previous user is reset, and sqlsrv_persistent_pool_info returns the counters of the pool.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function printPoolInfo()
+{
+    $info = sqlsrv_persistent_pool_info();
+    echo "Idle: " . $info['Idle'] . ", Active: " . $info['Active'] . ", Hits: " . $info['Hits'] .
+         ", Misses: " . $info['Misses'] . "\n";
+}
+
+function fetchValue($conn, $query)
+{
+    $stmt = sqlsrv_query($conn, $query);
+    if (!$stmt) {
+        fatalError("Failed to run $query");
+    }
+    $row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC);
+    return $row[0];
+}
+
+printPoolInfo();
+var_dump(sqlsrv_persistent_pool_info()['MaxIdleTime']);
+
+// leave a temporary table and an open transaction behind
+$conn = connect(array('Persistent' => true));
+$spid = fetchValue($conn, "SELECT @@SPID");
+sqlsrv_query($conn, "CREATE TABLE #persistent_conn (c1 int)");
+sqlsrv_begin_transaction($conn);
+sqlsrv_query($conn, "INSERT INTO #persistent_conn VALUES (1)");
+printPoolInfo();
+sqlsrv_close($conn);
+printPoolInfo();
+
+// the connection is taken from the pool with its session reset
+$conn = connect(array('Persistent' => true));
+var_dump(fetchValue($conn, "SELECT @@SPID") == $spid);
+var_dump(fetchValue($conn, "SELECT OBJECT_ID('tempdb..#persistent_conn')"));
+var_dump(fetchValue($conn, "SELECT @@TRANCOUNT"));
+printPoolInfo();
+
+// a connection with different options opens another connection
+$conn2 = connect(array('Persistent' => true, 'APP' => 'sqlsrv_connect_persistent'));
+var_dump(fetchValue($conn2, "SELECT @@SPID") != $spid);
+printPoolInfo();
+
+// connections without the option are not pooled
+$conn3 = connect(array('Persistent' => false));
+sqlsrv_close($conn3);
+
+sqlsrv_close($conn2);
+sqlsrv_close($conn);
+printPoolInfo();
+
+echo "Done\n";
+?>
+--EXPECT--
+Idle: 0, Active: 0, Hits: 0, Misses: 0
+int(300)
+Idle: 0, Active: 1, Hits: 0, Misses: 1
+Idle: 1, Active: 0, Hits: 0, Misses: 1
+bool(true)
+NULL
+int(0)
+Idle: 0, Active: 1, Hits: 1, Misses: 1
+bool(true)
+Idle: 0, Active: 2, Hits: 1, Misses: 2
+Idle: 2, Active: 0, Hits: 1, Misses: 2
+Done
@@ -0,0 +1,75 @@
+--TEST--
+Test the statements prepared with the DeferPrepare option
+--DESCRIPTION--
+With DeferPrepare, the first execution of a prepared statement is sent directly with its parameters and the
+statement is prepared by its second execution. A statement whose columns are described before it is executed
+is prepared then. The counters of each path are returned by sqlsrv_statement_cache_info, and the statement
+option overrides the connection option.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function printPaths($conn, $before)
+{
+    $info = sqlsrv_statement_cache_info($conn);
+    echo "DirectExecutes: " . ($info['DirectExecutes'] - $before['DirectExecutes']) .
+         ", DeferredPrepares: " . ($info['DeferredPrepares'] - $before['DeferredPrepares']) .
+         ", PreparedExecutes: " . ($info['PreparedExecutes'] - $before['PreparedExecutes']) . "\n";
+    return $info;
+}
+
+$conn = connect(array('DeferPrepare' => true));
+$info = sqlsrv_statement_cache_info($conn);
+
+// the first execution is sent directly and the second one prepares the statement
+$value = 0;
+$stmt = sqlsrv_prepare($conn, "SELECT ? + 1 AS c1", array(&$value));
+for ($value = 1; $value <= 3; $value++) {
+    if (!sqlsrv_execute($stmt)) {
+        fatalError("Failed to execute the statement");
+    }
+    sqlsrv_fetch($stmt);
+    echo sqlsrv_get_field($stmt, 0) . "\n";
+    $info = printPaths($conn, $info);
+}
+sqlsrv_free_stmt($stmt);
+
+// describing the columns before the first execution prepares the statement
+$stmt = sqlsrv_prepare($conn, "SELECT 1 AS c1, 'abc' AS c2");
+echo sqlsrv_num_fields($stmt) . "\n";
+sqlsrv_execute($stmt);
+$info = printPaths($conn, $info);
+sqlsrv_free_stmt($stmt);
+
+// the statement option overrides the connection option
+$stmt = sqlsrv_prepare($conn, "SELECT 1", array(), array('DeferPrepare' => false));
+sqlsrv_execute($stmt);
+$info = printPaths($conn, $info);
+sqlsrv_free_stmt($stmt);
+
+// the errors of a statement whose prepare is deferred are returned by its first execution
+$stmt = sqlsrv_prepare($conn, "SELECT * FROM defer_prepare_missing_table");
+var_dump($stmt !== false);
+var_dump(sqlsrv_execute($stmt));
+echo sqlsrv_errors()[0]['SQLSTATE'] . "\n";
+
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+2
+DirectExecutes: 1, DeferredPrepares: 0, PreparedExecutes: 0
+3
+DirectExecutes: 0, DeferredPrepares: 1, PreparedExecutes: 1
+4
+DirectExecutes: 0, DeferredPrepares: 0, PreparedExecutes: 1
+2
+DirectExecutes: 0, DeferredPrepares: 1, PreparedExecutes: 1
+DirectExecutes: 0, DeferredPrepares: 0, PreparedExecutes: 1
+bool(true)
+bool(false)
+42S02
+Done
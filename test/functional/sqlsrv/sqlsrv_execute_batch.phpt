@@ -0,0 +1,126 @@
+--TEST--
+Test sqlsrv_execute_batch with arrays of parameter values
+--DESCRIPTION--
+Rows of parameter values are sent in batches with different batch sizes. Each row gets a status in
+the returned array, a row that fails does not stop the other rows, and the statement can still be
+executed with sqlsrv_execute afterwards. Invalid rows, values and batch sizes are rejected.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function printErrors()
+{
+    $errors = sqlsrv_errors(SQLSRV_ERR_ERRORS);
+    echo $errors[0]['message'] . "\n";
+}
+
+$conn = connect(array('CharacterSet' => 'UTF-8'));
+
+$tableName = 'execute_batch';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_id int PRIMARY KEY, c_name nvarchar(50), c_price float, c_qty bigint, c_note varchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$stmt = sqlsrv_prepare($conn, "INSERT INTO $tableName VALUES (?, ?, ?, ?, ?)");
+if (!$stmt) {
+    fatalError("Failed to prepare the insert");
+}
+
+$rows = array();
+for ($i = 1; $i <= 25; $i++) {
+    $rows[] = array($i, "ünicode $i", $i / 4, ($i % 3 == 0) ? null : $i * 1000000000, str_repeat('x', $i * 400));
+}
+$status = sqlsrv_execute_batch($stmt, $rows, 10);
+if ($status === false) {
+    fatalError("Failed to execute the batch");
+}
+echo count($status) . " rows, " . count(array_filter($status)) . " succeeded\n";
+
+// the default batch size, with a duplicate key in the middle of the batch
+$rows = array(array(26, 'a', 1, 1, 'a'), array(1, 'duplicate', 2, 2, 'b'), array(27, 'c', 3, 3, 'c'));
+$status = sqlsrv_execute_batch($stmt, $rows);
+var_dump($status);
+
+// the statement can still be executed with single parameters
+$id = 28;
+$stmt = sqlsrv_prepare($conn, "INSERT INTO $tableName (c_id, c_name) VALUES (?, ?)", array(&$id, 'single'));
+sqlsrv_execute($stmt);
+$status = sqlsrv_execute_batch($stmt, array(array(29, 'batch'), array(30, null)));
+var_dump($status);
+$id = 31;
+if (!sqlsrv_execute($stmt)) {
+    fatalError("Failed to execute after the batch");
+}
+
+$stmt = sqlsrv_query($conn, "SELECT COUNT(*), SUM(c_qty), MAX(LEN(c_note)), COUNT(c_name) FROM $tableName");
+sqlsrv_fetch($stmt);
+echo sqlsrv_get_field($stmt, 0) . " " . sqlsrv_get_field($stmt, 1) . " " . sqlsrv_get_field($stmt, 2) . " " . sqlsrv_get_field($stmt, 3) . "\n";
+
+$stmt = sqlsrv_query($conn, "SELECT c_name, c_price FROM $tableName WHERE c_id = 10");
+var_dump(sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC));
+
+// invalid input
+$stmt = sqlsrv_prepare($conn, "INSERT INTO $tableName (c_id, c_name) VALUES (?, ?)");
+var_dump(sqlsrv_execute_batch($stmt, array()));
+if (sqlsrv_execute_batch($stmt, array(array(40, 'a'), array(41))) === false) {
+    printErrors();
+}
+if (sqlsrv_execute_batch($stmt, array(array(40, 'a'), 'row')) === false) {
+    printErrors();
+}
+if (sqlsrv_execute_batch($stmt, array(array(40, array('a')))) === false) {
+    printErrors();
+}
+if (sqlsrv_execute_batch($stmt, array(array(40, 'a')), 0) === false) {
+    printErrors();
+}
+$stmt = sqlsrv_prepare($conn, "SELECT 1");
+if (sqlsrv_execute_batch($stmt, array(array())) === false) {
+    printErrors();
+}
+$stmt = sqlsrv_query($conn, "SELECT 1");
+if (sqlsrv_execute_batch($stmt, array(array(1))) === false) {
+    printErrors();
+}
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+25 rows, 25 succeeded
+array(3) {
+  [0]=>
+  bool(true)
+  [1]=>
+  bool(false)
+  [2]=>
+  bool(true)
+}
+array(2) {
+  [0]=>
+  bool(true)
+  [1]=>
+  bool(true)
+}
+31 217000000004 10000 30
+array(2) {
+  [0]=>
+  string(11) "ünicode 10"
+  [1]=>
+  float(2.5)
+}
+array(0) {
+}
+The row at index 1 of the batch must be an array with a value for each of the 2 parameters of the statement.
+The row at index 1 of the batch must be an array with a value for each of the 2 parameters of the statement.
+Invalid value for parameter 2 in the row at index 0 of the batch. Only null, boolean, integer, float and string values can be executed in a batch.
+The batch size must be an integer between 1 and 65535.
+Only statements with parameters can be executed in a batch.
+A statement must be prepared with sqlsrv_prepare before calling sqlsrv_execute.
+Done
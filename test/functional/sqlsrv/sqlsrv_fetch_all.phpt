@@ -0,0 +1,157 @@
+--TEST--
+Test sqlsrv_fetch_all with each fetch type and cursor type
+--DESCRIPTION--
+The rows returned by sqlsrv_fetch_all must match the rows fetched one at a time with sqlsrv_fetch_array,
+including NULL values, numeric column names and the rows left after some were fetched. An empty array is
+returned when there are no more rows in a scrollable result set, a field without a name is a warning as for
+sqlsrv_fetch_object, and an invalid fetch type is rejected.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function fetchRows($conn, $query, $options, $fetchType)
+{
+    $stmt = sqlsrv_query($conn, $query, array(), $options);
+    if (!$stmt) {
+        fatalError("Failed to run query with options " . print_r($options, true));
+    }
+
+    $rows = array();
+    while ($row = sqlsrv_fetch_array($stmt, $fetchType)) {
+        $rows[] = $row;
+    }
+    sqlsrv_free_stmt($stmt);
+
+    return $rows;
+}
+
+function compareRows($conn, $query, $options, $fetchType)
+{
+    $expected = fetchRows($conn, $query, $options, $fetchType);
+
+    $stmt = sqlsrv_query($conn, $query, array(), $options);
+    $actual = sqlsrv_fetch_all($stmt, $fetchType);
+    if ($actual !== $expected) {
+        echo "Rows differ with fetch type $fetchType and options " . print_r($options, true) . "\n";
+        var_dump($actual);
+    }
+    sqlsrv_free_stmt($stmt);
+
+    echo "Fetched " . count($actual) . " rows with fetch type $fetchType\n";
+}
+
+$conn = connect(array('ReturnDatesAsStrings' => true, 'CharacterSet' => 'UTF-8'));
+
+$tableName = 'fetch_all';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_int int, c_float float, c_nvarchar nvarchar(50), c_datetime2 datetime2, c_max nvarchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+for ($i = 1; $i <= 20; $i++) {
+    $params = array($i, $i / 3, "nvarchar ünicode $i", sprintf("2020-01-%02d 10:20:30", $i), str_repeat("max$i", 50));
+    if ($i % 6 == 0) {
+        $params = array($i, null, null, null, null);
+    }
+    $stmt = sqlsrv_query($conn, "INSERT INTO $tableName VALUES (?, ?, ?, ?, ?)", $params);
+    if (!$stmt) {
+        fatalError("Failed to insert row $i");
+    }
+}
+
+$query = "SELECT c_int, c_float, c_nvarchar, c_datetime2, c_int AS [1], c_max FROM $tableName ORDER BY c_int";
+foreach (array(SQLSRV_FETCH_NUMERIC, SQLSRV_FETCH_ASSOC, SQLSRV_FETCH_BOTH) as $fetchType) {
+    compareRows($conn, $query, array(), $fetchType);
+    compareRows($conn, $query, array('Scrollable' => SQLSRV_CURSOR_CLIENT_BUFFERED), $fetchType);
+    compareRows($conn, $query, array('Scrollable' => SQLSRV_CURSOR_STATIC), $fetchType);
+}
+
+// fixed size columns are fetched in blocks
+compareRows($conn, "SELECT c_int, c_float, c_nvarchar FROM $tableName ORDER BY c_int", array('FetchBlockSize' => 8), SQLSRV_FETCH_ASSOC);
+
+// the rows left after the first ones were fetched, with the default fetch type
+$stmt = sqlsrv_query($conn, "SELECT c_int FROM $tableName ORDER BY c_int");
+sqlsrv_fetch_array($stmt);
+sqlsrv_fetch($stmt);
+$rows = sqlsrv_fetch_all($stmt);
+echo count($rows) . " rows left\n";
+print_r($rows[0]);
+
+// an empty result set
+$stmt = sqlsrv_query($conn, "SELECT c_int FROM $tableName WHERE c_int < 0");
+var_dump(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_ASSOC));
+
+// a consumed result set is empty if it is scrollable, and an error otherwise
+$stmt = sqlsrv_query($conn, "SELECT c_int FROM $tableName", array(), array('Scrollable' => SQLSRV_CURSOR_CLIENT_BUFFERED));
+echo count(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_NUMERIC)) . " rows\n";
+var_dump(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_NUMERIC));
+$stmt = sqlsrv_query($conn, "SELECT c_int FROM $tableName");
+echo count(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_NUMERIC)) . " rows\n";
+var_dump(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_NUMERIC));
+$errors = sqlsrv_errors();
+echo $errors[0]['message'] . "\n";
+
+// a field without a name is a warning, and it is skipped when warnings aren't errors
+$stmt = sqlsrv_query($conn, "SELECT c_int, c_int + 1 FROM $tableName WHERE c_int = 5");
+var_dump(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_ASSOC));
+$errors = sqlsrv_errors();
+echo $errors[0]['message'] . "\n";
+sqlsrv_configure('WarningsReturnAsErrors', false);
+$stmt = sqlsrv_query($conn, "SELECT c_int, c_int + 1 FROM $tableName WHERE c_int = 5");
+print_r(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_BOTH));
+sqlsrv_configure('WarningsReturnAsErrors', true);
+
+// invalid fetch type
+$stmt = sqlsrv_query($conn, "SELECT c_int FROM $tableName");
+var_dump(sqlsrv_fetch_all($stmt, 10));
+$errors = sqlsrv_errors();
+echo $errors[0]['message'] . "\n";
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+Fetched 20 rows with fetch type 1
+Fetched 20 rows with fetch type 1
+Fetched 20 rows with fetch type 1
+Fetched 20 rows with fetch type 2
+Fetched 20 rows with fetch type 2
+Fetched 20 rows with fetch type 2
+Fetched 20 rows with fetch type 3
+Fetched 20 rows with fetch type 3
+Fetched 20 rows with fetch type 3
+Fetched 20 rows with fetch type 2
+18 rows left
+Array
+(
+    [0] => 3
+    [c_int] => 3
+)
+array(0) {
+}
+20 rows
+array(0) {
+}
+20 rows
+bool(false)
+There are no more rows in the active result set.  Since this result set is not scrollable, no more data may be retrieved.
+bool(false)
+An empty field name was skipped by sqlsrv_fetch_object.
+Array
+(
+    [0] => Array
+        (
+            [0] => 5
+            [c_int] => 5
+            [1] => 6
+        )
+
+)
+bool(false)
+An invalid fetch type was specified. SQLSRV_FETCH_NUMERIC, SQLSRV_FETCH_ARRAY and SQLSRV_FETCH_BOTH are acceptable values.
+Done
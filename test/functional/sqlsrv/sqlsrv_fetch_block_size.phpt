@@ -0,0 +1,114 @@
+--TEST--
+Test the FetchBlockSize statement option with forward only cursors
+--DESCRIPTION--
+Rows fetched a block at a time with bound columns must match the rows fetched one at a time,
+including NULL values, for result sets with and without LOB columns. Invalid block sizes are rejected.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function fetchAll($conn, $query, $options)
+{
+    $stmt = sqlsrv_query($conn, $query, array(), $options);
+    if (!$stmt) {
+        fatalError("Failed to run query with options " . print_r($options, true));
+    }
+
+    $rows = array();
+    while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_ASSOC)) {
+        $rows[] = $row;
+    }
+    sqlsrv_free_stmt($stmt);
+
+    return $rows;
+}
+
+function compareRows($conn, $query, $blockSize)
+{
+    $expected = fetchAll($conn, $query, array());
+    $actual = fetchAll($conn, $query, array('FetchBlockSize' => $blockSize));
+
+    if (count($expected) !== count($actual)) {
+        echo "Expected " . count($expected) . " rows but got " . count($actual) . " with block size $blockSize\n";
+        return;
+    }
+    for ($i = 0; $i < count($expected); $i++) {
+        if ($expected[$i] !== $actual[$i]) {
+            echo "Row $i differs with block size $blockSize\n";
+            var_dump($expected[$i]);
+            var_dump($actual[$i]);
+        }
+    }
+    echo "Fetched " . count($actual) . " rows with block size $blockSize\n";
+}
+
+$conn = connect(array('ReturnDatesAsStrings' => true, 'CharacterSet' => 'UTF-8'));
+
+$tableName = 'fetch_block_size';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_int int, c_bigint bigint, c_float float, c_decimal decimal(18, 4), c_varchar varchar(50), c_nvarchar nvarchar(50), c_varbinary varbinary(20), c_datetime2 datetime2, c_max nvarchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$numRows = 25;
+for ($i = 1; $i <= $numRows; $i++) {
+    $params = array($i, $i * 100000000, $i / 3, $i * 1.25, "varchar $i", "nvarchar ünicode $i", bin2hex("bin$i"), sprintf("2020-01-%02d 10:20:30", $i), str_repeat("max$i", 100));
+    if ($i % 4 == 0) {
+        // every fourth row is all NULLs
+        $params = array_fill(0, count($params), null);
+    }
+    $stmt = sqlsrv_query($conn, "INSERT INTO $tableName VALUES (?, ?, ?, ?, ?, ?, CONVERT(varbinary(20), ?, 2), ?, ?)", $params);
+    if (!$stmt) {
+        fatalError("Failed to insert row $i");
+    }
+}
+
+// fixed size columns only, so the rows are fetched in blocks
+$query = "SELECT c_int, c_bigint, c_float, c_decimal, c_varchar, c_nvarchar, c_varbinary, c_datetime2 FROM $tableName ORDER BY c_int";
+compareRows($conn, $query, 1);
+compareRows($conn, $query, 7);
+compareRows($conn, $query, 100);
+
+// a LOB column falls back to fetching a row at a time
+compareRows($conn, "SELECT * FROM $tableName ORDER BY c_int", 10);
+
+// fields and streams are retrieved from the bound rows
+$stmt = sqlsrv_query($conn, $query, array(), array('FetchBlockSize' => 4));
+sqlsrv_fetch($stmt);
+sqlsrv_fetch($stmt);
+var_dump(sqlsrv_get_field($stmt, 0, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_CHAR)));
+$stream = sqlsrv_get_field($stmt, 5, SQLSRV_PHPTYPE_STREAM('UTF-8'));
+var_dump(stream_get_contents($stream));
+sqlsrv_free_stmt($stmt);
+
+// invalid block sizes
+foreach (array(0, -1, 65536, 'ten') as $blockSize) {
+    $stmt = sqlsrv_query($conn, $query, array(), array('FetchBlockSize' => $blockSize));
+    if ($stmt !== false) {
+        echo "FetchBlockSize $blockSize should have failed\n";
+    } else {
+        $errors = sqlsrv_errors();
+        echo $errors[0]['message'] . "\n";
+    }
+}
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+Fetched 25 rows with block size 1
+Fetched 25 rows with block size 7
+Fetched 25 rows with block size 100
+Fetched 25 rows with block size 10
+string(1) "2"
+string(19) "nvarchar ünicode 2"
+The fetch block size must be an integer between 1 and 65535.
+The fetch block size must be an integer between 1 and 65535.
+The fetch block size must be an integer between 1 and 65535.
+The fetch block size must be an integer between 1 and 65535.
+Done
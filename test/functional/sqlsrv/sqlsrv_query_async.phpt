@@ -0,0 +1,123 @@
+--TEST--
+Test executing queries with sqlsrv_query_async and polling them with sqlsrv_poll
+--DESCRIPTION--
+Queries executed asynchronously on a connection with MARS and on separate connections run at the same
+time, and their results are read once sqlsrv_poll returns true. The results can't be read while the
+statement is executing, stream parameters are rejected, and errors are returned by sqlsrv_poll.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function pollAll($stmts)
+{
+    $pending = $stmts;
+    $polls = 0;
+    while (!empty($pending)) {
+        foreach ($pending as $key => $stmt) {
+            $done = sqlsrv_poll($stmt);
+            if ($done === false) {
+                fatalError("Polling statement $key failed");
+            }
+            if ($done === true) {
+                unset($pending[$key]);
+            }
+        }
+        $polls++;
+        usleep(10000);
+    }
+    return $polls;
+}
+
+function printResults($stmts)
+{
+    foreach ($stmts as $stmt) {
+        $row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC);
+        echo implode(" ", $row) . "\n";
+    }
+}
+
+$query = "WAITFOR DELAY '00:00:02'; SELECT ?, N'ünicode'";
+
+// several statements on a connection with MARS run at the same time
+$conn = connect(array('MultipleActiveResultSets' => true, 'CharacterSet' => 'UTF-8'));
+$start = microtime(true);
+$stmts = array();
+for ($i = 1; $i <= 3; $i++) {
+    $stmts[] = sqlsrv_query_async($conn, $query, array($i)) ?: fatalError("Failed to start query $i");
+}
+$polls = pollAll($stmts);
+$elapsed = microtime(true) - $start;
+if ($elapsed > 5 || $polls < 2) {
+    echo "The queries did not run at the same time: $elapsed seconds, $polls polls\n";
+}
+printResults($stmts);
+
+// statements on separate connections
+$conns = array();
+$stmts = array();
+for ($i = 4; $i <= 5; $i++) {
+    $conns[$i] = connect(array('CharacterSet' => 'UTF-8'));
+    $stmts[] = sqlsrv_query_async($conns[$i], $query, array($i)) ?: fatalError("Failed to start query $i");
+}
+pollAll($stmts);
+printResults($stmts);
+
+// the results are not available until the execution completes
+$stmt = sqlsrv_query_async($conn, $query, array(6));
+var_dump(sqlsrv_poll($stmt));
+var_dump(sqlsrv_fetch($stmt));
+echo sqlsrv_errors()[0]['message'] . "\n";
+pollAll(array($stmt));
+var_dump(sqlsrv_poll($stmt));
+printResults(array($stmt));
+
+// a statement executed synchronously is always completed
+$stmt = sqlsrv_query($conn, "SELECT 1");
+var_dump(sqlsrv_poll($stmt));
+
+// a canceled statement may be freed
+$stmt = sqlsrv_query_async($conn, "WAITFOR DELAY '00:00:10'; SELECT 1");
+var_dump(sqlsrv_cancel($stmt));
+sqlsrv_free_stmt($stmt);
+
+// errors are returned when the execution completes
+$stmt = sqlsrv_query_async($conn, "WAITFOR DELAY '00:00:01'; SELECT * FROM no_such_table_async");
+while (($done = sqlsrv_poll($stmt)) === null) {
+    usleep(10000);
+}
+var_dump($done);
+echo sqlsrv_errors()[0]['SQLSTATE'] . "\n";
+
+// streams can't be sent as parameters
+$stream = fopen('data://text/plain,stream data', 'r');
+$stmt = sqlsrv_query_async($conn, "SELECT ?", array(array($stream, SQLSRV_PARAM_IN, SQLSRV_PHPTYPE_STREAM(SQLSRV_ENC_CHAR))));
+var_dump($stmt);
+echo sqlsrv_errors()[0]['message'] . "\n";
+
+foreach ($conns as $c) {
+    sqlsrv_close($c);
+}
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+1 ünicode
+2 ünicode
+3 ünicode
+4 ünicode
+5 ünicode
+NULL
+bool(false)
+The statement is still executing. Poll the statement until the execution completes.
+bool(true)
+6 ünicode
+bool(true)
+bool(true)
+bool(false)
+42S02
+bool(false)
+Stream parameters cannot be sent by a statement executed asynchronously.
+Done
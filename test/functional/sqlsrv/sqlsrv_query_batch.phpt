@@ -0,0 +1,100 @@
+--TEST--
+Test sqlsrv_query_batch with queries and parameters sent in a single batch
+--DESCRIPTION--
+The queries of a batch and their parameters are joined into one statement, whose result sets are read in turn
+with sqlsrv_next_result, or fetched at once when a fetch type is given. A query without columns returns the
+number of rows it modified. Empty batches, invalid queries and invalid fetch types are rejected, and an error in
+any query of the batch fails the fetch.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function printBatchErrors($result)
+{
+    if ($result !== false) {
+        echo "The batch should have failed\n";
+    } else {
+        $errors = sqlsrv_errors();
+        echo $errors[0]['message'] . "\n";
+    }
+}
+
+$conn = connect();
+
+$tableName = 'query_batch';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_int int, c_varchar varchar(10))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+if (!sqlsrv_query($conn, "INSERT INTO $tableName VALUES (1, 'one'), (2, 'two'), (3, 'three'), (4, 'four'), (5, 'five')")) {
+    fatalError("Failed to insert the rows");
+}
+
+// a trailing semicolon is optional, and a common table expression may follow another query
+$queries = array(array("SELECT c_int FROM $tableName WHERE c_int < ? ORDER BY c_int", array(3)),
+                 "SELECT COUNT(*) AS total FROM $tableName",
+                 array("UPDATE $tableName SET c_varchar = ? WHERE c_int = ?", array('deux?', 2)),
+                 "WITH cte AS (SELECT c_varchar FROM $tableName WHERE c_int = 2) SELECT c_varchar FROM cte; ");
+
+// lazy: the statement is positioned on the first result set
+$stmt = sqlsrv_query_batch($conn, $queries);
+if (!$stmt) {
+    fatalError("Failed to run the batch");
+}
+do {
+    if (sqlsrv_num_fields($stmt) > 0) {
+        echo json_encode(sqlsrv_fetch_all($stmt, SQLSRV_FETCH_ASSOC)) . "\n";
+    } else {
+        echo "rows affected: " . sqlsrv_rows_affected($stmt) . "\n";
+    }
+} while (sqlsrv_next_result($stmt));
+sqlsrv_free_stmt($stmt);
+
+// fetched: every result set at once
+echo json_encode(sqlsrv_query_batch($conn, $queries, array(), SQLSRV_FETCH_ASSOC)) . "\n";
+echo json_encode(sqlsrv_query_batch($conn, $queries, array('QueryTimeout' => 30), SQLSRV_FETCH_NUMERIC)) . "\n";
+
+// a variable passed by reference is read when the batch is executed
+$limit = 2;
+$results = sqlsrv_query_batch($conn, array(array("SELECT c_int FROM $tableName WHERE c_int <= ? ORDER BY c_int", array(&$limit)), "SELECT 'last' AS word"), null, SQLSRV_FETCH_NUMERIC);
+echo json_encode($results) . "\n";
+
+// invalid batches
+printBatchErrors(sqlsrv_query_batch($conn, array()));
+printBatchErrors(sqlsrv_query_batch($conn, array("SELECT 1", 42)));
+printBatchErrors(sqlsrv_query_batch($conn, array(" ; ")));
+printBatchErrors(sqlsrv_query_batch($conn, array(array("SELECT ?", 1))));
+printBatchErrors(sqlsrv_query_batch($conn, array(array("SELECT ?", array(1), 2))));
+printBatchErrors(sqlsrv_query_batch($conn, array("SELECT 1"), array(), 10));
+
+// an error in the second query fails the batch
+$result = sqlsrv_query_batch($conn, array("SELECT 1 AS one", "SELECT 1 / 0 AS boom"), array(), SQLSRV_FETCH_ASSOC);
+var_dump($result);
+$errors = sqlsrv_errors();
+var_dump(strpos($errors[0]['message'], 'Divide by zero') !== false);
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+[{"c_int":1},{"c_int":2}]
+[{"total":5}]
+rows affected: 1
+[{"c_varchar":"deux?"}]
+[[{"c_int":1},{"c_int":2}],[{"total":5}],1,[{"c_varchar":"deux?"}]]
+[[[1],[2]],[[5]],1,[["deux?"]]]
+[[[1],[2]],[["last"]]]
+A batch must contain at least one query.
+The query at position 1 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+The query at position 0 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+The query at position 0 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+The query at position 0 of the batch must be a non-empty string, or an array with a non-empty string and an array of parameters.
+An invalid fetch type was specified. SQLSRV_FETCH_NUMERIC, SQLSRV_FETCH_ARRAY and SQLSRV_FETCH_BOTH are acceptable values.
+bool(false)
+bool(true)
+Done
@@ -0,0 +1,189 @@
+--TEST--
+Test the ReadAhead statement option with blocks fetched on a background thread
+--DESCRIPTION--
+Rows of forward only cursors fetched a block at a time by a thread reading ahead must match the rows
+fetched one at a time, including when the ring of blocks is limited by ClientBufferMaxKBSize. The thread is
+stopped by sqlsrv_cancel, by executing the statement again and by moving to the next result set in the middle
+of a result set, and rows aren't lost when it is paused by sqlsrv_rows_affected, sqlsrv_num_fields or the first read of a field.
+Invalid values are rejected.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function fetchAll($conn, $query, $options)
+{
+    $stmt = sqlsrv_query($conn, $query, array(), $options);
+    if (!$stmt) {
+        fatalError("Failed to run query with options " . print_r($options, true));
+    }
+
+    $rows = array();
+    while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_ASSOC)) {
+        $rows[] = $row;
+    }
+    sqlsrv_free_stmt($stmt);
+
+    return $rows;
+}
+
+function compareRows($conn, $query, $options)
+{
+    $expected = fetchAll($conn, $query, array());
+    $actual = fetchAll($conn, $query, $options);
+
+    $label = "FetchBlockSize {$options['FetchBlockSize']}, ReadAhead {$options['ReadAhead']}";
+    if (isset($options['ClientBufferMaxKBSize'])) {
+        $label .= ", ClientBufferMaxKBSize {$options['ClientBufferMaxKBSize']}";
+    }
+    if ($expected !== $actual) {
+        echo "Rows differ with $label\n";
+        return;
+    }
+    echo "Fetched " . count($actual) . " rows with $label\n";
+}
+
+$conn = connect(array('ReturnDatesAsStrings' => true, 'CharacterSet' => 'UTF-8'));
+
+$tableName = 'read_ahead';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_int int, c_float float, c_decimal decimal(18, 4), c_nvarchar nvarchar(50), c_datetime2 datetime2)");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$numRows = 1000;
+$sql = "INSERT INTO $tableName SELECT TOP ($numRows) n, n / 3.0, n * 1.25, CASE WHEN n % 7 = 0 THEN NULL ELSE N'ünicode ' + CAST(n AS nvarchar(10)) END, " .
+       "DATEADD(second, n, '2020-01-01') FROM (SELECT ROW_NUMBER() OVER (ORDER BY a.object_id) AS n FROM sys.all_columns a CROSS JOIN sys.all_columns b) AS numbers";
+if (!sqlsrv_query($conn, $sql)) {
+    fatalError("Failed to insert the rows");
+}
+
+$query = "SELECT * FROM $tableName ORDER BY c_int";
+compareRows($conn, $query, array('FetchBlockSize' => 16, 'ReadAhead' => 0));
+compareRows($conn, $query, array('FetchBlockSize' => 16, 'ReadAhead' => 1));
+compareRows($conn, $query, array('FetchBlockSize' => 7, 'ReadAhead' => 4));
+compareRows($conn, $query, array('FetchBlockSize' => 1000, 'ReadAhead' => 64));
+
+// the ring is kept within the buffer limit by reading fewer blocks ahead, or none
+compareRows($conn, $query, array('FetchBlockSize' => 100, 'ReadAhead' => 16, 'ClientBufferMaxKBSize' => 40));
+compareRows($conn, $query, array('FetchBlockSize' => 100, 'ReadAhead' => 16, 'ClientBufferMaxKBSize' => 1));
+
+// read ahead is ignored without block fetching
+compareRows($conn, $query, array('FetchBlockSize' => 1, 'ReadAhead' => 8));
+
+$options = array('FetchBlockSize' => 10, 'ReadAhead' => 4);
+
+// the number of rows of the statement may be asked for in the middle of a result set
+$stmt = sqlsrv_query($conn, $query, array(), $options);
+sqlsrv_fetch($stmt);
+var_dump(sqlsrv_rows_affected($stmt));
+$count = 1;
+while (sqlsrv_fetch($stmt)) {
+    $count++;
+}
+echo "Fetched $count rows after sqlsrv_rows_affected\n";
+sqlsrv_free_stmt($stmt);
+
+// pausing the thread in the middle of a result set keeps the blocks it read ahead
+$stmt = sqlsrv_query($conn, $query, array(), $options);
+$count = 0;
+$sum = 0;
+while (sqlsrv_fetch($stmt)) {
+    $count++;
+    $sum += sqlsrv_get_field($stmt, 0);
+    if ($count % 37 == 0) {
+        sqlsrv_rows_affected($stmt);
+    }
+}
+echo "Fetched $count rows with a sum of $sum after pauses\n";
+sqlsrv_free_stmt($stmt);
+
+// the number of fields may be asked for in the middle of a result set
+$stmt = sqlsrv_query($conn, $query, array(), $options);
+$count = 0;
+$sum = 0;
+$fields = 0;
+while (sqlsrv_fetch($stmt)) {
+    $count++;
+    $sum += sqlsrv_get_field($stmt, 0);
+    $fields += sqlsrv_num_fields($stmt);
+}
+echo "Fetched $count rows with a sum of $sum and $fields fields after sqlsrv_num_fields\n";
+sqlsrv_free_stmt($stmt);
+
+// a canceled statement stops returning rows
+$stmt = sqlsrv_query($conn, $query, array(), $options);
+for ($i = 0; $i < 15; $i++) {
+    sqlsrv_fetch($stmt);
+}
+var_dump(sqlsrv_get_field($stmt, 0));
+var_dump(sqlsrv_cancel($stmt));
+var_dump(sqlsrv_fetch($stmt) ? true : false);
+sqlsrv_free_stmt($stmt);
+
+// executing again in the middle of a result set starts from its first row
+$stmt = sqlsrv_prepare($conn, "SELECT * FROM $tableName WHERE c_int > ? ORDER BY c_int", array(100), $options);
+sqlsrv_execute($stmt);
+for ($i = 0; $i < 25; $i++) {
+    sqlsrv_fetch($stmt);
+}
+sqlsrv_execute($stmt);
+sqlsrv_fetch($stmt);
+var_dump(sqlsrv_get_field($stmt, 0));
+sqlsrv_free_stmt($stmt);
+
+// the next result set is returned in the middle of the first one
+$stmt = sqlsrv_query($conn, "$query; SELECT c_int FROM $tableName WHERE c_int = 500", array(), $options);
+for ($i = 0; $i < 25; $i++) {
+    sqlsrv_fetch($stmt);
+}
+var_dump(sqlsrv_next_result($stmt));
+$row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC);
+var_dump($row[0]);
+sqlsrv_free_stmt($stmt);
+
+// freeing a statement in the middle of a result set
+$stmt = sqlsrv_query($conn, $query, array(), $options);
+sqlsrv_fetch($stmt);
+sqlsrv_free_stmt($stmt);
+
+// invalid values
+foreach (array(-1, 65, 'two') as $readAhead) {
+    $stmt = sqlsrv_query($conn, $query, array(), array('FetchBlockSize' => 10, 'ReadAhead' => $readAhead));
+    if ($stmt !== false) {
+        echo "ReadAhead $readAhead should have failed\n";
+    } else {
+        $errors = sqlsrv_errors();
+        echo $errors[0]['message'] . "\n";
+    }
+}
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+Fetched 1000 rows with FetchBlockSize 16, ReadAhead 0
+Fetched 1000 rows with FetchBlockSize 16, ReadAhead 1
+Fetched 1000 rows with FetchBlockSize 7, ReadAhead 4
+Fetched 1000 rows with FetchBlockSize 1000, ReadAhead 64
+Fetched 1000 rows with FetchBlockSize 100, ReadAhead 16, ClientBufferMaxKBSize 40
+Fetched 1000 rows with FetchBlockSize 100, ReadAhead 16, ClientBufferMaxKBSize 1
+Fetched 1000 rows with FetchBlockSize 1, ReadAhead 8
+int(-1)
+Fetched 1000 rows after sqlsrv_rows_affected
+Fetched 1000 rows with a sum of 500500 after pauses
+Fetched 1000 rows with a sum of 500500 and 5000 fields after sqlsrv_num_fields
+int(15)
+bool(true)
+bool(false)
+int(101)
+bool(true)
+int(500)
+The number of blocks read ahead must be an integer between 0 and 64.
+The number of blocks read ahead must be an integer between 0 and 64.
+The number of blocks read ahead must be an integer between 0 and 64.
+Done
@@ -0,0 +1,85 @@
+--TEST--
+Test the lines written to the slow query log
+--DESCRIPTION--
+With sqlsrv.SlowQueryThreshold=0 every execution is slow, and a line is written to the sqlsrv.SlowQueryLog file
+once the rows of the query are fetched or the statement is freed. The query is normalized, so the executions with
+different literals share a fingerprint, and the PHP types of the parameters are listed.
+--INI--
+sqlsrv.SlowQueryLog={PWD}/sqlsrv_slow_query.log
+sqlsrv.SlowQueryThreshold=0
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function findLine($file, $query, $count)
+{
+    // the log is written by a thread of the process, so the lines can take a moment to appear
+    for ($i = 0; $i < 100; $i++) {
+        $found = array();
+        if (file_exists($file)) {
+            foreach (file($file) as $line) {
+                $entry = json_decode($line, true);
+                if ($entry['query'] === $query) {
+                    $found[] = $entry;
+                }
+            }
+        }
+        if (count($found) >= $count) {
+            return $found;
+        }
+        usleep(50000);
+    }
+    return $found;
+}
+
+$file = __DIR__ . '/sqlsrv_slow_query.log';
+
+$conn = connect();
+
+// literals, lists of literals and comments are normalized
+foreach (array(5, 6) as $value) {
+    $stmt = sqlsrv_query($conn, "SELECT $value AS c1, 'abc'   AS c2 WHERE 1.5e3 > 2 AND N'x' IN ('x', N'y', 'z') -- comment $value
+                                 UNION ALL SELECT 0x1F, 'def'");
+    while (sqlsrv_fetch($stmt)) {
+    }
+    sqlsrv_free_stmt($stmt);
+}
+$entries = findLine($file, "SELECT ? AS c1, ? AS c2 WHERE ? > ? AND ? IN (?) UNION ALL SELECT ?, ?", 2);
+echo count($entries) . "\n";
+echo implode(",", array_keys($entries[0])) . "\n";
+var_dump($entries[0]['fingerprint'] === $entries[1]['fingerprint'] && strlen($entries[0]['fingerprint']) == 16);
+var_dump($entries[0]['rows']);
+var_dump($entries[0]['execute_time'] >= 0 && $entries[0]['fetch_time'] >= 0 && $entries[0]['bytes'] >= 0);
+
+// the line of a prepared statement is written when it is executed again or freed
+$value = 1;
+$stmt = sqlsrv_prepare($conn, "SELECT ? + 1 AS [1 + 1]", array(&$value));
+sqlsrv_execute($stmt);
+sqlsrv_free_stmt($stmt);
+$entries = findLine($file, "SELECT ? + ? AS [1 + 1]", 1);
+var_dump($entries[0]['param_types']);
+var_dump($entries[0]['rows']);
+
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--CLEAN--
+<?php
+@unlink(__DIR__ . '/sqlsrv_slow_query.log');
+@unlink(__DIR__ . '/sqlsrv_slow_query.log.1');
+?>
+--EXPECT--
+2
+timestamp,fingerprint,query,execute_time,fetch_time,rows,bytes,param_types
+bool(true)
+int(2)
+bool(true)
+array(1) {
+  [0]=>
+  string(3) "int"
+}
+int(0)
+Done
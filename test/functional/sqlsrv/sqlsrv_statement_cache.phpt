@@ -0,0 +1,96 @@
+--TEST--
+Test the statement cache of a connection with the StatementCacheSize option
+--DESCRIPTION--
+Prepared statements freed on a connection with StatementCacheSize are kept with their metadata and reused
+when the same query is prepared again. The least recently used statements are evicted past the limit, and
+the cached metadata is described again when the columns of the query change.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function printCacheInfo($conn)
+{
+    $info = sqlsrv_statement_cache_info($conn);
+    echo "Entries: " . $info['Entries'] . ", Hits: " . $info['Hits'] . ", Misses: " . $info['Misses'] .
+         ", Evictions: " . $info['Evictions'] . ", Invalidations: " . $info['Invalidations'] . "\n";
+}
+
+function prepareAndFetch($conn, $query)
+{
+    $stmt = sqlsrv_prepare($conn, $query);
+    if (!$stmt) {
+        fatalError("Failed to prepare $query");
+    }
+    if (!sqlsrv_execute($stmt)) {
+        fatalError("Failed to execute $query");
+    }
+    $names = array();
+    foreach (sqlsrv_field_metadata($stmt) as $field) {
+        $names[] = $field['Name'];
+    }
+    $row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_ASSOC);
+    echo implode(",", $names) . ": " . implode(",", $row) . "\n";
+    sqlsrv_free_stmt($stmt);
+}
+
+require('MsSetup.inc');
+$options = array_merge($connectionOptions, array('StatementCacheSize' => -1));
+$conn = sqlsrv_connect($server, $options);
+if ($conn === false) {
+    echo sqlsrv_errors()[0]['message'] . "\n";
+}
+
+$conn = connect(array('CharacterSet' => 'UTF-8', 'StatementCacheSize' => 2));
+printCacheInfo($conn);
+
+$tableName = 'statement_cache';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c1 int, c2 nvarchar(20))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+sqlsrv_query($conn, "INSERT INTO $tableName VALUES (1, N'ünicode')");
+
+$query = "SELECT * FROM $tableName";
+for ($i = 0; $i < 3; $i++) {
+    prepareAndFetch($conn, $query);
+}
+printCacheInfo($conn);
+
+// the first query is the least recently used one
+prepareAndFetch($conn, "SELECT c1 FROM $tableName");
+prepareAndFetch($conn, "SELECT c2 FROM $tableName");
+printCacheInfo($conn);
+prepareAndFetch($conn, $query);
+printCacheInfo($conn);
+
+// the cached metadata no longer matches the columns returned
+sqlsrv_query($conn, "ALTER TABLE $tableName ADD c3 int NOT NULL DEFAULT 3");
+prepareAndFetch($conn, "SELECT c2 FROM $tableName");
+prepareAndFetch($conn, $query);
+prepareAndFetch($conn, $query);
+printCacheInfo($conn);
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+Invalid value for the connection option StatementCacheSize. The value must be a non-negative integer.
+Entries: 0, Hits: 0, Misses: 0, Evictions: 0, Invalidations: 0
+c1,c2: 1,ünicode
+c1,c2: 1,ünicode
+c1,c2: 1,ünicode
+Entries: 1, Hits: 2, Misses: 1, Evictions: 0, Invalidations: 0
+c1: 1
+c2: ünicode
+Entries: 2, Hits: 2, Misses: 3, Evictions: 1, Invalidations: 0
+c1,c2: 1,ünicode
+Entries: 2, Hits: 2, Misses: 4, Evictions: 2, Invalidations: 0
+c2: ünicode
+c1,c2: 1,ünicode
+c1,c2,c3: 1,ünicode,3
+Entries: 2, Hits: 5, Misses: 4, Evictions: 2, Invalidations: 1
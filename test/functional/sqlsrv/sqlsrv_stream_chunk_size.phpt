@@ -0,0 +1,104 @@
+--TEST--
+Test reading large fields as streams with the StreamChunkSize option
+--DESCRIPTION--
+Binary, char and UTF-8 streams read with different chunk sizes must return the same data as the streams
+read with the default chunk size, whether they are read whole or a few bytes at a time.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function readStreams($conn, $query, $options, $freadSize = 0)
+{
+    $stmt = sqlsrv_query($conn, $query, array(), $options);
+    if (!$stmt) {
+        fatalError("Failed to run the query with options " . print_r($options, true));
+    }
+    sqlsrv_fetch($stmt);
+
+    $types = array(SQLSRV_PHPTYPE_STREAM(SQLSRV_ENC_BINARY),
+                   SQLSRV_PHPTYPE_STREAM(SQLSRV_ENC_CHAR),
+                   SQLSRV_PHPTYPE_STREAM('UTF-8'));
+    $values = array();
+    foreach ($types as $i => $type) {
+        $stream = sqlsrv_get_field($stmt, $i, $type);
+        if ($freadSize > 0) {
+            $value = '';
+            while (!feof($stream)) {
+                $value .= fread($stream, $freadSize);
+            }
+        } else {
+            $value = stream_get_contents($stream);
+        }
+        $values[] = $value;
+    }
+    sqlsrv_free_stmt($stmt);
+
+    return $values;
+}
+
+$conn = connect(array('CharacterSet' => 'UTF-8'));
+
+$tableName = 'stream_chunk_size';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_varbinary varbinary(max), c_varchar varchar(max), c_nvarchar nvarchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$binary = '';
+for ($i = 0; $i < 70000; $i++) {
+    $binary .= chr($i % 256);
+}
+$char = str_repeat('0123456789abcdef', 20000);
+$unicode = str_repeat('ünicode 文字 ', 15000);
+
+$params = array(array($binary, null, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_BINARY), SQLSRV_SQLTYPE_VARBINARY('max')), $char, $unicode);
+$stmt = sqlsrv_query($conn, "INSERT INTO $tableName VALUES (?, ?, ?)", $params);
+if (!$stmt) {
+    fatalError("Failed to insert the row");
+}
+
+$query = "SELECT c_varbinary, c_varchar, c_nvarchar FROM $tableName";
+$expected = readStreams($conn, $query, array());
+var_dump($expected === array($binary, $char, $unicode));
+
+foreach (array(1024, 65536, 1048576) as $chunkSize) {
+    $options = array('StreamChunkSize' => $chunkSize);
+    echo "StreamChunkSize $chunkSize: ";
+    var_dump(readStreams($conn, $query, $options) === $expected);
+    echo "StreamChunkSize $chunkSize with fread: ";
+    var_dump(readStreams($conn, $query, $options, 1000) === $expected);
+}
+
+// a chunk size applies to buffered result sets too
+$options = array('StreamChunkSize' => 65536, 'Scrollable' => SQLSRV_CURSOR_CLIENT_BUFFERED);
+echo "Buffered: ";
+var_dump(readStreams($conn, $query, $options) === $expected);
+
+foreach (array(100, 'large', 64 * 1024 * 1024 + 1) as $chunkSize) {
+    $stmt = sqlsrv_query($conn, $query, array(), array('StreamChunkSize' => $chunkSize));
+    if ($stmt === false) {
+        echo sqlsrv_errors()[0]['message'] . "\n";
+    }
+}
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+bool(true)
+StreamChunkSize 1024: bool(true)
+StreamChunkSize 1024 with fread: bool(true)
+StreamChunkSize 65536: bool(true)
+StreamChunkSize 65536 with fread: bool(true)
+StreamChunkSize 1048576: bool(true)
+StreamChunkSize 1048576 with fread: bool(true)
+Buffered: bool(true)
+The stream chunk size must be an integer between 1024 and 67108864.
+The stream chunk size must be an integer between 1024 and 67108864.
+The stream chunk size must be an integer between 1024 and 67108864.
+Done
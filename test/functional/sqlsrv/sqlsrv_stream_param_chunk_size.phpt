@@ -0,0 +1,128 @@
+--TEST--
+Test sending stream parameters with the StreamChunkSize option
+--DESCRIPTION--
+Binary, char and UTF-8 stream parameters sent with different chunk sizes must store the same data. Binary and
+char streams of plain files are sent from memory mappings of the files, while memory streams, files opened at
+another position than their start and UTF-8 streams are read a chunk at a time. The streams are sent at execution
+and with sqlsrv_send_stream_data.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function openStream($source, $data, $offset = 0)
+{
+    if ($source == 'memory') {
+        $stream = fopen('php://memory', 'w+b');
+        fwrite($stream, $data);
+        rewind($stream);
+    } else {
+        $fileName = tempnam(sys_get_temp_dir(), 'sqlsrv_stream');
+        file_put_contents($fileName, str_repeat('x', $offset) . $data);
+        $stream = fopen($fileName, 'rb');
+        fseek($stream, $offset);
+    }
+    return $stream;
+}
+
+function sendStreams($conn, $tableName, $source, $options, $offset = 0)
+{
+    global $binary, $char, $unicode;
+
+    $streams = array(openStream($source, $binary, $offset), openStream($source, $char, $offset), openStream($source, $unicode, $offset));
+    $params = array(array(&$streams[0], SQLSRV_PARAM_IN, SQLSRV_PHPTYPE_STREAM(SQLSRV_ENC_BINARY), SQLSRV_SQLTYPE_VARBINARY('max')),
+                    array(&$streams[1], SQLSRV_PARAM_IN, SQLSRV_PHPTYPE_STREAM(SQLSRV_ENC_CHAR), SQLSRV_SQLTYPE_VARCHAR('max')),
+                    array(&$streams[2], SQLSRV_PARAM_IN, SQLSRV_PHPTYPE_STREAM('UTF-8'), SQLSRV_SQLTYPE_NVARCHAR('max')));
+
+    sqlsrv_query($conn, "TRUNCATE TABLE $tableName");
+    $stmt = sqlsrv_query($conn, "INSERT INTO $tableName VALUES (?, ?, ?)", $params, $options);
+    if (!$stmt) {
+        fatalError("Failed to insert the streams with options " . print_r($options, true));
+    }
+    if (isset($options['SendStreamParamsAtExec']) && !$options['SendStreamParamsAtExec']) {
+        while (sqlsrv_send_stream_data($stmt)) {
+        }
+    }
+    sqlsrv_free_stmt($stmt);
+
+    foreach ($streams as $stream) {
+        $meta = stream_get_meta_data($stream);
+        fclose($stream);
+        if ($meta['wrapper_type'] == 'plainfile') {
+            unlink($meta['uri']);
+        }
+    }
+
+    $stmt = sqlsrv_query($conn, "SELECT c_varbinary, c_varchar, c_nvarchar FROM $tableName");
+    sqlsrv_fetch($stmt);
+    $values = array(sqlsrv_get_field($stmt, 0, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_BINARY)),
+                    sqlsrv_get_field($stmt, 1, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_CHAR)),
+                    sqlsrv_get_field($stmt, 2, SQLSRV_PHPTYPE_STRING('UTF-8')));
+    sqlsrv_free_stmt($stmt);
+
+    return $values === array($binary, $char, $unicode);
+}
+
+$conn = connect(array('CharacterSet' => 'UTF-8'));
+
+$tableName = 'stream_param_chunk_size';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_varbinary varbinary(max), c_varchar varchar(max), c_nvarchar nvarchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$binary = '';
+for ($i = 0; $i < 300000; $i++) {
+    $binary .= chr($i % 251);
+}
+$char = str_repeat('0123456789abcdef', 20000);
+$unicode = str_repeat('ünicode 文字 ', 15000);
+
+foreach (array('file', 'memory') as $source) {
+    echo "$source, default chunk size: ";
+    var_dump(sendStreams($conn, $tableName, $source, array()));
+    foreach (array(1024, 65536, 1048576) as $chunkSize) {
+        echo "$source, StreamChunkSize $chunkSize: ";
+        var_dump(sendStreams($conn, $tableName, $source, array('StreamChunkSize' => $chunkSize)));
+    }
+    echo "$source, sqlsrv_send_stream_data: ";
+    var_dump(sendStreams($conn, $tableName, $source, array('StreamChunkSize' => 4096, 'SendStreamParamsAtExec' => false)));
+}
+
+// a file opened at another position than its start is sent from that position
+echo "file at an offset: ";
+var_dump(sendStreams($conn, $tableName, 'file', array('StreamChunkSize' => 65536), 100));
+
+// an empty file is sent as an empty value
+$fileName = tempnam(sys_get_temp_dir(), 'sqlsrv_stream');
+$stream = fopen($fileName, 'rb');
+sqlsrv_query($conn, "TRUNCATE TABLE $tableName");
+sqlsrv_query($conn, "INSERT INTO $tableName (c_varbinary) VALUES (?)", array(array(&$stream, SQLSRV_PARAM_IN, SQLSRV_PHPTYPE_STREAM(SQLSRV_ENC_BINARY), SQLSRV_SQLTYPE_VARBINARY('max'))));
+fclose($stream);
+unlink($fileName);
+$stmt = sqlsrv_query($conn, "SELECT DATALENGTH(c_varbinary) FROM $tableName");
+sqlsrv_fetch($stmt);
+echo "empty file: ";
+var_dump(sqlsrv_get_field($stmt, 0));
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+file, default chunk size: bool(true)
+file, StreamChunkSize 1024: bool(true)
+file, StreamChunkSize 65536: bool(true)
+file, StreamChunkSize 1048576: bool(true)
+file, sqlsrv_send_stream_data: bool(true)
+memory, default chunk size: bool(true)
+memory, StreamChunkSize 1024: bool(true)
+memory, StreamChunkSize 65536: bool(true)
+memory, StreamChunkSize 1048576: bool(true)
+memory, sqlsrv_send_stream_data: bool(true)
+file at an offset: bool(true)
+empty file: int(0)
+Done
@@ -0,0 +1,76 @@
+--TEST--
+Test the spans and counters returned by sqlsrv_trace_info
+--DESCRIPTION--
+With sqlsrv.Trace on, each connect, prepare, execute, fetch, retrieval of a field and read from a stream
+adds a span to the statistics of the process, and the counters count the requests made to the server and
+the rows and bytes fetched. The values are compared before and after each step.
+--INI--
+sqlsrv.Trace=1
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function printDelta($before, $spans, $counters)
+{
+    $after = sqlsrv_trace_info();
+    $values = array();
+    foreach ($spans as $span) {
+        $values[] = $span . ": " . ($after['Spans'][$span]['Count'] - $before['Spans'][$span]['Count']);
+    }
+    foreach ($counters as $counter) {
+        $values[] = $counter . ": " . ($after['Counters'][$counter] - $before['Counters'][$counter]);
+    }
+    echo implode(", ", $values) . "\n";
+    return $after;
+}
+
+$info = sqlsrv_trace_info();
+var_dump($info['Enabled']);
+echo implode(",", array_keys($info['Spans'])) . "\n";
+echo implode(",", array_keys($info['Counters'])) . "\n";
+
+$conn = connect();
+$info = printDelta($info, array('Connect'), array());
+var_dump($info['Spans']['Connect']['TotalTime'] >= $info['Spans']['Connect']['MaxTime']);
+
+$stmt = sqlsrv_prepare($conn, "SELECT 1 AS c1, 'abc' AS c2 UNION ALL SELECT 2, 'def'");
+$info = printDelta($info, array('Prepare'), array('RoundTrips'));
+
+sqlsrv_execute($stmt);
+$info = printDelta($info, array('Execute'), array('RoundTrips'));
+
+while (sqlsrv_fetch($stmt)) {
+    sqlsrv_get_field($stmt, 1, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_CHAR));
+}
+$info = printDelta($info, array('Fetch', 'GetData'), array('Rows', 'BytesFetched'));
+
+// a field read as a stream
+$stmt = sqlsrv_query($conn, "SELECT REPLICATE('x', 100)");
+$info = sqlsrv_trace_info();
+sqlsrv_fetch($stmt);
+$stream = sqlsrv_get_field($stmt, 0, SQLSRV_PHPTYPE_STREAM(SQLSRV_ENC_CHAR));
+echo strlen(stream_get_contents($stream)) . "\n";
+$after = sqlsrv_trace_info();
+var_dump($after['Spans']['StreamRead']['Count'] > $info['Spans']['StreamRead']['Count']);
+var_dump($after['Counters']['BytesFetched'] - $info['Counters']['BytesFetched']);
+
+sqlsrv_free_stmt($stmt);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+bool(true)
+Connect,Prepare,Execute,Fetch,GetData,StreamRead
+RoundTrips,BytesFetched,Rows,Conversions,CacheHits
+Connect: 1
+bool(true)
+Prepare: 1, RoundTrips: 1
+Execute: 1, RoundTrips: 1
+Fetch: 3, GetData: 2, Rows: 2, BytesFetched: 6
+100
+bool(true)
+int(100)
+Done
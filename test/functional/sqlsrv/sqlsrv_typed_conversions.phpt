@@ -0,0 +1,158 @@
+--TEST--
+Test that decimal, numeric and datetime fields read in their ODBC structures match the strings of the driver
+--DESCRIPTION--
+Decimal, numeric, money, date and datetime fields of a forward only cursor are read as SQL_NUMERIC_STRUCT and
+SQL_TIMESTAMP_STRUCT and formatted by the extension, while a client buffered cursor holds the strings converted by
+the ODBC driver. Random values of each type are fetched both ways, as strings and as DateTime objects, with and
+without FormatDecimals and DecimalPlaces, and in both encodings, and every field must be the same.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+function randomDigits($count)
+{
+    $digits = '';
+    for ($i = 0; $i < $count; $i++) {
+        $digits .= mt_rand(0, 9);
+    }
+    return $digits;
+}
+
+function randomDecimal($precision, $scale)
+{
+    $number = randomDigits(mt_rand(0, $precision - $scale));
+    if ($scale > 0) {
+        $number .= '.' . randomDigits($scale);
+    }
+    if ($number == '' || $number[0] == '.') {
+        $number = '0' . $number;
+    }
+    return (mt_rand(0, 1) ? '-' : '') . $number;
+}
+
+function randomDate($minYear, $maxYear, $fraction)
+{
+    $date = sprintf('%04d-%02d-%02d %02d:%02d:%02d', mt_rand($minYear, $maxYear), mt_rand(1, 12), mt_rand(1, 28),
+                    mt_rand(0, 23), mt_rand(0, 59), mt_rand(0, 59));
+    if ($fraction > 0) {
+        $date .= '.' . randomDigits($fraction);
+    }
+    return $date;
+}
+
+function fetchAll($conn, $query, $options)
+{
+    $stmt = sqlsrv_query($conn, $query, array(), $options);
+    if ($stmt === false) {
+        fatalError("Failed to query the test table");
+    }
+    $rows = array();
+    while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC)) {
+        foreach ($row as $i => $field) {
+            if ($field instanceof DateTime) {
+                $row[$i] = $field->format('Y-m-d H:i:s.u');
+            }
+        }
+        $rows[] = $row;
+    }
+    sqlsrv_free_stmt($stmt);
+    return $rows;
+}
+
+function compareFetches($conn, $tableName, $label, $options = array())
+{
+    $query = "SELECT * FROM $tableName ORDER BY id";
+    $typed = fetchAll($conn, $query, $options);
+    $strings = fetchAll($conn, $query, array_merge($options, array('Scrollable' => 'buffered')));
+
+    $mismatches = 0;
+    foreach ($strings as $r => $row) {
+        foreach ($row as $i => $field) {
+            if ($typed[$r][$i] !== $field) {
+                if ($mismatches++ < 5) {
+                    echo "$label: row $r, field $i: " . var_export($typed[$r][$i], true) . " instead of " . var_export($field, true) . "\n";
+                }
+            }
+        }
+    }
+    echo "$label: " . count($typed) . " rows, $mismatches mismatches\n";
+}
+
+mt_srand(12345);
+
+$conn = connect();
+$tableName = 'typed_conversions';
+
+// the types, with the random values inserted into them
+$types = array(
+    'decimal(1, 0)' => function () { return randomDecimal(1, 0); },
+    'decimal(9, 2)' => function () { return randomDecimal(9, 2); },
+    'numeric(5, 5)' => function () { return randomDecimal(5, 5); },
+    'decimal(18, 9)' => function () { return randomDecimal(18, 9); },
+    'numeric(28, 0)' => function () { return randomDecimal(28, 0); },
+    'decimal(38, 0)' => function () { return randomDecimal(38, 0); },
+    'decimal(38, 12)' => function () { return randomDecimal(38, 12); },
+    'numeric(38, 38)' => function () { return randomDecimal(38, 38); },
+    'money' => function () { return randomDecimal(18, 4); },
+    'smallmoney' => function () { return randomDecimal(9, 4); },
+    'date' => function () { return substr(randomDate(1, 9999, 0), 0, 10); },
+    'datetime' => function () { return randomDate(1753, 9999, 3); },
+    'smalldatetime' => function () { return randomDate(1900, 2078, 0); },
+    'datetime2(0)' => function () { return randomDate(1, 9999, 0); },
+    'datetime2(3)' => function () { return randomDate(1, 9999, 3); },
+    'datetime2(7)' => function () { return randomDate(1, 9999, 7); },
+);
+
+$columns = array('id int');
+$i = 0;
+foreach ($types as $type => $generator) {
+    $columns[] = "c$i $type";
+    $i++;
+}
+createTableEx($conn, $tableName, implode(', ', $columns));
+
+$placeholders = implode(', ', array_fill(0, count($types) + 1, '?'));
+$insertSql = "INSERT INTO $tableName VALUES ($placeholders)";
+for ($id = 0; $id < 200; $id++) {
+    $values = array($id);
+    foreach ($types as $generator) {
+        // every tenth row is null, and the random decimals include zeroes of either sign
+        if ($id % 10 == 0) {
+            $values[] = null;
+        } else {
+            $values[] = $generator();
+        }
+    }
+    if (sqlsrv_query($conn, $insertSql, $values) === false) {
+        fatalError("Failed to insert row $id");
+    }
+}
+sqlsrv_close($conn);
+
+$conn = connect();
+compareFetches($conn, $tableName, 'default');
+sqlsrv_close($conn);
+
+$conn = connect(array('ReturnDatesAsStrings' => true, 'CharacterSet' => 'UTF-8'));
+compareFetches($conn, $tableName, 'UTF-8 strings');
+compareFetches($conn, $tableName, 'UTF-8 formatted', array('FormatDecimals' => true, 'DecimalPlaces' => 2));
+sqlsrv_close($conn);
+
+$conn = connect(array('ReturnDatesAsStrings' => true, 'CharacterSet' => SQLSRV_ENC_CHAR));
+compareFetches($conn, $tableName, 'char strings');
+compareFetches($conn, $tableName, 'char formatted', array('FormatDecimals' => true));
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+default: 200 rows, 0 mismatches
+UTF-8 strings: 200 rows, 0 mismatches
+UTF-8 formatted: 200 rows, 0 mismatches
+char strings: 200 rows, 0 mismatches
+char formatted: 200 rows, 0 mismatches
+Done
@@ -0,0 +1,90 @@
+--TEST--
+Test UTF-8 strings that are entirely or partly ASCII sent and fetched with the UTF-8 encoding
+--DESCRIPTION--
+ASCII characters are copied to and from UTF-16 without the system converters. Strings of different
+lengths, with non-ASCII characters at the start, in the middle or at the end, must round trip as
+parameters, in the query text, as fields and as output parameters.
+--SKIPIF--
+<?php require('skipif_versions_old.inc'); ?>
+--FILE--
+<?php
+require_once('MsCommon.inc');
+
+$conn = connect(array('CharacterSet' => 'UTF-8'));
+
+$tableName = 'utf8_ascii_conversion';
+dropTable($conn, $tableName);
+$stmt = sqlsrv_query($conn, "CREATE TABLE $tableName (c_id int, c_nvarchar nvarchar(4000), c_max nvarchar(max))");
+if (!$stmt) {
+    fatalError("Failed to create table $tableName");
+}
+
+$values = array('');
+foreach (array(1, 7, 8, 9, 15, 16, 17, 31, 32, 33, 100, 3000) as $len) {
+    $ascii = substr(str_repeat('abcdefghijklmnopqrstuvwxyz0123456789 ~', 100), 0, $len);
+    $values[] = $ascii;
+    $values[] = 'ü' . $ascii;
+    $values[] = $ascii . 'ü';
+    $values[] = substr($ascii, 0, intdiv($len, 2)) . '中文' . substr($ascii, intdiv($len, 2));
+    $values[] = $ascii . "\u{1F600}" . $ascii;
+}
+
+foreach ($values as $id => $value) {
+    $stmt = sqlsrv_query($conn, "INSERT INTO $tableName VALUES (?, ?, ?)", array($id, $value, $value));
+    if (!$stmt) {
+        fatalError("Failed to insert value $id");
+    }
+}
+
+$stmt = sqlsrv_query($conn, "SELECT c_id, c_nvarchar, c_max FROM $tableName ORDER BY c_id");
+$count = 0;
+while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC)) {
+    $id = $row[0];
+    if ($row[1] !== $values[$id] || $row[2] !== $values[$id]) {
+        echo "Value $id differs: " . var_export($row, true) . "\n";
+    }
+    $count++;
+}
+echo "$count values fetched\n";
+
+// the same strings through a client buffered cursor
+$stmt = sqlsrv_query($conn, "SELECT c_id, c_nvarchar FROM $tableName ORDER BY c_id", array(), array('Scrollable' => SQLSRV_CURSOR_CLIENT_BUFFERED));
+while ($row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC)) {
+    if ($row[1] !== $values[$row[0]]) {
+        echo "Buffered value {$row[0]} differs\n";
+    }
+}
+
+// the query text and output parameters are converted as well
+foreach (array(5, 8, 9) as $id) {
+    $stmt = sqlsrv_query($conn, "SELECT c_id FROM $tableName WHERE c_nvarchar = N'" . $values[$id] . "'");
+    $row = sqlsrv_fetch_array($stmt, SQLSRV_FETCH_NUMERIC);
+    echo $row[0] . "\n";
+
+    $out = '';
+    $stmt = sqlsrv_query($conn, "SET ? = (SELECT c_nvarchar FROM $tableName WHERE c_id = ?)",
+                         array(array(&$out, SQLSRV_PARAM_OUT, SQLSRV_PHPTYPE_STRING('UTF-8'), SQLSRV_SQLTYPE_NVARCHAR(4000)), $id));
+    sqlsrv_next_result($stmt);
+    var_dump($out === $values[$id]);
+}
+
+// a field fetched as a string with the system encoding is not converted from UTF-16
+$stmt = sqlsrv_query($conn, "SELECT c_nvarchar FROM $tableName WHERE c_id = 1");
+sqlsrv_fetch($stmt);
+var_dump(sqlsrv_get_field($stmt, 0, SQLSRV_PHPTYPE_STRING(SQLSRV_ENC_CHAR)));
+
+dropTable($conn, $tableName);
+sqlsrv_close($conn);
+
+echo "Done\n";
+?>
+--EXPECT--
+61 values fetched
+5
+bool(true)
+8
+bool(true)
+9
+bool(true)
+string(1) "a"
+Done